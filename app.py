@@ -2,7 +2,9 @@
 Streamlit Web Application for Tourism AI System
 """
 import streamlit as st
+import tracing
 from tourism_ai_agent import TourismAIAgent
+from warming import get_warmer
 
 # Page configuration
 st.set_page_config(
@@ -45,13 +47,68 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
-if 'agent' not in st.session_state:
-    st.session_state.agent = TourismAIAgent()
+# Conversations kept per browser session (the ones shown), older ones are dropped
+MAX_CHAT_HISTORY = 5
 
+
+@st.cache_resource
+def get_agent():
+    """
+    Process-wide agent shared by every session, created on first use
+    
+    Streamlit reruns this script for each interaction of each session; the
+    agent (and its compiled parser) is built once and reused by all of them.
+    Its HTTP pools and caches are process-wide singletons as well, created
+    lazily and safe to use from concurrent sessions. The cache warmer starts
+    with it and keeps popular destinations cached on the background loop.
+    """
+    get_warmer().start()
+    return TourismAIAgent()
+
+
+# Session state holds only this user's chat history
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 
+
+def response_html(response):
+    """
+    Response text as the styled answer box
+    """
+    # Format response with better styling
+    response_lines = response.split('\n')
+    formatted_response = ""
+    for line in response_lines:
+        if line.strip().startswith('-'):
+            formatted_response += f"  {line}\n"
+        else:
+            formatted_response += f"{line}\n"
+    
+    return f'<div class="response-box">{formatted_response.replace(chr(10), "<br>")}</div>'
+
+
+def render_waterfall(trace):
+    """
+    Show the per-stage timings of one answer as a waterfall table
+    """
+    total = max(trace.duration, 1e-9)
+    rows = []
+    for depth, stage, offset in trace.waterfall():
+        # 40 character timeline, one bar per stage
+        start = int(offset / total * 40)
+        width = max(1, int(stage.duration / total * 40))
+        details = [f"{key}={value}" for key, value in stage.attributes.items() if key != "query"]
+        if stage.error:
+            details.append(f"error={stage.error}")
+        rows.append({
+            "Stage": "\u00a0\u00a0" * depth + stage.name,
+            "Start (ms)": round(offset * 1000, 1),
+            "Duration (ms)": round(stage.duration * 1000, 1),
+            "Timeline": "\u00b7" * start + "\u2588" * width,
+            "Details": ", ".join(details)
+        })
+    st.table(rows)
+
 # Header
 st.markdown('<h1 class="main-header">🌍 Tourism AI System</h1>', unsafe_allow_html=True)
 st.markdown('<p class="sub-header">Your intelligent travel planning assistant</p>', unsafe_allow_html=True)
@@ -73,7 +130,8 @@ with st.sidebar:
         "I'm visiting Delhi, what is the weather conditions",
         "I'm going to go to Bangalore, what is the temperature there? And what are the places I can visit?",
         "I'm traveling to Paris, show me places to visit",
-        "I'm heading to Mumbai, what's the weather like?"
+        "I'm heading to Mumbai, what's the weather like?",
+        "I'm going to Jaipur, plan a 3 day itinerary"
     ]
     
     for example in example_queries:
@@ -89,6 +147,9 @@ with st.sidebar:
     
     All APIs are free and open-source!
     """)
+    
+    st.header("🔍 Debug")
+    show_timings = st.checkbox("Show pipeline timings", value=False)
 
 # Main content area
 st.markdown("---")
@@ -108,35 +169,44 @@ with col2:
 
 # Process query
 if submit_button and user_input:
+    # Sections are shown as soon as their agent answers, then replaced by the full answer below
+    partial_response = st.empty()
     with st.spinner("Processing your request..."):
-        response = st.session_state.agent.process_request(user_input)
+        with tracing.capture() as traces:
+            partial = ""
+            for section in get_agent().process_request_stream(user_input):
+                if section.kind == "answer":
+                    response = section.text
+                else:
+                    # Each destination of a multi-destination query is its own paragraph
+                    separator = "\n\n" if section.kind == "destination" else " "
+                    partial = partial + separator + section.text if partial else section.text
+                    partial_response.markdown(response_html(partial), unsafe_allow_html=True)
+        partial_response.empty()
         
         # Add to chat history
         st.session_state.chat_history.append({
             "query": user_input,
-            "response": response
+            "response": response,
+            "trace": traces[-1] if traces else None
         })
+        del st.session_state.chat_history[:-MAX_CHAT_HISTORY]
 
 # Display chat history
 if st.session_state.chat_history:
     st.markdown("### 💬 Conversation History")
     
-    for idx, chat in enumerate(reversed(st.session_state.chat_history[-5:])):  # Show last 5
+    for idx, chat in enumerate(reversed(st.session_state.chat_history)):
         with st.expander(f"Query: {chat['query'][:50]}..." if len(chat['query']) > 50 else f"Query: {chat['query']}", expanded=(idx == 0)):
             st.markdown(f"**Your Query:**")
             st.info(chat['query'])
             
             st.markdown(f"**Tourism AI Response:**")
-            # Format response with better styling
-            response_lines = chat['response'].split('\n')
-            formatted_response = ""
-            for line in response_lines:
-                if line.strip().startswith('-'):
-                    formatted_response += f"  {line}\n"
-                else:
-                    formatted_response += f"{line}\n"
+            st.markdown(response_html(chat['response']), unsafe_allow_html=True)
             
-            st.markdown(f'<div class="response-box">{formatted_response.replace(chr(10), "<br>")}</div>', unsafe_allow_html=True)
+            if show_timings and chat.get("trace"):
+                st.markdown(f"**Pipeline timings ({chat['trace'].duration * 1000:.0f} ms):**")
+                render_waterfall(chat["trace"])
 
 # Clear history button
 if st.session_state.chat_history:
@@ -0,0 +1,237 @@
+"""
+Benchmark - End-to-end request latency and throughput against local stub upstreams
+
+Usage:
+    python -m benchmarks.end_to_end [--mode cli|batch|both] [--requests N] [--concurrency N]
+        [--places N] [--latency SERVICE=SPEC ...] [--error-rate SERVICE=RATE ...]
+        [--overpass-elements N] [--respect-rate-limits] [--json results.json]
+
+The stubs from benchmarks.stub_servers run in a child process, so the
+numbers cover only the agent. The cli mode calls process_request the way
+main.py and app.py do, from --concurrency threads. The batch mode sends the
+same queries through process_batch in batches of --batch-size. Each mode
+starts with empty in-memory caches, and the offline gazetteer and POI index
+are disabled so every lookup reaches the stubs. The per-host rate limits
+meant for the public services are lifted unless --respect-rate-limits is
+given. Results can be written as JSON to compare runs.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.stub_servers import SERVICES, add_profile_arguments
+from upstream import BASE_URL_ENV_VARS
+
+TEMPLATES = [
+    "What is the weather in {place}?",
+    "Places to visit in {place}",
+    "I'm going to go to {place}, what is the temperature there? And what are the places I can visit?",
+    "trip to {place}",
+]
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ven", "tor", "sa", "bel", "dun", "gar", "hol", "nes"]
+
+DEFAULT_LATENCIES = ["nominatim=lognormal:150:0.4", "open_meteo=lognormal:80:0.3", "overpass=lognormal:900:0.5"]
+
+
+def place_names(count: int, rng: random.Random) -> List[str]:
+    """
+    Distinct made-up place names the query parser can extract
+    """
+    names = set()
+    while len(names) < count:
+        names.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title())
+    return sorted(names)
+
+
+def make_queries(count: int, places: int, unknown_rate: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    names = place_names(places, rng)
+    queries = []
+    for _ in range(count):
+        # The stub Nominatim doesn't know names containing "zzz"
+        place = "Zzz" + rng.choice(names).lower() if rng.random() < unknown_rate else rng.choice(names)
+        queries.append(rng.choice(TEMPLATES).format(place=place))
+    return queries
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def start_stubs(args: argparse.Namespace) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.stub_servers", "--port", "0",
+               "--seed", str(args.seed), "--overpass-elements", str(args.overpass_elements),
+               "--error-status", str(args.error_status)]
+    for option in args.latency:
+        command += ["--latency", option]
+    for option in args.error_rate:
+        command += ["--error-rate", option]
+    for option in args.stall:
+        command += ["--stall", option]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+
+
+def stub_environment(base_url: str, respect_rate_limits: bool = False) -> Dict[str, str]:
+    """
+    Environment pointing every upstream at the stubs, with all state in memory
+    """
+    env = {env_var: base_url for env_var in BASE_URL_ENV_VARS.values()}
+    env["TOURISM_GEOCODE_CACHE_PATH"] = ""
+    env["TOURISM_GAZETTEER_PATH"] = ""
+    env["TOURISM_POI_INDEX_DIR"] = ""
+    # Warming would fetch the seed destinations alongside the measured queries
+    env["TOURISM_WARM"] = "0"
+    env["TOURISM_WARM_STATE_PATH"] = ""
+    if not respect_rate_limits:
+        for service in SERVICES:
+            env[f"TOURISM_{service.upper()}_RATE"] = "0"
+            env[f"TOURISM_{service.upper()}_CONCURRENCY"] = "0"
+    return env
+
+
+def stub_counters(base_url: str) -> Dict[str, Dict[str, int]]:
+    with urllib.request.urlopen(f"{base_url}/_stats") as response:
+        return json.load(response)
+
+
+def reset_caches():
+    from geocode_cache import set_geocode_cache
+    from places_cache import set_places_cache
+    from weather_cache import set_forecast_cache, set_weather_cache
+
+    set_geocode_cache(None)
+    set_weather_cache(None)
+    set_forecast_cache(None)
+    set_places_cache(None)
+
+
+def run_cli(agent, queries: List[str], concurrency: int) -> Dict:
+    """
+    One process_request per query from a pool of threads, like concurrent CLI/Streamlit users
+    """
+    def timed(query: str) -> float:
+        started = time.perf_counter()
+        agent.process_request(query)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, queries))
+    return {"elapsed_s": time.perf_counter() - started, "latencies_s": latencies}
+
+
+def run_batch(agent, queries: List[str], concurrency: int, batch_size: int) -> Dict:
+    """
+    process_batch over consecutive slices of the queries, latency is per batch
+    """
+    latencies = []
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch_size):
+        batch_started = time.perf_counter()
+        agent.process_batch(queries[start:start + batch_size], max_concurrency=concurrency)
+        latencies.append(time.perf_counter() - batch_started)
+    return {"elapsed_s": time.perf_counter() - started, "latencies_s": latencies}
+
+
+def summarize(mode: str, queries: List[str], run: Dict, before: Dict, after: Dict) -> Dict:
+    latencies = run["latencies_s"]
+    upstream = {
+        service: {name: after[service][name] - before[service][name] for name in after[service]}
+        for service in SERVICES
+    }
+    return {
+        "mode": mode,
+        "queries": len(queries),
+        "elapsed_s": run["elapsed_s"],
+        "queries_per_s": len(queries) / run["elapsed_s"] if run["elapsed_s"] > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "upstream": upstream,
+        "peak_rss_mib": peak_rss_mib()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["cli", "batch", "both"], default="both")
+    parser.add_argument("--requests", type=int, default=200, help="Queries per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="CLI threads / batch max_concurrency")
+    parser.add_argument("--batch-size", type=int, default=50, help="Queries per process_batch call")
+    parser.add_argument("--places", type=int, default=40, help="Distinct places in the query mix")
+    parser.add_argument("--unknown-rate", type=float, default=0.05, help="Fraction of queries naming unknown places")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--respect-rate-limits", action="store_true",
+                        help="Keep the default per-host rate and concurrency limits")
+    parser.add_argument("--json", help="Write the results to this file")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if not args.latency:
+        args.latency = DEFAULT_LATENCIES
+
+    stubs = start_stubs(args)
+    try:
+        base_url = stubs.stdout.readline().strip()
+        if not base_url:
+            sys.exit("Stub servers failed to start")
+
+        os.environ.update(stub_environment(base_url, args.respect_rate_limits))
+
+        from tourism_ai_agent import TourismAIAgent
+
+        agent = TourismAIAgent()
+        queries = make_queries(args.requests, args.places, args.unknown_rate, args.seed)
+        modes = ["cli", "batch"] if args.mode == "both" else [args.mode]
+
+        results = []
+        for mode in modes:
+            reset_caches()
+            before = stub_counters(base_url)
+            if mode == "cli":
+                run = run_cli(agent, queries, args.concurrency)
+            else:
+                run = run_batch(agent, queries, args.concurrency, args.batch_size)
+            results.append(summarize(mode, queries, run, before, stub_counters(base_url)))
+    finally:
+        stubs.terminate()
+        stubs.wait()
+
+    print(f"{'mode':<6} {'queries':>8} {'q/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'nominatim':>10} {'open_meteo':>11} {'overpass':>9} {'errors':>7} {'peak RSS MiB':>13}")
+    for result in results:
+        upstream = result["upstream"]
+        errors = sum(counters["errors"] for counters in upstream.values())
+        print(f"{result['mode']:<6} {result['queries']:>8} {result['queries_per_s']:>8.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+              f"{upstream['nominatim']['requests']:>10} {upstream['open_meteo']['requests']:>11} "
+              f"{upstream['overpass']['requests']:>9} {errors:>7} {result['peak_rss_mib']:>13.1f}")
+    if "batch" in modes:
+        print("batch latencies are per process_batch call")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"arguments": vars(args), "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark - Memory and summary time of cached hourly forecasts, typed arrays versus lists of dicts
+
+Usage:
+    python -m benchmarks.forecast [--cities N] [--days N] [--range-days N] [--json results.json]
+
+--cities made-up 16 day hourly forecasts, shaped like Open-Meteo's, are
+decoded once as HourlyForecast arrays and once as the obvious alternative,
+one dict per hour. The memory each representation keeps per city is
+measured with tracemalloc, as a forecast cache of that many cities would
+hold it. Then every city's forecast is summarised for --range-days days
+(daily low/high, rainy hours, weather, best day), vectorized on the arrays
+and with a loop over the dicts; both must give the same summaries.
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+from benchmarks.stub_servers import hourly_forecast
+from forecast import (DAYTIME_HOURS, DEGREES_PER_RAIN_HOUR, HOURS_PER_DAY, IDEAL_TEMPERATURE, RAIN_MM,
+                      RAIN_PROBABILITY, DayForecast, ForecastSummary, HourlyForecast)
+
+
+def decode_dicts(data: Dict) -> List[Dict]:
+    """
+    The hourly block as one dict per hour
+    """
+    hourly = data["hourly"]
+    return [
+        {
+            "time": time_, "temperature": temperature, "precipitation_probability": probability,
+            "precipitation": precipitation, "weather_code": code
+        }
+        for time_, temperature, probability, precipitation, code in zip(
+            hourly["time"], hourly["temperature_2m"], hourly["precipitation_probability"],
+            hourly["precipitation"], hourly["weather_code"]
+        )
+    ]
+
+
+def score(day: DayForecast) -> float:
+    return day.rain_hours + abs(day.high - IDEAL_TEMPERATURE) / DEGREES_PER_RAIN_HOUR
+
+
+def summarize_dicts(hours: List[Dict], start: datetime.date, end: datetime.date) -> ForecastSummary:
+    """
+    Reference summary computed hour by hour
+    """
+    first_day = datetime.date.fromisoformat(hours[0]["time"][:10])
+    days = []
+    for index in range(len(hours) // HOURS_PER_DAY):
+        day = first_day + datetime.timedelta(days=index)
+        if not start <= day <= end:
+            continue
+        block = hours[index * HOURS_PER_DAY:(index + 1) * HOURS_PER_DAY]
+        temperatures = [hour["temperature"] for hour in block]
+        rain_hours = sum(
+            1 for hour in block
+            if hour["precipitation_probability"] >= RAIN_PROBABILITY or hour["precipitation"] >= RAIN_MM
+        )
+        code = max(hour["weather_code"] for hour in block[DAYTIME_HOURS])
+        days.append(DayForecast(day, min(temperatures), max(temperatures), rain_hours, code))
+
+    best_day = None
+    if len(days) > 1:
+        best_day = min(days, key=score).day
+    return ForecastSummary(days, best_day, first_day + datetime.timedelta(days=len(hours) // HOURS_PER_DAY - 1))
+
+
+def retained_bytes(build) -> tuple:
+    """
+    (result, bytes still allocated by build once it returns)
+    """
+    tracemalloc.start()
+    result = build()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained
+
+
+def same_summary(array_summary: ForecastSummary, dict_summary: ForecastSummary) -> bool:
+    # float32 arrays round the temperatures a little, which can break a tie for the best day either way
+    if len(array_summary.days) != len(dict_summary.days):
+        return False
+    scores = {day.day: score(day) for day in dict_summary.days}
+    if dict_summary.best_day and abs(scores[array_summary.best_day] - scores[dict_summary.best_day]) > 0.01:
+        return False
+    return all(
+        a.day == d.day and abs(a.low - d.low) < 0.01 and abs(a.high - d.high) < 0.01
+        and a.rain_hours == d.rain_hours and a.weather_code == d.weather_code
+        for a, d in zip(array_summary.days, dict_summary.days)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=5000, help="Cached forecasts")
+    parser.add_argument("--days", type=int, default=16, help="Days in each forecast")
+    parser.add_argument("--range-days", type=int, default=5, help="Days each summary covers")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    today = datetime.date.today()
+    payloads = [{"hourly": hourly_forecast(city, args.days, today)} for city in range(args.cities)]
+    start = today + datetime.timedelta(days=1)
+    end = start + datetime.timedelta(days=args.range_days - 1)
+
+    results = []
+    for variant, decode, summarize in [
+        ("arrays", HourlyForecast.from_open_meteo, lambda forecast: forecast.summarize(start, end)),
+        ("dicts", decode_dicts, lambda hours: summarize_dicts(hours, start, end)),
+    ]:
+        started = time.perf_counter()
+        decoded, retained = retained_bytes(lambda: [decode(payload) for payload in payloads])
+        decode_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        summaries = [summarize(forecast) for forecast in decoded]
+        summarize_s = time.perf_counter() - started
+
+        results.append({
+            "variant": variant,
+            "cities": args.cities,
+            "bytes_per_city": retained / args.cities,
+            "cache_mib": retained / 2 ** 20,
+            "decode_us_per_city": decode_s / args.cities * 1e6,
+            "summarize_us_per_city": summarize_s / args.cities * 1e6,
+            "summaries": summaries
+        })
+        del decoded
+
+    for array_summary, dict_summary in zip(results[0].pop("summaries"), results[1].pop("summaries")):
+        if not same_summary(array_summary, dict_summary):
+            sys.exit(f"Summaries differ: {array_summary} != {dict_summary}")
+
+    print(f"{args.cities} cities, {args.days} day hourly forecasts, {args.range_days} day summaries (identical)")
+    print(f"{'variant':<8} {'bytes/city':>11} {'cache MiB':>10} {'decode us':>10} {'summary us':>11}")
+    for result in results:
+        print(f"{result['variant']:<8} {result['bytes_per_city']:>11,.0f} {result['cache_mib']:>10.1f} "
+              f"{result['decode_us_per_city']:>10.1f} {result['summarize_us_per_city']:>11.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
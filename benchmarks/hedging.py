@@ -0,0 +1,162 @@
+"""
+Benchmark - Overpass tail latency and load with one endpoint versus hedged mirrors
+
+Usage:
+    python -m benchmarks.hedging [--mirrors N] [--lookups N] [--concurrency N]
+        [--latency overpass=lognormal:400:0.3] [--stall overpass=0.03:4000] [--fail-primary]
+
+Every mirror is its own stub server process with the same latency profile
+and an independent share of stalled requests (--stall, a slow mirror's
+tail). Attraction lookups for distinct coordinates, so nothing is shared or
+cached, are answered by places_agent in this process, first through the
+first mirror alone and then through the pool of all mirrors with hedging
+and circuit breakers. Before each mode --warmup lookups fill the pool's
+window of answer times, which sets the hedge delay.
+
+Reported per mode: failed lookups, latency percentiles, Overpass requests
+the stubs received per lookup (the extra load hedging costs), hedges sent and won,
+failovers and breaker trips. With --fail-primary the first mirror answers
+every request with HTTP 500, so its breaker opens and lookups move to the
+others.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.end_to_end import percentile, start_stubs, stub_counters, stub_environment
+from benchmarks.stub_servers import add_profile_arguments
+
+MODES = ["single", "hedged"]
+
+DEFAULT_LATENCIES = ["overpass=lognormal:400:0.3"]
+DEFAULT_STALLS = ["overpass=0.03:4000"]
+
+
+def make_points(count: int, seed: int) -> List[Tuple[float, float]]:
+    """
+    Distinct coordinates, so every lookup is its own Overpass request
+    """
+    rng = random.Random(seed)
+    return [(rng.uniform(-60.0, 60.0), rng.uniform(-180.0, 180.0)) for _ in range(count)]
+
+
+async def look_up(points: List[Tuple[float, float]], concurrency: int) -> List[Tuple[float, bool]]:
+    """
+    (seconds, answered) of every lookup
+    """
+    from places_agent import get_attraction_points_at_async
+    from upstream import UpstreamError
+
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(lat: float, lon: float) -> Tuple[float, bool]:
+        async with gate:
+            started = time.perf_counter()
+            try:
+                answered = await get_attraction_points_at_async(lat, lon) is not None
+            except UpstreamError:
+                answered = False
+            return time.perf_counter() - started, answered
+
+    return await asyncio.gather(*(one(lat, lon) for lat, lon in points))
+
+
+def run_mode(mode: str, urls: List[str], points: List[Tuple[float, float]], warmup: int,
+             concurrency: int) -> Dict:
+    from upstream import configure_client, run_sync
+
+    client = configure_client(endpoints={"overpass": urls[:1] if mode == "single" else urls})
+    run_sync(look_up(points[:warmup], concurrency))
+
+    before = sum(stub_counters(url)["overpass"]["requests"] for url in urls)
+    outcomes = run_sync(look_up(points[warmup:], concurrency))
+    requests = sum(stub_counters(url)["overpass"]["requests"] for url in urls) - before
+    # Hedging counters cover the warm-up as well
+    pool = client.endpoint_stats()["overpass"]
+    run_sync(client.close())
+
+    lookups = len(outcomes)
+    latencies = [seconds for seconds, _ in outcomes]
+    return {
+        "mode": mode,
+        "endpoints": len(pool["endpoints"]),
+        "lookups": lookups,
+        "failed": sum(not answered for _, answered in outcomes),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "requests_per_lookup": requests / lookups,
+        "hedge_delay_ms": pool["hedge_delay_ms"],
+        "hedged": pool["hedged"],
+        "hedges_won": pool["hedges_won"],
+        "failovers": pool["failovers"],
+        "trips": sum(endpoint["trips"] for endpoint in pool["endpoints"])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mirrors", type=int, default=2, help="Overpass stub servers in the pool")
+    parser.add_argument("--lookups", type=int, default=1000, help="Measured lookups per mode")
+    parser.add_argument("--warmup", type=int, default=50, help="Lookups before measuring, per mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="Lookups in flight at once")
+    parser.add_argument("--fail-primary", action="store_true", help="The first mirror answers every request with an error")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if not args.latency:
+        args.latency = DEFAULT_LATENCIES
+    if not args.stall:
+        args.stall = DEFAULT_STALLS
+
+    stubs = []
+    try:
+        for index in range(args.mirrors):
+            # Every mirror stalls on its own requests
+            mirror_args = argparse.Namespace(**vars(args))
+            mirror_args.seed = args.seed + index
+            if args.fail_primary and index == 0:
+                mirror_args.error_rate = args.error_rate + ["overpass=1.0"]
+                mirror_args.error_status = 500
+            stubs.append(start_stubs(mirror_args))
+        urls = [stub.stdout.readline().strip() for stub in stubs]
+        if not all(urls):
+            sys.exit("Stub servers failed to start")
+
+        # Nominatim and Open-Meteo aren't used, point them at the first stub
+        os.environ.update(stub_environment(urls[0]))
+        points = make_points(len(MODES) * (args.warmup + args.lookups), args.seed)
+        per_mode = args.warmup + args.lookups
+        results = [
+            run_mode(mode, urls, points[index * per_mode:(index + 1) * per_mode], args.warmup, args.concurrency)
+            for index, mode in enumerate(MODES)
+        ]
+    finally:
+        for stub in stubs:
+            stub.terminate()
+            stub.wait()
+
+    print(f"{args.lookups} lookups, {args.concurrency} in flight, overpass {' '.join(args.latency)} "
+          f"stall {' '.join(args.stall)}{', primary failing' if args.fail_primary else ''}")
+    print(f"{'mode':<8} {'endpoints':>9} {'failed':>6} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'max ms':>7} "
+          f"{'req/lookup':>10} {'delay ms':>8} {'hedged':>6} {'won':>5} {'failovers':>9} {'trips':>5}")
+    for result in results:
+        print(f"{result['mode']:<8} {result['endpoints']:>9} {result['failed']:>6} {result['p50_ms']:>7.0f} "
+              f"{result['p95_ms']:>7.0f} {result['p99_ms']:>7.0f} {result['max_ms']:>7.0f} {result['requests_per_lookup']:>10.3f} "
+              f"{result['hedge_delay_ms']:>8.0f} {result['hedged']:>6} {result['hedges_won']:>5} "
+              f"{result['failovers']:>9} {result['trips']:>5}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
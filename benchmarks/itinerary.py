@@ -0,0 +1,103 @@
+"""
+Benchmark - Itinerary planning time and route quality over synthetic POI sets
+
+Usage:
+    python -m benchmarks.itinerary [--sizes 50,200,500] [--days 1,3,7] [--repeat N]
+
+Attractions are scattered over a 20 km wide city in a few dense clusters,
+like old towns and museum quarters. For every size and day count the
+planner's time is reported with the total route length, next to the length
+of the plain nearest-neighbour tours (before 2-opt) and of the attractions
+visited in ranking order. Every plan must visit each attraction exactly once.
+"""
+import argparse
+import math
+import random
+import time
+from typing import List
+
+import numpy as np
+
+from itinerary_agent import cluster_days, distance_matrix, plan_days
+from ranking import Attraction
+
+CENTER = (48.8566, 2.3522)
+
+
+def attractions(count: int, seed: int = 5) -> List[Attraction]:
+    """
+    Attractions around CENTER, two thirds of them in dense quarters
+    """
+    rng = random.Random(seed)
+    lat, lon = CENTER
+    scale = 1 / math.cos(math.radians(lat))
+    quarters = [(lat + rng.uniform(-0.06, 0.06), lon + rng.uniform(-0.06, 0.06) * scale) for _ in range(6)]
+    items = []
+    for index in range(count):
+        if rng.random() < 2 / 3:
+            quarter_lat, quarter_lon = rng.choice(quarters)
+            point = (quarter_lat + rng.gauss(0, 0.006), quarter_lon + rng.gauss(0, 0.006) * scale)
+        else:
+            point = (lat + rng.uniform(-0.09, 0.09), lon + rng.uniform(-0.09, 0.09) * scale)
+        items.append(Attraction(f"Attraction {index}", *point))
+    return items
+
+
+def route_length(matrix: np.ndarray, route: List[int]) -> float:
+    return float(matrix[route[:-1], route[1:]].sum())
+
+
+def baseline_lengths(stops: List[Attraction], days: int):
+    """
+    Total length of the same day split visited in ranking order, and with nearest neighbour only
+    """
+    lats = np.array([CENTER[0]] + [stop.lat for stop in stops])
+    lons = np.array([CENTER[1]] + [stop.lon for stop in stops])
+    matrix = distance_matrix(lats, lons)
+    labels = cluster_days(lats[1:], lons[1:], min(days, len(stops)))
+
+    in_order = 0.0
+    nearest = 0.0
+    for day in range(int(labels.max()) + 1):
+        nodes = [0] + (np.flatnonzero(labels == day) + 1).tolist()
+        local = matrix[np.ix_(nodes, nodes)]
+        in_order += route_length(local, list(range(len(nodes))))
+
+        route = [0]
+        unvisited = set(range(1, len(nodes)))
+        while unvisited:
+            route.append(min(unvisited, key=lambda node: local[route[-1], node]))
+            unvisited.remove(route[-1])
+        nearest += route_length(local, route)
+    return in_order, nearest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,200,500", help="Comma-separated attraction counts")
+    parser.add_argument("--days", default="1,3,7", help="Comma-separated day counts")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per case, the best is reported")
+    args = parser.parse_args()
+
+    print(f"{'stops':>6} {'days':>5} {'plan ms':>9} {'route km':>9} {'nn km':>8} {'in order km':>12}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        stops = attractions(size)
+        for days in (int(value) for value in args.days.split(",")):
+            best = math.inf
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                plan = plan_days(CENTER[0], CENTER[1], stops, days)
+                best = min(best, time.perf_counter() - started)
+
+            planned = [stop for day in plan for stop in day.stops]
+            if sorted(planned) != sorted(stops):
+                raise SystemExit(f"Plan for {size} stops over {days} days doesn't visit every stop once")
+
+            in_order, nearest = baseline_lengths(stops, days)
+            total = sum(day.distance_m for day in plan)
+            print(f"{size:>6} {days:>5} {best * 1000:>9.2f} {total / 1000:>9.1f} "
+                  f"{nearest / 1000:>8.1f} {in_order / 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
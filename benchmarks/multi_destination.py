@@ -0,0 +1,128 @@
+"""
+Benchmark - Latency of queries naming several destinations, one destination at a time versus all at once
+
+Usage:
+    python -m benchmarks.multi_destination [--trials N] [--destinations N] [--places N]
+        [--latency SERVICE=SPEC ...] [--json results.json]
+
+Each trial picks --destinations made-up places. In the sequential mode they
+are asked about one after the other ("I'm going to A, what's the weather
+and what can I see?"), as a user had to before the agent understood lists
+of destinations. In the parallel mode one query names all of them ("I'm
+going to A, B and C, ..."), so they are resolved and fetched concurrently,
+with one multi-location Open-Meteo request for their weather. Caches are
+emptied before every trial of each mode.
+
+Reported: latency percentiles of the whole answer in both modes, the
+slowest single destination of each sequential trial (what the parallel
+answer should take), and upstream requests per trial. The parallel answer
+must be the sequential answers, one paragraph per destination.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.end_to_end import (DEFAULT_LATENCIES, percentile, place_names, reset_caches, start_stubs,
+                                   stub_counters, stub_environment)
+from benchmarks.stub_servers import SERVICES, add_profile_arguments
+
+QUERY = "I'm going to {places}, what's the weather and what can I see?"
+
+
+def listed(places: List[str]) -> str:
+    return places[0] if len(places) == 1 else ", ".join(places[:-1]) + " and " + places[-1]
+
+
+def run_trial(agent, places: List[str], stub_url: str) -> Dict:
+    """
+    Answer one trial's destinations in both modes
+    """
+    reset_caches()
+    before = stub_counters(stub_url)
+    singles = []
+    started = time.perf_counter()
+    for place in places:
+        single_started = time.perf_counter()
+        answer = agent.process_request(QUERY.format(places=place))
+        singles.append((time.perf_counter() - single_started, answer))
+    sequential_s = time.perf_counter() - started
+    middle = stub_counters(stub_url)
+
+    reset_caches()
+    started = time.perf_counter()
+    response = agent.process_request(QUERY.format(places=listed(places)))
+    parallel_s = time.perf_counter() - started
+    after = stub_counters(stub_url)
+
+    return {
+        "sequential_s": sequential_s,
+        "slowest_single_s": max(latency for latency, _ in singles),
+        "parallel_s": parallel_s,
+        "sequential_upstream": sum(middle[service]["requests"] - before[service]["requests"] for service in SERVICES),
+        "parallel_upstream": sum(after[service]["requests"] - middle[service]["requests"] for service in SERVICES),
+        "parallel_open_meteo": after["open_meteo"]["requests"] - middle["open_meteo"]["requests"],
+        "same_answers": response == "\n\n".join(answer for _, answer in singles)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=20, help="Queries per mode")
+    parser.add_argument("--destinations", type=int, default=3, help="Destinations named in each query")
+    parser.add_argument("--places", type=int, default=200, help="Distinct destinations to pick from")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if not args.latency:
+        args.latency = DEFAULT_LATENCIES
+
+    stubs = start_stubs(args)
+    try:
+        stub_url = stubs.stdout.readline().strip()
+        if not stub_url:
+            sys.exit("Stub servers failed to start")
+        os.environ.update(stub_environment(stub_url))
+
+        from tourism_ai_agent import TourismAIAgent
+
+        agent = TourismAIAgent()
+        rng = random.Random(args.seed)
+        names = place_names(args.places, rng)
+        trials = [run_trial(agent, rng.sample(names, args.destinations), stub_url) for _ in range(args.trials)]
+    finally:
+        stubs.terminate()
+        stubs.wait()
+
+    if not all(trial["same_answers"] for trial in trials):
+        sys.exit("Parallel answers differ from the sequential ones")
+
+    summary = {"trials": args.trials, "destinations": args.destinations}
+    for key in ("sequential_s", "slowest_single_s", "parallel_s"):
+        latencies = [trial[key] for trial in trials]
+        summary[key[:-len("_s")]] = {
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000
+        }
+    for key in ("sequential_upstream", "parallel_upstream", "parallel_open_meteo"):
+        summary[key] = sum(trial[key] for trial in trials) / args.trials
+
+    print(f"{args.trials} trials of {args.destinations} destinations (identical answers)")
+    print(f"{'mode':<15} {'p50 ms':>8} {'p95 ms':>8} {'upstream':>9}")
+    for mode, upstream in [("sequential", summary["sequential_upstream"]), ("slowest_single", None),
+                           ("parallel", summary["parallel_upstream"])]:
+        calls = f"{upstream:.1f}" if upstream is not None else "-"
+        print(f"{mode:<15} {summary[mode]['p50_ms']:>8.0f} {summary[mode]['p95_ms']:>8.0f} {calls:>9}")
+    print(f"Open-Meteo requests per parallel query: {summary['parallel_open_meteo']:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "trials": trials}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark - Overpass payload size, parse time and peak memory before/after the bounded query
+
+Usage:
+    python -m benchmarks.overpass_payload [--recorded dump.json ...] [--elements N]
+
+Recorded dumps are raw Overpass JSON answers to the old unbounded query
+(``node/way["tourism"|"leisure"](around:10000,...); out center;``). Without
+any, a synthetic large-city answer of the same shape is generated.
+
+"after" is the notable-features query the places agent sends first, "all
+named" the query it falls back to when notable features can't settle the
+top attractions (shown for comparison; the last column says whether the
+notable answer settled them, and to the same names).
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+from jsonstream import ArrayItemParser
+from ranking import OTHER_SCORE_LIMIT, CandidateSet, is_notable
+
+CHUNK_SIZE = 65536
+LIMIT = 5
+# Centre of the synthetic city
+CENTER = (12.97, 77.59)
+
+TOURISM_VALUES = ["attraction", "museum", "viewpoint", "information", "hotel", "artwork", "picnic_site"]
+LEISURE_VALUES = ["park", "pitch", "playground", "garden", "sports_centre", "swimming_pool"]
+
+
+def synthetic_response(elements: int, seed: int = 7) -> bytes:
+    """
+    Build an answer shaped like the old query's output for a large city
+    """
+    rng = random.Random(seed)
+    items = []
+    for i in range(elements):
+        tags = {}
+        if rng.random() < 0.5:
+            tags["tourism"] = rng.choice(TOURISM_VALUES)
+        else:
+            tags["leisure"] = rng.choice(LEISURE_VALUES)
+        # Most pitches, playgrounds and info boards are unnamed
+        if rng.random() < 0.3:
+            tags["name"] = f"Place {i}"
+            tags["name:en"] = f"Place {i}"
+        if rng.random() < 0.2:
+            tags.update({"opening_hours": "Mo-Su 09:00-18:00", "website": f"https://example.org/{i}"})
+        if rng.random() < 0.02:
+            tags["wikidata"] = f"Q{i}"
+
+        lat = CENTER[0] + rng.uniform(-0.09, 0.09)
+        lon = CENTER[1] + rng.uniform(-0.09, 0.09)
+        if rng.random() < 0.6:
+            items.append({"type": "node", "id": i, "lat": lat, "lon": lon, "tags": tags})
+        else:
+            items.append({
+                "type": "way", "id": i, "center": {"lat": lat, "lon": lon},
+                "nodes": [rng.randrange(10 ** 10) for _ in range(rng.randint(4, 40))],
+                "tags": tags
+            })
+
+    document = {"version": 0.6, "generator": "Overpass API", "elements": items}
+    return json.dumps(document).encode()
+
+
+def bounded_response(unbounded: bytes, notable_only: bool = True) -> bytes:
+    """
+    Derive the answer the new query returns for the same area
+
+    Keeps only named tourism/leisure features, notable ones unless
+    notable_only is False, and drops way node lists (``out tags center``);
+    all of them are returned and ranked.
+    """
+    data = json.loads(unbounded)
+    items = []
+    for element in data.get("elements", []):
+        tags = element.get("tags") or {}
+        if "name" not in tags or not ("tourism" in tags or "leisure" in tags):
+            continue
+        if notable_only and not is_notable(tags):
+            continue
+        item = {"type": element["type"], "id": element["id"]}
+        if "center" in element:
+            item["center"] = element["center"]
+        elif "lat" in element:
+            item["center"] = {"lat": element["lat"], "lon": element["lon"]}
+        item["tags"] = tags
+        items.append(item)
+
+    return json.dumps({"version": 0.6, "generator": "Overpass API", "elements": items}).encode()
+
+
+def parse_before(payload: bytes) -> List[str]:
+    """
+    The previous code path: decode the whole document, then keep the first names
+    """
+    data = json.loads(payload)
+    attractions = []
+    seen_names = set()
+    for element in data.get("elements", []):
+        tags = element.get("tags")
+        if not tags:
+            continue
+        name = tags.get("name") or tags.get("name:en") or tags.get("tourism") or tags.get("leisure")
+        if name and name not in seen_names:
+            attractions.append(name)
+            seen_names.add(name)
+            if len(attractions) >= LIMIT:
+                break
+    return attractions
+
+
+def parse_after(payload: bytes) -> Tuple[Optional[List[str]], int]:
+    """
+    The new code path: stream chunks through ArrayItemParser and rank every candidate
+
+    Returns:
+        Names found (None if they aren't settled by a notable-only answer) and
+        the number of bytes actually read
+    """
+    parser = ArrayItemParser("elements")
+    candidates = CandidateSet()
+    for offset in range(0, len(payload), CHUNK_SIZE):
+        for element in parser.feed(payload[offset:offset + CHUNK_SIZE]):
+            candidates.add_element(element)
+        if parser.done:
+            break
+    attractions = candidates.top_attractions_above(*CENTER, LIMIT, OTHER_SCORE_LIMIT)
+    names = [attraction.name for attraction in attractions] if attractions is not None else None
+    return names, parser.bytes_received
+
+
+def measure(function, payload: bytes, repeat: int) -> Dict[str, float]:
+    """
+    Time a parse function and record its peak traced memory
+    """
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function(payload)
+    elapsed = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    function(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"parse_ms": elapsed * 1000, "peak_kib": peak / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recorded", nargs="*", default=[], help="Raw Overpass JSON dumps of the old query")
+    parser.add_argument("--elements", type=int, default=40000, help="Elements in the synthetic answer")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions")
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.recorded:
+        with open(path, "rb") as dump:
+            samples.append((path, dump.read()))
+    if not samples:
+        samples.append((f"synthetic ({args.elements} elements)", synthetic_response(args.elements)))
+
+    print(f"{'sample':<32} {'variant':<10} {'bytes':>12} {'read':>12} {'parse ms':>10} {'peak KiB':>10}  settled")
+    for label, unbounded in samples:
+        named = bounded_response(unbounded, notable_only=False)
+        notable = bounded_response(unbounded)
+        before = measure(parse_before, unbounded, args.repeat)
+        full = measure(parse_after, named, args.repeat)
+        after = measure(parse_after, notable, args.repeat)
+
+        candidates = CandidateSet()
+        for element in json.loads(named)["elements"]:
+            candidates.add_element(element)
+        names, bytes_read = parse_after(notable)
+        if names is None:
+            settled = "no, falls back to all named"
+        else:
+            settled = "yes, same top" if names == candidates.top(*CENTER, LIMIT) else "yes, DIFFERENT top"
+
+        print(f"{label[:32]:<32} {'before':<10} {len(unbounded):>12,} {len(unbounded):>12,} "
+              f"{before['parse_ms']:>10.2f} {before['peak_kib']:>10.0f}")
+        print(f"{'':<32} {'all named':<10} {len(named):>12,} {len(named):>12,} "
+              f"{full['parse_ms']:>10.2f} {full['peak_kib']:>10.0f}")
+        print(f"{'':<32} {'after':<10} {len(notable):>12,} {bytes_read:>12,} "
+              f"{after['parse_ms']:>10.2f} {after['peak_kib']:>10.0f}  {settled}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark - Offline POI index lookups on a full-size region
+
+Usage:
+    python -m benchmarks.poi_index [--elements N] [--lookups N]
+
+A region is built from a synthetic large-city Overpass answer (the same
+generator as benchmarks.overpass_payload) and queried at random points
+around the centre. "nearest" decodes only the first five features;
+"attractions" is places_agent._indexed_attractions, which decodes records
+until it has INDEX_MAX_CANDIDATES candidates and ranks them. Reported are
+the median and 95th percentile lookup times and the records decoded per
+lookup.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from itertools import islice
+from typing import Callable, List, Tuple
+
+from benchmarks.overpass_payload import CENTER, LIMIT, synthetic_response
+from poi_index import POIIndex, build_region
+
+# Search points scatter this far around the centre, in degrees
+SPREAD = 0.05
+
+
+def lookup_ms(lookup: Callable[[float, float], object], points: List[Tuple[float, float]]) -> List[float]:
+    times = []
+    for lat, lon in points:
+        started = time.perf_counter()
+        lookup(lat, lon)
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--elements", type=int, default=40000, help="Features of the synthetic city")
+    parser.add_argument("--lookups", type=int, default=300, help="Lookups per measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dump = os.path.join(directory, "city.json")
+        with open(dump, "wb") as dump_file:
+            dump_file.write(synthetic_response(args.elements))
+        index_dir = os.path.join(directory, "index")
+        bounding_box = (CENTER[0] - 1.0, CENTER[1] - 1.0, CENTER[0] + 1.0, CENTER[1] + 1.0)
+        count = build_region("city", [dump], index_dir, bounding_box)
+
+        # The places agent reads the process-wide index, which loads this directory on first use
+        os.environ["TOURISM_POI_INDEX_DIR"] = index_dir
+        os.environ["TOURISM_POI_INDEX_CHECK_SECONDS"] = "0"
+        from places_agent import INDEX_MAX_CANDIDATES, OVERPASS_LEISURE_RADIUS, OVERPASS_RADIUS, _indexed_attractions
+
+        index = POIIndex(index_dir, check_interval=0)
+        rng = random.Random(5)
+        points = [(CENTER[0] + rng.uniform(-SPREAD, SPREAD), CENTER[1] + rng.uniform(-SPREAD, SPREAD))
+                  for _ in range(args.lookups)]
+
+        def nearest(lat: float, lon: float):
+            features = index.nearest(lat, lon, OVERPASS_RADIUS)
+            try:
+                return list(islice(features, LIMIT))
+            finally:
+                features.close()
+
+        def decoded(lat: float, lon: float) -> int:
+            """
+            Records _indexed_attractions decodes around a point
+            """
+            features = index.nearest(lat, lon, OVERPASS_RADIUS)
+            records = candidates = 0
+            try:
+                for feature in features:
+                    records += 1
+                    if "tourism" in feature["tags"] or feature["distance_m"] <= OVERPASS_LEISURE_RADIUS:
+                        candidates += 1
+                        if candidates >= INDEX_MAX_CANDIDATES:
+                            break
+            finally:
+                features.close()
+            return records
+
+        # Warm up: page the region in and import the ranking
+        for lat, lon in points[:20]:
+            _indexed_attractions(lat, lon, LIMIT)
+
+        print(f"{count} features indexed, {args.lookups} lookups within {SPREAD} degrees of the centre")
+        print(f"{'lookup':<12} {'p50 ms':>8} {'p95 ms':>8} {'decoded':>8}")
+        rows = [
+            ("nearest", lookup_ms(nearest, points), LIMIT),
+            ("attractions", lookup_ms(lambda lat, lon: _indexed_attractions(lat, lon, LIMIT), points),
+             statistics.mean(decoded(lat, lon) for lat, lon in points))
+        ]
+        for name, times, records in rows:
+            print(f"{name:<12} {statistics.median(times):>8.2f} {percentile(times, 0.95):>8.2f} {records:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Benchmark - Query parser throughput and equivalence with the original per-call parser
+
+Usage:
+    python -m benchmarks.query_parser [--generated N] [--repeat N] [--passes N]
+
+Every phrasing in the regression corpus, plus N generated ones, must parse
+to the same place name and intent as the original implementation (kept
+below as the reference, only its weather and places flags compared); the
+run aborts on the first difference. Phrasings the reference knows nothing
+about (dates, several destinations) must instead give the hand-written
+destinations in EXPECTED_PLACE_NAMES. Throughput
+is reported for unique phrasings with the parser's cache off (cold), against
+COLD_TARGET, and for the corpus parsed over and over with the cache on, as
+batch and replay runs do (replay), which mostly measures cache hits.
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from query_parser import DEFAULT_PLACES_KEYWORDS, DEFAULT_WEATHER_KEYWORDS, QueryParser
+
+# Cold parses per second asked for ("hundreds of thousands")
+COLD_TARGET = 200000
+
+CORPUS = [
+    "I'm going to go to Bangalore, let's plan my trip.",
+    "I'm going to go to Bangalore, what is the temperature there",
+    "I'm going to go to Bangalore, what is the temperature there? And what are the places I can visit?",
+    "What is the weather in Paris?",
+    "weather in new york",
+    "Places to visit in Tokyo",
+    "trip to Goa",
+    "Travel to Mount Abu, what should I see?",
+    "heading to san francisco. what's the forecast",
+    "Bangalore, let's plan",
+    "mumbai and pune weather",
+    "Delhi what is the temperature",
+    "Is it rainy in Kerala",
+    "tell me about london",
+    "going to",
+    "visit",
+    "in",
+    "Things to do in Barcelona.",
+    "Must see places in Lisbon",
+    "sightseeing in Prague, please",
+    "I want to visit Machu Picchu what is the climate like",
+    "Where to go in Istanbul",
+    "Is it sunny in Nice?",
+    "cloudy in Seattle when will it stop",
+    "VISITING NEW DELHI",
+    "plan a trip to zzzplace",
+    "What are the attractions in Sydney , Australia",
+    "in the mood for a trip",
+    "I'm heading to   Cape   Town   now",
+    "weather",
+    "",
+    "    ",
+    "temp in Oslo",
+    "Tokyo temperature",
+    "Can I visit Kyoto in winter?",
+    "Planning a visit to Hampi and Mysore",
+    "rainfall in Cherrapunji the wettest place",
+    "Let us go to Jaipur",
+    "to Ooty ?",
+    "going to Munnar !",
+    "in Coorg , what's up",
+    "Zürich weather",
+    "going to São Paulo, what is the temperature",
+    "Visit Kraków.",
+    "I'm travelling to Leh what should I pack",
+    "am visiting udaipur conditions",
+    "trip to st. petersburg",
+    "going to new-york",
+    "What's up in the Alps",
+]
+
+# Every destination each query names, for the phrasings the reference knows nothing about
+EXPECTED_PLACE_NAMES = {
+    "I'm going to Delhi and Agra and Jaipur, what's the weather and what can I see?": ["Delhi", "Agra", "Jaipur"],
+    "I'm going to Delhi, Agra and Jaipur, what's the weather?": ["Delhi", "Agra", "Jaipur"],
+    "going to delhi and agra and then jaipur, weather?": ["Delhi", "Agra", "Jaipur"],
+    "Tokyo and Kyoto and Osaka weather": ["Tokyo", "Kyoto", "Osaka"],
+    "mumbai and pune weather": ["Mumbai", "Pune"],
+    "In Tokyo and Kyoto what are the places": ["Tokyo", "Kyoto"],
+    "Trip to Delhi and delhi": ["Delhi"],
+    "I'm going to Paris, France, what is the weather?": ["Paris"],
+    "going to Delhi and Agra, Rajasthan": ["Delhi", "Agra"],
+    "Going to Goa and see the beaches": ["Goa"],
+    "Going to Goa and back": ["Goa"],
+    "I'm going to Paris and I want to know the weather": ["Paris"],
+    "I'm going to Delhi and I want to see the Taj": ["Delhi"],
+    "going to paris and i want to know the weather": ["Paris"],
+    "I'm going to Bangalore, let's plan my trip.": ["Bangalore"],
+    "I am visiting Rome next week": ["Rome"],
+    "I'm going to Paris June 3 to 7, what will the weather be?": ["Paris"],
+    "I'm going to Paris from 3 to 5 June, what will the weather be?": ["Paris"],
+    "I'm heading to Goa for a 3 day trip, weather?": ["Goa"],
+    "weather in Goa next weekend": ["Goa"],
+    "What's the weather in Kalora this weekend?": ["Kalora"],
+    "3 day trip to Kalora, weather?": ["Kalora"],
+    "Trip to Lisbon on 2026-06-03": ["Lisbon"],
+    "heading to Oslo tomorrow, what's the forecast": ["Oslo"],
+    "Going to Rome for the next 5 days": ["Rome"],
+    "weather in Oslo tomorrow and Bergen on friday": ["Oslo", "Bergen"],
+    "going to goa and then pune next week, weather?": ["Goa", "Pune"],
+}
+
+TEMPLATES = [
+    "I'm going to go to {place}, let's plan my trip.",
+    "What is the weather in {place}?",
+    "{place}, what is the temperature there",
+    "places to visit in {place}",
+    "I am visiting {place} next month. what should I see",
+    "trip to {place}",
+    "{place} and {other} weather",
+    "{place} {filler}",
+    "{filler} {place}",
+    "heading to {place} {filler}",
+]
+
+PLACES = [
+    "Bangalore", "new york", "Rio de Janeiro", "paris", "MUMBAI", "Cape Town",
+    "san francisco", "Ho Chi Minh City", "Kraków", "mount abu", "St Moritz"
+]
+
+FILLERS = [
+    "what", "where", "when", "let's", "and", "the", "it", "conditions", "is", "plan",
+    "forecast", "sunny", "to", "in", "visit", ",", ".", "?", "!", "see", "temp"
+]
+
+
+def legacy_parse_user_intent(user_input: str) -> Dict[str, bool]:
+    """
+    TourismAIAgent.parse_user_intent before the compiled parser
+    """
+    input_lower = user_input.lower()
+
+    wants_weather = any(keyword in input_lower for keyword in DEFAULT_WEATHER_KEYWORDS)
+    wants_places = any(keyword in input_lower for keyword in DEFAULT_PLACES_KEYWORDS)
+
+    if not wants_weather and not wants_places:
+        wants_places = True
+
+    return {
+        "weather": wants_weather,
+        "places": wants_places
+    }
+
+
+def legacy_extract_place_name(user_input: str) -> Optional[str]:
+    """
+    TourismAIAgent.extract_place_name before the compiled parser
+    """
+    stop_keywords = [
+        "what", "where", "when", "which", "who", "how",
+        "let's", "let us", "plan", "planning", "temperature",
+        "temp", "weather", "places", "attractions", "visit",
+        "can", "should", "will", "is", "are", "and"
+    ]
+
+    patterns = [
+        r"(?:going\s+to|visit|visiting|trip\s+to|travel\s+to|heading\s+to|am\s+visiting)\s+([a-zA-Z][a-zA-Z\s]*?)(?:\s+(?:what|where|when|let|plan|conditions)|,|\.|$)",
+        r"in\s+([a-zA-Z][a-zA-Z\s]*?)(?:\s+(?:what|where|when|it|the|conditions)|,|\.|$)",
+        r"^([a-zA-Z][a-zA-Z\s]+?),?\s+(?:let's|let\s+us|what|where|temperature|and)",
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, user_input, re.IGNORECASE)
+        if match:
+            place_name = match.group(1).strip()
+            place_name = re.sub(r'\s+', ' ', place_name)
+
+            words = place_name.split()
+            cleaned_words = []
+            for word in words:
+                if word.lower() not in stop_keywords:
+                    cleaned_words.append(word)
+                else:
+                    break
+
+            if cleaned_words:
+                place_name = ' '.join(cleaned_words)
+                if place_name.islower():
+                    place_name = place_name.title()
+                elif not place_name[0].isupper():
+                    place_name = place_name[0].upper() + place_name[1:]
+                return place_name
+
+    words = user_input.split()
+    place_words = []
+
+    for i, word in enumerate(words):
+        if i > 0 and words[i-1].lower() in ["to", "visit", "visiting", "in", "going"]:
+            j = i
+            while j < len(words):
+                current_word = words[j].lower()
+                if current_word in stop_keywords:
+                    break
+                if words[j] in [",", ".", "?", "!"]:
+                    break
+                place_words.append(words[j])
+                j += 1
+            break
+
+    if place_words:
+        place_name = ' '.join(place_words)
+        place_name = re.sub(r'[,.!?]+$', '', place_name)
+        place_name = place_name.title()
+        return place_name
+
+    return None
+
+
+def legacy_parse(user_input: str) -> Tuple[Optional[str], Dict[str, bool]]:
+    return legacy_extract_place_name(user_input), legacy_parse_user_intent(user_input)
+
+
+def generated_corpus(count: int, seed: int = 11) -> List[str]:
+    """
+    Template and random-word phrasings exercising pattern order and stop words
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.7:
+            query = rng.choice(TEMPLATES).format(
+                place=rng.choice(PLACES), other=rng.choice(PLACES), filler=rng.choice(FILLERS)
+            )
+        else:
+            words = [rng.choice(FILLERS + PLACES) for _ in range(rng.randint(1, 8))]
+            query = " ".join(words)
+        if rng.random() < 0.2:
+            query = query.upper() if rng.random() < 0.5 else query.lower()
+        queries.append(query)
+    return queries
+
+
+def check_equivalence(queries: List[str], parser: QueryParser) -> int:
+    """
+    Compare the compiled parser with the reference on every query not in EXPECTED_PLACE_NAMES
+
+    Returns:
+        Number of queries checked
+    """
+    checked = 0
+    for query in queries:
+        if query in EXPECTED_PLACE_NAMES:
+            continue
+        checked += 1
+        place_name, intent = legacy_parse(query)
+        expected = (place_name, intent)
+        parsed = parser.parse(query)
+        actual = (parsed.place_name, {key: parsed.intent[key] for key in intent})
+        if actual != expected:
+            sys.exit(f"Mismatch for {query!r}: expected {expected}, got {actual}")
+    return checked
+
+
+def check_place_names(parser: QueryParser) -> int:
+    """
+    Compare every destination the parser lists with EXPECTED_PLACE_NAMES
+
+    Returns:
+        Number of queries checked
+    """
+    for query, expected in EXPECTED_PLACE_NAMES.items():
+        actual = parser.place_names(query)
+        if actual != expected:
+            sys.exit(f"Mismatch for {query!r}: expected destinations {expected}, got {actual}")
+    return len(EXPECTED_PLACE_NAMES)
+
+
+def throughput(function: Callable[[str], object], queries: List[str], repeat: int) -> float:
+    """
+    Parses per second over repeat passes of the queries
+    """
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            function(query)
+    return len(queries) * repeat / (time.perf_counter() - started)
+
+
+def cold_throughput(make_parse: Callable[[], Callable[[str], object]], queries: List[str], passes: int) -> float:
+    """
+    Best parses per second over passes, each parsing every query once with a new parser
+
+    A new parser starts with an empty word table, so words first seen in
+    the pass are classified as part of it.
+    """
+    return max(throughput(make_parse(), queries, 1) for _ in range(passes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generated", type=int, default=20000, help="Generated phrasings checked on top of the corpus")
+    parser.add_argument("--repeat", type=int, default=20, help="Timing passes over the corpus")
+    parser.add_argument("--passes", type=int, default=5, help="Cold timing passes, the best one is reported")
+    args = parser.parse_args()
+
+    compiled = QueryParser(cache_size=0)
+    generated = generated_corpus(args.generated)
+    checked = check_equivalence(CORPUS + generated, compiled)
+    print(f"equivalent on {checked:,} phrasings")
+    print(f"expected destinations on {check_place_names(compiled):,} phrasings")
+
+    # Cold: every phrasing parsed once, cache off; replay: the corpus parsed over and over
+    unique = list(dict.fromkeys(generated))
+    rows = [
+        ("before", "cold", cold_throughput(lambda: legacy_parse, unique, args.passes)),
+        ("after", "cold", cold_throughput(lambda: QueryParser(cache_size=0).parse, unique, args.passes)),
+        ("before", "replay", throughput(legacy_parse, CORPUS, args.repeat)),
+        ("after", "replay", throughput(QueryParser().parse, CORPUS, args.repeat)),
+    ]
+    print(f"{'variant':<10} {'workload':<10} {'parses/s':>12}")
+    for variant, workload, rate in rows:
+        print(f"{variant:<10} {workload:<10} {rate:>12,.0f}")
+    before, after = rows[0][2], rows[1][2]
+    print(f"cold target {COLD_TARGET:,} parses/s: {'met' if after >= COLD_TARGET else 'not met'} "
+          f"({after / COLD_TARGET:.0%} of it, {after / before:.1f}x before)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark - Attraction ranking time for large candidate sets, vectorized versus pure Python
+
+Usage:
+    python -m benchmarks.ranking [--sizes 1000,10000,50000] [--repeat N]
+
+Candidates are read from a synthetic large-city Overpass answer (with a
+share of Wikidata-tagged features) and ranked around the city centre. The
+pure-Python reference scores each element with math.* and sorts them all;
+both must pick the same names. The reference weighs tags inline, so it is
+compared with the total of candidate extraction (tag weighting while the
+answer is decoded) and the NumPy ranking. Extraction is the larger part.
+"""
+import argparse
+import json
+import math
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.overpass_payload import synthetic_response
+from poi_index import haversine_m
+from ranking import DISTANCE_HALF_LIFE_M, DISTANCE_WEIGHT, CandidateSet, importance
+
+CENTER = (12.97, 77.59)
+LIMIT = 5
+
+
+def elements(count: int, seed: int = 3) -> List[Dict]:
+    """
+    Named elements of a synthetic answer, a fifth of them with a wikidata tag
+    """
+    rng = random.Random(seed)
+    items = []
+    # Only about a third of the synthetic elements are named
+    for element in json.loads(synthetic_response(count * 4, seed))["elements"]:
+        if "name" not in element["tags"]:
+            continue
+        if rng.random() < 0.2:
+            element["tags"]["wikidata"] = f"Q{element['id']}"
+        items.append(element)
+        if len(items) >= count:
+            break
+    return items
+
+
+def candidate_set(items: List[Dict]) -> CandidateSet:
+    candidates = CandidateSet()
+    for item in items:
+        candidates.add_element(item)
+    return candidates
+
+
+def reference_top(lat: float, lon: float, items: List[Dict], limit: int) -> List[str]:
+    """
+    Scalar scoring of every element and a full sort, the straightforward implementation
+    """
+    scored = []
+    for item in items:
+        point = item.get("center") or item
+        distance = haversine_m(lat, lon, point["lat"], point["lon"])
+        score = importance(item["tags"]) + DISTANCE_WEIGHT * 2 ** (-distance / DISTANCE_HALF_LIFE_M)
+        scored.append((-score, len(scored), item["tags"]["name"]))
+    scored.sort()
+    names = []
+    for _, _, name in scored:
+        if name not in names:
+            names.append(name)
+            if len(names) >= limit:
+                break
+    return names
+
+
+def timed_ms(function, repeat: int) -> float:
+    """
+    Best of repeat runs, in milliseconds
+    """
+    best = math.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated candidate counts")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per size, the best is reported")
+    args = parser.parse_args()
+
+    lat, lon = CENTER
+    print(f"{'candidates':>10} {'extract ms':>11} {'numpy ms':>9} {'total ms':>9} {'python ms':>10} {'speedup':>8}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        items = elements(size)
+        extract_ms = timed_ms(lambda: candidate_set(items), args.repeat)
+        candidates = candidate_set(items)
+
+        expected = reference_top(lat, lon, items, LIMIT)
+        actual = candidates.top(lat, lon, LIMIT)
+        if actual != expected:
+            raise SystemExit(f"Rankings differ for {size} candidates: {expected} != {actual}")
+
+        python_ms = timed_ms(lambda: reference_top(lat, lon, items, LIMIT), args.repeat)
+        numpy_ms = timed_ms(lambda: candidates.top(lat, lon, LIMIT), args.repeat)
+        total_ms = extract_ms + numpy_ms
+        print(f"{len(candidates):>10} {extract_ms:>11.2f} {numpy_ms:>9.2f} {total_ms:>9.2f} {python_ms:>10.2f} "
+              f"{python_ms / total_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
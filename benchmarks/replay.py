@@ -0,0 +1,232 @@
+"""
+Benchmark - Re-drive recorded traffic against a local stand-in serving the recorded upstream answers
+
+Usage:
+    python -m benchmarks.replay RECORDING [--speed X] [--concurrency N] [--latency-scale F]
+        [--limit N] [--show-diffs N] [--keep-offline-data] [--respect-rate-limits] [--json results.json]
+
+Record traffic by running the CLI, app or service with TOURISM_RECORD_PATH
+set (see recording.py). The replay starts benchmarks.replay_server on the
+recording in a child process and points the agent at it. Caches start
+empty, and warming and recording are off. The recorded queries are sent
+through process_request from --concurrency threads. They keep their
+original spacing divided by --speed; 0 sends them as fast as the threads
+allow. Latency is measured from the time a query was due to be sent, so
+queries waiting for a free thread count as slow.
+
+Reported: replayed latency percentiles next to the recorded ones,
+throughput, the upstream requests served and those missing from the
+recording, and answers that differ from the recorded ones (the first
+--show-diffs as unified diffs). Answers of queries that sent a request the
+recording has no answer for (e.g. a multi-location Open-Meteo request for
+another set of places, because a cache was warmer or colder than when
+recording) are reported as replay misses instead of differing answers. A
+miss on a lookup shared by several queries counts only for the query that
+sent it. The offline gazetteer and POI index are
+disabled like in the other benchmarks. With --keep-offline-data their
+settings are taken from the environment instead, to match a recording made
+with them.
+"""
+import argparse
+import contextvars
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
+
+from benchmarks.end_to_end import percentile, stub_counters, stub_environment
+from benchmarks.stub_servers import SERVICES
+from recording import Recorder, read_recording, request_key, set_recorder
+
+# Services of the unrecorded upstream requests made for the query being answered
+_query_misses: contextvars.ContextVar = contextvars.ContextVar("replay_query_misses", default=None)
+
+
+class MissTracker(Recorder):
+    """
+    Recorder that writes nothing and notes, per replayed query, the upstream
+    requests the recording has no answer for
+    """
+
+    def __init__(self, recorded_keys: Set[str]):
+        """
+        Args:
+            recorded_keys: request_key of every recorded upstream exchange
+        """
+        super().__init__()
+        self.enabled = True
+        self._recorded_keys = recorded_keys
+
+    def query(self, query: str, response: str, started: float, elapsed: float):
+        pass
+
+    def upstream(self, service: str, method: str, path: str, fields, status: int, body, started: float,
+                 elapsed: float, complete: bool = True):
+        misses = _query_misses.get()
+        if misses is not None and request_key(method, path, fields) not in self._recorded_keys:
+            misses.append(service)
+
+
+def start_replay_server(args: argparse.Namespace) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.replay_server", args.recording, "--port", "0",
+               "--latency-scale", str(args.latency_scale)]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+
+
+def replay_environment(base_url: str, args: argparse.Namespace) -> Dict[str, str]:
+    env = stub_environment(base_url, args.respect_rate_limits)
+    # The replay itself must not be appended to the recording
+    env["TOURISM_RECORD_PATH"] = ""
+    if args.keep_offline_data:
+        for name in ("TOURISM_GAZETTEER_PATH", "TOURISM_POI_INDEX_DIR"):
+            del env[name]
+    return env
+
+
+def replay(queries: List[Dict], speed: float, concurrency: int,
+           recorded_keys: Set[str]) -> Tuple[float, List[Tuple[float, str, List[str]]]]:
+    """
+    Send the queries at their recorded pace
+
+    Each latency runs from the query's scheduled send time (its submission
+    when speed is 0), not from when a thread picked it up, so a backlog of
+    queries behind busy threads shows in the percentiles.
+
+    Returns:
+        (elapsed seconds, (latency seconds, answer, services of unrecorded
+        upstream requests) per query)
+    """
+    from tourism_ai_agent import TourismAIAgent
+
+    agent = TourismAIAgent()
+    set_recorder(MissTracker(recorded_keys))
+
+    def answer(query: str, scheduled: float) -> Tuple[float, str, List[str]]:
+        misses = []
+        _query_misses.set(misses)
+        response = agent.process_request(query)
+        return time.perf_counter() - scheduled, response, misses
+
+    first_ts = queries[0]["ts"] if queries else 0.0
+    futures = []
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            for event in queries:
+                scheduled = time.perf_counter()
+                if speed > 0:
+                    scheduled = started + (event["ts"] - first_ts) / speed
+                    if scheduled > time.perf_counter():
+                        time.sleep(scheduled - time.perf_counter())
+                futures.append(pool.submit(answer, event["query"], scheduled))
+            results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+    finally:
+        set_recorder(None)
+    return elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="Recording written with TOURISM_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Pace relative to the recording, 0 sends the queries as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=16, help="Threads sending queries")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier of the recorded upstream latencies, 0 answers at once")
+    parser.add_argument("--limit", type=int, help="Replay only the first N queries")
+    parser.add_argument("--show-diffs", type=int, default=3, help="Differing answers printed in full")
+    parser.add_argument("--keep-offline-data", action="store_true",
+                        help="Use the gazetteer and POI index settings of the environment")
+    parser.add_argument("--respect-rate-limits", action="store_true",
+                        help="Keep the default per-host rate and concurrency limits")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    events = list(read_recording(args.recording))
+    queries = sorted((event for event in events if event["kind"] == "query"),
+                     key=lambda event: event["ts"])[:args.limit]
+    recorded_keys = {
+        request_key(event["method"], event["path"], event["fields"]) for event in events if event["kind"] == "upstream"
+    }
+    if not queries:
+        sys.exit(f"No queries recorded in {args.recording}")
+
+    server = start_replay_server(args)
+    try:
+        base_url = server.stdout.readline().strip()
+        if not base_url:
+            sys.exit("Replay server failed to start")
+        os.environ.update(replay_environment(base_url, args))
+
+        before = stub_counters(base_url)
+        elapsed, results = replay(queries, args.speed, args.concurrency, recorded_keys)
+        after = stub_counters(base_url)
+    finally:
+        server.terminate()
+        server.wait()
+
+    # Answers built from a 404 of the replay server say nothing about the code under test
+    diffs = []
+    replay_misses = []
+    for event, (_, response, misses) in zip(queries, results):
+        if response != event["response"]:
+            if misses:
+                replay_misses.append((event["query"], sorted(set(misses))))
+            else:
+                diffs.append((event["query"], event["response"], response))
+    latencies = [latency for latency, _, _ in results]
+    recorded = [event["elapsed_ms"] / 1000 for event in queries]
+    upstream = {
+        service: {name: after[service][name] - before[service][name] for name in after[service]}
+        for service in SERVICES
+    }
+    summary = {
+        "queries": len(queries),
+        "elapsed_s": elapsed,
+        "recorded_span_s": queries[-1]["ts"] - queries[0]["ts"],
+        "queries_per_s": len(queries) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "recorded_p50_ms": percentile(recorded, 0.50) * 1000,
+        "recorded_p95_ms": percentile(recorded, 0.95) * 1000,
+        "recorded_p99_ms": percentile(recorded, 0.99) * 1000,
+        "upstream": upstream,
+        "differing_answers": len(diffs),
+        "replay_misses": len(replay_misses)
+    }
+
+    print(f"{len(queries)} queries replayed in {elapsed:.1f} s ({summary['queries_per_s']:.1f} q/s), "
+          f"recorded over {summary['recorded_span_s']:.1f} s, speed {args.speed:g}, concurrency {args.concurrency}")
+    print(f"{'latency':<9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, prefix in [("recorded", "recorded_"), ("replayed", "")]:
+        print(f"{label:<9} {summary[prefix + 'p50_ms']:>8.0f} {summary[prefix + 'p95_ms']:>8.0f} "
+              f"{summary[prefix + 'p99_ms']:>8.0f}")
+    print(f"{'service':<11} {'requests':>9} {'misses':>7} {'errors':>7}")
+    for service in SERVICES:
+        counters = upstream[service]
+        print(f"{service:<11} {counters['requests']:>9} {counters['misses']:>7} {counters['errors']:>7}")
+    print(f"{len(diffs)} of {len(queries)} answers differ from the recording")
+    if replay_misses:
+        print(f"{len(replay_misses)} other answers changed because the recording has no answer for a request they "
+              f"made (replay misses, not counted as differing)")
+    for query, expected, actual in diffs[:args.show_diffs]:
+        print(f"\n{query}")
+        for line in difflib.unified_diff(expected.splitlines(), actual.splitlines(), "recorded", "replayed",
+                                         lineterm=""):
+            print(line)
+
+    if args.json:
+        summary["diffs"] = [{"query": query, "recorded": expected, "replayed": actual} for query, expected, actual in diffs]
+        summary["missed_queries"] = [{"query": query, "services": services} for query, services in replay_misses]
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Replay Server - Local stand-in answering upstream requests with the answers of a recording
+
+Usage:
+    python -m benchmarks.replay_server RECORDING [--port 8091] [--latency-scale F]
+
+Requests are matched to recorded exchanges by method, path and fields (see
+recording.request_key). Answers to the same request are served in the order
+they were recorded, and the last one is repeated after that. Each answer is
+delayed by its recorded latency times --latency-scale (0 answers at once).
+Requests that were never recorded get a 404 and are counted as misses.
+GET /_stats returns per-service request, error, byte and miss counters.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from typing import Dict, List
+
+from aiohttp import web
+
+from benchmarks.stub_servers import SERVICES
+from recording import read_recording, request_key
+
+
+class RecordedExchange:
+    """
+    One recorded upstream answer
+    """
+
+    __slots__ = ("service", "status", "body", "delay")
+
+    def __init__(self, event: Dict, latency_scale: float):
+        self.service = event["service"]
+        self.status = event["status"]
+        self.body = event["body"].encode() if event["body"] is not None else b""
+        self.delay = event["elapsed_ms"] / 1000 * latency_scale
+
+
+class ReplayUpstreams:
+    """
+    One aiohttp server answering every upstream path from a recording
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        """
+        Args:
+            path: Recording written by recording.Recorder
+            latency_scale: Multiplier of the recorded upstream latencies
+        """
+        self._answers: Dict[str, List[RecordedExchange]] = defaultdict(list)
+        self._served: Dict[str, int] = defaultdict(int)
+        self._services = {}
+        for event in read_recording(path):
+            if event["kind"] == "upstream":
+                key = request_key(event["method"], event["path"], event["fields"])
+                self._answers[key].append(RecordedExchange(event, latency_scale))
+                self._services[event["path"]] = event["service"]
+
+        self.counters = {service: {"requests": 0, "errors": 0, "bytes": 0, "misses": 0} for service in SERVICES}
+        self._runner = None
+
+    @property
+    def exchanges(self) -> int:
+        return sum(len(answers) for answers in self._answers.values())
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/_stats", self._stats)
+        app.router.add_route("*", "/{path:.*}", self._replay)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving
+
+        Returns:
+            Base URL of the replay server
+        """
+        self._runner = web.AppRunner(self.application(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{self._runner.addresses[0][1]}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _replay(self, request: web.Request) -> web.Response:
+        fields = dict(await request.post()) if request.method == "POST" else dict(request.query)
+        key = request_key(request.method, request.path, fields)
+        service = self._services.get(request.path)
+        counters = self.counters.get(service) or self.counters.setdefault(
+            "unknown", {"requests": 0, "errors": 0, "bytes": 0, "misses": 0})
+        counters["requests"] += 1
+
+        answers = self._answers.get(key)
+        if not answers:
+            counters["misses"] += 1
+            return web.Response(status=404, text="not recorded")
+
+        index = self._served[key]
+        self._served[key] = index + 1
+        answer = answers[min(index, len(answers) - 1)]
+        await asyncio.sleep(answer.delay)
+
+        if answer.status >= 400:
+            counters["errors"] += 1
+            return web.Response(status=answer.status, text="recorded error")
+        counters["bytes"] += len(answer.body)
+        return web.Response(body=answer.body, content_type="application/json")
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.counters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="Recording to serve (TOURISM_RECORD_PATH of the recorded process)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091, help="Port to listen on, 0 picks a free one")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier of the recorded upstream latencies, 0 answers at once")
+    args = parser.parse_args()
+
+    async def serve():
+        server = ReplayUpstreams(args.recording, args.latency_scale)
+        base_url = await server.start(args.host, args.port)
+        # First line of output is the base URL, the replay benchmark reads it
+        print(base_url, flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
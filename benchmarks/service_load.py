@@ -0,0 +1,145 @@
+"""
+Benchmark - HTTP service latency, throughput and load shedding under many concurrent clients
+
+Usage:
+    python -m benchmarks.service_load [--requests N] [--clients N] [--endpoint query|stream]
+        [--max-concurrency N] [--max-queue N] [--latency SERVICE=SPEC ...] [--json results.json]
+
+The stubs from benchmarks.stub_servers and service.py each run in a child
+process pointed at the stubs, with in-memory caches and without the per-host
+rate limits meant for the public services. --clients connections then send
+--requests queries between them, each client waiting for its answer before
+sending the next one. Latency percentiles cover answered requests; requests
+shed with 503 are counted separately. At the end the service gets SIGTERM
+and the time it takes to drain and exit is reported.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import aiohttp
+
+from benchmarks.end_to_end import DEFAULT_LATENCIES, make_queries, percentile, start_stubs, stub_environment
+from benchmarks.stub_servers import add_profile_arguments
+
+
+def start_service(args: argparse.Namespace, stub_url: str) -> subprocess.Popen:
+    env = dict(os.environ, **stub_environment(stub_url))
+    command = [sys.executable, "service.py", "--port", "0",
+               "--max-concurrency", str(args.max_concurrency), "--max-queue", str(args.max_queue)]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, text=True, env=env)
+
+
+async def send(session: aiohttp.ClientSession, url: str, query: str) -> int:
+    async with session.post(url, json={"query": query}) as response:
+        # Read the whole body, for /stream that is every section
+        await response.read()
+        return response.status
+
+
+async def run_clients(base_url: str, endpoint: str, queries: List[str], clients: int) -> Dict:
+    pending = list(reversed(queries))
+    latencies = []
+    statuses: Dict[int, int] = {}
+
+    async def client(session: aiohttp.ClientSession):
+        while pending:
+            query = pending.pop()
+            started = time.perf_counter()
+            try:
+                status = await send(session, f"{base_url}/{endpoint}", query)
+            except aiohttp.ClientError:
+                status = 0
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+        async with session.get(f"{base_url}/health") as response:
+            health = await response.json()
+
+    return {"elapsed_s": elapsed, "latencies_s": latencies, "statuses": statuses, "health": health}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Queries sent in total")
+    parser.add_argument("--clients", type=int, default=400, help="Concurrent client connections")
+    parser.add_argument("--endpoint", choices=["query", "stream"], default="query")
+    parser.add_argument("--max-concurrency", type=int, default=256, help="Service --max-concurrency")
+    parser.add_argument("--max-queue", type=int, default=1024, help="Service --max-queue")
+    parser.add_argument("--places", type=int, default=200, help="Distinct places in the query mix")
+    parser.add_argument("--unknown-rate", type=float, default=0.05, help="Fraction of queries naming unknown places")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if not args.latency:
+        args.latency = DEFAULT_LATENCIES
+
+    stubs = start_stubs(args)
+    service = None
+    try:
+        stub_url = stubs.stdout.readline().strip()
+        if not stub_url:
+            sys.exit("Stub servers failed to start")
+        service = start_service(args, stub_url)
+        base_url = service.stdout.readline().strip()
+        if not base_url:
+            sys.exit("Service failed to start")
+
+        queries = make_queries(args.requests, args.places, args.unknown_rate, args.seed)
+        run = asyncio.run(run_clients(base_url, args.endpoint, queries, args.clients))
+
+        stopping = time.perf_counter()
+        service.send_signal(signal.SIGTERM)
+        service.wait(timeout=60)
+        shutdown_s = time.perf_counter() - stopping
+    finally:
+        if service and service.poll() is None:
+            service.kill()
+        stubs.terminate()
+        stubs.wait()
+
+    latencies = run["latencies_s"]
+    result = {
+        "endpoint": args.endpoint,
+        "clients": args.clients,
+        "requests": len(queries),
+        "answered": run["statuses"].get(200, 0),
+        "shed": run["statuses"].get(503, 0),
+        "failed": sum(count for status, count in run["statuses"].items() if status not in (200, 503)),
+        "elapsed_s": run["elapsed_s"],
+        "queries_per_s": run["statuses"].get(200, 0) / run["elapsed_s"] if run["elapsed_s"] > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "shutdown_s": shutdown_s,
+        "exit_code": service.returncode
+    }
+
+    print(f"{result['requests']} {args.endpoint} requests from {args.clients} clients in {result['elapsed_s']:.2f}s "
+          f"({result['queries_per_s']:.1f} answered/s)")
+    print(f"  answered {result['answered']}, shed {result['shed']}, failed {result['failed']}")
+    print(f"  latency p50 {result['p50_ms']:.0f} ms, p95 {result['p95_ms']:.0f} ms, p99 {result['p99_ms']:.0f} ms")
+    print(f"  service admitted {run['health']['admitted']}, shed {run['health']['shed']}; "
+          f"shutdown took {result['shutdown_s']:.2f}s (exit code {result['exit_code']})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark - Memory and latency of many simultaneous Streamlit sessions, per-session versus shared agent
+
+Usage:
+    python -m benchmarks.sessions [--sessions N] [--queries-per-session N] [--concurrency N]
+        [--latency SERVICE=SPEC ...] [--json results.json]
+
+Streamlit runs each interaction of each browser session as a script run on
+its own thread, and keeps every session's state alive between runs. This
+benchmark replays that against the stub upstreams without Streamlit: every
+simulated session answers its queries the way app.py's submit handler does
+(streamed sections, captured trace, chat history entry), from a pool of
+--concurrency script-run threads.
+
+The per-session mode is the previous app: a TourismAIAgent in each
+session's state and an unbounded chat history. The shared mode is the
+current one: one agent for the process and the history capped like app.py.
+Each mode runs in a fresh child process and reports query latency, peak
+RSS, and the memory held by the session states once all sessions are idle
+(the deep size of every object they reach, the shared agent counted once).
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+
+from benchmarks.end_to_end import (DEFAULT_LATENCIES, make_queries, peak_rss_mib, percentile, start_stubs,
+                                   stub_environment)
+from benchmarks.stub_servers import add_profile_arguments
+
+MODES = ["per-session", "shared"]
+
+# As in app.py
+MAX_CHAT_HISTORY = 5
+
+
+def deep_size(roots: Iterable) -> int:
+    """
+    Bytes of every object reachable from roots, each counted once
+
+    Code, classes and modules are shared by the whole process and skipped.
+    """
+    skipped = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.CodeType)
+    seen = set()
+    pending = list(roots)
+    size = 0
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, skipped):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+    return size
+
+
+def run_sessions(mode: str, queries: List[List[str]], concurrency: int) -> Dict:
+    """
+    Answer every session's queries like app.py, then measure what stays allocated
+    """
+    import tracing
+    from tourism_ai_agent import TourismAIAgent
+
+    shared_agent = TourismAIAgent() if mode == "shared" else None
+    sessions = [{} for _ in queries]
+
+    def script_run(session_id: int, query: str) -> float:
+        state = sessions[session_id]
+        if mode == "per-session" and "agent" not in state:
+            state["agent"] = TourismAIAgent()
+        history = state.setdefault("chat_history", [])
+        agent = shared_agent or state["agent"]
+
+        started = time.perf_counter()
+        with tracing.capture() as traces:
+            for section in agent.process_request_stream(query):
+                if section.kind == "answer":
+                    response = section.text
+        elapsed = time.perf_counter() - started
+
+        history.append({"query": query, "response": response, "trace": traces[-1] if traces else None})
+        if mode == "shared":
+            del history[:-MAX_CHAT_HISTORY]
+        return elapsed
+
+    # Interleave the sessions' interactions like users working at the same time
+    runs = [(session_id, query) for session_id, session_queries in enumerate(queries) for query in session_queries]
+    random.Random(0).shuffle(runs)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda run: script_run(*run), runs))
+    elapsed = time.perf_counter() - started
+    retained = deep_size([sessions, shared_agent])
+
+    return {
+        "mode": mode,
+        "sessions": len(queries),
+        "queries": len(runs),
+        "elapsed_s": elapsed,
+        "queries_per_s": len(runs) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "retained_mib": retained / 2 ** 20,
+        "retained_kib_per_session": retained / 1024 / len(queries),
+        "peak_rss_mib": peak_rss_mib(),
+        "agents": len({id(session.get("agent", shared_agent)) for session in sessions})
+    }
+
+
+def run_mode(args: argparse.Namespace, mode: str, stub_url: str) -> Dict:
+    """
+    One mode in a fresh interpreter, so caches and RSS start from nothing
+    """
+    command = [sys.executable, "-m", "benchmarks.sessions", "--run-mode", mode,
+               "--sessions", str(args.sessions), "--queries-per-session", str(args.queries_per_session),
+               "--concurrency", str(args.concurrency), "--places", str(args.places), "--seed", str(args.seed)]
+    env = dict(os.environ, **stub_environment(stub_url))
+    output = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=300, help="Simultaneous browser sessions")
+    parser.add_argument("--queries-per-session", type=int, default=12, help="Queries each session sends")
+    parser.add_argument("--concurrency", type=int, default=32, help="Script runs executing at once")
+    parser.add_argument("--places", type=int, default=100, help="Distinct places in the query mix")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--run-mode", choices=MODES, help=argparse.SUPPRESS)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    total = args.sessions * args.queries_per_session
+    all_queries = make_queries(total, args.places, 0.05, args.seed)
+    queries = [all_queries[start:start + args.queries_per_session] for start in range(0, total, args.queries_per_session)]
+
+    if args.run_mode:
+        print(json.dumps(run_sessions(args.run_mode, queries, args.concurrency)))
+        return
+
+    if not args.latency:
+        args.latency = DEFAULT_LATENCIES
+    stubs = start_stubs(args)
+    try:
+        stub_url = stubs.stdout.readline().strip()
+        if not stub_url:
+            sys.exit("Stub servers failed to start")
+        results = [run_mode(args, mode, stub_url) for mode in MODES]
+    finally:
+        stubs.terminate()
+        stubs.wait()
+
+    print(f"{args.sessions} sessions x {args.queries_per_session} queries, {args.concurrency} concurrent script runs")
+    print(f"{'mode':<12} {'agents':>6} {'q/s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'retained MiB':>13} {'KiB/session':>12} {'peak RSS MiB':>13}")
+    for result in results:
+        print(f"{result['mode']:<12} {result['agents']:>6} {result['queries_per_s']:>7.1f} "
+              f"{result['p50_ms']:>7.0f} {result['p95_ms']:>7.0f} {result['retained_mib']:>13.2f} "
+              f"{result['retained_kib_per_session']:>12.1f} {result['peak_rss_mib']:>13.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
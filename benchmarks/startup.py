@@ -0,0 +1,120 @@
+"""
+Benchmark - CLI startup: import times, and one-shot queries answered cold versus by the warm daemon
+
+Usage:
+    python -m benchmarks.startup [--repeat N] [--queries N] [--latency SERVICE=SPEC ...]
+
+Import times are wall-clock times of fresh interpreters importing a module,
+minus an interpreter that imports nothing (best of --repeat). "first query
+imports" adds the modules loaded lazily with the first answer (aiohttp and
+the NumPy-based ranking and itinerary planner), which is what importing
+the agent used to cost. The slowest modules behind importing the agent are
+listed from python -X importtime.
+
+One-shot queries run `python main.py "QUERY"` against the stub upstreams,
+once with --no-daemon (a cold process with empty caches every time) and
+once with daemon.py running, which keeps its caches and connections warm
+between invocations. The same --queries queries are sent in both modes.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.end_to_end import DEFAULT_LATENCIES, make_queries, start_stubs, stub_environment
+from benchmarks.stub_servers import add_profile_arguments
+
+IMPORTS = [
+    ("main (CLI client)", "import main"),
+    ("tourism_ai_agent", "import tourism_ai_agent"),
+    ("first query imports", "import tourism_ai_agent, aiohttp, itinerary_agent"),
+]
+
+
+def wall_ms(command: List[str], env: Dict[str, str] = None) -> float:
+    started = time.perf_counter()
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def import_ms(statement: str, repeat: int) -> float:
+    baseline = min(wall_ms([sys.executable, "-c", "pass"]) for _ in range(repeat))
+    return min(wall_ms([sys.executable, "-c", statement]) for _ in range(repeat)) - baseline
+
+
+def slowest_imports(module: str, count: int) -> List[Tuple[str, float]]:
+    """
+    Modules with the largest self time when importing module
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            stderr=subprocess.PIPE, text=True, check=True).stderr
+    times = []
+    for line in output.splitlines():
+        # "import time: self [us] | cumulative | imported package", after one header line
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_us) / 1000))
+    return sorted(times, key=lambda item: item[1], reverse=True)[:count]
+
+
+def one_shot_ms(queries: List[str], env: Dict[str, str], no_daemon: bool) -> List[float]:
+    command = [sys.executable, "main.py"] + (["--no-daemon"] if no_daemon else [])
+    return [wall_ms(command + [query], env) for query in queries]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Interpreter starts per import measurement")
+    parser.add_argument("--queries", type=int, default=20, help="One-shot invocations per mode")
+    parser.add_argument("--places", type=int, default=5, help="Distinct places in the query mix")
+    parser.add_argument("--seed", type=int, default=1)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if not args.latency:
+        args.latency = DEFAULT_LATENCIES
+
+    print(f"{'import':<22} {'ms':>7}")
+    for label, statement in IMPORTS:
+        print(f"{label:<22} {import_ms(statement, args.repeat):>7.1f}")
+    print("\nslowest modules behind importing tourism_ai_agent (self time):")
+    for name, self_ms in slowest_imports("tourism_ai_agent", 5):
+        print(f"  {name:<32} {self_ms:>6.1f} ms")
+
+    queries = make_queries(args.queries, args.places, 0.0, args.seed)
+    stubs = start_stubs(args)
+    daemon = None
+    try:
+        stub_url = stubs.stdout.readline().strip()
+        if not stub_url:
+            sys.exit("Stub servers failed to start")
+        env = dict(os.environ, **stub_environment(stub_url))
+        env["TOURISM_DAEMON_SOCKET"] = os.path.join(tempfile.mkdtemp(), "daemon.sock")
+
+        cold = one_shot_ms(queries, env, no_daemon=True)
+
+        daemon = subprocess.Popen([sys.executable, "daemon.py"], env=env, stdout=subprocess.PIPE, text=True)
+        if not daemon.stdout.readline().strip():
+            sys.exit("Daemon failed to start")
+        warm = one_shot_ms(queries, env, no_daemon=False)
+    finally:
+        if daemon:
+            daemon.terminate()
+            daemon.wait()
+        stubs.terminate()
+        stubs.wait()
+
+    print(f"\n{len(queries)} one-shot queries over {args.places} places")
+    print(f"{'mode':<10} {'median ms':>10} {'p90 ms':>8} {'total s':>8}")
+    for mode, times in (("cold", cold), ("daemon", warm)):
+        ordered = sorted(times)
+        print(f"{mode:<10} {statistics.median(times):>10.0f} {ordered[int(0.9 * (len(ordered) - 1))]:>8.0f} "
+              f"{sum(times) / 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
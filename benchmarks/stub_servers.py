@@ -0,0 +1,345 @@
+"""
+Stub Servers - Local stand-ins for Nominatim, Open-Meteo and Overpass
+
+Usage:
+    python -m benchmarks.stub_servers [--port 8090] [--latency overpass=lognormal:900:0.5 ...]
+        [--error-rate nominatim=0.02 ...] [--stall overpass=0.03:8000 ...] [--overpass-elements N]
+
+All three APIs are served from one port, point the agent at it with
+TOURISM_NOMINATIM_URL, TOURISM_OPEN_METEO_URL and TOURISM_OVERPASS_URL.
+Every service has its own latency distribution and error rate, and a share
+of its requests can stall for a fixed extra time (a slow mirror). Overpass
+answers are built from a synthetic large-city dataset; bounded queries
+(``["name"]`` filters, ``out ... N``) get the named subset capped at N like
+the real service, anything else gets the full payload. GET /_stats returns
+per-service request, error and byte counters.
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import math
+import random
+import re
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from aiohttp import web
+
+from benchmarks.overpass_payload import CENTER, synthetic_response
+from ranking import is_notable
+
+SERVICES = ["nominatim", "open_meteo", "overpass"]
+
+_OUTPUT_LIMIT = re.compile(r"\bout\b[^;]*?\b(\d+)\s*;")
+_AROUND = re.compile(r"around:[\d.]+,(-?[\d.]+),(-?[\d.]+)\)")
+# Overpass answers kept for repeated queries
+OVERPASS_BODY_CACHE_SIZE = 1024
+
+
+class Latency(NamedTuple):
+    """
+    Response delay distribution of one stub service
+
+    distribution is fixed, uniform (median_ms +- spread milliseconds),
+    exponential (mean median_ms) or lognormal (median median_ms, sigma spread).
+    """
+    distribution: str = "fixed"
+    median_ms: float = 0.0
+    spread: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Draw one delay in seconds
+        """
+        if self.distribution == "fixed":
+            delay = self.median_ms
+        elif self.distribution == "uniform":
+            delay = rng.uniform(self.median_ms - self.spread, self.median_ms + self.spread)
+        elif self.distribution == "exponential":
+            delay = rng.expovariate(1 / self.median_ms) if self.median_ms > 0 else 0.0
+        elif self.distribution == "lognormal":
+            delay = self.median_ms * rng.lognormvariate(0, self.spread)
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.distribution}")
+        return max(delay, 0.0) / 1000
+
+
+def parse_latency(spec: str) -> Latency:
+    """
+    Parse "distribution:median_ms[:spread]", e.g. "lognormal:120:0.4" or "fixed:50"
+    """
+    parts = spec.split(":")
+    latency = Latency(parts[0], float(parts[1]) if len(parts) > 1 else 0.0,
+                      float(parts[2]) if len(parts) > 2 else 0.0)
+    latency.sample(random.Random())
+    return latency
+
+
+class ServiceProfile(NamedTuple):
+    """
+    Behaviour of one stub service
+    """
+    latency: Latency = Latency()
+    error_rate: float = 0.0
+    error_status: int = 503
+    stall_rate: float = 0.0
+    stall_ms: float = 0.0
+
+
+def parse_stall(spec: str) -> Tuple[float, float]:
+    """
+    Parse "rate:extra_ms", e.g. "0.03:8000" stalls 3% of requests for 8 more seconds
+    """
+    rate, _, extra_ms = spec.partition(":")
+    return float(rate), float(extra_ms or 0.0)
+
+
+def hourly_forecast(seed: int, days: int, start: datetime.date) -> Dict[str, list]:
+    """
+    Made-up Open-Meteo "hourly" block: a daily temperature cycle, and an
+    afternoon of rain every third day or so
+    """
+    hourly = {"time": [], "temperature_2m": [], "precipitation_probability": [], "precipitation": [], "weather_code": []}
+    for day in range(days):
+        date = (start + datetime.timedelta(days=day)).isoformat()
+        base = 5 + seed % 250 / 10 + (seed + day * 5) % 7 - 3
+        rainy_hours = (seed + day) % 8 if (seed + day * 7) % 3 == 0 else 0
+        for hour in range(24):
+            wet = 12 <= hour < 12 + rainy_hours
+            hourly["time"].append(f"{date}T{hour:02d}:00")
+            hourly["temperature_2m"].append(round(base + 6 * math.sin((hour - 9) / 24 * 2 * math.pi), 1))
+            hourly["precipitation_probability"].append(70 if wet else (seed + day * 13 + hour) % 40)
+            hourly["precipitation"].append(1.2 if wet else 0.0)
+            hourly["weather_code"].append(61 if wet else [0, 1, 2, 3][(seed + day) % 4])
+    return hourly
+
+
+class StubUpstreams:
+    """
+    One aiohttp server answering like Nominatim, Open-Meteo and Overpass
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, ServiceProfile]] = None,
+                 overpass_elements: int = 5000, seed: int = 1):
+        """
+        Args:
+            profiles: Latency and error behaviour keyed by service name
+            overpass_elements: Elements in the synthetic Overpass dataset
+            seed: Seed for latency and error sampling
+        """
+        self.profiles = {service: ServiceProfile() for service in SERVICES}
+        self.profiles.update(profiles or {})
+        self.counters = {service: {"requests": 0, "errors": 0, "bytes": 0} for service in SERVICES}
+
+        self._rng = random.Random(seed)
+        self._elements = json.loads(synthetic_response(overpass_elements))["elements"]
+        self._overpass_bodies = {}
+        self._runner = None
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/search", self._nominatim)
+        app.router.add_get("/v1/forecast", self._open_meteo)
+        app.router.add_post("/api/interpreter", self._overpass)
+        app.router.add_get("/_stats", self._stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving
+
+        Returns:
+            Base URL of the stub server
+        """
+        self._runner = web.AppRunner(self.application(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{self._runner.addresses[0][1]}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _answer(self, service: str, build) -> web.Response:
+        """
+        Delay, maybe fail, then send the body build() returns
+        """
+        profile = self.profiles[service]
+        counters = self.counters[service]
+        counters["requests"] += 1
+
+        delay = profile.latency.sample(self._rng)
+        if profile.stall_rate and self._rng.random() < profile.stall_rate:
+            delay += profile.stall_ms / 1000
+        await asyncio.sleep(delay)
+
+        if self._rng.random() < profile.error_rate:
+            counters["errors"] += 1
+            return web.Response(status=profile.error_status, text="stub error")
+
+        body = build()
+        counters["bytes"] += len(body)
+        return web.Response(body=body, content_type="application/json")
+
+    async def _nominatim(self, request: web.Request) -> web.Response:
+        query = request.query.get("q", "")
+
+        def build() -> bytes:
+            # Names containing "zzz" don't exist, everything else gets stable coordinates
+            if "zzz" in query.lower():
+                return b"[]"
+            digest = hashlib.sha1(query.lower().encode()).digest()
+            lat = -60 + digest[0] / 255 * 130
+            lon = -180 + int.from_bytes(digest[1:3], "big") / 65535 * 360
+            return json.dumps([{
+                "lat": f"{lat:.7f}", "lon": f"{lon:.7f}",
+                "display_name": f"{query}, Stubland",
+                "boundingbox": [f"{lat - 0.1:.7f}", f"{lat + 0.1:.7f}", f"{lon - 0.1:.7f}", f"{lon + 0.1:.7f}"]
+            }]).encode()
+
+        return await self._answer("nominatim", build)
+
+    async def _open_meteo(self, request: web.Request) -> web.Response:
+        latitudes = request.query.get("latitude", "").split(",")
+        longitudes = request.query.get("longitude", "").split(",")
+        hourly = "hourly" in request.query
+        days = int(request.query.get("forecast_days", 7))
+
+        def build() -> bytes:
+            items = []
+            for lat, lon in zip(latitudes, longitudes):
+                seed = zlib.crc32(f"{lat},{lon}".encode()) & 0xFFFF
+                item = {"latitude": float(lat), "longitude": float(lon)}
+                if hourly:
+                    item["hourly"] = hourly_forecast(seed, days, datetime.date.today())
+                else:
+                    item["current"] = {
+                        "temperature_2m": round(5 + seed % 300 / 10, 1),
+                        "precipitation_probability": seed % 101,
+                        "weather_code": [0, 1, 2, 3, 61, 80][seed % 6]
+                    }
+                items.append(item)
+            return json.dumps(items if len(items) != 1 else items[0]).encode()
+
+        return await self._answer("open_meteo", build)
+
+    async def _overpass(self, request: web.Request) -> web.Response:
+        query = (await request.post()).get("data", "")
+        named_only = '["name"]' in query
+        notable_only = '["wikidata"]' in query
+        limit = _OUTPUT_LIMIT.search(query)
+        around = _AROUND.search(query)
+        center = (float(around.group(1)), float(around.group(2))) if around else CENTER
+        key = (named_only, notable_only, int(limit.group(1)) if limit else None, center)
+
+        def build() -> bytes:
+            body = self._overpass_bodies.get(key)
+            if body is None:
+                if len(self._overpass_bodies) >= OVERPASS_BODY_CACHE_SIZE:
+                    self._overpass_bodies.clear()
+                body = self._overpass_bodies[key] = self._overpass_body(*key)
+            return body
+
+        return await self._answer("overpass", build)
+
+    def _overpass_body(self, named_only: bool, notable_only: bool, limit: Optional[int],
+                       center: Tuple[float, float]) -> bytes:
+        elements: List[Dict] = self._elements
+        if notable_only:
+            # Queries for notable features select them by tag value or wiki tag
+            elements = [element for element in elements if is_notable(element["tags"])]
+        if named_only:
+            # Bounded queries select named features and "out tags center" drops geometry
+            elements = [
+                {key: value for key, value in element.items() if key in ("type", "id", "tags", "lat", "lon", "center")}
+                for element in elements if "name" in element["tags"]
+            ]
+        if limit is not None:
+            elements = elements[:limit]
+        if center != CENTER:
+            # The same city, moved to wherever the query looks
+            elements = [_moved(element, center[0] - CENTER[0], center[1] - CENTER[1]) for element in elements]
+        return json.dumps({"version": 0.6, "generator": "stub", "elements": elements}).encode()
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.counters)
+
+
+def _moved(element: Dict, dlat: float, dlon: float) -> Dict:
+    moved = dict(element)
+    if "lat" in moved:
+        moved["lat"] += dlat
+        moved["lon"] += dlon
+    if "center" in moved:
+        moved["center"] = {"lat": moved["center"]["lat"] + dlat, "lon": moved["center"]["lon"] + dlon}
+    return moved
+
+
+def parse_service_options(options: List[str], parse) -> Dict[str, object]:
+    """
+    Parse repeated SERVICE=VALUE options, "all=VALUE" applies to every service
+    """
+    values = {}
+    for option in options:
+        service, _, value = option.partition("=")
+        for name in SERVICES if service == "all" else [service]:
+            if name not in SERVICES:
+                raise ValueError(f"Unknown service: {name}")
+            values[name] = parse(value)
+    return values
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """
+    Command line options shared by the stub server and the benchmarks driving it
+    """
+    parser.add_argument("--latency", action="append", default=[], metavar="SERVICE=SPEC",
+                        help="Latency distribution, e.g. overpass=lognormal:900:0.5 or all=fixed:20")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="SERVICE=RATE",
+                        help="Fraction of requests answered with an error status")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected errors")
+    parser.add_argument("--stall", action="append", default=[], metavar="SERVICE=RATE:MS",
+                        help="Fraction of requests delayed by MS more milliseconds, e.g. overpass=0.03:8000")
+    parser.add_argument("--overpass-elements", type=int, default=5000, help="Elements in the Overpass dataset")
+
+
+def profiles_from_arguments(args: argparse.Namespace) -> Dict[str, ServiceProfile]:
+    latencies = parse_service_options(args.latency, parse_latency)
+    error_rates = parse_service_options(args.error_rate, float)
+    stalls = parse_service_options(args.stall, parse_stall)
+    return {
+        service: ServiceProfile(latencies.get(service, Latency()), error_rates.get(service, 0.0), args.error_status,
+                                *stalls.get(service, (0.0, 0.0)))
+        for service in SERVICES
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090, help="Port to listen on, 0 picks a free one")
+    parser.add_argument("--seed", type=int, default=1)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    async def serve():
+        stubs = StubUpstreams(profiles_from_arguments(args), args.overpass_elements, args.seed)
+        base_url = await stubs.start(args.host, args.port)
+        # First line of output is the base URL, the end-to-end benchmark reads it
+        print(base_url, flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await stubs.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
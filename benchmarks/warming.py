@@ -0,0 +1,200 @@
+"""
+Benchmark - Cache misses and latency of popular destinations, cold versus warmed caches
+
+Usage:
+    python -m benchmarks.warming [--requests N] [--rate Q/S] [--places N] [--zipf S] [--top-n N]
+        [--bucket-seconds S] [--latency SERVICE=SPEC ...] [--json results.json]
+
+Traffic is skewed like the real one: place popularity follows a Zipf
+distribution over --places made-up destinations. Each mode starts with
+empty caches and sends the same --requests queries at --rate queries per
+second from a pool of threads, over several weather time buckets
+(--bucket-seconds, shortened from 15 minutes so refreshes happen during the
+run).
+
+In the cold mode nothing is warmed. In the warm mode the warmer first counts
+--history earlier queries (what it would have learned and saved before a
+restart), warms its top --top-n destinations before traffic starts, and
+keeps refreshing them on its schedule while the queries run.
+
+Hot destinations are the --top-n place names the agent extracted most often
+from the earlier queries. For queries about them, a miss is a query that
+waited for an upstream call: a geocode from Nominatim, weather that wasn't
+cached, or attractions from Overpass. Stale weather, served at once while
+it is refreshed, is counted separately. Upstream calls include the
+warmer's own.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.end_to_end import (DEFAULT_LATENCIES, TEMPLATES, percentile, place_names, reset_caches, start_stubs,
+                                   stub_counters, stub_environment)
+from benchmarks.stub_servers import SERVICES, add_profile_arguments
+
+MODES = ["cold", "warm"]
+
+
+def zipf_places(count: int, names: List[str], exponent: float, rng: random.Random) -> List[str]:
+    """
+    Places drawn with probability falling off with their rank in names
+    """
+    weights = [1 / (rank + 1) ** exponent for rank in range(len(names))]
+    return rng.choices(names, weights, k=count)
+
+
+def classify(trace) -> Tuple[bool, bool]:
+    """
+    (missed, stale) of one answered query, from its spans
+    """
+    missed = stale = False
+    for _, stage, _ in trace.waterfall():
+        attributes = stage.attributes
+        if stage.name == "geocode" and attributes.get("source") == "nominatim":
+            missed = True
+        elif stage.name == "weather":
+            missed = missed or attributes.get("cache_hit") is False
+            stale = stale or attributes.get("fresh") is False
+        elif stage.name == "places" and attributes.get("source") == "overpass":
+            missed = True
+    return missed, stale
+
+
+def run_mode(mode: str, args: argparse.Namespace, history: List[str], queries: List[Tuple[Optional[str], str]],
+             hot: set, stub_url: str) -> Dict:
+    import tracing
+    from tourism_ai_agent import TourismAIAgent
+    from warming import CacheWarmer, set_warmer
+
+    reset_caches()
+    warmer = CacheWarmer(seeds=[], top_n=args.top_n, enabled=mode == "warm")
+    set_warmer(warmer)
+    agent = TourismAIAgent()
+    before = stub_counters(stub_url)
+
+    startup_s = None
+    if mode == "warm":
+        for place in history:
+            warmer.record(place)
+        started = time.perf_counter()
+        warmer.start()
+        while warmer.counters["rounds"] < 1:
+            time.sleep(0.01)
+        startup_s = time.perf_counter() - started
+
+    def answer(query: str) -> Tuple[float, Optional[object]]:
+        with tracing.capture() as traces:
+            started = time.perf_counter()
+            agent.process_request(query)
+            elapsed = time.perf_counter() - started
+        return elapsed, traces[-1] if traces else None
+
+    # Queries arrive at a steady rate, whether or not earlier ones have been answered
+    futures = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        started = time.perf_counter()
+        for index, (_, query) in enumerate(queries):
+            delay = started + index / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(answer, query))
+        results = [future.result() for future in futures]
+    warmer.stop()
+
+    after = stub_counters(stub_url)
+    hot_latencies, other_latencies = [], []
+    misses = stale = 0
+    for (place, _), (elapsed, trace) in zip(queries, results):
+        if place not in hot:
+            other_latencies.append(elapsed)
+            continue
+        hot_latencies.append(elapsed)
+        if trace is not None:
+            missed, was_stale = classify(trace)
+            misses += missed
+            stale += was_stale
+
+    return {
+        "mode": mode,
+        "hot_queries": len(hot_latencies),
+        "hot_misses": misses,
+        "hot_stale": stale,
+        "hot_p50_ms": percentile(hot_latencies, 0.50) * 1000,
+        "hot_p95_ms": percentile(hot_latencies, 0.95) * 1000,
+        "other_p50_ms": percentile(other_latencies, 0.50) * 1000 if other_latencies else 0.0,
+        "other_p95_ms": percentile(other_latencies, 0.95) * 1000 if other_latencies else 0.0,
+        "upstream_calls": sum(after[service]["requests"] - before[service]["requests"] for service in SERVICES),
+        "startup_warm_s": startup_s,
+        "warming": warmer.stats() if mode == "warm" else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=600, help="Queries per mode")
+    parser.add_argument("--rate", type=float, default=40.0, help="Queries sent per second")
+    parser.add_argument("--concurrency", type=int, default=32, help="Threads answering queries")
+    parser.add_argument("--places", type=int, default=300, help="Distinct destinations")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exponent of the popularity distribution")
+    parser.add_argument("--top-n", type=int, default=20, help="Hot destinations, and how many the warmer keeps")
+    parser.add_argument("--history", type=int, default=2000, help="Earlier queries the warmer has counted")
+    parser.add_argument("--bucket-seconds", type=float, default=5.0, help="Weather time bucket length")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if not args.latency:
+        args.latency = DEFAULT_LATENCIES
+
+    stubs = start_stubs(args)
+    try:
+        stub_url = stubs.stdout.readline().strip()
+        if not stub_url:
+            sys.exit("Stub servers failed to start")
+        os.environ.update(stub_environment(stub_url))
+        os.environ["TOURISM_WEATHER_BUCKET_SECONDS"] = str(args.bucket_seconds)
+
+        from tourism_ai_agent import TourismAIAgent
+
+        agent = TourismAIAgent()
+
+        def make_queries(count: int) -> List[Tuple[Optional[str], str]]:
+            # Paired with the place name the agent extracts, as the warmer learns it
+            queries = [rng.choice(TEMPLATES).format(place=place) for place in zipf_places(count, names, args.zipf, rng)]
+            return [(agent.extract_place_name(query), query) for query in queries]
+
+        rng = random.Random(args.seed)
+        names = place_names(args.places, rng)
+        # Earlier traffic has the same popular places, sampled independently
+        history = [place for place, _ in make_queries(args.history) if place]
+        queries = make_queries(args.requests)
+        hot = {place for place, _ in Counter(history).most_common(args.top_n)}
+
+        results = [run_mode(mode, args, history, queries, hot, stub_url) for mode in MODES]
+    finally:
+        stubs.terminate()
+        stubs.wait()
+
+    print(f"{args.requests} queries at {args.rate:g}/s over {args.places} places (zipf {args.zipf:g}), "
+          f"top {args.top_n} hot, {args.bucket_seconds:g} s weather buckets")
+    print(f"{'mode':<6} {'hot':>5} {'misses':>7} {'stale':>6} {'hot p50':>8} {'hot p95':>8} "
+          f"{'other p50':>10} {'other p95':>10} {'upstream':>9} {'startup s':>10}")
+    for result in results:
+        startup = f"{result['startup_warm_s']:.2f}" if result["startup_warm_s"] is not None else "-"
+        print(f"{result['mode']:<6} {result['hot_queries']:>5} {result['hot_misses']:>7} {result['hot_stale']:>6} "
+              f"{result['hot_p50_ms']:>8.0f} {result['hot_p95_ms']:>8.0f} {result['other_p50_ms']:>10.0f} "
+              f"{result['other_p95_ms']:>10.0f} {result['upstream_calls']:>9} {startup:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
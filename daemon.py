@@ -0,0 +1,259 @@
+"""
+Daemon - Warm background agent answering CLI queries over a local Unix socket
+
+Usage:
+    python daemon.py [--socket PATH]
+    python main.py "I'm going to Paris, what is the weather?"
+
+A one-shot `python main.py` pays for interpreter startup, the agent's
+imports and empty caches on every run. The daemon keeps one agent with its
+caches and pooled upstream connections alive, and main.py forwards queries
+to it whenever it is listening, falling back to answering in-process.
+
+Protocol: the client sends one JSON line, {"query": "..."}, and reads one
+JSON line per response section, {"kind": "...", "text": "..."}, as soon as
+each child agent answers; the last one is the full "answer". {"ping": true}
+gets the daemon's status, and failures are sent as {"error": "..."}.
+
+Queries may carry personal travel plans, so the socket lives in a directory
+only its user can enter, is created accessible to its user alone, and
+clients only connect to a socket owned by their own user.
+
+This module is imported by main.py on every start, so everything the
+server needs is imported inside serve().
+"""
+import json
+import os
+import socket
+import stat
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+SOCKET_ENV_VAR = "TOURISM_DAEMON_SOCKET"
+# Seconds the client waits for the next section before giving up
+DEFAULT_CLIENT_TIMEOUT = 60.0
+DEFAULT_SHUTDOWN_GRACE = 30.0
+
+
+class DaemonError(Exception):
+    """
+    The daemon couldn't answer a query
+    """
+
+
+def default_socket_path() -> str:
+    """
+    Socket path from TOURISM_DAEMON_SOCKET, else in $XDG_RUNTIME_DIR, else in a private temp directory
+    """
+    path = os.environ.get(SOCKET_ENV_VAR)
+    if path:
+        return path
+    runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_directory:
+        return os.path.join(runtime_directory, "tourism-ai.sock")
+    return os.path.join(_private_directory(), "daemon.sock")
+
+
+def _private_directory() -> str:
+    # Created with mode 0700 by serve(), anyone else's directory of that name is refused
+    return os.path.join(tempfile.gettempdir(), f"tourism-ai-{os.getuid()}")
+
+
+def _owned_by_user(path: str) -> bool:
+    try:
+        return os.lstat(path).st_uid == os.getuid()
+    except OSError:
+        return False
+
+
+def _connect(socket_path: Optional[str], timeout: float) -> Optional[socket.socket]:
+    socket_path = socket_path or default_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    if not _owned_by_user(socket_path):
+        print(f"Error connecting to daemon: {socket_path} belongs to another user, not using it")
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def _prepare_directory(socket_path: str):
+    """
+    Create the socket's directory if needed; the default private one must be ours and closed to others
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)
+    if directory == _private_directory():
+        status = os.lstat(directory)
+        if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o077:
+            raise SystemExit(f"{directory} must be a directory of this user that only it can access")
+
+
+def _messages(connection: socket.socket, request: dict) -> Iterator[dict]:
+    with connection, connection.makefile("rb") as lines:
+        connection.sendall(json.dumps(request).encode() + b"\n")
+        for line in lines:
+            message = json.loads(line)
+            if "error" in message:
+                raise DaemonError(message["error"])
+            yield message
+
+
+def ask(query: str, socket_path: Optional[str] = None,
+        timeout: float = DEFAULT_CLIENT_TIMEOUT) -> Optional[Iterator[Tuple[str, str]]]:
+    """
+    Send a query to the running daemon
+
+    Args:
+        query: User's query
+        socket_path: Daemon socket, default_socket_path() by default
+        timeout: Seconds to wait for each section
+
+    Returns:
+        Iterator over (kind, text) response sections as the daemon sends them,
+        or None if no daemon is listening
+
+    Raises:
+        DaemonError: While iterating, if the daemon failed to answer
+    """
+    connection = _connect(socket_path, timeout)
+    if connection is None:
+        return None
+    return ((message["kind"], message["text"]) for message in _messages(connection, {"query": query}))
+
+
+def ping(socket_path: Optional[str] = None, timeout: float = 5.0) -> Optional[dict]:
+    """
+    Status of the running daemon, or None if no daemon is listening
+    """
+    connection = _connect(socket_path, timeout)
+    if connection is None:
+        return None
+    return next(_messages(connection, {"ping": True}), None)
+
+
+async def serve(socket_path: str, shutdown_grace: float = DEFAULT_SHUTDOWN_GRACE):
+    """
+    Answer queries on the socket until SIGTERM or SIGINT, then finish the ones in flight
+
+    Args:
+        socket_path: Path of the Unix socket to listen on
+        shutdown_grace: Seconds to wait for queries in flight when stopping
+    """
+    import asyncio
+    import signal
+    import time
+
+    # Load everything the first query would, so it is answered warm (imported
+    # for that side effect only, hence unused here)
+    import aiohttp  # noqa: F401
+    import itinerary_agent  # noqa: F401
+    from tourism_ai_agent import TourismAIAgent
+    from upstream import get_client
+    from warming import get_warmer
+
+    _prepare_directory(socket_path)
+    if os.path.exists(socket_path):
+        if ping(socket_path):
+            raise SystemExit(f"A daemon is already listening on {socket_path}")
+        # Left behind by a daemon that didn't shut down
+        os.unlink(socket_path)
+
+    agent = TourismAIAgent()
+    # Popular destinations stay cached while the daemon runs
+    get_warmer().start()
+    started = time.time()
+    counters = {"queries": 0}
+    active = set()
+
+    async def send(writer: asyncio.StreamWriter, message: dict):
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+
+    async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        active.add(asyncio.current_task())
+        try:
+            try:
+                request = json.loads(await reader.readline())
+            except ValueError:
+                await send(writer, {"error": "Request must be one JSON line"})
+                return
+
+            if request.get("ping"):
+                await send(writer, {"status": "ok", "pid": os.getpid(), "uptime_s": round(time.time() - started, 1),
+                                    "queries": counters["queries"], "upstream": get_client().stats(),
+                                    "warming": get_warmer().stats()})
+                return
+
+            query = request.get("query")
+            if not isinstance(query, str) or not query.strip():
+                await send(writer, {"error": "'query' must be a non-empty string"})
+                return
+
+            counters["queries"] += 1
+            sections = agent.process_request_stream_async(query.strip())
+            try:
+                async for section in sections:
+                    await send(writer, {"kind": section.kind, "text": section.text})
+            except ConnectionError:
+                pass
+            except Exception as e:
+                print(f"Error answering query: {e}")
+                await send(writer, {"error": str(e)})
+            finally:
+                await sections.aclose()
+        except ConnectionError:
+            pass
+        finally:
+            active.discard(asyncio.current_task())
+            writer.close()
+
+    # The socket is created accessible to this user only, never open to others even briefly
+    # (the umask is process-wide, nothing else creates files while the server starts)
+    umask = os.umask(0o077)
+    try:
+        server = await asyncio.start_unix_server(answer, socket_path)
+    finally:
+        os.umask(umask)
+    print(socket_path, flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        get_warmer().stop()
+        if active:
+            await asyncio.wait(set(active), timeout=shutdown_grace)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        await get_client().close()
+
+
+def main():
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=default_socket_path(), help="Unix socket to listen on")
+    parser.add_argument("--shutdown-grace", type=float, default=DEFAULT_SHUTDOWN_GRACE,
+                        help="Seconds to finish queries in flight on shutdown")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.socket, args.shutdown_grace))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Endpoints - Interchangeable upstream mirrors with health tracking, circuit breakers and hedging policy
+
+A service with several endpoints (Overpass has public mirrors) is served by
+an EndpointPool. Every endpoint keeps a window of recent answer times and a
+circuit breaker: after a few consecutive failures it is skipped for a while,
+then a single probe decides whether it is used again.
+
+Requests go to the first available endpoint. If it hasn't answered after the
+pool's recent p95 answer time, the same request is sent to the next one and
+whichever answers first is used (see UpstreamClient). Hedges draw on a budget
+that refills with every request, so they stay a small fraction of the load
+even when every endpoint is slow.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+# Consecutive failures that open an endpoint's breaker, and for how long
+FAILURE_THRESHOLD = 3
+OPEN_SECONDS = 30.0
+MAX_OPEN_SECONDS = 300.0
+
+# Hedge after the pool's p95 answer time, within these bounds
+HEDGE_QUANTILE = 0.95
+MIN_HEDGE_DELAY = 0.05
+MAX_HEDGE_DELAY = 10.0
+# Delay used until enough answers have been timed
+DEFAULT_HEDGE_DELAY = 3.0
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# Hedges allowed per request on average, and how many may be saved up
+HEDGE_BUDGET = 0.1
+HEDGE_BURST = 5.0
+
+
+class CircuitBreaker:
+    """
+    Closed, open or half-open state of one endpoint
+
+    Closed lets every request through. FAILURE_THRESHOLD consecutive failures
+    open it: requests are refused until the open period is over, then one
+    probe is let through (half-open). A successful probe closes the breaker,
+    a failed one opens it again for twice as long.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, open_seconds: float = OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.trips = 0
+        self._open_for = open_seconds
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        if self._probing or time.monotonic() >= self._open_until:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """
+        Whether a request may go to the endpoint now, claims the probe when half-open
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def succeeded(self):
+        self.failures = 0
+        self._probing = False
+        self._open_for = self.open_seconds
+
+    def failed(self):
+        self.failures += 1
+        if self._probing:
+            self._probing = False
+            self._open_for = min(self._open_for * 2, MAX_OPEN_SECONDS)
+        if self.failures >= self.failure_threshold:
+            if self.failures == self.failure_threshold:
+                self.trips += 1
+            self._open_until = time.monotonic() + self._open_for
+
+    def released(self):
+        """
+        A probe ended without an outcome (e.g. it lost a hedge race), let another one through
+        """
+        self._probing = False
+
+
+class Endpoint:
+    """
+    One base URL of a service, with its answer times, counters and breaker
+    """
+
+    def __init__(self, service: str, url: str, scheduler_name: str):
+        """
+        Args:
+            service: Service name (e.g. overpass)
+            url: Base URL of this endpoint
+            scheduler_name: Name of the host scheduler rate limiting it
+        """
+        self.service = service
+        self.url = url.rstrip("/")
+        self.host = urlsplit(self.url).netloc
+        self.scheduler_name = scheduler_name
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"requests": 0, "answers": 0, "failures": 0, "hedges": 0, "cancelled": 0}
+        self.last_error = None
+
+    def stats(self) -> Dict:
+        ordered = sorted(self.latencies)
+        return {
+            "url": self.url,
+            "state": self.breaker.state,
+            "trips": self.breaker.trips,
+            **self.counters,
+            "p50_ms": round(quantile(ordered, 0.5) * 1000, 1) if ordered else None,
+            "p95_ms": round(quantile(ordered, 0.95) * 1000, 1) if ordered else None,
+            "last_error": self.last_error
+        }
+
+
+def quantile(ordered: List[float], fraction: float) -> float:
+    """
+    Nearest-rank quantile of sorted values
+    """
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+class EndpointPool:
+    """
+    Endpoints of one service in order of preference, with the hedging policy
+    """
+
+    def __init__(self, service: str, urls: List[str], hedge_budget: float = HEDGE_BUDGET):
+        """
+        Args:
+            service: Service name
+            urls: Base URLs, the preferred one first
+            hedge_budget: Hedges allowed per request on average (0 disables hedging)
+        """
+        self.service = service
+        # The first endpoint keeps the service's own scheduler, mirrors get one per host
+        self.endpoints = [
+            Endpoint(service, url, service if index == 0 else f"{service}@{urlsplit(url).netloc}")
+            for index, url in enumerate(urls)
+        ]
+        self.hedge_budget = hedge_budget
+        self.counters = {"requests": 0, "hedged": 0, "hedges_won": 0, "failovers": 0, "rejected": 0}
+
+        self._answer_times = deque(maxlen=LATENCY_WINDOW)
+        self._hedge_tokens = min(1.0, HEDGE_BURST)
+        self._lock = threading.Lock()
+
+    def start(self) -> List[Endpoint]:
+        """
+        Register a request and pick the endpoints it may use
+
+        Returns:
+            Available endpoints, the one to send the request to first. The
+            first one's breaker has let the request through; the others are
+            checked again with allow() before a hedge or failover goes to them.
+        """
+        with self._lock:
+            self.counters["requests"] += 1
+            self._hedge_tokens = min(self._hedge_tokens + self.hedge_budget, HEDGE_BURST)
+
+            for index, endpoint in enumerate(self.endpoints):
+                if endpoint.breaker.allow():
+                    return [endpoint] + [other for other in self.endpoints[index + 1:] if other.breaker.state != "open"]
+
+            self.counters["rejected"] += 1
+            return []
+
+    def allow(self, endpoint: Endpoint) -> bool:
+        with self._lock:
+            return endpoint.breaker.allow()
+
+    def take_hedge(self) -> bool:
+        """
+        Spend one hedge from the budget, if there is one left
+        """
+        with self._lock:
+            if self._hedge_tokens < 1.0:
+                return False
+            self._hedge_tokens -= 1.0
+            self.counters["hedged"] += 1
+            return True
+
+    def hedge_delay(self) -> float:
+        """
+        Seconds to wait for the first endpoint before hedging: the recent p95 answer time
+        """
+        with self._lock:
+            return self._hedge_delay()
+
+    def sent(self, endpoint: Endpoint, hedge: bool = False):
+        with self._lock:
+            endpoint.counters["requests"] += 1
+            if hedge:
+                endpoint.counters["hedges"] += 1
+
+    def answered(self, endpoint: Endpoint, seconds: float, request_seconds: Optional[float], hedge: bool = False):
+        """
+        Record an endpoint's answer
+
+        Args:
+            endpoint: Endpoint that answered
+            seconds: Time the endpoint took
+            request_seconds: Time since the request started, the hedge delay is its p95
+                (None when another endpoint already answered the request)
+            hedge: The answer came from a hedge
+        """
+        with self._lock:
+            endpoint.counters["answers"] += 1
+            endpoint.latencies.append(seconds)
+            endpoint.breaker.succeeded()
+            # A request answered by the other endpoint of a race isn't timed again
+            if request_seconds is not None:
+                self._answer_times.append(request_seconds)
+            if hedge:
+                self.counters["hedges_won"] += 1
+
+    def failed(self, endpoint: Endpoint, error: BaseException):
+        with self._lock:
+            endpoint.counters["failures"] += 1
+            endpoint.last_error = f"{type(error).__name__}: {error}"
+            endpoint.breaker.failed()
+
+    def cancelled(self, endpoint: Endpoint):
+        """
+        An endpoint lost the race and its request was cancelled
+        """
+        with self._lock:
+            endpoint.counters["cancelled"] += 1
+            endpoint.breaker.released()
+
+    def failover(self):
+        with self._lock:
+            self.counters["failovers"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "hedge_delay_ms": round(self._hedge_delay() * 1000, 1),
+                "endpoints": [endpoint.stats() for endpoint in self.endpoints]
+            }
+
+    def _hedge_delay(self) -> float:
+        if len(self._answer_times) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return min(max(quantile(sorted(self._answer_times), HEDGE_QUANTILE), MIN_HEDGE_DELAY), MAX_HEDGE_DELAY)
+
+
+def endpoint_urls(service: str, base_url: Optional[str], defaults: List[str]) -> List[str]:
+    """
+    Endpoints of a service from the environment
+
+    TOURISM_<SERVICE>_URLS (comma-separated, preferred first) wins; a single
+    base URL set through TOURISM_<SERVICE>_URL or the client's overrides is
+    used on its own; otherwise the default mirrors.
+
+    Args:
+        service: Service name
+        base_url: Base URL configured for the service, or None if it is the default
+        defaults: Default endpoints
+    """
+    configured = os.environ.get(f"TOURISM_{service.upper()}_URLS", "")
+    urls = [url.strip() for url in configured.split(",") if url.strip()]
+    if urls:
+        return urls
+    if base_url:
+        return [base_url]
+    return list(defaults)
@@ -0,0 +1,193 @@
+"""
+Forecast - Hourly Open-Meteo forecasts held in typed NumPy arrays and summarised per day
+
+A 16 day hourly forecast decoded from JSON is four lists of 384 boxed
+numbers (or, worse, 384 small dicts). Here each variable is one typed
+array, about 10 bytes an hour and 4 KB a grid cell, so the forecast cache
+can hold thousands of cities. Daily lows and highs, rainy hour counts and
+the best day of a range are computed for all days at once by reshaping the
+hours into a days x 24 matrix.
+"""
+import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+# Open-Meteo hourly variables, in the order the arrays are kept
+HOURLY_VARIABLES = "temperature_2m,precipitation_probability,precipitation,weather_code"
+# Open-Meteo forecasts reach this many days ahead, a whole forecast is fetched and cached per grid cell
+FORECAST_DAYS = 16
+HOURS_PER_DAY = 24
+
+# An hour counts as rainy at this chance of rain or this much rain
+RAIN_PROBABILITY = 50
+RAIN_MM = 0.1
+# Best day: the fewest rainy hours, each worth this many degrees away from the ideal high
+IDEAL_TEMPERATURE = 22.0
+DEGREES_PER_RAIN_HOUR = 3.0
+# Weather of a day is the worst weather code between these hours
+DAYTIME_HOURS = slice(8, 20)
+
+# Stored in place of missing probabilities and weather codes
+MISSING_CODE = 255
+
+# WMO weather codes used by Open-Meteo, by the lowest code of each group
+WEATHER_DESCRIPTIONS = [
+    (0, "clear"), (1, "partly cloudy"), (3, "cloudy"), (45, "fog"), (51, "drizzle"), (61, "rain"),
+    (71, "snow"), (80, "rain showers"), (85, "snow showers"), (95, "thunderstorms")
+]
+
+
+class DayForecast(NamedTuple):
+    """
+    Summary of one day of a forecast
+    """
+    day: datetime.date
+    low: float
+    high: float
+    rain_hours: int
+    weather_code: int
+
+
+class ForecastSummary(NamedTuple):
+    """
+    Daily summaries of the requested days the forecast covers
+
+    days is empty when none of them is covered; best_day is None unless
+    there are at least two days to choose from.
+    """
+    days: List[DayForecast]
+    best_day: Optional[datetime.date]
+    covered_until: datetime.date
+
+
+class HourlyForecast:
+    """
+    Hourly forecast of one place, one typed array per variable
+
+    Hour i is i hours after local midnight of start. Temperatures and
+    precipitation are float32 with NaN where Open-Meteo has no value,
+    probabilities and weather codes uint8 with MISSING_CODE.
+    """
+
+    __slots__ = ("start", "temperature", "precipitation_probability", "precipitation", "weather_code")
+
+    def __init__(self, start: datetime.date, temperature: np.ndarray, precipitation_probability: np.ndarray,
+                 precipitation: np.ndarray, weather_code: np.ndarray):
+        self.start = start
+        self.temperature = temperature
+        self.precipitation_probability = precipitation_probability
+        self.precipitation = precipitation
+        self.weather_code = weather_code
+
+    @classmethod
+    def from_open_meteo(cls, data: Dict) -> Optional["HourlyForecast"]:
+        """
+        Build a forecast from one location of an Open-Meteo response with
+        HOURLY_VARIABLES, keeping whole days only
+
+        Returns:
+            HourlyForecast, or None if the response has no hourly block
+        """
+        hourly = data.get("hourly")
+        if not hourly or not hourly.get("time"):
+            return None
+
+        times = hourly["time"]
+        hours = len(times) // HOURS_PER_DAY * HOURS_PER_DAY
+        if not hours:
+            return None
+
+        def floats(name: str) -> np.ndarray:
+            # None becomes NaN
+            values = hourly.get(name) or [None] * hours
+            return np.array(values[:hours], dtype=np.float32)
+
+        def codes(name: str) -> np.ndarray:
+            values = floats(name)
+            return np.where(np.isnan(values), MISSING_CODE, values).astype(np.uint8)
+
+        return cls(
+            start=datetime.date.fromisoformat(times[0][:10]),
+            temperature=floats("temperature_2m"),
+            precipitation_probability=codes("precipitation_probability"),
+            precipitation=floats("precipitation"),
+            weather_code=codes("weather_code")
+        )
+
+    @property
+    def days(self) -> int:
+        return len(self.temperature) // HOURS_PER_DAY
+
+    @property
+    def end(self) -> datetime.date:
+        """
+        Last day of the forecast
+        """
+        return self.start + datetime.timedelta(days=self.days - 1)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes taken by the arrays' data
+        """
+        return sum(getattr(self, name).nbytes for name in self.__slots__[1:])
+
+    def summarize(self, start: datetime.date, end: datetime.date) -> ForecastSummary:
+        """
+        Daily lows, highs, rainy hours and weather of the days from start to
+        end (inclusive) that the forecast covers, and the best of them
+
+        Args:
+            start: First day asked about
+            end: Last day asked about
+
+        Returns:
+            ForecastSummary
+        """
+        first = max((start - self.start).days, 0)
+        last = min((end - self.start).days, self.days - 1)
+        if first > last:
+            return ForecastSummary([], None, self.end)
+
+        rows = slice(first * HOURS_PER_DAY, (last + 1) * HOURS_PER_DAY)
+        temperature = self.temperature[rows].reshape(-1, HOURS_PER_DAY)
+        probability = self.precipitation_probability[rows].reshape(-1, HOURS_PER_DAY)
+        precipitation = self.precipitation[rows].reshape(-1, HOURS_PER_DAY)
+        codes = self.weather_code[rows].reshape(-1, HOURS_PER_DAY)
+
+        # fmin/fmax skip NaN hours, a day with no temperatures at all stays NaN
+        lows = np.fmin.reduce(temperature, axis=1)
+        highs = np.fmax.reduce(temperature, axis=1)
+        rainy = ((probability >= RAIN_PROBABILITY) & (probability != MISSING_CODE)) | (precipitation >= RAIN_MM)
+        rain_hours = rainy.sum(axis=1)
+        daytime = codes[:, DAYTIME_HOURS]
+        weather = np.where(daytime == MISSING_CODE, 0, daytime).max(axis=1)
+
+        # One tolist per column is cheaper than converting NumPy scalars one by one
+        days = [
+            DayForecast(self.start + datetime.timedelta(days=first + index), low, high, hours, code)
+            for index, (low, high, hours, code) in enumerate(zip(
+                lows.tolist(), highs.tolist(), rain_hours.tolist(), weather.tolist()
+            ))
+        ]
+
+        best_day = None
+        if len(days) > 1:
+            scores = rain_hours + np.abs(highs - IDEAL_TEMPERATURE) / DEGREES_PER_RAIN_HOUR
+            scores = np.where(np.isnan(scores), np.inf, scores)
+            best_day = days[int(np.argmin(scores))].day
+
+        return ForecastSummary(days, best_day, self.end)
+
+
+def describe_weather_code(code: int) -> str:
+    """
+    Short description of a WMO weather code
+    """
+    description = WEATHER_DESCRIPTIONS[0][1]
+    for lowest, name in WEATHER_DESCRIPTIONS:
+        if code < lowest:
+            break
+        description = name
+    return description
@@ -0,0 +1,456 @@
+"""
+Gazetteer - Offline, memory-mapped city lookup with typo tolerance, built from a GeoNames cities file
+
+The index stores every normalized city name (main, ASCII and Latin alternate
+names) in one sorted key table. Exact and prefix lookups are binary searches;
+fuzzy lookups walk the sorted keys as an implicit trie, reusing the edit
+distance rows of shared prefixes and skipping every key below a prefix that is
+already too far from the query. Matches are ranked by population.
+
+Build it from e.g. https://download.geonames.org/export/dump/cities15000.zip:
+
+    python -m gazetteer build cities15000.txt
+"""
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.idx")
+
+# Fuzzy matches must be this populous, so typos don't land on obscure hamlets
+FUZZY_MIN_POPULATION = 50000
+
+_MAGIC = b"GAZT"
+_VERSION = 1
+# magic, version, key count, posting count, city count
+_HEADER = struct.Struct("<4sIIII")
+
+# GeoNames "geoname" table columns
+_COL_NAME = 1
+_COL_ASCIINAME = 2
+_COL_ALTERNATE_NAMES = 3
+_COL_LAT = 4
+_COL_LON = 5
+_COL_COUNTRY = 8
+_COL_POPULATION = 14
+
+_NON_KEY_CHARS = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Fold a place name to the ASCII key form used by the index
+
+    Args:
+        name: Raw place name
+
+    Returns:
+        Lower-case ASCII letters and digits separated by single spaces
+    """
+    folded = unicodedata.normalize("NFKD", name)
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    folded = folded.lower().encode("ascii", "ignore").decode("ascii")
+    return _NON_KEY_CHARS.sub(" ", folded).strip()
+
+
+def max_edit_distance(key: str) -> int:
+    """
+    Typos tolerated for a query of this length
+    """
+    if len(key) < 4:
+        return 0
+    if len(key) < 8:
+        return 1
+    return 2
+
+
+class _Keys:
+    """
+    Sequence view over the sorted key table, usable with bisect
+    """
+
+    def __init__(self, blob: memoryview, starts: memoryview):
+        self._blob = blob
+        self._starts = starts
+
+    def __len__(self) -> int:
+        return len(self._starts) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return self._blob[self._starts[index]:self._starts[index + 1]].tobytes()
+
+    def release(self):
+        self._blob.release()
+        self._starts.release()
+
+
+class Gazetteer:
+    """
+    Memory-mapped gazetteer index
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, key_count, posting_count, city_count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a gazetteer index file")
+
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+
+        def take(count: int, fmt: str, size: int) -> memoryview:
+            nonlocal offset
+            part = view[offset:offset + count * size].cast(fmt)
+            offset += count * size
+            return part
+
+        key_starts = take(key_count + 1, "I", 4)
+        self._posting_starts = take(key_count + 1, "I", 4)
+        self._postings = take(posting_count, "I", 4)
+        self._lats = take(city_count, "f", 4)
+        self._lons = take(city_count, "f", 4)
+        self._populations = take(city_count, "I", 4)
+        name_starts = take(city_count + 1, "I", 4)
+        key_blob = take(key_starts[key_count] if key_count else 0, "B", 1)
+        name_blob = take(name_starts[city_count] if city_count else 0, "B", 1)
+
+        self.keys = _Keys(key_blob, key_starts)
+        self._names = _Keys(name_blob, name_starts)
+        self.city_count = city_count
+
+    def city(self, city_id: int) -> Dict:
+        """
+        Decode one city record in the geocoding result format
+        """
+        return {
+            "lat": float(self._lats[city_id]),
+            "lon": float(self._lons[city_id]),
+            "display_name": self._names[city_id].decode("utf-8"),
+            "bounding_box": None,
+            "population": self._populations[city_id]
+        }
+
+    def _cities(self, key_index: int) -> List[int]:
+        # Postings of a key are stored most populous first
+        return list(self._postings[self._posting_starts[key_index]:self._posting_starts[key_index + 1]])
+
+    def exact(self, name: str) -> Optional[Dict]:
+        """
+        Most populous city whose name normalizes to the same key
+
+        Args:
+            name: Place name
+
+        Returns:
+            City record, or None
+        """
+        key = normalize_name(name).encode("ascii")
+        if not key:
+            return None
+
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return self.city(self._cities(index)[0])
+
+        return None
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """
+        Most populous cities whose name starts with a prefix
+
+        Args:
+            prefix: Beginning of a place name
+            limit: Maximum number of cities to return
+
+        Returns:
+            City records, most populous first
+        """
+        key = normalize_name(prefix).encode("ascii")
+        if not key:
+            return []
+
+        low = bisect_left(self.keys, key)
+        high = bisect_left(self.keys, key + b"\xff", low)
+
+        city_ids = set()
+        for index in range(low, high):
+            city_ids.update(self._cities(index))
+
+        ranked = sorted(city_ids, key=lambda city_id: -self._populations[city_id])
+        return [self.city(city_id) for city_id in ranked[:limit]]
+
+    def fuzzy(self, name: str, max_distance: Optional[int] = None) -> List[Tuple[int, Dict]]:
+        """
+        Cities within a bounded edit distance of a name
+
+        Args:
+            name: Possibly misspelled place name
+            max_distance: Maximum Levenshtein distance, defaults by query length
+
+        Returns:
+            List of (distance, city record), closest and then most populous first
+        """
+        query = normalize_name(name)
+        if not query:
+            return []
+        if max_distance is None:
+            max_distance = max_edit_distance(query)
+
+        keys = self.keys
+        key_count = len(keys)
+        query_length = len(query)
+
+        # rows[d] is the edit distance row of the current key's first d characters,
+        # cells outside the band are clamped to too_far
+        too_far = max_distance + 1
+        rows = [[min(column, too_far) for column in range(query_length + 1)]]
+        previous = ""
+        matches = {}
+        index = 0
+
+        while index < key_count:
+            key = keys[index].decode("ascii")
+
+            common = 0
+            limit = min(len(previous), len(key), len(rows) - 1)
+            while common < limit and previous[common] == key[common]:
+                common += 1
+            del rows[common + 1:]
+
+            pruned = False
+            for depth in range(common, len(key)):
+                above = rows[-1]
+                char = key[depth]
+                length = depth + 1
+                # Only cells within max_distance of the diagonal can stay in bounds
+                row = [too_far] * (query_length + 1)
+                if length <= max_distance:
+                    row[0] = length
+                low = max(1, length - max_distance)
+                high = min(query_length, length + max_distance)
+                best = row[0]
+                for column in range(low, high + 1):
+                    cost = 0 if query[column - 1] == char else 1
+                    value = min(row[column - 1] + 1, above[column] + 1, above[column - 1] + cost)
+                    row[column] = value
+                    if value < best:
+                        best = value
+                rows.append(row)
+
+                if best > max_distance:
+                    # No key below this prefix can match, skip them all
+                    prefix = key[:length]
+                    index = bisect_left(keys, prefix.encode("ascii") + b"\xff", index)
+                    previous = prefix
+                    pruned = True
+                    break
+
+            if pruned:
+                continue
+
+            distance = rows[-1][-1]
+            if distance <= max_distance:
+                for city_id in self._cities(index):
+                    if city_id not in matches or matches[city_id] > distance:
+                        matches[city_id] = distance
+
+            previous = key
+            index += 1
+
+        ranked = sorted(matches.items(), key=lambda item: (item[1], -self._populations[item[0]]))
+        return [(distance, self.city(city_id)) for city_id, distance in ranked]
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        """
+        Resolve a place name: exact match first, then the best typo-tolerant match
+
+        Args:
+            name: Place name
+
+        Returns:
+            City record, or None if the gazetteer doesn't know the place
+        """
+        return self.exact(name) or self.typo_match(name)
+
+    def typo_match(self, name: str) -> Optional[Dict]:
+        """
+        The most populous city within one or two typos of a name
+
+        A pure-Python trie walk taking milliseconds; geocoding only uses it
+        when Nominatim knows no such place, since a real place missing from
+        the gazetteer would otherwise be replaced by a similarly named city.
+
+        Args:
+            name: Place name
+
+        Returns:
+            City record of at least FUZZY_MIN_POPULATION people, or None
+        """
+        # Widen the search one edit at a time, tighter bounds prune much earlier
+        for max_distance in range(1, max_edit_distance(normalize_name(name)) + 1):
+            for distance, city in self.fuzzy(name, max_distance):
+                if city["population"] >= FUZZY_MIN_POPULATION:
+                    return city
+
+        return None
+
+    def close(self):
+        # The mmap can't be closed while views into it are still exported
+        self.keys.release()
+        self._names.release()
+        self._posting_starts.release()
+        self._postings.release()
+        self._lats.release()
+        self._lons.release()
+        self._populations.release()
+        self._mmap.close()
+
+
+def _city_keys(fields: List[str]) -> List[str]:
+    names = [fields[_COL_NAME], fields[_COL_ASCIINAME]]
+    names.extend(fields[_COL_ALTERNATE_NAMES].split(",") if fields[_COL_ALTERNATE_NAMES] else [])
+
+    keys = set()
+    for name in names:
+        # Alternate names in non-Latin scripts fold to (almost) nothing and are skipped
+        key = normalize_name(name)
+        if 2 <= len(key) <= 40:
+            keys.add(key)
+    return sorted(keys)
+
+
+def build_gazetteer(source: str, output: str = DEFAULT_GAZETTEER_PATH, min_population: int = 0) -> int:
+    """
+    Build the index from a GeoNames cities file (tab-separated geoname table)
+
+    Args:
+        source: Path to e.g. cities15000.txt
+        output: Index file to write
+        min_population: Skip smaller cities
+
+    Returns:
+        Number of indexed cities
+    """
+    cities = []
+    with open(source, encoding="utf-8") as cities_file:
+        for line in cities_file:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) <= _COL_POPULATION:
+                continue
+            population = int(fields[_COL_POPULATION] or 0)
+            if population < min_population:
+                continue
+            cities.append((
+                population,
+                float(fields[_COL_LAT]),
+                float(fields[_COL_LON]),
+                f"{fields[_COL_NAME]}, {fields[_COL_COUNTRY]}",
+                _city_keys(fields)
+            ))
+
+    # Most populous first, so every posting list is already ranked
+    cities.sort(key=lambda city: -city[0])
+
+    postings_by_key = {}
+    for city_id, city in enumerate(cities):
+        for key in city[4]:
+            postings_by_key.setdefault(key, []).append(city_id)
+
+    keys = sorted(postings_by_key)
+    key_blob = bytearray()
+    key_starts = [0]
+    posting_starts = [0]
+    postings = []
+    for key in keys:
+        key_blob += key.encode("ascii")
+        key_starts.append(len(key_blob))
+        postings.extend(postings_by_key[key])
+        posting_starts.append(len(postings))
+
+    name_blob = bytearray()
+    name_starts = [0]
+    for city in cities:
+        name_blob += city[3].encode("utf-8")
+        name_starts.append(len(name_blob))
+
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temporary_path = output + ".tmp"
+    with open(temporary_path, "wb") as index_file:
+        index_file.write(_HEADER.pack(_MAGIC, _VERSION, len(keys), len(postings), len(cities)))
+        index_file.write(struct.pack(f"<{len(key_starts)}I", *key_starts))
+        index_file.write(struct.pack(f"<{len(posting_starts)}I", *posting_starts))
+        index_file.write(struct.pack(f"<{len(postings)}I", *postings))
+        index_file.write(struct.pack(f"<{len(cities)}f", *(city[1] for city in cities)))
+        index_file.write(struct.pack(f"<{len(cities)}f", *(city[2] for city in cities)))
+        index_file.write(struct.pack(f"<{len(cities)}I", *(city[0] for city in cities)))
+        index_file.write(struct.pack(f"<{len(name_starts)}I", *name_starts))
+        index_file.write(key_blob)
+        index_file.write(name_blob)
+    os.replace(temporary_path, output)
+
+    return len(cities)
+
+
+_default_gazetteer = None
+_default_gazetteer_loaded = False
+_default_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """
+    Return the process-wide gazetteer from TOURISM_GAZETTEER_PATH, or None if it isn't built
+    """
+    global _default_gazetteer, _default_gazetteer_loaded
+
+    with _default_gazetteer_lock:
+        if not _default_gazetteer_loaded:
+            path = os.environ.get("TOURISM_GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+            if os.path.exists(path):
+                try:
+                    _default_gazetteer = Gazetteer(path)
+                except Exception as e:
+                    print(f"Error loading gazetteer {path}: {e}")
+            _default_gazetteer_loaded = True
+        return _default_gazetteer
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build or query the offline gazetteer")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    build = subcommands.add_parser("build", help="Build the index from a GeoNames cities file")
+    build.add_argument("source", help="GeoNames cities file, e.g. cities15000.txt")
+    build.add_argument("--output", default=os.environ.get("TOURISM_GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH))
+    build.add_argument("--min-population", type=int, default=0)
+
+    lookup = subcommands.add_parser("lookup", help="Look a place name up")
+    lookup.add_argument("name")
+    lookup.add_argument("--index", default=os.environ.get("TOURISM_GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH))
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_gazetteer(args.source, args.output, args.min_population)
+        print(f"Indexed {count} cities into {args.output}")
+    else:
+        gazetteer = Gazetteer(args.index)
+        print(gazetteer.lookup(args.name))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""
+Geocode Cache - Two-tier (in-process LRU + on-disk SQLite) cache for Nominatim lookups
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Default cache settings, each can be overridden through the environment
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "tourism_ai", "geocode.sqlite3")
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 6 * 3600
+
+# Share of the on-disk entries evicted beyond the overflow, so a full store
+# doesn't evict (and recount) on every write
+EVICTION_SLACK = 0.01
+
+# Returned by lookups when a key is not cached at all (None is a cached "not found")
+MISSING = object()
+
+
+def normalize_key(place_name: str) -> str:
+    """
+    Normalize a place string so equivalent spellings share one cache entry
+
+    Args:
+        place_name: Raw place name
+
+    Returns:
+        Lower-cased place name with punctuation and extra whitespace removed
+    """
+    key = place_name.casefold()
+    key = re.sub(r"[^\w\s]", " ", key)
+    return re.sub(r"\s+", " ", key).strip()
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded in-process cache with per-entry expiry
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """
+        Return the cached value for key, or MISSING if absent or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """
+    On-disk key/value store that survives restarts
+
+    The row count is kept in memory (counted once at open, adjusted on
+    inserts and evictions), so writes don't count the table. It is recounted
+    before evicting, as other processes may share the file.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10 * DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+            self._rows = self._count_rows()
+
+    def _count_rows(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def get(self, key: str) -> Tuple[Any, float]:
+        """
+        Return (value, expires_at) for key, or (MISSING, 0) if absent or expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None or row[1] <= time.time():
+            return MISSING, 0.0
+
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        text = json.dumps(value)
+        with self._lock, self._conn:
+            # Updating first tells a new key from a replaced one, which INSERT OR REPLACE doesn't
+            updated = self._conn.execute(
+                "UPDATE cache SET value = ?, expires_at = ? WHERE key = ?", (text, expires_at, key)
+            ).rowcount
+            if not updated:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, text, expires_at)
+                )
+                self._rows += 1
+
+            if self._rows > self.max_entries:
+                self._rows = self._count_rows()
+                if self._rows > self.max_entries:
+                    self._evict()
+
+    def _evict(self):
+        """
+        Drop expired rows first, then the entries closest to expiry, down to
+        EVICTION_SLACK below max_entries
+        """
+        removed = self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        target = self.max_entries - max(int(self.max_entries * EVICTION_SLACK), 1)
+        overflow = self._rows - removed - target
+        if overflow > 0:
+            removed += self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY expires_at LIMIT ?)", (overflow,)
+            ).rowcount
+        self._rows -= removed
+        self.evictions += removed
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+            self._rows = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class GeocodeCache:
+    """
+    Two-tier geocode cache: a bounded LRU in front of an optional SQLite store
+
+    Found places are kept for ``ttl`` seconds, places that were not found are
+    kept for the shorter ``negative_ttl`` so misspellings don't hammer upstream.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = LRUCache(max_entries)
+        self.disk = None
+
+        if path:
+            try:
+                self.disk = SQLiteStore(path, max_entries=10 * max_entries)
+            except Exception as e:
+                print(f"Error opening geocode cache at {path}: {e}")
+
+        self._counter_lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "writes": 0
+        }
+
+    def _count(self, name: str):
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    def get(self, place_name: str) -> Any:
+        """
+        Look up a place in the cache
+
+        Args:
+            place_name: Name of the place
+
+        Returns:
+            Cached geocode result, None for a cached "not found", or MISSING
+        """
+        key = normalize_key(place_name)
+
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self._count("memory_hits")
+            if value is None:
+                self._count("negative_hits")
+            return value
+
+        if self.disk:
+            try:
+                value, expires_at = self.disk.get(key)
+            except Exception as e:
+                print(f"Error reading geocode cache: {e}")
+                value = MISSING
+
+            if value is not MISSING:
+                # Promote to the in-process tier for the remaining lifetime
+                self.memory.set(key, value, expires_at)
+                self._count("disk_hits")
+                if value is None:
+                    self._count("negative_hits")
+                return value
+
+        self._count("misses")
+        return MISSING
+
+    def set(self, place_name: str, value: Optional[Dict]):
+        """
+        Store a geocode result, or None to remember that the place wasn't found
+
+        Args:
+            place_name: Name of the place
+            value: Geocode result dictionary or None
+        """
+        key = normalize_key(place_name)
+        ttl = self.ttl if value is not None else self.negative_ttl
+        expires_at = time.time() + ttl
+
+        self.memory.set(key, value, expires_at)
+        if self.disk:
+            try:
+                self.disk.set(key, value, expires_at)
+            except Exception as e:
+                print(f"Error writing geocode cache: {e}")
+
+        self._count("writes")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit/miss/eviction counters for sizing the cache
+
+        Returns:
+            Dictionary of counters and current in-memory size
+        """
+        with self._counter_lock:
+            stats = dict(self._counters)
+
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        stats["memory_evictions"] = self.memory.evictions
+        stats["disk_evictions"] = self.disk.evictions if self.disk else 0
+        stats["memory_entries"] = len(self.memory)
+        return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_geocode_cache() -> GeocodeCache:
+    """
+    Return the process-wide geocode cache, creating it from the environment on first use
+
+    Environment:
+        TOURISM_GEOCODE_CACHE_PATH: SQLite file path, empty to keep the cache in memory only
+        TOURISM_GEOCODE_CACHE_SIZE: Maximum in-memory entries
+        TOURISM_GEOCODE_TTL: Seconds to keep found places
+        TOURISM_GEOCODE_NEGATIVE_TTL: Seconds to keep places that were not found
+    """
+    global _default_cache
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = GeocodeCache(
+                path=os.environ.get("TOURISM_GEOCODE_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_entries=int(os.environ.get("TOURISM_GEOCODE_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                ttl=float(os.environ.get("TOURISM_GEOCODE_TTL", DEFAULT_TTL)),
+                negative_ttl=float(os.environ.get("TOURISM_GEOCODE_NEGATIVE_TTL", DEFAULT_NEGATIVE_TTL))
+            )
+        return _default_cache
+
+
+def set_geocode_cache(cache: Optional[GeocodeCache]):
+    """
+    Replace the process-wide geocode cache (None recreates it from the environment)
+    """
+    global _default_cache
+
+    with _default_cache_lock:
+        _default_cache = cache
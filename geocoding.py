@@ -1,22 +1,144 @@
 """
-Geocoding utility using Nominatim API
+Geocoding utility using the offline gazetteer and Nominatim API
 """
-import requests
-from typing import Optional, Tuple
+import asyncio
+from typing import Dict, NamedTuple, Optional, Tuple
+from gazetteer import get_gazetteer
+from geocode_cache import MISSING, get_geocode_cache, normalize_key
+from singleflight import get_group
+from tracing import span
+from upstream import UpstreamThrottled, get_client, run_sync
 
 
-def get_coordinates(place_name: str) -> Optional[Tuple[float, float]]:
+class ResolvedPlace(NamedTuple):
     """
-    Get latitude and longitude for a place using Nominatim API
+    A place resolved once per request and shared with the child agents
+    """
+    name: str
+    lat: float
+    lon: float
+    display_name: str
+    bounding_box: Optional[Tuple[float, float, float, float]]
+    
+    @property
+    def coordinates(self) -> Tuple[float, float]:
+        return (self.lat, self.lon)
+
+
+async def geocode_async(place_name: str) -> Optional[Dict]:
+    """
+    Look up a place in the offline gazetteer, then the geocode cache, then Nominatim API
+    
+    Only exact gazetteer matches are taken before Nominatim. Typo-tolerant
+    matches are the fallback when Nominatim finds nothing or is throttled,
+    so real places missing from the gazetteer are not replaced by a
+    similarly named city.
     
     Args:
         place_name: Name of the place to geocode
         
     Returns:
-        Tuple of (latitude, longitude) if found, None otherwise
+        Dictionary with lat, lon, display_name and bounding_box if found,
+        None otherwise
+        
+    Raises:
+        UpstreamThrottled: Nominatim is rate limiting us, the place may well exist
     """
-    base_url = "https://nominatim.openstreetmap.org/search"
+    with span("geocode", place=place_name) as current:
+        gazetteer = get_gazetteer()
+        if gazetteer:
+            try:
+                city = gazetteer.exact(place_name)
+            except Exception as e:
+                print(f"Error reading gazetteer: {e}")
+                city = None
+            
+            if city:
+                current.set(source="gazetteer")
+                return city
+        
+        cache = get_geocode_cache()
+        
+        cached = cache.get(place_name)
+        current.set(cache_hit=cached is not MISSING)
+        if cached is not MISSING:
+            current.set(source="cache")
+            result = cached
+        else:
+            # Concurrent lookups of the same place share one Nominatim call
+            current.set(source="nominatim")
+            try:
+                result = await get_group("geocoding").do_async(normalize_key(place_name),
+                                                               lambda: _geocode_uncached(place_name))
+            except UpstreamThrottled:
+                city = await _typo_match(gazetteer, place_name)
+                if not city:
+                    raise
+                current.set(source="gazetteer_typo", throttled=True)
+                return city
+        
+        if result is None:
+            city = await _typo_match(gazetteer, place_name)
+            if city:
+                current.set(source="gazetteer_typo")
+                return city
+        
+        return result
+
+
+async def _typo_match(gazetteer, place_name: str) -> Optional[Dict]:
+    """
+    Typo-tolerant gazetteer match, run in a worker thread to keep the trie walk off the event loop
+    """
+    if not gazetteer:
+        return None
     
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, gazetteer.typo_match, place_name)
+    except Exception as e:
+        print(f"Error reading gazetteer: {e}")
+        return None
+
+
+async def _geocode_uncached(place_name: str) -> Optional[Dict]:
+    """
+    Call Nominatim API and cache the answer
+    """
+    try:
+        result = await _fetch_nominatim(place_name)
+    except UpstreamThrottled:
+        # Throttling says nothing about the place, let the caller tell the user to retry
+        raise
+    except Exception as e:
+        # Upstream failures are not cached, only genuine "not found" answers
+        print(f"Error in geocoding: {e}")
+        return None
+    
+    get_geocode_cache().set(place_name, result)
+    return result
+
+
+def geocode(place_name: str) -> Optional[Dict]:
+    """
+    Synchronous wrapper around geocode_async
+    
+    Args:
+        place_name: Name of the place to geocode
+        
+    Returns:
+        Dictionary with lat, lon, display_name and bounding_box if found,
+        None otherwise
+        
+    Raises:
+        UpstreamThrottled: Nominatim is rate limiting us, the place may well exist
+    """
+    return run_sync(geocode_async(place_name))
+
+
+async def _fetch_nominatim(place_name: str) -> Optional[Dict]:
+    """
+    Call Nominatim API for a place, raising on transport or HTTP errors
+    """
     params = {
         "q": place_name,
         "format": "json",
@@ -24,26 +146,93 @@ def get_coordinates(place_name: str) -> Optional[Tuple[float, float]]:
         "addressdetails": 1
     }
     
-    headers = {
-        "User-Agent": "Tourism-AI-Agent/1.0"
-    }
+    data = await get_client().get_json("nominatim", "/search", params=params, timeout=10)
     
-    try:
-        response = requests.get(base_url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
+    if data and len(data) > 0:
+        return _parse_result(data[0])
+    
+    return None
+
+
+def _parse_result(result: Dict) -> Dict:
+    """
+    Convert a raw Nominatim result into the fields the agents use
+    """
+    bounding_box = None
+    # Nominatim orders the box as [south, north, west, east]
+    if len(result.get("boundingbox") or []) == 4:
+        bounding_box = tuple(float(value) for value in result["boundingbox"])
         
-        data = response.json()
+    return {
+        "lat": float(result["lat"]),
+        "lon": float(result["lon"]),
+        "display_name": result.get("display_name", ""),
+        "bounding_box": bounding_box
+    }
+
+
+async def resolve_place_async(place_name: str) -> Optional[ResolvedPlace]:
+    """
+    Resolve a place name once so it can be handed to every child agent
+    
+    Args:
+        place_name: Name of the place to resolve
         
-        if data and len(data) > 0:
-            result = data[0]
-            lat = float(result["lat"])
-            lon = float(result["lon"])
-            return (lat, lon)
+    Returns:
+        ResolvedPlace if found, None otherwise
         
+    Raises:
+        UpstreamThrottled: Nominatim is rate limiting us, the place may well exist
+    """
+    result = await geocode_async(place_name)
+    
+    if not result:
         return None
-    except Exception as e:
-        print(f"Error in geocoding: {e}")
+    
+    return ResolvedPlace(
+        name=place_name,
+        lat=result["lat"],
+        lon=result["lon"],
+        display_name=result["display_name"] or place_name,
+        bounding_box=tuple(result["bounding_box"]) if result["bounding_box"] else None
+    )
+
+
+def resolve_place(place_name: str) -> Optional[ResolvedPlace]:
+    """
+    Synchronous wrapper around resolve_place_async
+    
+    Args:
+        place_name: Name of the place to resolve
+        
+    Returns:
+        ResolvedPlace if found, None otherwise
+        
+    Raises:
+        UpstreamThrottled: Nominatim is rate limiting us, the place may well exist
+    """
+    return run_sync(resolve_place_async(place_name))
+
+
+def get_coordinates(place_name: str) -> Optional[Tuple[float, float]]:
+    """
+    Get latitude and longitude for a place using Nominatim API
+    
+    Args:
+        place_name: Name of the place to geocode
+        
+    Returns:
+        Tuple of (latitude, longitude) if found, None otherwise
+        
+    Raises:
+        UpstreamThrottled: Nominatim is rate limiting us, the place may well exist
+    """
+    result = geocode(place_name)
+    
+    if not result:
         return None
+        
+    return (result["lat"], result["lon"])
 
 
 def place_exists(place_name: str) -> bool:
@@ -55,6 +244,8 @@ def place_exists(place_name: str) -> bool:
         
     Returns:
         True if place exists, False otherwise
+        
+    Raises:
+        UpstreamThrottled: Nominatim is rate limiting us, the answer is unknown
     """
     return get_coordinates(place_name) is not None
-
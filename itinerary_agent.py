@@ -0,0 +1,294 @@
+"""
+Itinerary Agent - Day-by-day trip plans over the best ranked attractions
+
+The attractions around a place are split into one group per day with a
+size-balanced k-means clustering of their positions. Each day is ordered
+as a route from the city centre: a nearest-neighbour tour improved with
+2-opt moves. All distances come from one vectorized haversine matrix.
+"""
+import math
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from geocoding import ResolvedPlace, geocode_async
+from places_agent import get_attraction_points_at_async
+from poi_index import EARTH_RADIUS_M
+from ranking import Attraction
+from tracing import span
+from upstream import run_sync
+
+# Attractions planned per day of the trip
+STOPS_PER_DAY = 4
+KMEANS_ITERATIONS = 20
+TWO_OPT_MAX_PASSES = 50
+
+
+class ItineraryDay(NamedTuple):
+    """
+    One day of a plan: stops in visiting order and the route length from the centre
+    """
+    stops: List[Attraction]
+    distance_m: float
+
+
+def distance_matrix(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distances in metres between every pair of points
+
+    Args:
+        lats: Latitudes in degrees
+        lons: Longitudes in degrees
+
+    Returns:
+        Symmetric (n, n) matrix
+    """
+    phi = np.radians(lats)
+    lam = np.radians(lons)
+    dphi = phi[:, None] - phi[None, :]
+    dlam = lam[:, None] - lam[None, :]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def cluster_days(lats: np.ndarray, lons: np.ndarray, days: int) -> np.ndarray:
+    """
+    Split points into days of (almost) equal size, keeping each day's stops close together
+
+    Lloyd's k-means on an equirectangular projection, which is accurate
+    enough at city scale, with a capacity-bounded assignment step so no day
+    gets more than its share of stops. Seeding is farthest-point, so plans
+    are deterministic.
+
+    Args:
+        lats: Latitudes of the stops
+        lons: Longitudes of the stops
+        days: Number of groups
+
+    Returns:
+        Day index of every stop
+    """
+    count = len(lats)
+    if days <= 1 or count <= 1:
+        return np.zeros(count, dtype=int)
+    if days >= count:
+        return np.arange(count)
+
+    points = np.column_stack((lons * math.cos(math.radians(float(np.mean(lats)))), lats))
+
+    # Farthest-point seeding: start from the point farthest from the centroid
+    seeds = [int(np.argmax(((points - points.mean(axis=0)) ** 2).sum(axis=1)))]
+    nearest_seed = ((points - points[seeds[0]]) ** 2).sum(axis=1)
+    for _ in range(1, days):
+        seeds.append(int(np.argmax(nearest_seed)))
+        nearest_seed = np.minimum(nearest_seed, ((points - points[seeds[-1]]) ** 2).sum(axis=1))
+    centers = points[seeds]
+
+    capacity = math.ceil(count / days)
+    labels = None
+    for _ in range(KMEANS_ITERATIONS):
+        squared = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = _assign_with_capacity(squared, capacity)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        centers = np.array([points[labels == day].mean(axis=0) for day in range(days)])
+
+    return labels
+
+
+def _assign_with_capacity(squared: np.ndarray, capacity: int) -> np.ndarray:
+    """
+    Give each point its nearest center that still has room, most clear-cut points first
+    """
+    preferences = np.argsort(squared, axis=1)
+    sizes = [0] * squared.shape[1]
+    labels = np.empty(squared.shape[0], dtype=int)
+    for point in np.argsort(squared.min(axis=1)).tolist():
+        for day in preferences[point].tolist():
+            if sizes[day] < capacity:
+                labels[point] = day
+                sizes[day] += 1
+                break
+    return labels
+
+
+def order_stops(matrix: np.ndarray) -> List[int]:
+    """
+    Short open route through every node, starting at node 0
+
+    Nearest-neighbour construction followed by 2-opt segment reversals until
+    no reversal shortens the route. Each 2-opt step scores all reversals
+    starting at one position with a single vectorized expression.
+
+    Args:
+        matrix: Distance matrix, node 0 is the starting point
+
+    Returns:
+        Node indices in visiting order, beginning with 0
+    """
+    count = len(matrix)
+    if count <= 2:
+        return list(range(count))
+
+    # Nearest neighbour
+    route = [0]
+    unvisited = np.ones(count, dtype=bool)
+    unvisited[0] = False
+    for _ in range(count - 1):
+        distances = np.where(unvisited, matrix[route[-1]], np.inf)
+        following = int(np.argmin(distances))
+        route.append(following)
+        unvisited[following] = False
+    route = np.array(route)
+
+    # 2-opt: reversing route[i..j] swaps edges (i-1, i), (j, j+1) for (i-1, j), (i, j+1)
+    for _ in range(TWO_OPT_MAX_PASSES):
+        improved = False
+        for i in range(1, count - 1):
+            before = route[i - 1]
+            first = route[i]
+            last = route[i + 1:]
+            after = route[i + 2:]
+            # The route is open, reversing up to its end removes no trailing edge
+            removed_after = np.append(matrix[last[:-1], after], 0.0)
+            added_after = np.append(matrix[first, after], 0.0)
+            delta = matrix[before, last] + added_after - matrix[before, first] - removed_after
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-6:
+                route[i:i + best + 2] = route[i:i + best + 2][::-1].copy()
+                improved = True
+        if not improved:
+            break
+
+    return route.tolist()
+
+
+def plan_days(lat: float, lon: float, attractions: Sequence[Attraction], days: int) -> List[ItineraryDay]:
+    """
+    Split attractions into days and order each day's stops
+
+    Args:
+        lat: Latitude of the city centre, where every day starts
+        lon: Longitude of the city centre
+        attractions: Stops to plan
+        days: Number of days
+
+    Returns:
+        Non-empty days, the one closest to the centre first
+    """
+    if not attractions:
+        return []
+
+    lats = np.array([lat] + [attraction.lat for attraction in attractions])
+    lons = np.array([lon] + [attraction.lon for attraction in attractions])
+    matrix = distance_matrix(lats, lons)
+    labels = cluster_days(lats[1:], lons[1:], min(days, len(attractions)))
+
+    plan = []
+    for day in range(int(labels.max()) + 1):
+        nodes = [0] + (np.flatnonzero(labels == day) + 1).tolist()
+        if len(nodes) == 1:
+            continue
+        local = matrix[np.ix_(nodes, nodes)]
+        route = order_stops(local)
+        distance = float(local[route[:-1], route[1:]].sum())
+        stops = [attractions[nodes[node] - 1] for node in route[1:]]
+        plan.append((float(matrix[0, nodes[1:]].mean()), ItineraryDay(stops, distance)))
+
+    plan.sort(key=lambda item: item[0])
+    return [itinerary_day for _, itinerary_day in plan]
+
+
+async def plan_itinerary_async(place_name: str, days: int, place: Optional[ResolvedPlace] = None,
+                               stops_per_day: int = STOPS_PER_DAY) -> Optional[List[ItineraryDay]]:
+    """
+    Plan a multi-day trip over the best ranked attractions of a place
+
+    Args:
+        place_name: Name of the place
+        days: Number of days
+        place: Already resolved place, skips geocoding when given
+        stops_per_day: Attractions per day
+
+    Returns:
+        Itinerary days, or None if the place or its attractions weren't found
+
+    Raises:
+        UpstreamThrottled: A service kept rate limiting the lookup
+    """
+    if place:
+        lat, lon = place.lat, place.lon
+    else:
+        result = await geocode_async(place_name)
+        if not result:
+            return None
+        lat, lon = result["lat"], result["lon"]
+
+    attractions = await get_attraction_points_at_async(lat, lon, days * stops_per_day)
+    if not attractions:
+        return None
+
+    with span("itinerary", days=days, stops=len(attractions)):
+        return plan_days(lat, lon, attractions, days)
+
+
+def plan_itinerary(place_name: str, days: int, place: Optional[ResolvedPlace] = None,
+                   stops_per_day: int = STOPS_PER_DAY) -> Optional[List[ItineraryDay]]:
+    """
+    Synchronous wrapper around plan_itinerary_async
+    """
+    return run_sync(plan_itinerary_async(place_name, days, place, stops_per_day))
+
+
+async def format_itinerary_response_async(place_name: str, place: Optional[ResolvedPlace] = None, days: int = 1) -> str:
+    """
+    Plan a trip and format it as a natural language response
+
+    Args:
+        place_name: Name of the place
+        place: Already resolved place, skips geocoding when given
+        days: Number of days
+
+    Returns:
+        Formatted itinerary response string
+
+    Raises:
+        UpstreamThrottled: A service kept rate limiting the lookup
+    """
+    return format_itinerary(place_name, await plan_itinerary_async(place_name, days, place))
+
+
+def format_itinerary_response(place_name: str, place: Optional[ResolvedPlace] = None, days: int = 1) -> str:
+    """
+    Synchronous wrapper around format_itinerary_response_async
+    """
+    return run_sync(format_itinerary_response_async(place_name, place, days))
+
+
+def format_itinerary(place_name: str, itinerary: Optional[List[ItineraryDay]]) -> str:
+    """
+    Format an already planned itinerary as a natural language response
+
+    Args:
+        place_name: Name of the place
+        itinerary: Result of plan_itinerary, or None
+
+    Returns:
+        Formatted itinerary response string
+    """
+    if not itinerary:
+        return f"I don't know if the place '{place_name}' exists. Could you check the spelling?"
+
+    if len(itinerary) == 1:
+        response = f"Here is a plan for your day in {place_name}:\n"
+    else:
+        response = f"Here is a {len(itinerary)}-day plan for {place_name}:\n"
+
+    for number, day in enumerate(itinerary, 1):
+        if len(itinerary) > 1:
+            response += f"Day {number} (about {day.distance_m / 1000:.1f} km):\n"
+        for stop in day.stops:
+            response += f"- {stop.name}\n"
+
+    return response.strip()
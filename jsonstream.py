@@ -0,0 +1,106 @@
+"""
+Incremental JSON parsing - Decode the items of a top-level JSON array as the bytes arrive
+"""
+import codecs
+import json
+from typing import Any, List
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class ArrayItemParser:
+    """
+    Incrementally yield the items of one array inside a streamed JSON object
+
+    Feed it chunks of a document such as ``{"version": 0.6, "elements": [...]}``
+    and it returns each element of the ``elements`` array as soon as it is
+    complete, so the caller can stop reading once it has what it needs.
+    """
+
+    def __init__(self, key: str = "elements"):
+        """
+        Args:
+            key: Name of the array member to decode
+        """
+        self._marker = f'"{key}"'
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._in_array = False
+        self.done = False
+        self.bytes_received = 0
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        Add a chunk of the document
+
+        Args:
+            chunk: Next bytes of the document
+
+        Returns:
+            Array items completed by this chunk
+        """
+        self.bytes_received += len(chunk)
+        self._buffer += self._text_decoder.decode(chunk)
+
+        if self.done:
+            return []
+
+        if not self._in_array and not self._find_array():
+            return []
+
+        items = []
+        buffer = self._buffer
+        pos = 0
+        length = len(buffer)
+
+        while True:
+            # Skip separators between items
+            while pos < length and (buffer[pos] in _WHITESPACE or buffer[pos] == ","):
+                pos += 1
+
+            if pos >= length:
+                break
+
+            if buffer[pos] == "]":
+                self.done = True
+                pos += 1
+                break
+
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Item is not complete yet, wait for the next chunk
+                break
+
+            items.append(item)
+            pos = end
+
+        # Drop consumed text so the buffer stays bounded by one chunk plus one item
+        self._buffer = buffer[pos:]
+        return items
+
+    def _find_array(self) -> bool:
+        """
+        Locate the opening bracket of the array, keeping partial input for later
+        """
+        start = 0
+        while True:
+            index = self._buffer.find(self._marker, start)
+            if index < 0:
+                # Keep a tail long enough to match a marker split across chunks
+                self._buffer = self._buffer[-len(self._marker):]
+                return False
+
+            # The marker must be an object key followed by an array value
+            rest = self._buffer[index + len(self._marker):].lstrip(_WHITESPACE)
+            if not rest or (rest[0] == ":" and not rest[1:].lstrip(_WHITESPACE)):
+                self._buffer = self._buffer[index:]
+                return False
+
+            if rest[0] == ":" and rest[1:].lstrip(_WHITESPACE)[0] == "[":
+                self._buffer = rest[1:].lstrip(_WHITESPACE)[1:]
+                self._in_array = True
+                return True
+
+            start = index + 1
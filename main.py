@@ -1,13 +1,85 @@
 """
 Main application for Tourism AI System
+
+Usage:
+    python main.py                  # interactive session
+    python main.py "QUERY"          # answer one query and exit
+
+Queries go to the warm daemon (python daemon.py) whenever one is listening,
+otherwise they are answered in this process. --no-daemon always answers
+in-process. The agent is only imported when it is needed, so the banner and
+daemon answers don't wait for it.
 """
-from tourism_ai_agent import TourismAIAgent
+import argparse
+from typing import Callable, Iterator, Tuple
+
+from daemon import DaemonError, ask
+
+
+def make_answerer(use_daemon: bool = True, socket_path: str = None) -> Callable[[str], Iterator[Tuple[str, str]]]:
+    """
+    Function answering a query as (kind, text) sections, through the daemon when it is running
+    
+    Args:
+        use_daemon: Forward queries to the daemon if one is listening
+        socket_path: Daemon socket, the default one if None
+        
+    Returns:
+        Function from a query to its response sections
+    """
+    agents = []
+    
+    def answer(user_input: str) -> Iterator[Tuple[str, str]]:
+        if use_daemon:
+            sections = ask(user_input, socket_path)
+            if sections is not None:
+                return sections
+        
+        if not agents:
+            from tourism_ai_agent import TourismAIAgent
+            agents.append(TourismAIAgent())
+        return ((section.kind, section.text) for section in agents[0].process_request_stream(user_input))
+    
+    return answer
+
+
+def print_response(sections: Iterator[Tuple[str, str]]):
+    """
+    Print each section as soon as its agent answers
+    """
+    streamed = False
+    for kind, text in sections:
+        if kind != "answer":
+            # Each destination of a multi-destination query is its own paragraph
+            separator = "\n\n" if kind == "destination" else " "
+            print(("" if not streamed else separator) + text, end="", flush=True)
+            streamed = True
+        elif not streamed:
+            # Nothing was streamed (e.g. unknown place), the answer is the whole response
+            print(text, end="")
+    print()
 
 
 def main():
     """
     Main entry point for the Tourism AI application
     """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query", nargs="*", help="Answer this query and exit")
+    parser.add_argument("--no-daemon", action="store_true", help="Answer in this process even if the daemon is running")
+    parser.add_argument("--socket", help="Daemon socket path")
+    args = parser.parse_args()
+    
+    answer = make_answerer(not args.no_daemon, args.socket)
+    
+    if args.query:
+        try:
+            print_response(answer(" ".join(args.query)))
+        except DaemonError as e:
+            print(f"Error: {e}")
+            return 1
+        return 0
+    
     print("=" * 60)
     print("Welcome to Tourism AI System")
     print("=" * 60)
@@ -18,8 +90,6 @@ def main():
     print('  - "I\'m going to go to Bangalore, what is the temperature there? And what are the places I can visit?"')
     print("\nType 'exit' or 'quit' to stop.\n")
     
-    agent = TourismAIAgent()
-    
     while True:
         try:
             user_input = input("\nYou: ").strip()
@@ -32,10 +102,8 @@ def main():
                 print("Please enter a valid query.")
                 continue
             
-            # Process the request
-            response = agent.process_request(user_input)
-            
-            print(f"\nTourism AI: {response}")
+            print("\nTourism AI: ", end="", flush=True)
+            print_response(answer(user_input))
             
         except KeyboardInterrupt:
             print("\n\nThank you for using Tourism AI System. Goodbye!")
@@ -43,8 +111,9 @@ def main():
         except Exception as e:
             print(f"\nError: {e}")
             print("Please try again with a different query.")
+    
+    return 0
 
 
 if __name__ == "__main__":
-    main()
-
+    raise SystemExit(main())
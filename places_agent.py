@@ -1,15 +1,44 @@
 """
 Places Agent - Uses Overpass API to get tourist attractions
 """
-import requests
-from typing import Optional, List
-from geocoding import get_coordinates
+from typing import TYPE_CHECKING, Optional, List
+from geocode_cache import MISSING
+from geocoding import ResolvedPlace, geocode_async
+from jsonstream import ArrayItemParser
+from places_cache import get_places_cache
+from poi_index import get_poi_index
+from singleflight import get_group
+from tracing import span
+from upstream import UpstreamThrottled, get_client, run_sync
+
+if TYPE_CHECKING:
+    from ranking import Attraction, CandidateSet
+
+# Tourism features are searched within 20km, leisure features (parks, gardens) closer in
+OVERPASS_RADIUS = 20000
+OVERPASS_LEISURE_RADIUS = 10000
+# Nearest POI index features considered for ranking
+INDEX_MAX_CANDIDATES = 500
 
 
 def get_tourist_attractions(place_name: str, limit: int = 5) -> Optional[List[str]]:
     """
     Get tourist attractions for a place using Overpass API
     
+    Args:
+        place_name: Name of the place
+        limit: Maximum number of attractions to return (default: 5)
+        
+    Returns:
+        List of tourist attraction names, or None if place not found
+    """
+    return run_sync(get_tourist_attractions_async(place_name, limit))
+
+
+async def get_tourist_attractions_async(place_name: str, limit: int = 5) -> Optional[List[str]]:
+    """
+    Async variant of get_tourist_attractions
+    
     Args:
         place_name: Name of the place
         limit: Maximum number of attractions to return (default: 5)
@@ -18,107 +47,299 @@ def get_tourist_attractions(place_name: str, limit: int = 5) -> Optional[List[st
         List of tourist attraction names, or None if place not found
     """
     # First, get coordinates
-    coords = get_coordinates(place_name)
+    result = await geocode_async(place_name)
     
-    if not coords:
+    if not result:
         return None
     
-    lat, lon = coords
+    return await get_tourist_attractions_at_async(result["lat"], result["lon"], limit)
+
+
+def get_tourist_attractions_at(lat: float, lon: float, limit: int = 5) -> Optional[List[str]]:
+    """
+    Get tourist attractions around already resolved coordinates using Overpass API
     
-    # Overpass API query to find tourist attractions
-    # We'll search for tourist attractions, parks, museums, monuments within ~10km
-    overpass_url = "https://overpass-api.de/api/interpreter"
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        limit: Maximum number of attractions to return (default: 5)
+        
+    Returns:
+        List of tourist attraction names, or None if nothing was found
+    """
+    return run_sync(get_tourist_attractions_at_async(lat, lon, limit))
+
+
+async def get_tourist_attractions_at_async(lat: float, lon: float, limit: int = 5) -> Optional[List[str]]:
+    """
+    Async variant of get_tourist_attractions_at
     
-    # Overpass QL query to find tourist attractions
-    query = f"""
-    [out:json][timeout:25];
-    (
-      node["tourism"](around:10000,{lat},{lon});
-      node["leisure"](around:10000,{lat},{lon});
-      way["tourism"](around:10000,{lat},{lon});
-      way["leisure"](around:10000,{lat},{lon});
-    );
-    out center;
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        limit: Maximum number of attractions to return (default: 5)
+        
+    Returns:
+        List of tourist attraction names, or None if nothing was found
     """
+    attractions = await get_attraction_points_at_async(lat, lon, limit)
     
-    try:
-        response = requests.post(overpass_url, data={"data": query}, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        attractions = []
-        seen_names = set()
-        
-        if "elements" in data:
-            for element in data["elements"]:
-                if "tags" in element:
-                    tags = element["tags"]
-                    
-                    # Try different tag combinations for names
-                    name = (
-                        tags.get("name") or
-                        tags.get("name:en") or
-                        tags.get("tourism") or
-                        tags.get("leisure")
-                    )
-                    
-                    if name and name not in seen_names:
-                        attractions.append(name)
-                        seen_names.add(name)
-                        
-                        if len(attractions) >= limit:
-                            break
-        
-        # If we didn't get enough results, try a broader search
-        if len(attractions) < limit:
-            broader_query = f"""
-            [out:json][timeout:25];
-            (
-              node["tourism"]["name"](around:20000,{lat},{lon});
-              way["tourism"]["name"](around:20000,{lat},{lon});
-              relation["tourism"]["name"](around:20000,{lat},{lon});
-            );
-            out center;
-            """
+    return [attraction.name for attraction in attractions] if attractions else None
+
+
+async def get_attraction_points_at_async(lat: float, lon: float, limit: int = 5) -> Optional[List["Attraction"]]:
+    """
+    Best ranked attractions around a point, keeping their coordinates
+    
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        limit: Maximum number of attractions to return (default: 5)
+        
+    Returns:
+        List of attractions (name, lat, lon), best first, or None if nothing was found
+    """
+    with span("places") as current:
+        # Covered destinations are answered from the offline POI index
+        indexed = _indexed_attractions(lat, lon, limit)
+        if indexed is not None:
+            current.set(source="poi_index", elements=len(indexed))
+            return indexed if indexed else None
+        
+        cached = get_places_cache().get(lat, lon, limit)
+        if cached is not MISSING:
+            current.set(source="cache", elements=len(cached))
+            return cached
+        
+        current.set(source="overpass")
+        attractions = await _fetch_and_cache(lat, lon, limit)
+        current.set(elements=len(attractions or []))
+        return attractions
+
+
+async def refresh_attractions_async(lat: float, lon: float, limit: int = 5) -> bool:
+    """
+    Fetch the attractions around a point into the cache again, e.g. before its entry expires
+    
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        limit: Maximum number of attractions to cache (default: 5)
+        
+    Returns:
+        True if Overpass was called and found attractions; points covered by
+        the offline POI index need no refresh and return False
+        
+    Raises:
+        UpstreamThrottled: Overpass kept rate limiting us
+    """
+    if _indexed_attractions(lat, lon, limit) is not None:
+        return False
+    
+    return bool(await _fetch_and_cache(lat, lon, limit))
+
+
+async def _fetch_and_cache(lat: float, lon: float, limit: int) -> Optional[List["Attraction"]]:
+    # Concurrent requests for the same spot share one Overpass call
+    cache = get_places_cache()
+    attractions = await get_group("places").do_async(cache.key(lat, lon, limit), lambda: _fetch_attractions(lat, lon, limit))
+    if attractions:
+        cache.set(lat, lon, limit, attractions)
+    
+    return attractions
+
+
+async def _fetch_attractions(lat: float, lon: float, limit: int) -> Optional[List["Attraction"]]:
+    """
+    Query Overpass API, streaming the answer into candidates and ranking them
+    """
+    # Ranking needs NumPy, which is only imported with the first lookup
+    from ranking import OTHER_SCORE_LIMIT
+    
+    with span("places.overpass") as current:
+        try:
+            # Notable features settle the ranking unless fewer than limit of them beat
+            # every other feature's best possible score; only then is everything fetched
+            candidates = await _read_candidates(build_attractions_query(lat, lon, notable_only=True), current)
+            attractions = candidates.top_attractions_above(lat, lon, limit, OTHER_SCORE_LIMIT)
+            if attractions is None:
+                current.set(full_query=True)
+                candidates = await _read_candidates(build_attractions_query(lat, lon), current)
+                attractions = candidates.top_attractions(lat, lon, limit)
             
-            response = requests.post(overpass_url, data={"data": broader_query}, timeout=30)
-            response.raise_for_status()
+            return attractions if attractions else None
             
-            data = response.json()
+        except UpstreamThrottled:
+            raise
+        except Exception as e:
+            print(f"Error fetching tourist attractions: {e}")
+            current.set(failed=type(e).__name__)
+            return None
+
+
+async def _read_candidates(query: str, current) -> "CandidateSet":
+    """
+    Stream an Overpass answer into ranking candidates, adding its sizes to the span
+    """
+    from ranking import CandidateSet
+    
+    candidates = CandidateSet()
+    elements = 0
+    
+    async with get_client().stream_post_form("overpass", "/api/interpreter", {"data": query}, timeout=30) as chunks:
+        parser = ArrayItemParser("elements")
+        
+        # Elements are decoded as chunks arrive; every one is a ranking candidate, so
+        # the whole answer is read (a cut-off list would be in id order, not by merit)
+        async for chunk in chunks:
+            for element in parser.feed(chunk):
+                elements += 1
+                candidates.add_element(element)
             
-            if "elements" in data:
-                for element in data["elements"]:
-                    if "tags" in element and len(attractions) < limit:
-                        tags = element["tags"]
-                        name = tags.get("name") or tags.get("name:en")
-                        
-                        if name and name not in seen_names:
-                            attractions.append(name)
-                            seen_names.add(name)
-                            
-                            if len(attractions) >= limit:
-                                break
-        
-        return attractions if attractions else None
+            if parser.done:
+                break
+    
+    sizes = current.attributes
+    current.set(
+        elements=sizes.get("elements", 0) + elements,
+        candidates=len(candidates),
+        bytes_received=sizes.get("bytes_received", 0) + parser.bytes_received
+    )
+    return candidates
+
+
+def build_attractions_query(lat: float, lon: float, notable_only: bool = False) -> str:
+    """
+    Build the Overpass QL query used to find attractions around a point
+    
+    Only named features are selected, and the output is limited to tags plus a
+    centre point, without way geometry. No element limit is set: Overpass cuts
+    a limited output off in id (or quadtile) order, which would drop the best
+    attractions of large cities. The answer is bounded by selecting notable
+    features instead (a notable tag value of ranking.TAG_WEIGHTS, or a
+    Wikidata/Wikipedia tag), which is what large cities rank first anyway.
+    qt skips the server-side sort by id, the ranking orders them anyway.
+    
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        notable_only: Select notable features only, instead of every named one
         
+    Returns:
+        Overpass QL query string
+    """
+    radii = {"tourism": OVERPASS_RADIUS, "leisure": OVERPASS_LEISURE_RADIUS}
+    statements = []
+    for base, radius in radii.items():
+        around = f"(around:{radius},{lat},{lon});"
+        if not notable_only:
+            statements.append(f'nwr["{base}"]["name"]{around}')
+            continue
+        
+        from ranking import TAG_WEIGHTS, notable_values
+        
+        for key in TAG_WEIGHTS:
+            values = notable_values(key)
+            # Values of another key searched at least as far out are found by its own statement
+            if values and (key == base or radii.get(key, 0) < radius):
+                selector = "" if key == base else f'["{base}"]'
+                statements.append(f'nwr{selector}["{key}"~"^({"|".join(values)})$"]["name"]{around}')
+        for wiki in ("wikidata", "wikipedia"):
+            statements.append(f'nwr["{base}"]["{wiki}"]["name"]{around}')
+    
+    union = "\n      ".join(statements)
+    return f"""
+    [out:json][timeout:25];
+    (
+      {union}
+    );
+    out tags center qt;
+    """
+
+
+def _indexed_attractions(lat: float, lon: float, limit: int) -> Optional[List["Attraction"]]:
+    """
+    Rank the nearest features of the offline POI index
+    
+    Returns:
+        List of attractions (possibly empty), or None if the index doesn't cover the area
+    """
+    try:
+        features = get_poi_index().nearest(lat, lon, OVERPASS_RADIUS)
     except Exception as e:
-        print(f"Error fetching tourist attractions: {e}")
+        print(f"Error reading POI index: {e}")
+        return None
+    
+    if features is None:
         return None
+    
+    from ranking import CandidateSet
+    
+    candidates = CandidateSet()
+    
+    try:
+        for feature in features:
+            # Same selection as the Overpass query: leisure features only close in
+            if "tourism" not in feature["tags"] and feature["distance_m"] > OVERPASS_LEISURE_RADIUS:
+                continue
+            
+            candidates.add(feature["name"], feature["lat"], feature["lon"], feature["tags"])
+            if len(candidates) >= INDEX_MAX_CANDIDATES:
+                break
+    finally:
+        # Lets go of the region, so one replaced by a rebuild is unmapped right away
+        features.close()
+    
+    return candidates.top_attractions(lat, lon, limit)
 
 
-def format_places_response(place_name: str) -> str:
+def format_places_response(place_name: str, place: Optional[ResolvedPlace] = None) -> str:
     """
     Format tourist attractions as a natural language response
     
     Args:
         place_name: Name of the place
+        place: Already resolved place, skips geocoding when given
+        
+    Returns:
+        Formatted places response string
+    """
+    return run_sync(format_places_response_async(place_name, place))
+
+
+async def format_places_response_async(place_name: str, place: Optional[ResolvedPlace] = None) -> str:
+    """
+    Async variant of format_places_response
+    
+    Args:
+        place_name: Name of the place
+        place: Already resolved place, skips geocoding when given
         
     Returns:
         Formatted places response string
+        
+    Raises:
+        UpstreamThrottled: A service kept rate limiting the lookup
     """
-    attractions = get_tourist_attractions(place_name)
+    if place:
+        attractions = await get_tourist_attractions_at_async(place.lat, place.lon)
+    else:
+        attractions = await get_tourist_attractions_async(place_name)
     
+    return format_places(place_name, attractions)
+
+
+def format_places(place_name: str, attractions: Optional[List[str]]) -> str:
+    """
+    Format already fetched tourist attractions as a natural language response
+    
+    Args:
+        place_name: Name of the place
+        attractions: Result of get_tourist_attractions, or None
+        
+    Returns:
+        Formatted places response string
+    """
     if not attractions:
         return f"I don't know if the place '{place_name}' exists. Could you check the spelling?"
     
@@ -0,0 +1,105 @@
+"""
+Places Cache - Process-wide cache of ranked attractions around a point
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from geocode_cache import MISSING, LRUCache
+
+# OpenStreetMap attractions change slowly, a day old answer is as good as a new one
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 2000
+# Points within about 100 m share an entry
+DEFAULT_PRECISION = 3
+
+
+class PlacesCache:
+    """
+    Bounded cache of the best ranked attractions per point and result size
+
+    Only lookups that found attractions are cached: an empty answer can't be
+    told apart from a failed Overpass call.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 precision: int = DEFAULT_PRECISION):
+        self.ttl = ttl
+        self.precision = precision
+        self._entries = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0}
+
+    def key(self, lat: float, lon: float, limit: int) -> Tuple[float, float, int]:
+        return (round(lat, self.precision), round(lon, self.precision), limit)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, lat: float, lon: float, limit: int) -> Any:
+        """
+        Return the cached attractions around a point, or MISSING
+        """
+        entry = self._entries.get(self.key(lat, lon, limit))
+        self._count("misses" if entry is MISSING else "hits")
+        return entry if entry is MISSING else entry[0]
+
+    def expires_in(self, lat: float, lon: float, limit: int) -> float:
+        """
+        Seconds until the entry for a point expires, 0 if there is none
+        """
+        entry = self._entries.get(self.key(lat, lon, limit))
+        return 0.0 if entry is MISSING else max(entry[1] - time.time(), 0.0)
+
+    def set(self, lat: float, lon: float, limit: int, attractions: List):
+        expires_at = time.time() + self.ttl
+        self._entries.set(self.key(lat, lon, limit), (attractions, expires_at), expires_at)
+        self._count("writes")
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit/miss counters for sizing the cache
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        stats["evictions"] = self._entries.evictions
+        stats["entries"] = len(self._entries)
+        return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_places_cache() -> PlacesCache:
+    """
+    Return the process-wide places cache, creating it from the environment on first use
+
+    Environment:
+        TOURISM_PLACES_CACHE_SIZE: Maximum cached points
+        TOURISM_PLACES_TTL: Seconds to keep the attractions of a point
+    """
+    global _default_cache
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PlacesCache(
+                max_entries=int(os.environ.get("TOURISM_PLACES_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                ttl=float(os.environ.get("TOURISM_PLACES_TTL", DEFAULT_TTL))
+            )
+        return _default_cache
+
+
+def set_places_cache(cache: Optional[PlacesCache]):
+    """
+    Replace the process-wide places cache (None recreates it from the environment)
+    """
+    global _default_cache
+
+    with _default_cache_lock:
+        _default_cache = cache
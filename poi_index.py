@@ -0,0 +1,628 @@
+"""
+POI Index - Offline, memory-mapped spatial index of tourism/leisure features built from OSM data
+
+Each region is one file in the index directory, so regions can be rebuilt
+independently, also while the process runs: lookups check the directory for
+added, rebuilt or removed regions every TOURISM_POI_INDEX_CHECK_SECONDS. A
+file holds a fixed lat/lon grid whose cells are stored in row-major order,
+which turns a radius search into one binary search per grid row followed by a
+scan of the packed coordinates in that row's cells.
+
+Build a region from saved Overpass JSON dumps or an OSM XML extract:
+
+    python -m poi_index build bangalore dumps/bangalore.json
+    python -m poi_index build paris paris.osm.bz2 --index-dir data/poi_index
+"""
+import argparse
+import bz2
+import gzip
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "poi_index")
+INDEX_SUFFIX = ".poi"
+
+# Tags kept for every feature, everything else in the extract is dropped
+KEPT_TAGS = ("name", "name:en", "tourism", "leisure", "historic", "wikidata", "wikipedia")
+
+# Grid resolution: 2**15 rows by 2**16 columns, roughly 610m cells at the equator
+LAT_BITS = 15
+LON_BITS = 16
+CELL_LAT = 180.0 / (1 << LAT_BITS)
+CELL_LON = 360.0 / (1 << LON_BITS)
+
+EARTH_RADIUS_M = 6371008.8
+
+# Seconds between checks of the index directory for added, rebuilt or removed regions
+DEFAULT_CHECK_INTERVAL = 30.0
+
+# Per-record flags, checked before a record's text is decoded
+FLAG_NAMED = 1
+FLAG_TOURISM = 2
+
+# First ring of the expanding nearest-neighbour search
+_FIRST_RING_M = 1000.0
+
+# Records are compact UTF-8 JSON, decoded without json.loads' encoding detection
+_decode = json.JSONDecoder().decode
+
+_MAGIC = b"POIX"
+_VERSION = 1
+# magic, version, record count, cell count, bounding box (south, west, north, east)
+_HEADER = struct.Struct("<4sIII4d")
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Great-circle distance between two points in metres
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _cell_row(lat: float) -> int:
+    return min(int((lat + 90.0) / CELL_LAT), (1 << LAT_BITS) - 1)
+
+
+def _cell_col(lon: float) -> int:
+    return min(int((lon + 180.0) / CELL_LON), (1 << LON_BITS) - 1)
+
+
+def cell_key(lat: float, lon: float) -> int:
+    """
+    Row-major grid cell key of a point
+    """
+    return (_cell_row(lat) << LON_BITS) | _cell_col(lon)
+
+
+def _radius_box(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """
+    Bounding box (south, west, north, east) of a circle
+    """
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+
+
+class RegionIndex:
+    """
+    One memory-mapped region file
+
+    Lookups hold a reference while they read it (acquire/release); a region
+    that was replaced or removed is retired and unmapped once the last of
+    them lets go.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)[:-len(INDEX_SUFFIX)]
+        self.mtime = os.path.getmtime(path)
+        self.closed = False
+        self._readers = 0
+        self._retired = False
+        self._readers_lock = threading.Lock()
+
+        with open(path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, cells, south, west, north, east = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a POI index file")
+
+        self.count = count
+        self.bounding_box = (south, west, north, east)
+
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+        self._cell_keys = view[offset:offset + 8 * cells].cast("Q")
+        offset += 8 * cells
+        self._cell_starts = view[offset:offset + 4 * (cells + 1)].cast("I")
+        offset += 4 * (cells + 1)
+        self._lats = view[offset:offset + 4 * count].cast("f")
+        offset += 4 * count
+        self._lons = view[offset:offset + 4 * count].cast("f")
+        offset += 4 * count
+        self._flags = view[offset:offset + count]
+        offset += count
+        self._text_starts = view[offset:offset + 4 * (count + 1)].cast("I")
+        offset += 4 * (count + 1)
+        self._text_base = offset
+
+    def covers(self, lat: float, lon: float, radius_m: float) -> bool:
+        """
+        Whether the whole search circle lies inside this region
+        """
+        south, west, north, east = _radius_box(lat, lon, radius_m)
+        box_south, box_west, box_north, box_east = self.bounding_box
+        return south >= box_south and north <= box_north and west >= box_west and east <= box_east
+
+    def search(self, lat: float, lon: float, radius_m: float, required_flags: int = 0) -> List[Tuple[float, int]]:
+        """
+        Find records within radius_m of a point
+
+        Args:
+            lat: Latitude of the centre
+            lon: Longitude of the centre
+            radius_m: Search radius in metres
+            required_flags: FLAG_* bits a record must have
+
+        Returns:
+            Unsorted list of (distance in metres, record position). Distances
+            are equirectangular, within 0.1% of the great-circle distance at
+            the radii the agents search.
+        """
+        south, west, north, east = _radius_box(lat, lon, radius_m)
+        first_col = _cell_col(west)
+        last_col = _cell_col(east)
+
+        keys = self._cell_keys
+        starts = self._cell_starts
+        lats = self._lats
+        lons = self._lons
+        flags = self._flags
+
+        # Cheap degree-box prefilter before the distance
+        dlat = north - lat
+        dlon = east - lon
+        # Longitude degrees shrink with the cosine of the latitude; compared squared, in degrees
+        lon_scale = math.cos(math.radians(lat))
+        limit = math.degrees(radius_m / EARTH_RADIUS_M) ** 2
+        metres_per_degree = math.radians(EARTH_RADIUS_M)
+
+        hits = []
+        for row in range(_cell_row(south), _cell_row(north) + 1):
+            low = bisect_left(keys, (row << LON_BITS) | first_col)
+            high = bisect_left(keys, ((row << LON_BITS) | last_col) + 1, low)
+            if low == high:
+                continue
+            for position in range(starts[low], starts[high]):
+                if flags[position] & required_flags != required_flags:
+                    continue
+                north_offset = lats[position] - lat
+                east_offset = lons[position] - lon
+                if abs(north_offset) > dlat or abs(east_offset) > dlon:
+                    continue
+                east_offset *= lon_scale
+                squared = north_offset * north_offset + east_offset * east_offset
+                if squared <= limit:
+                    hits.append((math.sqrt(squared) * metres_per_degree, position))
+
+        return hits
+
+    def iter_nearest(self, lat: float, lon: float, radius_m: float, required_flags: int = 0) -> Iterator[Dict]:
+        """
+        Yield records within radius_m of a point, nearest first
+
+        The search starts with a small ring and doubles it only while the caller
+        keeps asking for more, so finding the few closest features doesn't scan
+        the whole radius.
+        """
+        inner = -1.0
+        ring = min(_FIRST_RING_M, radius_m)
+        while True:
+            hits = [hit for hit in self.search(lat, lon, ring, required_flags) if hit[0] > inner]
+            hits.sort()
+            for distance, position in hits:
+                yield self.record(position, distance)
+
+            if ring >= radius_m:
+                return
+            inner = ring
+            ring = min(ring * 2, radius_m)
+
+    def record(self, position: int, distance: float) -> Dict:
+        """
+        Decode one record
+
+        Returns:
+            Feature with name, tags, lat, lon and distance_m
+        """
+        start = self._text_base + self._text_starts[position]
+        end = self._text_base + self._text_starts[position + 1]
+        poi = _decode(str(self._mmap[start:end], "utf-8"))
+        poi["lat"] = float(self._lats[position])
+        poi["lon"] = float(self._lons[position])
+        poi["distance_m"] = distance
+        return poi
+
+    def acquire(self):
+        """
+        Keep the region open for one more reader
+        """
+        with self._readers_lock:
+            if self.closed:
+                raise ValueError(f"{self.path} is closed")
+            self._readers += 1
+
+    def release(self):
+        """
+        Let go of a reference taken with acquire, closing a retired region after its last reader
+        """
+        with self._readers_lock:
+            self._readers -= 1
+            last = self._retired and self._readers == 0
+        if last:
+            self.close()
+
+    def retire(self):
+        """
+        Close the region as soon as no reader holds it any more
+        """
+        with self._readers_lock:
+            self._retired = True
+            unused = self._readers == 0
+        if unused:
+            self.close()
+
+    def close(self):
+        with self._readers_lock:
+            if self.closed:
+                return
+            self.closed = True
+        self._cell_keys.release()
+        self._cell_starts.release()
+        self._lats.release()
+        self._lons.release()
+        self._flags.release()
+        self._text_starts.release()
+        self._mmap.close()
+
+
+class POIIndex:
+    """
+    All region files of an index directory, memory-mapped at startup and
+    reloaded when they change
+    """
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        """
+        Args:
+            index_dir: Directory holding one file per region
+            check_interval: Seconds between checks for changed region files, 0 never checks
+        """
+        self.index_dir = index_dir
+        self.check_interval = check_interval
+        self.regions = {}
+        self._lock = threading.Lock()
+        self._checking = threading.Lock()
+        self.reload()
+        self._checked = time.monotonic()
+
+    def reload(self):
+        """
+        Pick up regions that were added, rebuilt or removed since the last load
+
+        Replaced and removed regions are retired rather than closed: lookups
+        may still be reading them. Each one is unmapped once its last reader
+        lets go of it.
+        """
+        paths = {}
+        if os.path.isdir(self.index_dir):
+            for filename in os.listdir(self.index_dir):
+                if filename.endswith(INDEX_SUFFIX):
+                    paths[filename[:-len(INDEX_SUFFIX)]] = os.path.join(self.index_dir, filename)
+
+        with self._lock:
+            regions = dict(self.regions)
+            replaced = []
+            for name in list(regions):
+                if name not in paths:
+                    replaced.append(regions.pop(name))
+
+            for name, path in paths.items():
+                current = regions.get(name)
+                if current is not None and current.mtime == os.path.getmtime(path):
+                    continue
+                try:
+                    regions[name] = RegionIndex(path)
+                except Exception as e:
+                    print(f"Error loading POI index {path}: {e}")
+                    continue
+                if current is not None:
+                    replaced.append(current)
+
+            # Lookups take their reference under the same lock, so none starts on a retired region
+            self.regions = regions
+            for region in replaced:
+                region.retire()
+
+    def _check_for_changes(self):
+        """
+        Reload if check_interval has passed since the last check, without making other callers wait
+        """
+        if self.check_interval <= 0 or time.monotonic() - self._checked < self.check_interval:
+            return
+        if not self._checking.acquire(blocking=False):
+            return
+        try:
+            self._checked = time.monotonic()
+            self.reload()
+        except OSError as e:
+            print(f"Error checking POI index {self.index_dir}: {e}")
+        finally:
+            self._checking.release()
+
+    def nearest(self, lat: float, lon: float, radius_m: float, named_only: bool = True) -> Optional[Iterator[Dict]]:
+        """
+        Features within radius_m of a point, nearest first
+
+        Args:
+            lat: Latitude of the centre
+            lon: Longitude of the centre
+            radius_m: Search radius in metres
+            named_only: Skip features without a name
+
+        Returns:
+            Lazy iterator over features (name, tags, lat, lon, distance_m), or
+            None if no region covers the whole search circle. The region stays
+            open until the iterator is exhausted or closed.
+        """
+        self._check_for_changes()
+
+        with self._lock:
+            for region in self.regions.values():
+                if region.covers(lat, lon, radius_m):
+                    region.acquire()
+                    break
+            else:
+                return None
+
+        return RegionReader(region, region.iter_nearest(lat, lon, radius_m, FLAG_NAMED if named_only else 0))
+
+
+class RegionReader:
+    """
+    Iterator over one lookup's features that holds its region open until it
+    is exhausted, closed or garbage collected
+    """
+
+    def __init__(self, region: RegionIndex, features: Iterator[Dict]):
+        self._region = region
+        self._features = features
+
+    def __iter__(self) -> "RegionReader":
+        return self
+
+    def __next__(self) -> Dict:
+        try:
+            return next(self._features)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        region, self._region = self._region, None
+        if region is not None:
+            self._features.close()
+            region.release()
+
+    def __del__(self):
+        self.close()
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_poi_index() -> POIIndex:
+    """
+    Return the process-wide POI index, loading TOURISM_POI_INDEX_DIR on first use
+    """
+    global _default_index
+
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = POIIndex(
+                os.environ.get("TOURISM_POI_INDEX_DIR", DEFAULT_INDEX_DIR),
+                float(os.environ.get("TOURISM_POI_INDEX_CHECK_SECONDS", DEFAULT_CHECK_INTERVAL))
+            )
+        return _default_index
+
+
+def _open_extract(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _feature(tags: Dict, lat: float, lon: float) -> Optional[Dict]:
+    if not ("tourism" in tags or "leisure" in tags):
+        return None
+    return {
+        "lat": lat,
+        "lon": lon,
+        "name": tags.get("name") or tags.get("name:en"),
+        "tags": {key: tags[key] for key in KEPT_TAGS if key in tags}
+    }
+
+
+def read_overpass_json(path: str) -> Iterable[Dict]:
+    """
+    Features from a saved Overpass JSON answer (queried with ``out center``)
+    """
+    with _open_extract(path) as dump:
+        data = json.load(dump)
+
+    for element in data.get("elements", []):
+        tags = element.get("tags") or {}
+        if "lat" in element:
+            lat, lon = element["lat"], element["lon"]
+        elif "center" in element:
+            lat, lon = element["center"]["lat"], element["center"]["lon"]
+        else:
+            continue
+        feature = _feature(tags, lat, lon)
+        if feature:
+            yield feature
+
+
+def read_osm_xml(path: str) -> Iterable[Dict]:
+    """
+    Features from an OSM XML extract, ways are placed at the centre of their nodes
+    """
+    node_coords = {}
+
+    with _open_extract(path) as extract:
+        for _, element in ET.iterparse(extract, events=("end",)):
+            if element.tag not in ("node", "way"):
+                continue
+
+            tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+
+            if element.tag == "node":
+                lat = float(element.get("lat"))
+                lon = float(element.get("lon"))
+                node_coords[int(element.get("id"))] = (lat, lon)
+            else:
+                coords = [node_coords[ref] for ref in (int(nd.get("ref")) for nd in element.iter("nd"))
+                          if ref in node_coords]
+                if not coords:
+                    element.clear()
+                    continue
+                lats = [coord[0] for coord in coords]
+                lons = [coord[1] for coord in coords]
+                lat = (min(lats) + max(lats)) / 2
+                lon = (min(lons) + max(lons)) / 2
+
+            feature = _feature(tags, lat, lon) if tags else None
+            if feature:
+                yield feature
+
+            element.clear()
+
+
+def read_features(paths: Iterable[str]) -> List[Dict]:
+    """
+    Read and de-duplicate features from Overpass JSON dumps and OSM XML extracts
+    """
+    features = []
+    seen = set()
+    for path in paths:
+        reader = read_osm_xml if ".osm" in os.path.basename(path) else read_overpass_json
+        for feature in reader(path):
+            key = (feature["name"], round(feature["lat"], 5), round(feature["lon"], 5))
+            if key in seen:
+                continue
+            seen.add(key)
+            features.append(feature)
+    return features
+
+
+def _flags(feature: Dict) -> int:
+    flags = 0
+    if feature["name"]:
+        flags |= FLAG_NAMED
+    if "tourism" in feature["tags"]:
+        flags |= FLAG_TOURISM
+    return flags
+
+
+def write_region(path: str, features: List[Dict], bounding_box: Optional[Tuple[float, float, float, float]] = None):
+    """
+    Write one region file atomically
+
+    Args:
+        path: Destination file
+        features: Features with lat, lon, name and tags
+        bounding_box: Area the region is authoritative for, defaults to the
+            extent of the features
+    """
+    features = sorted(features, key=lambda feature: cell_key(feature["lat"], feature["lon"]))
+
+    if bounding_box is None:
+        if features:
+            bounding_box = (
+                min(feature["lat"] for feature in features),
+                min(feature["lon"] for feature in features),
+                max(feature["lat"] for feature in features),
+                max(feature["lon"] for feature in features)
+            )
+        else:
+            bounding_box = (0.0, 0.0, 0.0, 0.0)
+
+    cell_keys = []
+    cell_starts = []
+    texts = []
+    text_starts = [0]
+    for position, feature in enumerate(features):
+        key = cell_key(feature["lat"], feature["lon"])
+        if not cell_keys or cell_keys[-1] != key:
+            cell_keys.append(key)
+            cell_starts.append(position)
+        text = json.dumps({"name": feature["name"], "tags": feature["tags"]},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        texts.append(text)
+        text_starts.append(text_starts[-1] + len(text))
+    cell_starts.append(len(features))
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as index_file:
+        index_file.write(_HEADER.pack(_MAGIC, _VERSION, len(features), len(cell_keys), *bounding_box))
+        index_file.write(struct.pack(f"<{len(cell_keys)}Q", *cell_keys))
+        index_file.write(struct.pack(f"<{len(cell_starts)}I", *cell_starts))
+        index_file.write(struct.pack(f"<{len(features)}f", *(feature["lat"] for feature in features)))
+        index_file.write(struct.pack(f"<{len(features)}f", *(feature["lon"] for feature in features)))
+        index_file.write(bytes(_flags(feature) for feature in features))
+        index_file.write(struct.pack(f"<{len(text_starts)}I", *text_starts))
+        for text in texts:
+            index_file.write(text)
+    os.replace(temporary_path, path)
+
+
+def build_region(region: str, inputs: List[str], index_dir: str = DEFAULT_INDEX_DIR,
+                 bounding_box: Optional[Tuple[float, float, float, float]] = None) -> int:
+    """
+    (Re)build the index file of one region, leaving other regions untouched
+
+    Returns:
+        Number of indexed features
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    features = read_features(inputs)
+    write_region(os.path.join(index_dir, region + INDEX_SUFFIX), features, bounding_box)
+    return len(features)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build the offline POI index")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    build = subcommands.add_parser("build", help="Build or rebuild one region")
+    build.add_argument("region", help="Region name, used as the index file name")
+    build.add_argument("inputs", nargs="+", help="Overpass JSON dumps or OSM XML extracts (.osm, .osm.gz, .osm.bz2)")
+    build.add_argument("--index-dir", default=os.environ.get("TOURISM_POI_INDEX_DIR", DEFAULT_INDEX_DIR))
+    build.add_argument("--bbox", type=float, nargs=4, metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                       help="Area the region covers, defaults to the extent of its features")
+
+    subcommands.add_parser("list", help="List indexed regions").add_argument(
+        "--index-dir", default=os.environ.get("TOURISM_POI_INDEX_DIR", DEFAULT_INDEX_DIR))
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_region(args.region, args.inputs, args.index_dir, tuple(args.bbox) if args.bbox else None)
+        print(f"Indexed {count} features for region '{args.region}'")
+    else:
+        index = POIIndex(args.index_dir)
+        for name, region in sorted(index.regions.items()):
+            print(f"{name}: {region.count} features, bbox {region.bounding_box}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1050 @@
+"""
+Query Parser - Compiled intent and place extraction for user queries
+
+Queries go through a single-pass tokenizer: the lower-cased query is split
+into words, each distinct word is classified once (intent keywords, date
+words, the triggers and end words of PLACE_PATTERNS, stop keywords), and one
+walk over the words gives the intent flags, whether dates are mentioned and
+the place span, exactly as the patterns would. The few queries whose
+case-insensitive matching lower-cased words cannot mirror use the compiled
+patterns.
+
+Dates ("next weekend", "June 3 to 7", "2026-06-03", "Friday") are turned
+into a DateRange for forecasts. Queries naming several destinations ("Delhi,
+Agra and Jaipur") give all of them in order through place_names.
+"""
+import datetime
+import functools
+import operator
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+from gazetteer import get_gazetteer, normalize_name
+
+DEFAULT_WEATHER_KEYWORDS = [
+    "weather", "temperature", "temp", "rain", "rainfall",
+    "forecast", "climate", "rainy", "sunny", "cloudy"
+]
+
+DEFAULT_PLACES_KEYWORDS = [
+    "places", "attractions", "tourist", "visit", "see",
+    "sightseeing", "where to go", "things to do", "must see",
+    "plan", "planning", "trip", "itinerary"
+]
+
+# Keywords that indicate the end of place name
+STOP_KEYWORDS = frozenset([
+    "what", "where", "when", "which", "who", "how",
+    "let's", "let us", "plan", "planning", "temperature",
+    "temp", "weather", "places", "attractions", "visit",
+    "can", "should", "will", "is", "are", "and"
+])
+
+# Words after which the fallback treats the next words as the place name
+FALLBACK_TRIGGERS = frozenset(["to", "visit", "visiting", "in", "going"])
+
+# Common patterns, tried in order (case-insensitive)
+PLACE_PATTERNS = [
+    # Pattern: "visiting/going to [place]"
+    re.compile(
+        r"(?:going\s+to|visit|visiting|trip\s+to|travel\s+to|heading\s+to|am\s+visiting)\s+([a-zA-Z][a-zA-Z\s]*?)"
+        r"(?:\s+(?:what|where|when|let|plan|conditions)|,|\.|$)",
+        re.IGNORECASE
+    ),
+    # Pattern: "in [place]"
+    re.compile(r"in\s+([a-zA-Z][a-zA-Z\s]*?)(?:\s+(?:what|where|when|it|the|conditions)|,|\.|$)", re.IGNORECASE),
+    # Pattern: "[Place], let's/what/where"
+    re.compile(r"^([a-zA-Z][a-zA-Z\s]+?),?\s+(?:let's|let\s+us|what|where|temperature|and)", re.IGNORECASE),
+]
+
+# Lower-case literals a query must contain for the fallback to have any chance of matching
+FALLBACK_TRIGGER_LITERALS = ["to", "visit", "in", "going"]
+
+# Literals of PLACE_PATTERNS, for the tokenizer that mirrors them: the
+# trigger words (the end of a word, "to" after the first four), and the
+# words the place name ends before (the start of the next word)
+_VISIT_TRIGGERS = ("visit", "visiting")
+_TO_TRIGGERS = ("going", "trip", "travel", "heading")
+_PLACE_ENDS = ("what", "where", "when", "let", "plan", "conditions")
+_IN_PLACE_ENDS = ("what", "where", "when", "it", "the", "conditions")
+_LEADING_PLACE_ENDS = ("what", "where", "temperature", "and", "let's")
+
+_ASCII_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+# The only other characters IGNORECASE lets [a-zA-Z] match ("İ" is also the
+# only one that lower() makes longer); queries with them use the patterns
+_ASCII_LETTER_FOLDS = re.compile("[\u0130\u0131\u017f\u212a]")
+
+# Classification bits of a word, its number of leading letters is kept above them
+_LETTERS_ONLY = 1
+_STARTS_WITH_LETTER = 2
+_PUNCTUATION = 4  # starts with "," or "."
+_LETTERS_THEN_PUNCTUATION = 8
+_LETTERS_THEN_COMMA = 16
+_COMMA = 32
+_WEATHER = 64
+_PLACES = 128
+_DATE_WORD = 256
+_VISIT = 512
+_TO = 1024
+_BEFORE_TO = 2048
+_IN = 4096
+_ENDS_PLACE = 8192
+_ENDS_IN_PLACE = 16384
+_ENDS_LEADING_PLACE = 32768
+_LET = 65536
+_STOP = 131072  # the leading letters are a stop keyword
+_FALLBACK_TRIGGER = 262144
+_ENDS_FALLBACK = 524288
+_LETTERS_SHIFT = 20
+
+# Classified words kept per parser, the table is emptied when it reaches this size
+MAX_CLASSIFIED_WORDS = 65536
+
+DEFAULT_CACHE_SIZE = 4096
+
+# Queries asking for an itinerary get a day-by-day plan; other planning
+# words only do when the query says how many days
+ITINERARY_KEYWORDS = ["itinerary", "day by day", "day-by-day"]
+PLANNING_KEYWORDS = ["plan", "planning", "trip", "tour", "holiday", "vacation", "schedule"]
+DEFAULT_ITINERARY_DAYS = 1
+MAX_ITINERARY_DAYS = 14
+
+_NUMBER_WORDS = {
+    "a": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14
+}
+_DAY_COUNT = re.compile(r"\b(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")[\s-]*days?\b")
+_WEEKEND = re.compile(r"\bweekend\b")
+_WEEK = re.compile(r"\b(?:a|one)[\s-]*week\b")
+
+_MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3, "april": 4, "apr": 4,
+    "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7, "august": 8, "aug": 8,
+    "september": 9, "sept": 9, "sep": 9, "october": 10, "oct": 10, "november": 11, "nov": 11,
+    "december": 12, "dec": 12
+}
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_MONTH = "(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+_DAY_OF_MONTH = r"(\d{1,2})(?:st|nd|rd|th)?"
+_RANGE_SEPARATOR = r"\s*(?:-|to|until|till|through|and)\s*"
+# "june 3", "june 3-7", "june 28 to july 2"
+_MONTH_FIRST = re.compile(
+    rf"\b{_MONTH}\s+{_DAY_OF_MONTH}(?:{_RANGE_SEPARATOR}(?:{_MONTH}\s+)?{_DAY_OF_MONTH})?\b"
+)
+# "3 june", "3rd of june", "3-7 june"
+_DAY_FIRST = re.compile(rf"\b{_DAY_OF_MONTH}(?:{_RANGE_SEPARATOR}{_DAY_OF_MONTH})?\s+(?:of\s+)?{_MONTH}\b")
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_WEEKDAY = re.compile(r"\b(?:(this|next|coming)\s+)?(" + "|".join(_WEEKDAYS) + r")s?\b")
+_RELATIVE_DAY = re.compile(r"\b(day after tomorrow|tomorrow|today|tonight)\b")
+_RELATIVE_WEEK = re.compile(r"\b(?:(this|next|coming)\s+)?(weekend|week)\b")
+# Month names only count as a date next to a day number ("may" alone is a verb)
+_DATE_PATTERNS = [_ISO_DATE, _MONTH_FIRST, _DAY_FIRST, _WEEKDAY, _RELATIVE_DAY, _RELATIVE_WEEK, _DAY_COUNT, _WEEK]
+# Every date pattern needs one of these ("day" is in "today" and the weekdays), most queries have none
+_DATE_HINT = re.compile(r"\d|day|week|tomorrow|tonight")
+# Words left dangling at the end of a place name once a date is cut off it
+_DATE_CONNECTORS = frozenset(["from", "on", "for", "during", "between", "this", "next", "coming", "over", "until", "the", "at"])
+# A date this many days in the past is taken as this year's (a trip under way), earlier ones as next year's
+PAST_DATE_GRACE_DAYS = 7
+
+# Words leading into a date, cut together with it ("for a 3 day trip", "from June 3")
+_LEADING_CONNECTORS = re.compile(
+    r"(?:\b(?:" + "|".join(sorted(_DATE_CONNECTORS | {"a", "an"})) + r")\s+)+$"
+)
+
+_TRAILING_PUNCTUATION = re.compile(r"[,.!?]+$")
+_WORD = re.compile(r"\S+")
+# The word right after a date, unless punctuation ends the name first
+_NEXT_NAME_WORD = re.compile(r"[ \t]+([^\s,.!?;]+)")
+
+# Destinations listed after the first place: ", Agra", " and Agra", " & Agra"
+# (each item ends at punctuation or the next "and", matched from there)
+_LIST_WORD = r"(?!and\b)[^\s,.!?;&]+"
+_LISTED_PLACE = re.compile(rf"\s*(,\s*(?:and\s+)?|\s(?:and|&)\s+|&\s*)({_LIST_WORD}(?:\s+{_LIST_WORD})*)",
+                           re.IGNORECASE)
+# Words between "and" and the destination ("Delhi and then Agra")
+_LIST_FILLERS = frozenset(["then", "also", "maybe", "finally", "to", "on", "visit", "visiting"])
+# Pronouns, articles and verbs that end a list item ("Paris and I want to know the weather")
+_NOT_PLACE_WORDS = frozenset([
+    "i", "we", "you", "he", "she", "they", "it", "my", "our", "your", "me", "us", "them", "there", "here",
+    "the", "a", "an", "this", "that", "some", "any", "all", "please", "am", "was", "were", "be", "do", "does",
+    "want", "wants", "would", "could", "like", "need", "see", "go", "know", "tell", "show", "get", "have",
+    "has", "stay", "explore", "check", "find", "come", "back", "return"
+])
+# Destinations answered per query, later ones are dropped
+MAX_PLACES = 8
+# Names containing "and" (or "&") that are one destination, not two; city names
+# are also looked up in the gazetteer when one is built
+JOINED_PLACE_NAMES = [
+    "Antigua and Barbuda", "Bosnia and Herzegovina", "Trinidad and Tobago", "Saint Kitts and Nevis",
+    "St Kitts and Nevis", "Saint Vincent and the Grenadines", "St Vincent and the Grenadines",
+    "Sao Tome and Principe", "Turks and Caicos", "Turks and Caicos Islands", "Wallis and Futuna",
+    "Saint Pierre and Miquelon", "Svalbard and Jan Mayen", "Heard Island and McDonald Islands",
+    "South Georgia and the South Sandwich Islands", "Brighton and Hove"
+]
+_JOINED_PLACES = {normalize_name(name): name for name in JOINED_PLACE_NAMES}
+_JOINED_MAX_WORDS = max(len(key.split()) for key in _JOINED_PLACES)
+_JOINED_FIRST_WORDS = frozenset(key.split()[0] for key in _JOINED_PLACES)
+_JOINER = re.compile(r"\s+(?:and|&)\s", re.IGNORECASE)
+
+
+class Words(NamedTuple):
+    """
+    A lower-cased query split by the tokenizer
+    """
+    words: List[str]
+    flags: List[int]
+    # All flags of the query ORed together
+    seen: int
+
+
+class DateRange(NamedTuple):
+    """
+    First and last day (inclusive) a query asks about
+    """
+    start: datetime.date
+    end: datetime.date
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+
+class ParsedQuery(NamedTuple):
+    """
+    Everything the agent needs from one user query
+    """
+    place_name: Optional[str]
+    intent: Dict[str, bool]
+
+
+def compile_keywords(keywords: Iterable[str]) -> Pattern:
+    """
+    Compile keywords into one alternation, longest first
+
+    A single search of the result tells whether any keyword occurs as a
+    substring, in one pass of the regex engine instead of one scan per keyword.
+    """
+    keywords = sorted(set(keywords), key=len, reverse=True)
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords))
+
+
+class QueryParser:
+    """
+    Compiled parser producing the intent flags and place name of a query
+
+    Gives exactly the results of the original per-call keyword loops and
+    regexes. Results are memoized per query string, since batch and replay
+    workloads repeat the same phrasings many times.
+    """
+
+    def __init__(self, weather_keywords: List[str] = None, places_keywords: List[str] = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            weather_keywords: Substrings that ask for the weather
+            places_keywords: Substrings that ask for places to visit
+            cache_size: Parsed queries kept in memory (0 disables the cache)
+        """
+        weather_keywords = DEFAULT_WEATHER_KEYWORDS if weather_keywords is None else weather_keywords
+        places_keywords = DEFAULT_PLACES_KEYWORDS if places_keywords is None else places_keywords
+        self._weather = compile_keywords(weather_keywords)
+        self._places = compile_keywords(places_keywords)
+        # Keywords made of letters lie within one word, the others ("where to
+        # go") are looked for in the whole query
+        self._weather_in_word = _compile_words(weather_keywords)
+        self._places_in_word = _compile_words(places_keywords)
+        self._weather_phrases = _compile_phrases(weather_keywords)
+        self._places_phrases = _compile_phrases(places_keywords)
+        self._classified = {}
+        self._fallback_trigger = compile_keywords(FALLBACK_TRIGGER_LITERALS)
+        self._itinerary = compile_keywords(ITINERARY_KEYWORDS)
+        self._planning = compile_keywords(PLANNING_KEYWORDS)
+
+        if cache_size:
+            self._parse = functools.lru_cache(maxsize=cache_size)(self._parse)
+
+    def _parse(self, user_input: str) -> Tuple[Optional[str], bool, bool, bool, Tuple[str, ...]]:
+        input_lower = user_input.lower()
+
+        words = None
+        if user_input.isascii() or not _ASCII_LETTER_FOLDS.search(user_input):
+            words = self._tokenize(input_lower)
+        if words is not None:
+            wants_weather = bool(words.seen & _WEATHER) or _search(self._weather_phrases, input_lower)
+            wants_places = bool(words.seen & _PLACES) or _search(self._places_phrases, input_lower)
+            date_words = bool(words.seen & _DATE_WORD)
+        else:
+            wants_weather = self._weather.search(input_lower) is not None
+            wants_places = self._places.search(input_lower) is not None
+            date_words = _DATE_HINT.search(input_lower) is not None
+
+        # If no specific keywords, default to places
+        if not wants_weather and not wants_places:
+            wants_places = True
+
+        has_dates = date_words and any(pattern.search(input_lower) for pattern in _DATE_PATTERNS)
+        if has_dates:
+            dates, _ = _date_spans(user_input, input_lower)
+            has_dates = bool(dates)
+            if has_dates and len(input_lower) == len(user_input):
+                # "Paris June 3 to 7" would otherwise stop the patterns at the digits
+                user_input = _cut_spans(user_input, dates)
+                input_lower = user_input.lower()
+                if words is not None:
+                    words = self._tokenize(input_lower)
+
+        listing = "and" in input_lower or "&" in input_lower
+        if words is not None:
+            place = self._place_in_words(user_input, input_lower, words, listing)
+        else:
+            place = self._place_span(user_input, input_lower)
+        if not place:
+            return None, wants_weather, wants_places, has_dates, ()
+
+        place_name, end = place
+        if not place_name:
+            return place_name, wants_weather, wants_places, has_dates, ()
+
+        place_names = (place_name,)
+        if listing:
+            joined = _joined_place(user_input, place_name, end)
+            if joined:
+                place_name, end = joined
+                place_names = (place_name,)
+            place_names = _unique_places(place_names + self._listed_places(user_input, end))
+
+        return place_name, wants_weather, wants_places, has_dates, place_names
+
+    def _tokenize(self, input_lower: str) -> Words:
+        """
+        Split a lower-cased query into classified words, in one pass
+        """
+        words = input_lower.split()
+        flags = list(map(self._classified.get, words))
+        if None in flags:
+            flags = [self._classify(word) if word_flags is None else word_flags for word, word_flags in zip(words, flags)]
+        return Words(words, flags, functools.reduce(operator.or_, flags, 0))
+
+    def _classify(self, word: str) -> int:
+        """
+        Classification bits of one word, remembered for the next query using it
+        """
+        letters = len(word) - len(word.lstrip(_ASCII_LETTERS))
+        rest = word[letters:]
+        flags = letters << _LETTERS_SHIFT
+        if not rest:
+            flags |= _LETTERS_ONLY
+        elif letters and rest[0] in ",.":
+            flags |= _LETTERS_THEN_PUNCTUATION | (_LETTERS_THEN_COMMA if rest == "," else 0)
+        if letters:
+            flags |= _STARTS_WITH_LETTER
+        elif word[0] in ",.":
+            flags |= _PUNCTUATION | (_COMMA if word == "," else 0)
+
+        if self._weather_in_word and self._weather_in_word.search(word):
+            flags |= _WEATHER
+        if self._places_in_word and self._places_in_word.search(word):
+            flags |= _PLACES
+        if _DATE_HINT.search(word):
+            flags |= _DATE_WORD
+
+        if word.endswith(_VISIT_TRIGGERS):
+            flags |= _VISIT
+        if word == "to":
+            flags |= _TO
+        if word.endswith(_TO_TRIGGERS):
+            flags |= _BEFORE_TO
+        if word.endswith("in"):
+            flags |= _IN
+        if word.startswith(_PLACE_ENDS):
+            flags |= _ENDS_PLACE
+        if word.startswith(_IN_PLACE_ENDS):
+            flags |= _ENDS_IN_PLACE
+        if word.startswith(_LEADING_PLACE_ENDS):
+            flags |= _ENDS_LEADING_PLACE
+        if word == "let":
+            flags |= _LET
+        if letters and word[:letters] in STOP_KEYWORDS:
+            flags |= _STOP
+
+        if word in FALLBACK_TRIGGERS:
+            flags |= _FALLBACK_TRIGGER
+        if word in STOP_KEYWORDS or word in (",", ".", "?", "!"):
+            flags |= _ENDS_FALLBACK
+
+        if len(self._classified) >= MAX_CLASSIFIED_WORDS:
+            self._classified.clear()
+        self._classified[word] = flags
+        return flags
+
+    def _place_in_words(self, user_input: str, input_lower: str, words: Words,
+                        listing: bool) -> Optional[Tuple[str, Optional[int]]]:
+        """
+        _place_span walking the words of a query instead of running PLACE_PATTERNS
+
+        Each pattern's place starts at the word after a trigger and ends at
+        the first word followed by the pattern's end word, a comma, a full
+        stop or the end of the query; anything else there makes that trigger
+        fail and the next one is tried. The offset after the place is only
+        worked out when listing (the query may name more places), else None.
+        """
+        flags, seen = words.flags, words.seen
+        count = len(flags)
+
+        # "going to/visit/visiting/trip to/travel to/heading to/am visiting [place]"
+        if seen & (_VISIT | _TO):
+            for index in range(count - 1):
+                word_flags = flags[index]
+                if not (word_flags & _VISIT or (word_flags & _TO and index and flags[index - 1] & _BEFORE_TO)):
+                    continue
+                if not flags[index + 1] & _STARTS_WITH_LETTER:
+                    continue
+                last = _place_end(flags, index + 1, _ENDS_PLACE)
+                if last is not None:
+                    place = _cleaned_place(user_input, words, index + 1, last, listing)
+                    if place:
+                        return place
+                    break
+
+        # "in [place]"
+        if seen & _IN:
+            for index in range(count - 1):
+                if flags[index] & _IN and flags[index + 1] & _STARTS_WITH_LETTER:
+                    last = _place_end(flags, index + 1, _ENDS_IN_PLACE)
+                    if last is not None:
+                        place = _cleaned_place(user_input, words, index + 1, last, listing)
+                        if place:
+                            return place
+                        break
+
+        # "[Place], let's/what/where/temperature/and"
+        if seen & (_ENDS_LEADING_PLACE | _LET) and count and flags[0] & _STARTS_WITH_LETTER \
+                and not input_lower[0].isspace():
+            last = _leading_place_end(input_lower, words)
+            if last is not None:
+                place = _cleaned_place(user_input, words, 0, last, listing)
+                if place:
+                    return place
+
+        # Fallback: the words after "to/visit/visiting/in/going"
+        if not seen & _FALLBACK_TRIGGER:
+            return None
+
+        for index in range(1, count):
+            if flags[index - 1] & _FALLBACK_TRIGGER:
+                last = index
+                while last < count and not flags[last] & _ENDS_FALLBACK:
+                    last += 1
+                if last == index:
+                    return None
+
+                original = user_input.split()
+                place_name = _TRAILING_PUNCTUATION.sub("", " ".join(original[index:last])).title()
+                if seen & _DATE_WORD:
+                    place_name = strip_dates(place_name)
+                return place_name, _word_end(user_input, original, last - 1, len(original[last - 1])) if listing else None
+
+        return None
+
+    def _place_span(self, user_input: str, input_lower: str) -> Optional[Tuple[str, int]]:
+        """
+        The first place name and the offset in user_input just after its last word
+
+        Runs PLACE_PATTERNS, for the queries the tokenizer can't handle.
+        """
+        for pattern in PLACE_PATTERNS:
+            match = pattern.search(user_input)
+            if match:
+                # Remove any stop keywords that might have been captured
+                cleaned_words = []
+                end = match.start(1)
+                for word in _WORD.finditer(match.group(1)):
+                    if word.group().lower() in STOP_KEYWORDS:
+                        break
+                    cleaned_words.append(word.group())
+                    end = match.start(1) + word.end()
+
+                if cleaned_words:
+                    return strip_dates(_capitalized(" ".join(cleaned_words))), end
+
+        # Fallback: the words after "to/visit/visiting/in/going"
+        if not self._fallback_trigger.search(input_lower):
+            return None
+
+        words = list(_WORD.finditer(user_input))
+        for i in range(1, len(words)):
+            if words[i - 1].group().lower() in FALLBACK_TRIGGERS:
+                place_words = []
+                for word in words[i:]:
+                    if word.group().lower() in STOP_KEYWORDS or word.group() in (",", ".", "?", "!"):
+                        break
+                    place_words.append(word)
+
+                if place_words:
+                    place_name = _TRAILING_PUNCTUATION.sub("", " ".join(word.group() for word in place_words))
+                    return strip_dates(place_name.title()), place_words[-1].end()
+                return None
+
+        return None
+
+    def _listed_places(self, user_input: str, end: int) -> Tuple[str, ...]:
+        """
+        Further destinations listed right after the first place
+
+        "Delhi, Agra and Jaipur" lists Agra and Jaipur, but a comma alone does
+        not start a list ("Paris, France"): items after the last "and" or "&"
+        are dropped. Names containing "and" stay whole ("Trinidad and Tobago"). In queries with capitals only capitalised words count as
+        destinations, so "Goa and see the beaches" lists nothing, and an item
+        ends at a pronoun or verb ("Paris and I want to know the weather").
+        """
+        mixed_case = not user_input.islower()
+        listed = []
+        last_joined = 0
+        match = _LISTED_PLACE.match(user_input, end)
+        while match:
+            words = match.group(2).split()
+            while words and words[0].lower() in _LIST_FILLERS:
+                words = words[1:]
+
+            place_words = []
+            for word in words:
+                word_lower = word.lower()
+                if (word_lower in STOP_KEYWORDS or word_lower.split("'")[0] in STOP_KEYWORDS
+                        or word_lower.split("'")[0] in _NOT_PLACE_WORDS or self._weather.fullmatch(word_lower) or self._places.fullmatch(word_lower)):
+                    break
+                place_words.append(word)
+            if not place_words or (mixed_case and not place_words[0][0].isupper()):
+                break
+
+            place_name = " ".join(place_words)
+            if place_name.islower():
+                place_name = place_name.title()
+            place_name = strip_dates(place_name)
+            if not place_name:
+                break
+            end = match.end()
+            if len(place_words) == len(words):
+                joined = _joined_place(user_input, place_name, end)
+                if joined:
+                    place_name, end = joined
+            listed.append(place_name)
+            if match.group(1).strip(", ").lower() in ("and", "&"):
+                last_joined = len(listed)
+            if len(place_words) < len(words):
+                # The list ends at the first word that is not part of a place
+                break
+            match = _LISTED_PLACE.match(user_input, end)
+
+        return tuple(listed[:last_joined])
+
+    def itinerary_days(self, user_input: str) -> Optional[int]:
+        """
+        Number of days to plan, if the query asks for an itinerary
+
+        "3 day trip", "plan my weekend" or "itinerary" ask for one; "let's plan
+        my trip" alone keeps the list of places to visit.
+
+        Returns:
+            Days between 1 and MAX_ITINERARY_DAYS, or None for no itinerary
+        """
+        input_lower = user_input.lower()
+
+        days = None
+        match = _DAY_COUNT.search(input_lower)
+        if match:
+            days = int(match.group(1)) if match.group(1).isdigit() else _NUMBER_WORDS[match.group(1)]
+        elif _WEEKEND.search(input_lower):
+            days = 2
+        elif _WEEK.search(input_lower):
+            days = 7
+
+        if self._itinerary.search(input_lower):
+            days = days or DEFAULT_ITINERARY_DAYS
+        elif days is None or not self._planning.search(input_lower):
+            return None
+
+        return min(max(days, 1), MAX_ITINERARY_DAYS)
+
+    def date_range(self, user_input: str, today: Optional[datetime.date] = None) -> Optional[DateRange]:
+        """
+        Days a query asks about
+
+        Explicit dates ("June 3 to 7", "3rd of June", "2026-06-03") win over
+        weekdays ("Friday to Sunday"), which win over relative days
+        ("tomorrow", "next weekend", "this week"). A number of days ("a 3 day
+        trip", "next 5 days") sets the length of a range with a single start
+        day, and starting today when there is none.
+
+        Args:
+            user_input: User's input string
+            today: Day relative dates are counted from, defaults to today
+
+        Returns:
+            DateRange, or None if the query mentions no dates
+        """
+        input_lower = user_input.lower()
+        today = today or datetime.date.today()
+        if _DATE_HINT.search(input_lower):
+            # Dates that are part of a place name ("Sunday Island") don't count
+            _, in_names = _date_spans(user_input, input_lower)
+            for start, end in in_names:
+                input_lower = input_lower[:start] + " " * (end - start) + input_lower[end:]
+
+        match = _DAY_COUNT.search(input_lower)
+        if match:
+            days = int(match.group(1)) if match.group(1).isdigit() else _NUMBER_WORDS[match.group(1)]
+        else:
+            days = 7 if _WEEK.search(input_lower) else None
+
+        dates = _explicit_dates(input_lower, today) or _weekday_dates(input_lower, today)
+        if dates:
+            start, end = min(dates), max(dates)
+        else:
+            relative = _relative_range(input_lower, today)
+            if relative:
+                start, end = relative
+            elif days:
+                start, end = today, today
+            else:
+                return None
+
+        if start == end and days:
+            end = start + datetime.timedelta(days=max(days, 1) - 1)
+
+        return DateRange(start, end)
+
+    def intent(self, user_input: str) -> Dict[str, bool]:
+        """
+        Intent flags of a query
+
+        Returns:
+            Dictionary with flags for weather, places and forecast (the
+            query mentions dates, see date_range)
+        """
+        return self.parse(user_input).intent
+
+    def place_name(self, user_input: str) -> Optional[str]:
+        """
+        Place name mentioned in a query
+
+        Returns:
+            Extracted place name or None
+        """
+        return self._parse(user_input)[0]
+
+    def place_names(self, user_input: str) -> List[str]:
+        """
+        Every destination a query names, in order ("Delhi and Agra and Jaipur")
+
+        Returns:
+            Place names, the first being place_name, or an empty list (at
+            most MAX_PLACES, duplicates removed)
+        """
+        return list(self._parse(user_input)[4])
+
+    def parse(self, user_input: str) -> ParsedQuery:
+        """
+        Place name and intent flags of a query
+
+        Returns:
+            ParsedQuery
+        """
+        place_name, wants_weather, wants_places, has_dates, _ = self._parse(user_input)
+        return ParsedQuery(place_name, {"weather": wants_weather, "places": wants_places, "forecast": has_dates})
+
+
+def _is_word(keyword: str) -> bool:
+    return keyword.isascii() and keyword.isalpha()
+
+
+def _compile_words(keywords: Iterable[str]) -> Optional[Pattern]:
+    """
+    compile_keywords of the keywords made of letters only, None if there are none
+    """
+    words = [keyword for keyword in keywords if _is_word(keyword)]
+    return compile_keywords(words) if words else None
+
+
+def _compile_phrases(keywords: Iterable[str]) -> Optional[Pattern]:
+    """
+    compile_keywords of the keywords that are not made of letters only,
+    leaving out those containing one that is ("must see" and "see"), None
+    if none are left
+    """
+    keywords = list(keywords)
+    words = [keyword for keyword in keywords if _is_word(keyword)]
+    phrases = [keyword for keyword in keywords
+               if not _is_word(keyword) and not any(word in keyword for word in words)]
+    return compile_keywords(phrases) if phrases else None
+
+
+def _search(pattern: Optional[Pattern], text: str) -> bool:
+    return pattern is not None and pattern.search(text) is not None
+
+
+def _capitalized(place_name: str) -> str:
+    """
+    Title case a place name written in lower case, otherwise only capitalise its first letter
+    """
+    if place_name.islower():
+        return place_name.title()
+    if not place_name[0].isupper():
+        return place_name[0].upper() + place_name[1:]
+    return place_name
+
+
+def _place_end(flags: List[int], first: int, ends: int) -> Optional[int]:
+    """
+    Last word of a place starting at word first: the first word followed by
+    a word with the ends bit, a comma, a full stop or the end of the query.
+    A word with other characters after its letters ends the place there if
+    they start with a comma or full stop. None if something else comes first.
+    """
+    count = len(flags)
+    index = first
+    while True:
+        word_flags = flags[index]
+        if not word_flags & _LETTERS_ONLY:
+            return index if word_flags & _LETTERS_THEN_PUNCTUATION else None
+        if index + 1 == count:
+            return index
+        following = flags[index + 1]
+        if following & (ends | _PUNCTUATION):
+            return index
+        if not following & _STARTS_WITH_LETTER:
+            return None
+        index += 1
+
+
+def _leading_place_end(input_lower: str, words: Words) -> Optional[int]:
+    """
+    Last word of the place the third place pattern captures at the start of
+    the query (at least two characters, then an optional comma, whitespace
+    and an end word), None if it does not match
+    """
+    flags = words.flags
+    count = len(flags)
+
+    def ends_at(index: int) -> bool:
+        if index >= count:
+            return False
+        if flags[index] & _ENDS_LEADING_PLACE:
+            return True
+        # "let us"
+        return bool(flags[index] & _LET) and index + 1 < count and words.words[index + 1].startswith("us")
+
+    # A one-letter first word only ends the place before at least two whitespace characters
+    short_start = len(words.words[0]) < 2 and not input_lower[2:3].isspace()
+
+    index = 0
+    while True:
+        word_flags = flags[index]
+        if not word_flags & _LETTERS_ONLY:
+            # "Paris, what"
+            long_enough = index or word_flags >> _LETTERS_SHIFT >= 2
+            return index if word_flags & _LETTERS_THEN_COMMA and long_enough and ends_at(index + 1) else None
+        if index + 1 == count:
+            return None
+        # "Paris , what"
+        if flags[index + 1] & _COMMA:
+            return index if ends_at(index + 2) else None
+        if ends_at(index + 1) and (index or not short_start):
+            return index
+        if not flags[index + 1] & _STARTS_WITH_LETTER:
+            return None
+        index += 1
+
+
+def _cleaned_place(user_input: str, words: Words, first: int, last: int,
+                   listing: bool) -> Optional[Tuple[str, Optional[int]]]:
+    """
+    Place name from the letters of words first to last, cut at the first
+    stop keyword, and the offset just after it when listing; None if
+    nothing is left
+    """
+    flags = words.flags
+    end = first
+    while end <= last and not flags[end] & _STOP:
+        end += 1
+    if end == first:
+        return None
+
+    original = user_input.split()
+    length = flags[end - 1] >> _LETTERS_SHIFT
+    place_name = " ".join(original[first:end - 1] + [original[end - 1][:length]])
+    place_name = _capitalized(place_name)
+    if words.seen & _DATE_WORD:
+        place_name = strip_dates(place_name)
+    return place_name, _word_end(user_input, original, end - 1, length) if listing else None
+
+
+def _word_end(user_input: str, words: List[str], index: int, length: int) -> int:
+    """
+    Offset in user_input after the first length characters of its index-th word
+    """
+    offset = 0
+    for word in words[:index + 1]:
+        offset = user_input.index(word, offset) + len(word)
+    return offset - len(words[index]) + length
+
+
+def _joined_place(user_input: str, place_name: str, end: int) -> Optional[Tuple[str, int]]:
+    """
+    The longer name place_name starts when "and" or "&" and the rest of it follow at end
+
+    "Bosnia" followed by " and Herzegovina" is Bosnia and Herzegovina, one
+    destination. Names come from JOINED_PLACE_NAMES and the gazetteer.
+
+    Returns:
+        The longest such name and the offset in user_input after it, or None
+    """
+    if not _JOINER.match(user_input, end):
+        return None
+    words = place_name.split()
+    gazetteer = get_gazetteer()
+    if gazetteer is None and normalize_name(words[0]) not in _JOINED_FIRST_WORDS:
+        return None
+
+    joined = None
+    for count, word in enumerate(_WORD.finditer(user_input, end), 1):
+        text = _TRAILING_PUNCTUATION.sub("", word.group())
+        words.append("and" if text == "&" else text)
+        if not text or len(words) > _JOINED_MAX_WORDS:
+            break
+
+        key = normalize_name(" ".join(words))
+        name = _JOINED_PLACES.get(key)
+        if name is None and count > 1 and gazetteer is not None:
+            city = gazetteer.exact(key)
+            if city is not None and normalize_name(city["name"]) == key:
+                name = city["name"]
+        if name is not None:
+            joined = name, word.start() + len(text)
+        if len(text) < len(word.group()):
+            # Punctuation ends the name
+            break
+
+    return joined
+
+
+def _unique_places(place_names: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Place names without repeats (ignoring case), at most MAX_PLACES
+    """
+    seen = set()
+    unique = []
+    for place_name in place_names:
+        if place_name.lower() not in seen:
+            seen.add(place_name.lower())
+            unique.append(place_name)
+    return tuple(unique[:MAX_PLACES])
+
+
+def _mentions_dates(input_lower: str) -> bool:
+    return _DATE_HINT.search(input_lower) is not None and any(pattern.search(input_lower) for pattern in _DATE_PATTERNS)
+
+
+def cut_dates(user_input: str, input_lower: Optional[str] = None) -> str:
+    """
+    Replace the dates of a query, with the words leading into them, by commas
+
+    "I'm going to Paris from June 3 to 7, weather?" becomes "I'm going to
+    Paris , , weather?", so the place patterns end the place name where the
+    dates started. Dates that are part of a place name stay ("Sunday Island").
+    """
+    input_lower = user_input.lower() if input_lower is None else input_lower
+    # Offsets in the lower-cased query only line up with the original when the lengths match
+    if len(input_lower) != len(user_input):
+        return user_input
+
+    spans, _ = _date_spans(user_input, input_lower)
+    return _cut_spans(user_input, spans)
+
+
+def _cut_spans(user_input: str, spans: List[Tuple[int, int]]) -> str:
+    if not spans:
+        return user_input
+    pieces = []
+    last = 0
+    for start, end in spans:
+        pieces.append(user_input[last:start])
+        last = end
+    pieces.append(user_input[last:])
+    return " , ".join(pieces)
+
+
+def _date_spans(user_input: str, input_lower: str) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Dates of a query, in order and without overlaps
+
+    A date right after a preposition ("from June 3", "on Sunday") or at the
+    edge of a name ("Paris tomorrow", "Paris, next week") is a date. In a
+    query with capitals, a capitalised date followed by another word of a name
+    is part of that name ("weather in Sunday Island", "going to Tonight Town").
+
+    Returns:
+        Spans of the dates, each with the words leading into it, and spans of
+        the date words that are part of a place name
+    """
+    spans = sorted(match.span() for pattern in _DATE_PATTERNS for match in pattern.finditer(input_lower))
+    # Capitals only line up with the lower-cased offsets when the lengths match
+    names_possible = not user_input.islower() and len(input_lower) == len(user_input)
+
+    dates = []
+    in_names = []
+    last = 0
+    for start, end in spans:
+        if start < last:
+            # Overlapping dates ("June 3 to 7" and "3 to 7") count once
+            if dates and dates[-1][1] == last:
+                dates[-1] = (dates[-1][0], max(last, end))
+            last = max(last, end)
+            continue
+        leading = _LEADING_CONNECTORS.search(input_lower, last, start)
+        if not leading and names_possible and _names_place(user_input, start, end):
+            in_names.append((start, end))
+        else:
+            dates.append((leading.start() if leading else start, end))
+        last = end
+
+    return dates, in_names
+
+
+def _names_place(user_input: str, start: int, end: int) -> bool:
+    """
+    Whether the date at start:end begins a place name: it is capitalised and so is the word after it
+    """
+    if not user_input[start].isupper():
+        return False
+    following = _NEXT_NAME_WORD.match(user_input, end)
+    if not following:
+        return False
+    word = following.group(1)
+    word_lower = word.lower()
+    return word[0].isupper() and not (
+        word_lower in STOP_KEYWORDS or word_lower in _NOT_PLACE_WORDS
+        or word_lower in FALLBACK_TRIGGERS or word_lower in _DATE_CONNECTORS
+    )
+
+
+def strip_dates(place_name: str) -> str:
+    """
+    Cut the dates the place patterns captured off the end of a place name
+
+    "Goa Next Weekend" and "Paris From June 3 To 7" become "Goa" and
+    "Paris"; dates elsewhere in a name stay ("Sunday Island"). A name that
+    would be left empty is returned unchanged.
+    """
+    # Offsets in the lower-cased name only line up with the original for ASCII
+    if not place_name.isascii():
+        return place_name
+
+    if not _mentions_dates(place_name.lower()):
+        return place_name
+
+    words = place_name.split()
+    stripped = False
+    while words:
+        name = " ".join(words)
+        name_lower = name.lower()
+        starts = [
+            match.start() for pattern in _DATE_PATTERNS for match in pattern.finditer(name_lower)
+            if match.end() == len(name_lower)
+        ]
+        if not starts:
+            break
+        words = name[:min(starts)].split()
+        while words and words[-1].lower() in _DATE_CONNECTORS:
+            words.pop()
+        stripped = True
+
+    return " ".join(words) if stripped and words else place_name
+
+
+def _resolve_day(year: int, month: int, day: int, today: datetime.date) -> Optional[datetime.date]:
+    """
+    Date of a day and month without a year: the next one, unless it is only a few days past
+    """
+    try:
+        resolved = datetime.date(year, month, day)
+        if resolved < today - datetime.timedelta(days=PAST_DATE_GRACE_DAYS):
+            resolved = datetime.date(year + 1, month, day)
+        return resolved
+    except ValueError:
+        return None
+
+
+def _explicit_dates(input_lower: str, today: datetime.date) -> List[datetime.date]:
+    """
+    Calendar dates written out in a query, in no particular order
+    """
+    dates = []
+    for match in _ISO_DATE.finditer(input_lower):
+        try:
+            dates.append(datetime.date(*(int(part) for part in match.groups())))
+        except ValueError:
+            continue
+
+    for match in _MONTH_FIRST.finditer(input_lower):
+        first_month, first_day, last_month, last_day = match.groups()
+        dates.append(_resolve_day(today.year, _MONTHS[first_month], int(first_day), today))
+        if last_day:
+            dates.append(_resolve_day(today.year, _MONTHS[last_month or first_month], int(last_day), today))
+
+    for match in _DAY_FIRST.finditer(input_lower):
+        first_day, last_day, month = match.groups()
+        dates.append(_resolve_day(today.year, _MONTHS[month], int(first_day), today))
+        if last_day:
+            dates.append(_resolve_day(today.year, _MONTHS[month], int(last_day), today))
+
+    return [day for day in dates if day is not None]
+
+
+def _weekday_dates(input_lower: str, today: datetime.date) -> List[datetime.date]:
+    """
+    Weekdays named in a query, each on or after the one before it
+
+    "next friday" is the Friday of next week when this week's hasn't passed yet.
+    """
+    dates = []
+    for match in _WEEKDAY.finditer(input_lower):
+        qualifier, name = match.groups()
+        after = dates[-1] if dates else today
+        resolved = after + datetime.timedelta(days=(_WEEKDAYS.index(name) - after.weekday()) % 7)
+        if qualifier == "next" and not dates and resolved.isocalendar()[1] == today.isocalendar()[1]:
+            resolved += datetime.timedelta(days=7)
+        dates.append(resolved)
+    return dates
+
+
+def _relative_range(input_lower: str, today: datetime.date) -> Optional[Tuple[datetime.date, datetime.date]]:
+    """
+    Range of "today", "tomorrow", "this weekend", "next week" and the like
+    """
+    match = _RELATIVE_DAY.search(input_lower)
+    if match:
+        offset = {"day after tomorrow": 2, "tomorrow": 1}.get(match.group(1), 0)
+        day = today + datetime.timedelta(days=offset)
+        return day, day
+
+    match = _RELATIVE_WEEK.search(input_lower)
+    if not match:
+        return None
+
+    qualifier, unit = match.groups()
+    if unit == "weekend":
+        # On a Sunday "this weekend" is what is left of it
+        saturday = today + datetime.timedelta(days=(5 - today.weekday()) % 7)
+        start = today if today.weekday() == 6 else saturday
+        if qualifier == "next":
+            start, saturday = saturday + datetime.timedelta(days=7), saturday + datetime.timedelta(days=7)
+        return start, saturday + datetime.timedelta(days=1)
+
+    # A bare "week" ("a week in Rome") is a length, not a date
+    if qualifier is None:
+        return None
+    monday = today - datetime.timedelta(days=today.weekday())
+    if qualifier == "next":
+        monday += datetime.timedelta(days=7)
+        return monday, monday + datetime.timedelta(days=6)
+    return today, monday + datetime.timedelta(days=6)
@@ -0,0 +1,319 @@
+"""
+Ranking - Relevance scoring and top-k selection of attraction candidates
+
+Overpass and the POI index return features in no useful order. Every
+candidate gets an importance when it is read (what kind of feature it is
+and whether it has a Wikidata/Wikipedia entry), the ranking stage adds a
+distance score computed for all candidates at once with NumPy, and a heap
+picks the best few unique names without sorting the whole list.
+
+Reading has to keep up with tens of thousands of elements per lookup:
+importances are memoized per combination of tag values, and names that
+only repeat a feature type are checked when a candidate is picked rather
+than for every element read.
+"""
+import heapq
+import math
+from array import array
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from poi_index import EARTH_RADIUS_M
+
+# Importance of a feature by (key, value), checked in this order of keys
+TAG_WEIGHTS = {
+    "tourism": {
+        "attraction": 3.0, "museum": 3.0, "gallery": 2.5, "viewpoint": 2.5, "zoo": 2.5,
+        "aquarium": 2.5, "theme_park": 2.5, "artwork": 1.5, "picnic_site": 1.0,
+        "information": 0.2, "hotel": 0.2, "hostel": 0.2, "guest_house": 0.2, "motel": 0.2,
+        "apartment": 0.1, "camp_site": 0.5, "caravan_site": 0.3, "yes": 0.5
+    },
+    "historic": {
+        "castle": 2.5, "monument": 2.5, "fort": 2.5, "ruins": 2.0, "archaeological_site": 2.0,
+        "memorial": 1.0, "yes": 1.0
+    },
+    "leisure": {
+        "park": 1.5, "garden": 1.5, "nature_reserve": 1.5, "water_park": 1.5, "marina": 1.0,
+        "stadium": 1.0, "beach_resort": 1.0, "sports_centre": 0.3, "swimming_pool": 0.3,
+        "fitness_centre": 0.1, "playground": 0.1, "pitch": 0.1, "track": 0.1, "yes": 0.2
+    }
+}
+# Importance of values missing from TAG_WEIGHTS
+DEFAULT_TAG_WEIGHTS = {"tourism": 1.0, "historic": 1.0, "leisure": 0.3}
+
+# Features notable enough for Wikidata/Wikipedia are usually worth a visit
+WIKI_BONUS = 2.0
+
+# Distance score: DISTANCE_WEIGHT at the centre, halving every DISTANCE_HALF_LIFE_M
+DISTANCE_WEIGHT = 2.0
+DISTANCE_HALF_LIFE_M = 3000.0
+
+# Features with a tag weighing at least this, or a wiki tag, are notable; Overpass is
+# asked for notable features first (the defaults and the wiki bonus are kept on either
+# side of it, so notability can be selected by tag value)
+NOTABLE_WEIGHT = 2.0
+# Best score a feature that isn't notable can reach, right at the centre
+OTHER_SCORE_LIMIT = max(
+    [weight for weights in TAG_WEIGHTS.values() for weight in weights.values() if weight < NOTABLE_WEIGHT]
+    + list(DEFAULT_TAG_WEIGHTS.values())
+) + DISTANCE_WEIGHT
+
+# Importances memoized per (tourism, historic, leisure, has wiki tag) values, up to this many
+IMPORTANCE_CACHE_SIZE = 4096
+_importance_cache = {}
+
+# Names that are just a feature type, e.g. a park mapped with name=park
+GENERIC_NAMES = frozenset([
+    "yes", "no", "park", "garden", "playground", "pitch", "museum", "attraction", "viewpoint",
+    "information", "hotel", "picnic site", "sports centre", "swimming pool", "monument",
+    "memorial", "artwork", "statue", "unnamed", "untitled"
+])
+
+
+class Attraction(NamedTuple):
+    """
+    A ranked attraction and where it is
+    """
+    name: str
+    lat: float
+    lon: float
+
+
+def is_generic_name(name: str, tags: Dict[str, str]) -> bool:
+    """
+    Whether a name only repeats the feature's type instead of naming it
+
+    Args:
+        name: Candidate display name
+        tags: OSM tags of the feature
+
+    Returns:
+        True for names like "park", "yes" or the value of one of the feature's tags
+    """
+    normalized = name.strip().lower().replace("_", " ")
+    if len(normalized) < 2 or normalized in GENERIC_NAMES:
+        return True
+    return any(
+        normalized == value.lower().replace("_", " ")
+        for key, value in tags.items() if key not in ("name", "name:en") and isinstance(value, str)
+    )
+
+
+def importance(tags: Dict[str, str]) -> float:
+    """
+    Score of a feature from its tags, before distance is taken into account
+
+    Args:
+        tags: OSM tags of the feature
+
+    Returns:
+        The highest weight among its tourism/historic/leisure tags, plus the wiki bonus
+    """
+    score = 0.0
+    for key, weights in TAG_WEIGHTS.items():
+        value = tags.get(key)
+        if value is not None:
+            score = max(score, weights.get(value, DEFAULT_TAG_WEIGHTS[key]))
+    if "wikidata" in tags or "wikipedia" in tags:
+        score += WIKI_BONUS
+    return score
+
+
+def notable_values(key: str) -> List[str]:
+    """
+    Values of a tag key that make a feature notable
+
+    Args:
+        key: One of the keys of TAG_WEIGHTS
+
+    Returns:
+        The values weighing at least NOTABLE_WEIGHT, sorted
+    """
+    return sorted(value for value, weight in TAG_WEIGHTS[key].items() if weight >= NOTABLE_WEIGHT)
+
+
+def is_notable(tags: Dict[str, str]) -> bool:
+    """
+    Whether a feature is among the ones Overpass is asked for first
+
+    Args:
+        tags: OSM tags of the feature
+
+    Returns:
+        True if it has a notable tag value or a Wikidata/Wikipedia tag
+    """
+    return importance(tags) >= NOTABLE_WEIGHT
+
+
+def _cached_importance(tags: Dict[str, str]) -> float:
+    key = (tags.get("tourism"), tags.get("historic"), tags.get("leisure"), "wikidata" in tags or "wikipedia" in tags)
+    score = _importance_cache.get(key)
+    if score is None:
+        score = importance(tags)
+        if len(_importance_cache) < IMPORTANCE_CACHE_SIZE:
+            _importance_cache[key] = score
+    return score
+
+
+def haversine_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distances in metres from one point to many, in one vectorized pass
+    """
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons - lon)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class CandidateSet:
+    """
+    Attraction candidates stored column-wise, so ranking needs no per-candidate conversion
+    """
+
+    def __init__(self):
+        self.names = []
+        self._tags = []
+        self._lats = array("d")
+        self._lons = array("d")
+        self._importances = array("d")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: Optional[str], lat: Optional[float], lon: Optional[float], tags: Dict[str, str]) -> bool:
+        """
+        Add a feature, skipping unnamed or unplaced ones
+
+        Generically named features are skipped when the top candidates are
+        picked, which is far cheaper than checking every feature read.
+
+        Returns:
+            True if the feature became a candidate
+        """
+        if not name or lat is None or lon is None:
+            return False
+        self.names.append(name)
+        self._tags.append(tags)
+        self._lats.append(lat)
+        self._lons.append(lon)
+        self._importances.append(_cached_importance(tags))
+        return True
+
+    def add_element(self, element: Dict) -> bool:
+        """
+        Add an Overpass element (nodes have lat/lon, ways and relations a center)
+        """
+        tags = element.get("tags")
+        if not tags:
+            return False
+        name = tags.get("name") or tags.get("name:en")
+        point = element.get("center") or element
+        lat = point.get("lat")
+        lon = point.get("lon")
+        # Same as add, inlined: this runs for every element of an Overpass answer
+        if not name or lat is None or lon is None:
+            return False
+        self.names.append(name)
+        self._tags.append(tags)
+        self._lats.append(lat)
+        self._lons.append(lon)
+        self._importances.append(_cached_importance(tags))
+        return True
+
+    def scores(self, lat: float, lon: float) -> np.ndarray:
+        """
+        Relevance of every candidate: importance plus a distance score decaying away from the centre
+
+        Args:
+            lat: Latitude of the place
+            lon: Longitude of the place
+
+        Returns:
+            Scores in insertion order
+        """
+        lats = np.frombuffer(self._lats, dtype=np.float64)
+        lons = np.frombuffer(self._lons, dtype=np.float64)
+        importances = np.frombuffer(self._importances, dtype=np.float64)
+        distances = haversine_many(lat, lon, lats, lons)
+        return importances + DISTANCE_WEIGHT * np.exp2(-distances / DISTANCE_HALF_LIFE_M)
+
+    def top(self, lat: float, lon: float, limit: int = 5) -> List[str]:
+        """
+        Names of the limit best scoring candidates, best first, each name once
+
+        Args:
+            lat: Latitude of the place
+            lon: Longitude of the place
+            limit: Number of names to return
+
+        Returns:
+            Up to limit distinct names
+        """
+        return [self.names[index] for index in self._top_indices(self.scores(lat, lon), limit)]
+
+    def top_attractions(self, lat: float, lon: float, limit: int = 5) -> List[Attraction]:
+        """
+        Like top, keeping each attraction's coordinates
+
+        Returns:
+            Up to limit attractions with distinct names, best first
+        """
+        return self._attractions(self._top_indices(self.scores(lat, lon), limit))
+
+    def top_attractions_above(self, lat: float, lon: float, limit: int, floor: float) -> Optional[List[Attraction]]:
+        """
+        Like top_attractions, if all limit of them score above floor
+
+        A candidate missing from this set that can score at most floor is then
+        certain not to belong among them.
+
+        Args:
+            lat: Latitude of the place
+            lon: Longitude of the place
+            limit: Number of attractions to return
+            floor: Score every returned attraction has to beat
+
+        Returns:
+            limit attractions with distinct names, best first, or None
+        """
+        scores = self.scores(lat, lon)
+        indices = self._top_indices(scores, limit)
+        if len(indices) < limit or (indices and scores[indices[-1]] <= floor):
+            return None
+        return self._attractions(indices)
+
+    def _attractions(self, indices: List[int]) -> List[Attraction]:
+        return [Attraction(self.names[index], self._lats[index], self._lons[index]) for index in indices]
+
+    def _top_indices(self, scores: np.ndarray, limit: int) -> List[int]:
+        count = len(self.names)
+        if not count or limit <= 0:
+            return []
+
+        # Preselect a pool in linear time, widen it only if it falls short of limit
+        pool_size = min(count, limit * 4)
+        while True:
+            if pool_size < count:
+                pool = np.argpartition(-scores, pool_size - 1)[:pool_size]
+            else:
+                pool = np.arange(count)
+            heap = list(zip((-scores[pool]).tolist(), pool.tolist()))
+            heapq.heapify(heap)
+
+            indices = []
+            seen_names = set()
+            while heap and len(indices) < limit:
+                _, index = heapq.heappop(heap)
+                name = self.names[index]
+                if name not in seen_names:
+                    seen_names.add(name)
+                    if not is_generic_name(name, self._tags[index]):
+                        indices.append(index)
+
+            # Duplicates and generic names can leave the pool short of limit
+            if len(indices) >= limit or pool_size >= count:
+                return indices
+            pool_size = min(count, pool_size * 4)
@@ -0,0 +1,185 @@
+"""
+Recording - Append-only compressed log of user queries and upstream exchanges, for replaying real traffic
+
+With TOURISM_RECORD_PATH set, every answered query and every upstream
+request (Nominatim, Open-Meteo, Overpass) is written as one JSON line to a
+gzip file. benchmarks/replay.py serves the recorded upstream answers from a
+local stand-in and sends the recorded queries again, so performance changes
+can be checked against real traffic without calling the public APIs.
+
+Events:
+    {"kind": "query", "ts": ..., "query": ..., "response": ..., "elapsed_ms": ...}
+    {"kind": "upstream", "ts": ..., "service": ..., "method": ..., "path": ...,
+     "fields": {...}, "status": ..., "body": ..., "complete": ..., "elapsed_ms": ...}
+
+ts is the Unix time the query or request started. fields are the query
+string or form fields as strings, body is the text of the answer (None for
+errors), and complete is False when the caller stopped reading a streamed
+answer early.
+"""
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+# Compressed output is flushed at most this often, flushing every line would
+# cost compression ratio
+FLUSH_INTERVAL = 1.0
+
+
+def request_key(method: str, path: str, fields: Optional[Dict]) -> str:
+    """
+    Key matching a replayed request to the recorded ones, from its method, path and fields
+    """
+    fields = sorted((str(name), str(value)) for name, value in (fields or {}).items())
+    return json.dumps([method.upper(), path, fields], separators=(",", ":"))
+
+
+def read_recording(path: str) -> Iterator[Dict]:
+    """
+    Events of a recording in the order they were written
+
+    Files ending in .gz may hold several gzip members (one per recording
+    process that appended to them); other files are plain JSONL.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Recorder:
+    """
+    Thread-safe writer of recording events
+
+    The file is opened for appending on the first event, so a disabled or
+    idle recorder costs nothing. Each process appends its own gzip member.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: File to append events to, None or empty disables recording
+        """
+        self.path = path or None
+        self.enabled = self.path is not None
+        self._file = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"queries": 0, "upstream": 0}
+
+    def query(self, query: str, response: str, started: float, elapsed: float):
+        """
+        Record an answered query
+
+        Args:
+            query: User input
+            response: Combined answer
+            started: Unix time the query arrived
+            elapsed: Seconds taken to answer
+        """
+        if self.enabled:
+            self._write("queries", {
+                "kind": "query", "ts": round(started, 3), "query": query, "response": response,
+                "elapsed_ms": round(elapsed * 1000, 1)
+            })
+
+    def upstream(self, service: str, method: str, path: str, fields: Optional[Dict], status: int,
+                 body: Optional[bytes], started: float, elapsed: float, complete: bool = True):
+        """
+        Record one upstream exchange
+
+        Args:
+            service: Upstream service name
+            method: HTTP method
+            path: Request path below the service base URL
+            fields: Query string or form fields
+            status: HTTP status of the answer (504 for a timeout)
+            body: Answer body, None for errors
+            started: Unix time the request started
+            elapsed: Seconds until the answer was read
+            complete: Whether the whole body was read
+        """
+        if self.enabled:
+            self._write("upstream", {
+                "kind": "upstream", "ts": round(started, 3), "service": service, "method": method, "path": path,
+                "fields": {str(name): str(value) for name, value in (fields or {}).items()},
+                "status": status, "body": body.decode("utf-8", "replace") if body is not None else None,
+                "complete": complete, "elapsed_ms": round(elapsed * 1000, 1)
+            })
+
+    def _write(self, counter: str, event: Dict):
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    opener = gzip.open if self.path.endswith(".gz") else open
+                    self._file = opener(self.path, "at", encoding="utf-8")
+                self._file.write(line)
+                self._counters[counter] += 1
+
+                now = time.monotonic()
+                if now - self._last_flush >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    self._last_flush = now
+            except OSError as e:
+                print(f"Error writing recording: {e}")
+                self.enabled = False
+
+    def close(self):
+        """
+        Finish the file, later events start a new gzip member
+        """
+        with self._lock:
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError as e:
+                    print(f"Error closing recording: {e}")
+                self._file = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["path"] = self.path
+        return stats
+
+
+_default_recorder = None
+_default_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> Recorder:
+    """
+    Return the process-wide recorder, creating it from the environment on first use
+
+    Environment:
+        TOURISM_RECORD_PATH: File to record queries and upstream exchanges
+            to (.gz for gzip), unset or empty for no recording
+    """
+    global _default_recorder
+
+    with _default_recorder_lock:
+        if _default_recorder is None:
+            _default_recorder = Recorder(os.environ.get("TOURISM_RECORD_PATH"))
+            atexit.register(_default_recorder.close)
+        return _default_recorder
+
+
+def set_recorder(recorder: Optional[Recorder]):
+    """
+    Replace the process-wide recorder (None recreates it from the environment)
+    """
+    global _default_recorder
+
+    with _default_recorder_lock:
+        if _default_recorder is not None and _default_recorder is not recorder:
+            _default_recorder.close()
+        _default_recorder = recorder
@@ -0,0 +1,392 @@
+"""
+Scheduler - Per-host rate limiting, request priorities and adaptive backoff for upstream calls
+
+Every upstream service gets a HostScheduler. It meters outgoing calls with a
+token bucket and caps concurrent calls. Callers wait in one priority queue,
+so interactive requests go ahead of batch and prefetch work. A call made
+for several requests at once runs under a SharedPriority, which rises to the
+most urgent of them and moves its queued calls up with it. A 429, 503 or
+504 answer pauses the whole host, either for the Retry-After the service
+asked for or for a jittered exponential backoff.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+# Request priorities, lower goes first
+INTERACTIVE = 0
+BATCH = 1
+PREFETCH = 2
+
+# Statuses that mean "slow down" rather than "no such thing"
+THROTTLE_STATUSES = frozenset([429, 503, 504])
+
+# (requests per second, burst, max concurrent calls); 0 disables a limit.
+# Nominatim's usage policy allows about one request per second, the public
+# Overpass instance gives each client two query slots.
+DEFAULT_LIMITS = {
+    "nominatim": (1.0, 1, 2),
+    "open_meteo": (10.0, 10, 0),
+    "overpass": (2.0, 2, 2)
+}
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+
+
+class SharedPriority:
+    """
+    Priority of one call made on behalf of several requests, the most urgent among them
+
+    Requests joining the call raise it with raise_to; the call's upstream
+    requests that are already queued move up the queue with it.
+    """
+
+    def __init__(self, priority: int):
+        self.value = priority
+        self._lock = threading.Lock()
+        self._queued: List[Tuple["HostScheduler", "_Waiter"]] = []
+
+    def raise_to(self, priority: int):
+        """
+        Make the call at least as urgent as priority
+        """
+        with self._lock:
+            if priority >= self.value:
+                return
+            self.value = priority
+            queued = list(self._queued)
+        # Outside our lock: schedulers take theirs first when queueing
+        for scheduler, waiter in queued:
+            scheduler._reprioritize(waiter, priority)
+
+    def _add(self, scheduler: "HostScheduler", waiter: "_Waiter") -> int:
+        with self._lock:
+            self._queued.append((scheduler, waiter))
+            return self.value
+
+    def _remove(self, scheduler: "HostScheduler", waiter: "_Waiter"):
+        with self._lock:
+            self._queued.remove((scheduler, waiter))
+
+
+_priority = contextvars.ContextVar("tourism_request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: Union[int, SharedPriority]) -> Iterator[None]:
+    """
+    Run the enclosed upstream calls (including those in tasks started inside) at a priority
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    priority = _priority.get()
+    return priority.value if isinstance(priority, SharedPriority) else priority
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait according to a Retry-After header (delay-seconds or HTTP-date)
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Classic token bucket: rate tokens per second, holding at most burst tokens
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        Seconds until a token is available
+        """
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Waiter:
+    __slots__ = ("priority", "sequence", "loop", "event", "cancelled")
+
+    def __init__(self, priority: int, sequence: int):
+        self.priority = priority
+        self.sequence = sequence
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # The waiter's loop is closed, nobody is waiting any more
+            pass
+
+
+class HostScheduler:
+    """
+    Admission control for one upstream host
+
+    Callers from any thread or event loop wait in a single priority queue;
+    only the head of the queue may start a call, once the token bucket, the
+    concurrency cap and any backoff allow it.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        rate: float = 0.0,
+        burst: int = 1,
+        max_concurrent: int = 0,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_backoff: float = DEFAULT_BASE_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF
+    ):
+        """
+        Args:
+            service: Upstream service name
+            rate: Calls per second, 0 for no rate limit
+            burst: Calls that may start back to back after an idle period
+            max_concurrent: Calls in flight at once, 0 for no cap
+            max_retries: Retries of a throttled call before giving up
+            base_backoff: First backoff in seconds when no Retry-After is given
+            max_backoff: Upper bound of any backoff in seconds
+        """
+        self.service = service
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._lock = threading.Lock()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._failures = 0
+        self._counters = {"calls": 0, "queued": 0, "throttled": 0, "wait_s": 0.0}
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None) -> AsyncIterator[None]:
+        """
+        Wait for permission to make one call and hold it for the call's duration
+
+        Args:
+            priority: Queue priority, defaults to the current request_priority
+        """
+        await self._acquire(_priority.get() if priority is None else priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _delay(self, now: float) -> Optional[float]:
+        """
+        Seconds until the head of the queue may start, None if it has to wait for a release
+        """
+        if self.max_concurrent > 0 and self._in_flight >= self.max_concurrent:
+            return None
+        delay = max(self._blocked_until - now, 0.0)
+        if self._bucket is not None:
+            delay = max(delay, self._bucket.wait_time(now))
+        return delay
+
+    def _wake_head(self):
+        while self._queue and self._queue[0].cancelled:
+            heapq.heappop(self._queue)
+        if self._queue:
+            self._queue[0].wake()
+
+    async def _acquire(self, priority: Union[int, SharedPriority]):
+        started = time.monotonic()
+
+        with self._lock:
+            self._counters["calls"] += 1
+            # Fast path: nothing is queued and the call may start right away
+            if not self._queue and self._delay(started) == 0:
+                self._start(started)
+                return
+
+            self._counters["queued"] += 1
+            shared = priority if isinstance(priority, SharedPriority) else None
+            waiter = _Waiter(priority if shared is None else shared.value, next(self._sequence))
+            if shared is not None:
+                # Registered before it is queued, so no raise_to in between is missed
+                waiter.priority = shared._add(self, waiter)
+            heapq.heappush(self._queue, waiter)
+
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    delay = None
+                    if self._queue[0] is waiter:
+                        delay = self._delay(now)
+                        if delay == 0:
+                            heapq.heappop(self._queue)
+                            self._start(now)
+                            self._counters["wait_s"] += now - started
+                            self._wake_head()
+                            return
+
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                waiter.event.clear()
+        except BaseException:
+            with self._lock:
+                waiter.cancelled = True
+                self._wake_head()
+            raise
+        finally:
+            if shared is not None:
+                shared._remove(self, waiter)
+
+    def _reprioritize(self, waiter: _Waiter, priority: int):
+        with self._lock:
+            if priority < waiter.priority and waiter in self._queue:
+                waiter.priority = priority
+                heapq.heapify(self._queue)
+                self._wake_head()
+
+    def _start(self, now: float):
+        if self._bucket is not None:
+            self._bucket.take(now)
+        self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._wake_head()
+
+    def throttled(self, retry_after: Optional[float] = None) -> float:
+        """
+        Record a throttling answer and pause the host
+
+        Args:
+            retry_after: Seconds the service asked us to wait, if it said so
+
+        Returns:
+            Seconds the host is paused for
+        """
+        with self._lock:
+            self._counters["throttled"] += 1
+            self._failures += 1
+            if retry_after is not None:
+                delay = min(retry_after, self.max_backoff)
+            else:
+                # Exponential backoff with jitter, so paused callers don't retry in lockstep
+                ceiling = min(self.max_backoff, self.base_backoff * 2 ** (self._failures - 1))
+                delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            return delay
+
+    def succeeded(self):
+        with self._lock:
+            self._failures = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Calls admitted, calls that had to queue, throttling answers and total queueing time
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["queue_length"] = sum(1 for waiter in self._queue if not waiter.cancelled)
+            stats["in_flight"] = self._in_flight
+            stats["paused_s"] = max(self._blocked_until - time.monotonic(), 0.0)
+        return stats
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(service: str) -> HostScheduler:
+    """
+    Return the process-wide scheduler of a service, creating it from the environment on first use
+
+    Mirrors of a service are scheduled separately as "<service>@<host>",
+    each with the service's limits.
+
+    Environment:
+        TOURISM_<SERVICE>_RATE: Calls per second, 0 disables rate limiting
+        TOURISM_<SERVICE>_BURST: Token bucket size
+        TOURISM_<SERVICE>_CONCURRENCY: Concurrent calls, 0 for no cap
+        TOURISM_UPSTREAM_MAX_RETRIES: Retries of throttled calls
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(service)
+        if scheduler is None:
+            base_service = service.partition("@")[0]
+            rate, burst, concurrency = DEFAULT_LIMITS.get(base_service, (0.0, 1, 0))
+            prefix = f"TOURISM_{base_service.upper()}"
+            scheduler = _schedulers[service] = HostScheduler(
+                service,
+                rate=float(os.environ.get(f"{prefix}_RATE", rate)),
+                burst=int(os.environ.get(f"{prefix}_BURST", burst)),
+                max_concurrent=int(os.environ.get(f"{prefix}_CONCURRENCY", concurrency)),
+                max_retries=int(os.environ.get("TOURISM_UPSTREAM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+            )
+        return scheduler
+
+
+def set_scheduler(service: str, scheduler: Optional[HostScheduler]):
+    """
+    Replace the scheduler of a service (None recreates it from the environment)
+    """
+    with _schedulers_lock:
+        if scheduler is None:
+            _schedulers.pop(service, None)
+        else:
+            _schedulers[service] = scheduler
+
+
+def scheduler_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Scheduler counters of every service, keyed by service name
+    """
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {scheduler.service: scheduler.stats() for scheduler in schedulers}
@@ -0,0 +1,366 @@
+"""
+Service - JSON HTTP API serving the Tourism AI agent, for the mobile client and other backends
+
+Usage:
+    python service.py [--host 127.0.0.1] [--port 8080] [--max-concurrency 64] [--max-queue 256]
+
+Endpoints:
+    POST /query    {"query": "..."}                      -> {"response": "...", "elapsed_ms": ...}
+    POST /batch    {"queries": [...], "max_concurrency": 8} -> {"responses": [...], "stats": {...}}
+    POST /stream   {"query": "..."}                      -> NDJSON lines {"kind": "...", "text": "..."}
+    GET  /health                                         -> {"status": "ok", "in_flight": ..., ...}
+    GET  /metrics                                        -> per-stage metrics in the Prometheus format
+
+All requests run on one asyncio event loop. At most --max-concurrency
+requests are processed at once; up to --max-queue more wait for a slot, for
+at most --queue-timeout seconds. Anything beyond that is shed at once with
+503 and Retry-After, so a saturated service answers quickly instead of
+timing out. On SIGTERM or SIGINT the service stops accepting connections,
+answers 503 on the ones kept alive (/health reports "draining") and finishes
+the requests in flight before it exits. Popular destinations are kept
+warm in the caches in the background (see warming.py).
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from aiohttp import web
+
+import tracing
+from scheduler import scheduler_stats
+from tourism_ai_agent import TourismAIAgent
+from upstream import configure_client, get_client
+from warming import get_warmer
+
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_QUEUE_TIMEOUT = 10.0
+DEFAULT_SHUTDOWN_GRACE = 30.0
+# Pooled connections per upstream host, well above the 32 the CLI uses
+DEFAULT_UPSTREAM_CONNECTIONS = 128
+MAX_BATCH_QUERIES = 500
+
+_state_key = web.AppKey("service_state", object)
+_shutdown_grace_key = web.AppKey("shutdown_grace", float)
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is shed because every slot and queue place is taken
+    """
+
+
+class AdmissionControl:
+    """
+    Concurrency limit with a bounded wait queue, for one event loop
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        """
+        Args:
+            max_concurrency: Requests processed at once
+            max_queue: Requests allowed to wait for a slot, beyond that they are shed
+            queue_timeout: Seconds a request may wait before it is shed
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.counters = {"admitted": 0, "shed": 0, "completed": 0}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one processing slot for the enclosed block
+
+        Raises:
+            Overloaded: The queue is full or the wait exceeded queue_timeout
+        """
+        # Counted rather than asking the semaphore, which requests that arrived together haven't taken yet
+        if self.in_flight + self.queued >= self.max_concurrency + self.max_queue:
+            self.counters["shed"] += 1
+            raise Overloaded()
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["shed"] += 1
+            raise Overloaded() from None
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        self.counters["admitted"] += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.counters["completed"] += 1
+            self._semaphore.release()
+            if self.in_flight == 0 and self.queued == 0:
+                self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """
+        Wait until no request is queued or in flight
+
+        Returns:
+            True if the service went idle within timeout
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class _ServiceState:
+    def __init__(self, agent: TourismAIAgent, admission: AdmissionControl):
+        self.agent = agent
+        self.admission = admission
+        self.draining = False
+        self.started = time.time()
+
+
+def _error(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+
+def _overloaded() -> web.Response:
+    return _error(503, "Service is overloaded, please retry shortly", {"Retry-After": "1"})
+
+
+async def _read_json(request: web.Request) -> Dict:
+    """
+    Request body as a JSON object
+
+    Raises:
+        web.HTTPBadRequest: The body isn't a JSON object
+    """
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Body must be JSON"}), content_type="application/json")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Body must be a JSON object"}), content_type="application/json")
+    return body
+
+
+def _query(body: Dict) -> str:
+    query = body.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise web.HTTPBadRequest(text=json.dumps({"error": "'query' must be a non-empty string"}),
+                                 content_type="application/json")
+    return query.strip()
+
+
+async def handle_query(request: web.Request) -> web.Response:
+    state = request.app[_state_key]
+    if state.draining:
+        return _error(503, "Service is shutting down")
+    query = _query(await _read_json(request))
+
+    started = time.perf_counter()
+    try:
+        async with state.admission.slot():
+            response = await state.agent.process_request_async(query)
+    except Overloaded:
+        return _overloaded()
+
+    return web.json_response({"response": response, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+
+async def handle_batch(request: web.Request) -> web.Response:
+    state = request.app[_state_key]
+    if state.draining:
+        return _error(503, "Service is shutting down")
+    body = await _read_json(request)
+
+    queries = body.get("queries")
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return _error(400, "'queries' must be a list of strings")
+    if len(queries) > MAX_BATCH_QUERIES:
+        return _error(413, f"At most {MAX_BATCH_QUERIES} queries per batch")
+    max_concurrency = body.get("max_concurrency", 8)
+    if not isinstance(max_concurrency, int) or max_concurrency < 1:
+        return _error(400, "'max_concurrency' must be a positive integer")
+
+    try:
+        # A batch takes one slot; its upstream calls queue behind interactive ones
+        async with state.admission.slot():
+            result = await state.agent.process_batch_async(queries, max_concurrency)
+    except Overloaded:
+        return _overloaded()
+
+    return web.json_response({"responses": result.responses, "stats": result.stats})
+
+
+async def handle_stream(request: web.Request) -> web.StreamResponse:
+    state = request.app[_state_key]
+    if state.draining:
+        return _error(503, "Service is shutting down")
+    query = _query(await _read_json(request))
+
+    try:
+        async with state.admission.slot():
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+
+            sections = state.agent.process_request_stream_async(query)
+            try:
+                async for section in sections:
+                    line = json.dumps({"kind": section.kind, "text": section.text}) + "\n"
+                    await response.write(line.encode())
+            finally:
+                # Also stops the agent's work if the client went away
+                await sections.aclose()
+
+            await response.write_eof()
+            return response
+    except Overloaded:
+        return _overloaded()
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    state = request.app[_state_key]
+    admission = state.admission
+    return web.json_response({
+        "status": "draining" if state.draining else "ok",
+        "uptime_s": round(time.time() - state.started, 1),
+        "in_flight": admission.in_flight,
+        "queued": admission.queued,
+        "max_concurrency": admission.max_concurrency,
+        "max_queue": admission.max_queue,
+        **admission.counters,
+        "upstream": get_client().stats(),
+        "endpoints": get_client().endpoint_stats(),
+        "schedulers": scheduler_stats(),
+        "warming": get_warmer().stats()
+    }, status=503 if state.draining else 200)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=tracing.prometheus_text(), content_type="text/plain")
+
+
+async def _start_warming(app: web.Application):
+    get_warmer().start()
+
+
+async def _drain(app: web.Application):
+    state = app[_state_key]
+    state.draining = True
+    get_warmer().stop()
+    if not await state.admission.wait_idle(app[_shutdown_grace_key]):
+        print(f"Error during shutdown: {state.admission.in_flight} requests still in flight")
+
+
+async def _close_upstream(app: web.Application):
+    await get_client().close()
+
+
+def create_app(
+    agent: Optional[TourismAIAgent] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    max_queue: int = DEFAULT_MAX_QUEUE,
+    queue_timeout: float = DEFAULT_QUEUE_TIMEOUT,
+    shutdown_grace: float = DEFAULT_SHUTDOWN_GRACE
+) -> web.Application:
+    """
+    Build the service application
+
+    Args:
+        agent: Agent answering the queries, a new TourismAIAgent by default
+        max_concurrency: Requests processed at once
+        max_queue: Requests allowed to wait for a slot before new ones are shed
+        queue_timeout: Seconds a request may wait for a slot
+        shutdown_grace: Seconds to wait for requests in flight when shutting down
+
+    Returns:
+        aiohttp application, to be run with aiohttp.web or serve()
+    """
+    app = web.Application()
+    app[_state_key] = _ServiceState(agent or TourismAIAgent(), AdmissionControl(max_concurrency, max_queue, queue_timeout))
+    app[_shutdown_grace_key] = shutdown_grace
+
+    app.router.add_post("/query", handle_query)
+    app.router.add_post("/batch", handle_batch)
+    app.router.add_post("/stream", handle_stream)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+
+    app.on_startup.append(_start_warming)
+    app.on_shutdown.append(_drain)
+    app.on_cleanup.append(_close_upstream)
+    return app
+
+
+async def serve(app: web.Application, host: str, port: int, reuse_port: bool = False):
+    """
+    Serve until SIGTERM or SIGINT, then drain and shut down
+
+    Args:
+        app: Application from create_app
+        host: Address to listen on
+        port: Port to listen on, 0 picks a free one
+        reuse_port: Let several service processes listen on the same port
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port, reuse_port=reuse_port or None).start()
+    # First line of output is the base URL, benchmarks read it
+    print(f"http://{host}:{runner.addresses[0][1]}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("TOURISM_SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("TOURISM_SERVICE_PORT", 8080)),
+                        help="Port to listen on, 0 picks a free one")
+    parser.add_argument("--max-concurrency", type=int,
+                        default=int(os.environ.get("TOURISM_SERVICE_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                        help="Requests processed at once")
+    parser.add_argument("--max-queue", type=int,
+                        default=int(os.environ.get("TOURISM_SERVICE_QUEUE", DEFAULT_MAX_QUEUE)),
+                        help="Requests waiting for a slot before new ones get 503")
+    parser.add_argument("--queue-timeout", type=float, default=DEFAULT_QUEUE_TIMEOUT,
+                        help="Seconds a request may wait for a slot")
+    parser.add_argument("--shutdown-grace", type=float, default=DEFAULT_SHUTDOWN_GRACE,
+                        help="Seconds to finish requests in flight on shutdown")
+    parser.add_argument("--upstream-connections", type=int,
+                        default=int(os.environ.get("TOURISM_SERVICE_UPSTREAM_CONNECTIONS", DEFAULT_UPSTREAM_CONNECTIONS)),
+                        help="Pooled connections per upstream host")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="Share the port with other service processes, the kernel balances connections")
+    args = parser.parse_args()
+
+    configure_client(limit_per_host=args.upstream_connections)
+
+    app = create_app(max_concurrency=args.max_concurrency, max_queue=args.max_queue,
+                     queue_timeout=args.queue_timeout, shutdown_grace=args.shutdown_grace)
+    asyncio.run(serve(app, args.host, args.port, args.reuse_port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Singleflight - Collapse concurrent identical upstream lookups into one call
+
+Callers that ask for the same key while a call is in flight wait for that
+call and share its result or error. The shared state is a
+concurrent.futures.Future, so thread callers and asyncio callers on any event
+loop can all wait on the same in-flight call. Async calls run in their own
+task, so a caller that gives up (its deadline passed, its client went away)
+does not cancel the call for the others. That task runs at the most urgent
+request priority among its callers, so an interactive request joining a
+prefetch call doesn't wait behind other prefetch work.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from scheduler import SharedPriority, current_priority, request_priority
+from tracing import annotate
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+class SingleFlight:
+    """
+    One group of coalesced calls, e.g. all geocoding lookups
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        # Priorities of in-flight async calls, by key
+        self._priorities = {}
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "executions": 0, "collapsed": 0}
+        # Running async calls, the event loop only keeps weak references to tasks
+        self._tasks = set()
+
+    def _join(self, key: Hashable, priority: Optional[SharedPriority] = None):
+        """
+        Return (future, leader): the in-flight future for key, and whether the
+        caller has to run the call itself
+
+        A leader's priority becomes the call's; a waiter's priority raises the
+        in-flight call's priority to its own.
+        """
+        with self._lock:
+            self._counters["calls"] += 1
+            future = self._calls.get(key)
+            if future is None:
+                future = Future()
+                # A running future can't be cancelled by a waiter giving up
+                future.set_running_or_notify_cancel()
+                self._calls[key] = future
+                if priority is not None:
+                    self._priorities[key] = priority
+                self._counters["executions"] += 1
+                return future, True
+
+            self._counters["collapsed"] += 1
+            shared = self._priorities.get(key)
+
+        if shared is not None and priority is not None:
+            shared.raise_to(priority.value)
+        return future, False
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            self._calls.pop(key, None)
+            self._priorities.pop(key, None)
+        if isinstance(error, asyncio.CancelledError):
+            # The call itself was cancelled (e.g. its event loop shut down), waiters just see a failed call
+            error = RuntimeError(f"{self.name} call for {key!r} was cancelled")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def do_async(self, key: Hashable, function: Callable[[], Awaitable]) -> Any:
+        """
+        Await function() unless an identical call is already in flight
+
+        Args:
+            key: Identity of the call
+            function: Coroutine function performing the upstream call
+
+        Returns:
+            The (possibly shared) result
+        """
+        priority = SharedPriority(current_priority())
+        future, leader = self._join(key, priority)
+        if leader:
+            # No caller, the first one included, can cancel the call for the others;
+            # the task's upstream requests queue at the call's shared priority
+            with request_priority(priority):
+                task = asyncio.ensure_future(self._run_async(key, future, function))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            annotate(coalesced=True)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def _run_async(self, key: Hashable, future: Future, function: Callable[[], Awaitable]):
+        # The outcome goes to future only, so nobody has to retrieve it from the task
+        try:
+            result = await function()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            return
+
+        self._finish(key, future, result)
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """
+        Call function() unless an identical call is already in flight (thread callers)
+
+        Args:
+            key: Identity of the call
+            function: Function performing the upstream call
+
+        Returns:
+            The (possibly shared) result
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+
+        self._finish(key, future, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Calls made, upstream executions and calls collapsed onto an in-flight one
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        stats["in_flight"] = len(self._calls)
+        return stats
+
+
+def get_group(name: str) -> SingleFlight:
+    """
+    Return the process-wide group with this name, creating it on first use
+    """
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
+
+
+def flight_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Coalescing counters of every group, keyed by group name
+    """
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
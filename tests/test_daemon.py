@@ -0,0 +1,46 @@
+import os
+import socket
+
+import pytest
+
+import daemon
+
+
+def test_default_socket_path(monkeypatch, tmp_path):
+    monkeypatch.delenv(daemon.SOCKET_ENV_VAR, raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert daemon.default_socket_path() == str(tmp_path / "tourism-ai.sock")
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert daemon.default_socket_path() == os.path.join(daemon._private_directory(), "daemon.sock")
+
+    monkeypatch.setenv(daemon.SOCKET_ENV_VAR, "/run/custom.sock")
+    assert daemon.default_socket_path() == "/run/custom.sock"
+
+
+def test_private_directory_must_be_closed_to_others(monkeypatch, tmp_path):
+    private = tmp_path / "private"
+    monkeypatch.setattr(daemon, "_private_directory", lambda: str(private))
+    daemon._prepare_directory(str(private / "daemon.sock"))
+    assert os.stat(private).st_mode & 0o777 == 0o700
+
+    os.chmod(private, 0o755)
+    with pytest.raises(SystemExit):
+        daemon._prepare_directory(str(private / "daemon.sock"))
+
+
+@pytest.mark.skipif(os.getuid() != 0, reason="changing a socket's owner needs root")
+def test_client_ignores_sockets_of_other_users(tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    try:
+        connection = daemon._connect(path, 1.0)
+        assert connection is not None
+        connection.close()
+
+        os.chown(path, 12345, -1)
+        assert daemon._connect(path, 1.0) is None
+    finally:
+        listener.close()
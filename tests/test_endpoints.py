@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+import endpoints
+from endpoints import FAILURE_THRESHOLD, CircuitBreaker, EndpointPool, endpoint_urls
+from scheduler import HostScheduler, set_scheduler
+from upstream import UpstreamClient
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=10)
+    for _ in range(2):
+        breaker.failed()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.failed()
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.trips == 1
+
+    # One probe once the open period is over
+    clock[0] += 10
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed probe opens it for twice as long
+    breaker.failed()
+    clock[0] += 10
+    assert breaker.state == "open"
+    clock[0] += 10
+    assert breaker.allow()
+
+    # A probe that lost a hedge race lets another one through, a successful one closes it
+    breaker.released()
+    assert breaker.allow()
+    breaker.succeeded()
+    assert breaker.state == "closed"
+    assert breaker.trips == 1
+
+
+def test_pool_skips_open_endpoints(clock):
+    pool = EndpointPool("overpass", ["https://a.example", "https://b.example"])
+    primary, mirror = pool.endpoints
+    assert (primary.scheduler_name, mirror.scheduler_name) == ("overpass", "overpass@b.example")
+    assert pool.start() == [primary, mirror]
+
+    for _ in range(FAILURE_THRESHOLD):
+        pool.failed(primary, RuntimeError("down"))
+    assert pool.start() == [mirror]
+
+    for _ in range(FAILURE_THRESHOLD):
+        pool.failed(mirror, RuntimeError("down"))
+    assert pool.start() == []
+    assert pool.stats()["rejected"] == 1
+
+
+def test_hedge_budget_and_delay(clock):
+    pool = EndpointPool("overpass", ["https://a.example", "https://b.example"], hedge_budget=0.5)
+    pool.start()
+    assert pool.take_hedge()
+    assert not pool.take_hedge()
+    pool.start()
+    pool.start()
+    assert pool.take_hedge()
+
+    assert pool.hedge_delay() == endpoints.DEFAULT_HEDGE_DELAY
+    for index in range(100):
+        pool.answered(pool.endpoints[0], 0.1, 0.2 + index / 100)
+    assert pool.hedge_delay() == pytest.approx(1.14)
+
+
+def test_endpoint_urls(monkeypatch):
+    defaults = ["https://a.example", "https://b.example"]
+    monkeypatch.delenv("TOURISM_OVERPASS_URLS", raising=False)
+    assert endpoint_urls("overpass", None, defaults) == defaults
+    assert endpoint_urls("overpass", "http://localhost:1", defaults) == ["http://localhost:1"]
+    monkeypatch.setenv("TOURISM_OVERPASS_URLS", " http://x , http://y,")
+    assert endpoint_urls("overpass", "http://localhost:1", defaults) == ["http://x", "http://y"]
+
+
+async def mirror(delay: float, status: int = 200):
+    async def handler(request):
+        await asyncio.sleep(delay)
+        if status != 200:
+            return web.Response(status=status)
+        return web.json_response({"served_by": request.host})
+
+    app = web.Application()
+    app.router.add_post("/api/interpreter", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+def hedged_request(monkeypatch, primary_delay: float, primary_status: int = 200):
+    monkeypatch.setattr(endpoints, "DEFAULT_HEDGE_DELAY", 0.1)
+
+    async def main():
+        primary, primary_url = await mirror(primary_delay, primary_status)
+        secondary, secondary_url = await mirror(0.0)
+        client = UpstreamClient(endpoints={"overpass": [primary_url, secondary_url]})
+        for endpoint in client.pools["overpass"].endpoints:
+            set_scheduler(endpoint.scheduler_name, HostScheduler(endpoint.scheduler_name, max_retries=0))
+        try:
+            started = time.perf_counter()
+            answer = await client.post_form("overpass", "/api/interpreter", {"data": "[out:json];"})
+            return answer, secondary_url, time.perf_counter() - started, client.endpoint_stats()["overpass"]
+        finally:
+            await client.close()
+            await primary.cleanup()
+            await secondary.cleanup()
+            for endpoint in client.pools["overpass"].endpoints:
+                set_scheduler(endpoint.scheduler_name, None)
+
+    return asyncio.run(main())
+
+
+def test_slow_endpoint_is_hedged(monkeypatch):
+    answer, secondary_url, elapsed, stats = hedged_request(monkeypatch, primary_delay=2.0)
+    assert secondary_url.endswith(answer["served_by"])
+    assert elapsed < 1.0
+    assert (stats["hedged"], stats["hedges_won"], stats["failovers"]) == (1, 1, 0)
+    assert stats["endpoints"][0]["cancelled"] == 1
+
+
+def test_failed_endpoint_fails_over_without_waiting(monkeypatch):
+    answer, secondary_url, elapsed, stats = hedged_request(monkeypatch, primary_delay=0.0, primary_status=500)
+    assert secondary_url.endswith(answer["served_by"])
+    assert (stats["hedged"], stats["failovers"]) == (0, 1)
+    assert stats["endpoints"][0]["failures"] == 1
@@ -0,0 +1,110 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from forecast import MISSING_CODE, HourlyForecast, describe_weather_code
+from query_parser import DateRange, QueryParser
+from weather_agent import format_forecast
+
+START = datetime.date(2026, 10, 17)
+
+
+def open_meteo(days, temperature, probability=0, precipitation=0.0, code=0, extra_hours=0):
+    """
+    One location of an Open-Meteo hourly answer, each variable a function of (day, hour)
+    """
+    hours = [(day, hour) for day in range(days) for hour in range(24)] + [(days, hour) for hour in range(extra_hours)]
+    value = lambda spec, day, hour: spec(day, hour) if callable(spec) else spec
+    return {"hourly": {
+        "time": [f"{START + datetime.timedelta(days=day)}T{hour:02d}:00" for day, hour in hours],
+        "temperature_2m": [value(temperature, day, hour) for day, hour in hours],
+        "precipitation_probability": [value(probability, day, hour) for day, hour in hours],
+        "precipitation": [value(precipitation, day, hour) for day, hour in hours],
+        "weather_code": [value(code, day, hour) for day, hour in hours],
+    }}
+
+
+def test_forecast_keeps_whole_days_in_typed_arrays():
+    forecast = HourlyForecast.from_open_meteo(open_meteo(3, 20.0, probability=None, extra_hours=5))
+    assert (forecast.start, forecast.days, forecast.end) == (START, 3, datetime.date(2026, 10, 19))
+    assert forecast.temperature.dtype == np.float32
+    assert forecast.weather_code.dtype == np.uint8
+    assert (forecast.precipitation_probability == MISSING_CODE).all()
+    assert forecast.nbytes == 72 * (4 + 1 + 4 + 1)
+
+    assert HourlyForecast.from_open_meteo({}) is None
+    assert HourlyForecast.from_open_meteo(open_meteo(0, 20.0, extra_hours=5)) is None
+
+
+def test_daily_summaries_and_best_day():
+    # Day 0 is warm but rains all afternoon, day 1 is dry and mild, day 2 is dry and cold
+    temperature = lambda day, hour: [26.0, 21.0, 8.0][day] + (2.0 if hour == 14 else 0.0)
+    probability = lambda day, hour: 80 if day == 0 and 12 <= hour < 18 else None
+    code = lambda day, hour: 61 if day == 0 and hour == 13 else (95 if hour == 2 else 1)
+    forecast = HourlyForecast.from_open_meteo(open_meteo(3, temperature, probability, code=code))
+
+    summary = forecast.summarize(START, START + datetime.timedelta(days=5))
+    assert [(day.low, day.high, day.rain_hours, day.weather_code) for day in summary.days] == [
+        (26.0, 28.0, 6, 61), (21.0, 23.0, 0, 1), (8.0, 10.0, 0, 1)
+    ]
+    assert summary.best_day == datetime.date(2026, 10, 18)
+    assert summary.covered_until == datetime.date(2026, 10, 19)
+
+    single = forecast.summarize(START, START)
+    assert (len(single.days), single.best_day) == (1, None)
+    assert forecast.summarize(START + datetime.timedelta(days=3), START + datetime.timedelta(days=4)).days == []
+
+
+def test_days_without_temperatures_are_never_best():
+    temperature = lambda day, hour: None if day == 0 else 30.0
+    summary = HourlyForecast.from_open_meteo(open_meteo(2, temperature)).summarize(
+        START, START + datetime.timedelta(days=1))
+    assert np.isnan(summary.days[0].high)
+    assert summary.best_day == datetime.date(2026, 10, 18)
+
+
+@pytest.mark.parametrize("code, description", [
+    (0, "clear"), (2, "partly cloudy"), (3, "cloudy"), (63, "rain"), (82, "rain showers"), (99, "thunderstorms")
+])
+def test_weather_codes(code, description):
+    assert describe_weather_code(code) == description
+
+
+def test_format_forecast():
+    forecast = HourlyForecast.from_open_meteo(open_meteo(2, lambda day, hour: 15.0 + day + hour / 10))
+    dates = DateRange(START, START + datetime.timedelta(days=3))
+    assert format_forecast("Paris", forecast, dates) == "\n".join([
+        "Here is the forecast for Paris from Sat 17 Oct to Sun 18 Oct:",
+        "- Sat 17 Oct: 15 to 17°C, clear, dry",
+        "- Sun 18 Oct: 16 to 18°C, clear, dry",
+        "Sun 18 Oct looks like the best day.",
+        "The forecast doesn't reach beyond Sun 18 Oct yet.",
+    ])
+
+    later = DateRange(datetime.date(2026, 11, 1), datetime.date(2026, 11, 2))
+    assert format_forecast("Paris", forecast, later) == (
+        "I can only forecast the weather in Paris from Sat 17 Oct to Sun 18 Oct, "
+        "so I can't tell you about Sun 01 Nov yet.")
+    assert "exists" in format_forecast("Atlantis", None, dates)
+
+
+@pytest.mark.parametrize("query, start, end", [
+    ("weather in Paris tomorrow", "2026-10-18", "2026-10-18"),
+    ("Paris this weekend", "2026-10-17", "2026-10-18"),
+    ("Visit Goa next weekend", "2026-10-24", "2026-10-25"),
+    ("Rome from Friday to Sunday", "2026-10-23", "2026-10-25"),
+    ("Paris next week", "2026-10-19", "2026-10-25"),
+    ("weather in Paris from June 3 to 7", "2027-06-03", "2027-06-07"),
+    ("a 3 day trip to Goa from 2026-11-02", "2026-11-02", "2026-11-04"),
+    ("weather in Delhi for the next 5 days", "2026-10-17", "2026-10-21"),
+])
+def test_date_ranges(query, start, end):
+    assert QueryParser(cache_size=0).date_range(query, START) == DateRange(
+        datetime.date.fromisoformat(start), datetime.date.fromisoformat(end))
+
+
+def test_a_length_alone_starts_today():
+    parser = QueryParser(cache_size=0)
+    assert parser.date_range("a week in Rome", START) == DateRange(START, datetime.date(2026, 10, 23))
+    assert parser.date_range("weather in Paris", START) is None
@@ -0,0 +1,80 @@
+import itertools
+
+import pytest
+
+from gazetteer import Gazetteer, build_gazetteer, normalize_name
+
+CITIES = [
+    # name, ascii name, alternate names, lat, lon, country, population
+    ("Paris", "Paris", "Lutetia,Parigi", 48.85341, 2.3488, "FR", 2138551),
+    ("Paris", "Paris", "", 33.66094, -95.55551, "US", 24782),
+    ("São Paulo", "Sao Paulo", "Sampa", -23.5475, -46.63611, "BR", 10021295),
+    ("Bengaluru", "Bengaluru", "Bangalore", 12.97194, 77.59369, "IN", 5104047),
+    ("Bangor", "Bangor", "", 54.65338, -5.66895, "GB", 20000),
+    ("Parma", "Parma", "", 44.79935, 10.32618, "IT", 146299),
+]
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    source = tmp_path / "cities.txt"
+    rows = []
+    for geoname_id, (name, ascii_name, alternate, lat, lon, country, population) in enumerate(CITIES):
+        fields = [str(geoname_id), name, ascii_name, alternate, str(lat), str(lon), "P", "PPL", country,
+                  "", "", "", "", "", str(population), "", "", "UTC", "2024-01-01"]
+        rows.append("\t".join(fields))
+    source.write_text("\n".join(rows) + "\n", encoding="utf-8")
+    path = str(tmp_path / "gazetteer.idx")
+    assert build_gazetteer(str(source), path) == len(CITIES)
+
+    index = Gazetteer(path)
+    yield index
+    index.close()
+
+
+def levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(b, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (char != other))
+    return row[-1]
+
+
+def test_normalize_name():
+    assert normalize_name("  São-Paulo!! ") == "sao paulo"
+    assert normalize_name("Zürich") == "zurich"
+
+
+def test_exact_lookup_prefers_the_most_populous_city(gazetteer):
+    assert gazetteer.exact("paris")["display_name"] == "Paris, FR"
+    assert gazetteer.exact("Sao  Paulo")["display_name"] == "São Paulo, BR"
+    assert gazetteer.exact("Bangalore")["display_name"] == "Bengaluru, IN"
+    assert gazetteer.exact("Atlantis") is None
+
+
+def test_complete_prefix(gazetteer):
+    assert [city["display_name"] for city in gazetteer.complete("par")] == ["Paris, FR", "Parma, IT", "Paris, US"]
+    assert [city["display_name"] for city in gazetteer.complete("par", limit=1)] == ["Paris, FR"]
+
+
+def test_fuzzy_matches_every_key_within_the_distance(gazetteer):
+    keys = [gazetteer.keys[index].decode("ascii") for index in range(len(gazetteer.keys))]
+    for query, max_distance in itertools.product(["bangalre", "parsi", "sao paolo", "lutetsia", "bang"], [1, 2]):
+        # Brute force: the cities of every key within the distance
+        expected = {
+            gazetteer.city(city_id)["display_name"]
+            for index, key in enumerate(keys) if levenshtein(query, key) <= max_distance
+            for city_id in gazetteer._cities(index)
+        }
+        found = [city["display_name"] for _, city in gazetteer.fuzzy(query, max_distance)]
+        assert sorted(found) == sorted(expected)
+
+
+def test_typo_match_skips_small_places(gazetteer):
+    assert gazetteer.typo_match("Bangalor")["display_name"] == "Bengaluru, IN"
+    # One typo away from Bangor too, which is too small to be trusted
+    assert gazetteer.typo_match("Bangorr") is None
+    assert gazetteer.lookup("Pariss")["display_name"] == "Paris, FR"
+    # A swap of two letters is two edits, more than a five-letter name tolerates
+    assert gazetteer.lookup("Parsi") is None
@@ -0,0 +1,35 @@
+import sqlite3
+import time
+
+from geocode_cache import MISSING, SQLiteStore
+
+
+def test_disk_store_stays_bounded_without_counting_every_write(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"), max_entries=500)
+    counts = []
+    store._conn.set_trace_callback(lambda statement: counts.append(statement) if "COUNT(*)" in statement else None)
+
+    expires_at = time.time() + 3600
+    for i in range(2000):
+        store.set(f"place {i}", {"lat": i}, expires_at + i)
+    # Replacing an existing key doesn't grow the store
+    store.set("place 1999", {"lat": -1}, expires_at + 1999)
+
+    rows = sqlite3.connect(str(tmp_path / "cache.sqlite3")).execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+    assert rows == store._rows <= 500
+    assert store.evictions == 2000 - rows
+    # Only the recount before each eviction, which frees 1% more than needed
+    assert 0 < len(counts) <= 1500 // 5
+    # The entries closest to expiry went first
+    assert store.get("place 0") == (MISSING, 0.0)
+    assert store.get("place 1999")[0] == {"lat": -1}
+
+
+def test_row_count_is_loaded_at_open(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    store = SQLiteStore(path, max_entries=10)
+    for i in range(5):
+        store.set(f"place {i}", None, time.time() + 60)
+    store.close()
+
+    assert SQLiteStore(path, max_entries=10)._rows == 5
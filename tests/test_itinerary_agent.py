@@ -0,0 +1,84 @@
+import numpy as np
+
+from itinerary_agent import ItineraryDay, cluster_days, distance_matrix, format_itinerary, order_stops, plan_days
+from ranking import Attraction
+
+CENTER = (48.8566, 2.3522)
+
+
+def route_length(matrix, route):
+    return float(sum(matrix[a, b] for a, b in zip(route, route[1:])))
+
+
+def test_stops_on_a_line_are_visited_in_order():
+    rng = np.random.default_rng(1)
+    offsets = rng.permutation(np.arange(1, 9)) * 0.01
+    lats = np.concatenate(([CENTER[0]], CENTER[0] + offsets))
+    lons = np.full(len(lats), CENTER[1])
+    route = order_stops(distance_matrix(lats, lons))
+    assert [round(offsets[node - 1] * 100) for node in route[1:]] == list(range(1, 9))
+
+
+def test_route_is_two_opt_optimal():
+    rng = np.random.default_rng(7)
+    lats = CENTER[0] + rng.uniform(-0.05, 0.05, 40)
+    lons = CENTER[1] + rng.uniform(-0.05, 0.05, 40)
+    matrix = distance_matrix(lats, lons)
+    route = order_stops(matrix)
+    assert route[0] == 0
+    assert sorted(route) == list(range(40))
+
+    # No segment reversal (open route, node 0 fixed) shortens it
+    length = route_length(matrix, route)
+    for i in range(1, 39):
+        for j in range(i + 1, 40):
+            candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+            assert route_length(matrix, candidate) >= length - 1e-3
+
+    # And it beats the nearest-neighbour tour 2-opt starts from
+    unvisited = set(range(1, 40))
+    tour = [0]
+    while unvisited:
+        tour.append(min(unvisited, key=lambda node: matrix[tour[-1], node]))
+        unvisited.remove(tour[-1])
+    assert length <= route_length(matrix, tour)
+
+
+def test_days_are_balanced_and_compact():
+    rng = np.random.default_rng(3)
+    # Two neighbourhoods 10km apart, six stops each
+    lats = np.concatenate((CENTER[0] + rng.normal(0, 0.003, 6), CENTER[0] + 0.09 + rng.normal(0, 0.003, 6)))
+    lons = np.concatenate((CENTER[1] + rng.normal(0, 0.003, 6), CENTER[1] + rng.normal(0, 0.003, 6)))
+    labels = cluster_days(lats, lons, 2)
+    assert len(set(labels[:6].tolist())) == 1
+    assert len(set(labels[6:].tolist())) == 1
+    assert labels[0] != labels[6]
+
+    # Capacity keeps days even when one neighbourhood has most stops
+    labels = cluster_days(lats[:9], lons[:9], 3)
+    assert sorted(np.bincount(labels).tolist()) == [3, 3, 3]
+
+
+def test_plan_visits_every_attraction_once():
+    rng = np.random.default_rng(5)
+    attractions = [
+        Attraction(f"Stop {i}", CENTER[0] + lat, CENTER[1] + lon)
+        for i, (lat, lon) in enumerate(rng.uniform(-0.04, 0.04, (12, 2)))
+    ]
+    plan = plan_days(*CENTER, attractions, 3)
+    assert len(plan) == 3
+    assert sorted(stop.name for day in plan for stop in day.stops) == sorted(attraction.name for attraction in attractions)
+    assert all(day.distance_m > 0 for day in plan)
+    assert plan_days(*CENTER, [], 3) == []
+
+
+def test_format_itinerary():
+    louvre = Attraction("Louvre", 48.8606, 2.3376)
+    orsay = Attraction("Orsay", 48.86, 2.3266)
+    assert format_itinerary("Paris", [ItineraryDay([louvre, orsay], 1200.0)]) == (
+        "Here is a plan for your day in Paris:\n- Louvre\n- Orsay"
+    )
+    assert format_itinerary("Paris", [ItineraryDay([louvre], 1500.0), ItineraryDay([orsay], 2500.0)]) == (
+        "Here is a 2-day plan for Paris:\nDay 1 (about 1.5 km):\n- Louvre\nDay 2 (about 2.5 km):\n- Orsay"
+    )
+    assert "exists" in format_itinerary("Atlantis", None)
@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+from poi_index import POIIndex, build_region
+
+BOUNDING_BOX = (12.0, 77.0, 14.0, 78.0)
+
+
+def build(tmp_path, prefix):
+    dump = tmp_path / f"{prefix}.json"
+    dump.write_text(json.dumps({"elements": [
+        {"type": "node", "id": i, "lat": 12.9 + i * 0.001, "lon": 77.5,
+         "tags": {"tourism": "museum", "name": f"{prefix} {i}"}}
+        for i in range(20)
+    ]}))
+    build_region("city", [str(dump)], str(tmp_path / "index"), BOUNDING_BOX)
+
+
+def rebuild(tmp_path, prefix):
+    build(tmp_path, prefix)
+    path = tmp_path / "index" / os.listdir(tmp_path / "index")[0]
+    os.utime(path, (os.path.getatime(path), os.path.getmtime(path) + 10))
+
+
+def test_rebuilt_region_is_picked_up_while_old_readers_finish(tmp_path):
+    build(tmp_path, "Old")
+    index = POIIndex(str(tmp_path / "index"), check_interval=0.01)
+    reader = index.nearest(12.9, 77.5, 5000)
+    assert next(reader)["name"] == "Old 0"
+
+    rebuild(tmp_path, "New")
+    time.sleep(0.02)
+
+    assert next(index.nearest(12.9, 77.5, 5000))["name"] == "New 0"
+    assert [feature["name"] for feature in reader][:2] == ["Old 1", "Old 2"]
+
+
+def test_removed_region_is_dropped(tmp_path):
+    build(tmp_path, "Old")
+    index = POIIndex(str(tmp_path / "index"), check_interval=0.01)
+    assert index.nearest(12.9, 77.5, 5000) is not None
+
+    for filename in os.listdir(tmp_path / "index"):
+        os.remove(tmp_path / "index" / filename)
+    time.sleep(0.02)
+
+    assert index.nearest(12.9, 77.5, 5000) is None
+
+
+def test_replaced_region_is_closed_after_its_last_reader(tmp_path):
+    build(tmp_path, "Old")
+    index = POIIndex(str(tmp_path / "index"), check_interval=0)
+    old = index.regions["city"]
+    started = index.nearest(12.9, 77.5, 5000)
+    next(started)
+    unstarted = index.nearest(12.9, 77.5, 5000)
+
+    rebuild(tmp_path, "New")
+    index.reload()
+    assert index.regions["city"] is not old
+
+    unstarted.close()
+    assert not old.closed
+    assert len(list(started)) == 19
+    assert old.closed
+
+
+def test_idle_region_is_closed_when_replaced(tmp_path):
+    build(tmp_path, "Old")
+    index = POIIndex(str(tmp_path / "index"), check_interval=0)
+    old = index.regions["city"]
+    next(index.nearest(12.9, 77.5, 5000))
+
+    rebuild(tmp_path, "New")
+    index.reload()
+    assert old.closed
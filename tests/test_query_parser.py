@@ -0,0 +1,103 @@
+import datetime
+import random
+
+import pytest
+
+from query_parser import DateRange, QueryParser, cut_dates, strip_dates
+
+# Words and separators exercising the triggers, end words and punctuation the place patterns look at
+PIECES = [
+    "going", "to", "visit", "visiting", "revisit", "trip", "travel", "heading", "am", "in", "rain", "berlin",
+    "what", "whatever", "where", "when", "let", "let's", "us", "plan", "planet", "conditions", "it", "italy",
+    "the", "there", "temperature", "and", "android", "is", "can", "Paris", "paris", "NEW", "York", "I", "x",
+    ",", ".", "?", "'", "3", "Kraków", "weather", "tomorrow", "june", "Rome,", "Rome.", "Rome?", ",what", "in,"
+]
+SEPARATORS = [" ", " ", " ", "  ", "\t", "\n", ", ", " , ", ""]
+
+
+def fuzzed_queries(count, seed=5):
+    rng = random.Random(seed)
+    for _ in range(count):
+        words = [rng.choice(PIECES) for _ in range(rng.randint(1, 7))]
+        query = "".join(word + rng.choice(SEPARATORS) for word in words)
+        yield query.rstrip() if rng.random() < 0.3 else query
+
+
+def test_tokenizer_finds_the_place_the_patterns_find():
+    parser = QueryParser(cache_size=0)
+    for query in fuzzed_queries(20000):
+        text = cut_dates(query)
+        text_lower = text.lower()
+        expected = parser._place_span(text, text_lower)
+        assert parser._place_in_words(text, text_lower, parser._tokenize(text_lower), True) == expected, query
+
+
+def test_tokenizer_intent_flags_match_the_keyword_search():
+    parser = QueryParser(cache_size=0)
+    for query in fuzzed_queries(5000):
+        intent = parser.intent(query)
+        weather = parser._weather.search(query.lower()) is not None
+        places = parser._places.search(query.lower()) is not None
+        assert (intent["weather"], intent["places"]) == (weather, places or not weather), query
+
+
+@pytest.mark.parametrize("query, place_name", [
+    ("I'm going to go to Bangalore, let's plan my trip.", "Go to Bangalore"),
+    ("What is the weather in Paris?", "Paris"),
+    ("Visit Kraków.", "Kraków"),
+    ("Zürich weather", None),
+    ("I  what", "I"),
+    ("things to do in new york", "New York"),
+])
+def test_place_names(query, place_name):
+    assert QueryParser(cache_size=0).place_name(query) == place_name
+
+
+def test_word_table_is_bounded(monkeypatch):
+    monkeypatch.setattr("query_parser.MAX_CLASSIFIED_WORDS", 10)
+    parser = QueryParser(cache_size=0)
+    for i in range(50):
+        parser.parse(f"weather in place{i} and town{i}")
+    assert len(parser._classified) <= 10
+
+
+@pytest.mark.parametrize("query, place_names", [
+    ("Visit Bosnia and Herzegovina", ("Bosnia and Herzegovina",)),
+    ("I'm going to Trinidad and Tobago next week", ("Trinidad and Tobago",)),
+    ("weather in antigua and barbuda", ("Antigua and Barbuda",)),
+    ("Visit Paris and Bosnia and Herzegovina", ("Paris", "Bosnia and Herzegovina")),
+    ("Visit Trinidad and Tobago and Barbados", ("Trinidad and Tobago", "Barbados")),
+    ("Visit Paris and Rome", ("Paris", "Rome")),
+])
+def test_names_containing_and_are_one_destination(query, place_names):
+    assert QueryParser(cache_size=0).place_names(query) == list(place_names)
+
+
+@pytest.mark.parametrize("query, place_name, forecast", [
+    ("weather in Sunday Island", "Sunday Island", False),
+    ("I'm going to Tonight Town", "Tonight Town", False),
+    ("going to Tonight Town tomorrow", "Tonight Town", True),
+    ("weather in Sunday Island on Friday", "Sunday Island", True),
+    ("I'm going to Paris from June 3 to 7, weather?", "Paris", True),
+    ("weather in Paris tomorrow morning", "Paris", True),
+    ("Visit Goa next weekend", "Goa", True),
+])
+def test_place_names_containing_date_words(query, place_name, forecast):
+    parsed = QueryParser(cache_size=0).parse(query)
+    assert parsed.place_name == place_name
+    assert parsed.intent["forecast"] == forecast
+
+
+def test_only_dates_at_the_end_are_stripped_from_a_place_name():
+    assert strip_dates("Goa Next Weekend") == "Goa"
+    assert strip_dates("Paris From June 3 To 7") == "Paris"
+    assert strip_dates("Sunday Island") == "Sunday Island"
+    assert strip_dates("Sunday Island Tomorrow") == "Sunday Island"
+
+
+def test_date_words_in_a_place_name_are_not_a_date_range():
+    parser = QueryParser(cache_size=0)
+    assert parser.date_range("weather in Sunday Island") is None
+    assert parser.date_range("weather in Sunday Island on Friday", datetime.date(2026, 10, 17)) == DateRange(
+        datetime.date(2026, 10, 23), datetime.date(2026, 10, 23)
+    )
@@ -0,0 +1,57 @@
+import asyncio
+
+import places_agent
+from ranking import OTHER_SCORE_LIMIT, CandidateSet, is_notable
+
+CENTER = (48.8566, 2.3522)
+
+
+def candidates(*features):
+    candidate_set = CandidateSet()
+    for name, offset, tags in features:
+        candidate_set.add(name, CENTER[0] + offset, CENTER[1], dict(tags, name=name))
+    return candidate_set
+
+
+def test_notable_features():
+    assert is_notable({"tourism": "museum"})
+    assert is_notable({"leisure": "park", "historic": "castle"})
+    assert is_notable({"tourism": "hotel", "wikidata": "Q1"})
+    assert not is_notable({"tourism": "artwork"})
+    assert not is_notable({"leisure": "park"})
+
+
+def test_top_attractions_above_needs_limit_results_beating_the_floor():
+    near = candidates(("Louvre", 0.0, {"tourism": "museum"}), ("Orsay", 0.001, {"tourism": "museum"}))
+    assert [attraction.name for attraction in near.top_attractions_above(*CENTER, 2, OTHER_SCORE_LIMIT)] == [
+        "Louvre", "Orsay"
+    ]
+    # Too few candidates, or a far away one that a nearby park could outrank
+    assert near.top_attractions_above(*CENTER, 3, OTHER_SCORE_LIMIT) is None
+    far = candidates(("Louvre", 0.0, {"tourism": "museum"}), ("Versailles", 0.15, {"tourism": "museum"}))
+    assert far.top_attractions_above(*CENTER, 2, OTHER_SCORE_LIMIT) is None
+
+
+def test_fetch_falls_back_to_every_named_feature(monkeypatch):
+    features = [
+        ("Louvre", 0.0, {"tourism": "museum"}),
+        ("Versailles", 0.15, {"tourism": "museum"}),
+        ("Tuileries", 0.002, {"leisure": "park"}),
+    ]
+    queries = []
+
+    async def read_candidates(query, current):
+        notable_only = '["wikidata"]' in query
+        queries.append(notable_only)
+        return candidates(*(feature for feature in features if not notable_only or is_notable(feature[2])))
+
+    monkeypatch.setattr(places_agent, "_read_candidates", read_candidates)
+    attractions = asyncio.run(places_agent._fetch_attractions(*CENTER, 2))
+    assert [attraction.name for attraction in attractions] == ["Louvre", "Tuileries"]
+    assert queries == [True, False]
+
+    queries.clear()
+    features[1] = ("Orsay", 0.001, {"tourism": "museum"})
+    attractions = asyncio.run(places_agent._fetch_attractions(*CENTER, 2))
+    assert [attraction.name for attraction in attractions] == ["Louvre", "Orsay"]
+    assert queries == [True]
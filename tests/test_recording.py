@@ -0,0 +1,107 @@
+import asyncio
+import gzip
+
+import pytest
+from aiohttp import web
+
+from benchmarks.replay_server import ReplayUpstreams
+from recording import Recorder, read_recording, request_key, set_recorder
+from scheduler import HostScheduler, set_scheduler
+from upstream import UpstreamClient, UpstreamError
+
+
+def test_request_key_ignores_field_order_and_types():
+    assert request_key("get", "/search", {"q": "Paris", "limit": 1}) == request_key(
+        "GET", "/search", {"limit": "1", "q": "Paris"})
+    assert request_key("GET", "/search", None) == request_key("GET", "/search", {})
+    assert request_key("GET", "/search", {"q": "Paris"}) != request_key("POST", "/search", {"q": "Paris"})
+
+
+def test_recorders_append_gzip_members(tmp_path):
+    path = str(tmp_path / "traffic" / "recording.jsonl.gz")
+    Recorder(None).query("unrecorded", "", 0.0, 0.0)
+    assert not (tmp_path / "traffic").exists()
+
+    for query in ["weather in Paris", "visit Rome"]:
+        recorder = Recorder(path)
+        recorder.query(query, "answer", 1700000000.0, 0.25)
+        recorder.upstream("nominatim", "GET", "/search", {"q": query, "limit": 1}, 200, b'[{"lat": "1"}]',
+                          1700000000.0, 0.1)
+        recorder.close()
+    assert recorder.stats() == {"queries": 1, "upstream": 1, "path": path}
+
+    with gzip.open(path, "rt") as f:
+        assert len(f.read().splitlines()) == 4
+    events = list(read_recording(path))
+    assert [event["kind"] for event in events] == ["query", "upstream", "query", "upstream"]
+    assert events[0] == {"kind": "query", "ts": 1700000000.0, "query": "weather in Paris", "response": "answer",
+                         "elapsed_ms": 250.0}
+    assert events[3]["fields"] == {"q": "visit Rome", "limit": "1"}
+    assert events[3]["body"] == '[{"lat": "1"}]'
+
+
+@pytest.fixture
+def nominatim():
+    set_scheduler("nominatim", HostScheduler("nominatim", max_retries=0))
+    yield
+    set_scheduler("nominatim", None)
+    set_recorder(None)
+
+
+async def origin():
+    served = []
+
+    async def search(request):
+        if request.query["q"] == "Atlantis":
+            return web.Response(status=404)
+        served.append(request.query["q"])
+        return web.json_response([{"name": request.query["q"], "answer": len(served)}])
+
+    app = web.Application()
+    app.router.add_get("/search", search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+def test_recorded_exchanges_are_replayed(nominatim, tmp_path):
+    path = str(tmp_path / "recording.jsonl.gz")
+
+    async def record():
+        runner, url = await origin()
+        client = UpstreamClient(base_urls={"nominatim": url})
+        set_recorder(Recorder(path))
+        try:
+            answers = [await client.get_json("nominatim", "/search", {"q": "Paris"}) for _ in range(2)]
+            with pytest.raises(UpstreamError):
+                await client.get_json("nominatim", "/search", {"q": "Atlantis"})
+            return answers
+        finally:
+            set_recorder(None)
+            await client.close()
+            await runner.cleanup()
+
+    async def replay():
+        server = ReplayUpstreams(path, latency_scale=0)
+        client = UpstreamClient(base_urls={"nominatim": await server.start()})
+        try:
+            # Answers to the same request come back in recorded order, then the last one repeats
+            answers = [await client.get_json("nominatim", "/search", {"q": "Paris"}) for _ in range(3)]
+            for query in ["Atlantis", "Rome"]:
+                with pytest.raises(UpstreamError) as error:
+                    await client.get_json("nominatim", "/search", {"q": query})
+                assert error.value.status == 404
+            return server.exchanges, answers, server.counters["nominatim"]
+        finally:
+            await client.close()
+            await server.stop()
+
+    recorded = asyncio.run(record())
+    assert [event["status"] for event in read_recording(path)] == [200, 200, 404]
+
+    exchanges, replayed, counters = asyncio.run(replay())
+    assert exchanges == 3
+    assert replayed == recorded + recorded[-1:]
+    assert (counters["requests"], counters["errors"], counters["misses"]) == (5, 1, 1)
+    assert counters["bytes"] > 0
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+from scheduler import BATCH, INTERACTIVE, PREFETCH, HostScheduler, TokenBucket, parse_retry_after, request_priority
+
+
+def test_queued_calls_start_in_priority_order():
+    scheduler = HostScheduler("test", max_concurrent=1)
+    started = []
+
+    async def call(label, priority):
+        with request_priority(priority):
+            async with scheduler.slot():
+                started.append(label)
+
+    async def main():
+        released = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot():
+                await released.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        calls = [
+            asyncio.ensure_future(call("prefetch", PREFETCH)),
+            asyncio.ensure_future(call("batch 1", BATCH)),
+            asyncio.ensure_future(call("interactive", INTERACTIVE)),
+            asyncio.ensure_future(call("batch 2", BATCH)),
+        ]
+        while scheduler.stats()["queue_length"] < 4:
+            await asyncio.sleep(0)
+        released.set()
+        await asyncio.gather(holder, *calls)
+
+    asyncio.run(main())
+    # Same priority keeps arrival order
+    assert started == ["interactive", "batch 1", "batch 2", "prefetch"]
+
+
+def test_cancelled_waiter_does_not_block_the_queue():
+    scheduler = HostScheduler("test", max_concurrent=1)
+
+    async def main():
+        released = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot():
+                await released.wait()
+
+        async def call():
+            async with scheduler.slot():
+                return "done"
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        given_up = asyncio.ensure_future(call())
+        waiting = asyncio.ensure_future(call())
+        await asyncio.sleep(0)
+        given_up.cancel()
+        released.set()
+        await holder
+        return await asyncio.wait_for(waiting, 1.0)
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_token_bucket_spaces_out_calls():
+    bucket = TokenBucket(rate=10.0, burst=2)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.take(now)
+    assert abs(bucket.wait_time(now) - 0.1) < 1e-9
+    assert bucket.wait_time(now + 0.1) == 0.0
+
+    scheduler = HostScheduler("test", rate=20.0, burst=1)
+
+    async def main():
+        async def call():
+            async with scheduler.slot():
+                return time.monotonic()
+
+        return await asyncio.gather(*(call() for _ in range(4)))
+
+    started = asyncio.run(main())
+    assert started[-1] - started[0] >= 3 / 20 - 0.01
+
+
+def test_retry_after_and_backoff():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert 55 <= parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+    scheduler = HostScheduler("test", base_backoff=1.0, max_backoff=4.0)
+    assert scheduler.throttled(retry_after=30) == 4.0
+    # Jittered exponential backoff: each failure doubles the ceiling, up to max_backoff
+    delays = [scheduler.throttled() for _ in range(3)]
+    assert 1.0 <= delays[0] <= 2.0
+    assert all(2.0 <= delay <= 4.0 for delay in delays[1:])
+    assert scheduler.stats()["paused_s"] > 0
+
+    scheduler.succeeded()
+    assert 0.5 <= scheduler.throttled() <= 1.0
@@ -0,0 +1,116 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import service
+from service import AdmissionControl, Overloaded, create_app
+from tourism_ai_agent import ResponseSection
+from warming import CacheWarmer
+
+
+class SlowAgent:
+    """
+    Stand-in agent answering every query after a delay
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    async def process_request_async(self, query):
+        await asyncio.sleep(self.delay)
+        return f"answer to {query}"
+
+    async def process_request_stream_async(self, query):
+        yield ResponseSection("weather", "Sunny.")
+        await asyncio.sleep(self.delay)
+        yield ResponseSection("answer", f"answer to {query}")
+
+
+@pytest.fixture(autouse=True)
+def no_warming(monkeypatch):
+    warmer = CacheWarmer(seeds=[], enabled=False)
+    monkeypatch.setattr(service, "get_warmer", lambda: warmer)
+
+
+async def started(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+def test_query_and_stream_endpoints():
+    async def main():
+        runner, url = await started(create_app(SlowAgent()))
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(f"{url}/query", json={"query": " Paris "}) as response:
+                    answer = (response.status, await response.json())
+                async with session.post(f"{url}/query", data="not json") as response:
+                    invalid = response.status
+                async with session.post(f"{url}/query", json={"query": ""}) as response:
+                    empty = response.status
+                async with session.post(f"{url}/stream", json={"query": "Paris"}) as response:
+                    lines = [line async for line in response.content]
+        finally:
+            await runner.cleanup()
+        return answer, invalid, empty, lines
+
+    answer, invalid, empty, lines = asyncio.run(main())
+    assert answer[0] == 200
+    assert answer[1]["response"] == "answer to Paris"
+    assert (invalid, empty) == (400, 400)
+    assert lines == [b'{"kind": "weather", "text": "Sunny."}\n', b'{"kind": "answer", "text": "answer to Paris"}\n']
+
+
+def test_requests_beyond_the_queue_are_shed():
+    async def main():
+        app = create_app(SlowAgent(0.2), max_concurrency=1, max_queue=1)
+        runner, url = await started(app)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async def query():
+                    async with session.post(f"{url}/query", json={"query": "Paris"}) as response:
+                        return response.status, response.headers.get("Retry-After")
+
+                return await asyncio.gather(*(query() for _ in range(3)))
+        finally:
+            await runner.cleanup()
+
+    results = sorted(asyncio.run(main()))
+    assert results == [(200, None), (200, None), (503, "1")]
+
+
+def test_admission_sheds_after_the_queue_timeout():
+    async def main():
+        admission = AdmissionControl(max_concurrency=1, max_queue=10, queue_timeout=0.05)
+        async with admission.slot():
+            with pytest.raises(Overloaded):
+                async with admission.slot():
+                    pass
+            assert not await admission.wait_idle(0.01)
+        assert await admission.wait_idle(0.01)
+        return admission.counters
+
+    assert asyncio.run(main()) == {"admitted": 1, "shed": 1, "completed": 1}
+
+
+def test_shutdown_finishes_requests_in_flight():
+    async def main():
+        runner, url = await started(create_app(SlowAgent(0.3)))
+        async with aiohttp.ClientSession() as session:
+            async def query():
+                async with session.post(f"{url}/query", json={"query": "Paris"}) as response:
+                    return response.status, await response.json()
+
+            in_flight = asyncio.ensure_future(query())
+            await asyncio.sleep(0.1)
+            await runner.cleanup()
+            return await in_flight
+
+    status, body = asyncio.run(main())
+    assert status == 200
+    assert body["response"] == "answer to Paris"
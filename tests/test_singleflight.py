@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from scheduler import BATCH, PREFETCH, HostScheduler, request_priority
+from singleflight import SingleFlight
+
+
+def test_waiters_share_one_call():
+    group = SingleFlight("test")
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(group.do_async("key", lookup) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["result"] * 5
+    assert len(calls) == 1
+    assert group.stats() == {"calls": 5, "executions": 1, "collapsed": 4, "in_flight": 0}
+
+
+def test_first_caller_giving_up_does_not_fail_the_others():
+    group = SingleFlight("test")
+
+    async def lookup():
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def main():
+        # The first caller starts the call, then its deadline passes
+        first = asyncio.ensure_future(asyncio.wait_for(group.do_async("key", lookup), 0.02))
+        while not group.stats()["in_flight"]:
+            await asyncio.sleep(0)
+        second = asyncio.ensure_future(group.do_async("key", lookup))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, asyncio.TimeoutError)
+    assert second == "result"
+    assert group.stats()["executions"] == 1
+
+
+def test_errors_are_shared():
+    group = SingleFlight("test")
+
+    async def lookup():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(*(group.do_async("key", lookup) for _ in range(2)), return_exceptions=True)
+
+    assert [type(error) for error in asyncio.run(main())] == [ValueError, ValueError]
+
+
+def test_thread_callers():
+    group = SingleFlight("test")
+    assert group.do("key", lambda: 42) == 42
+    with pytest.raises(ZeroDivisionError):
+        group.do("key", lambda: 1 / 0)
+
+
+def test_shared_call_runs_at_its_most_urgent_callers_priority():
+    group = SingleFlight("test")
+    scheduler = HostScheduler("test", max_concurrent=1)
+    started = []
+
+    async def upstream(label):
+        async with scheduler.slot():
+            started.append(label)
+
+    async def main():
+        released = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot():
+                await released.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with request_priority(PREFETCH):
+            prefetch = asyncio.ensure_future(group.do_async("key", lambda: upstream("shared")))
+        with request_priority(BATCH):
+            batch = asyncio.ensure_future(upstream("batch"))
+        while scheduler.stats()["queue_length"] < 2:
+            await asyncio.sleep(0)
+
+        # An interactive request joins the prefetch call while it is queued
+        interactive = asyncio.ensure_future(group.do_async("key", lambda: upstream("duplicate")))
+        await asyncio.sleep(0)
+        released.set()
+        await asyncio.gather(holder, prefetch, batch, interactive)
+
+    asyncio.run(main())
+    assert started == ["shared", "batch"]
@@ -0,0 +1,73 @@
+import asyncio
+import random
+
+import pytest
+
+from benchmarks.end_to_end import make_queries, percentile
+from benchmarks.stub_servers import Latency, ServiceProfile, StubUpstreams, parse_latency
+from scheduler import HostScheduler, set_scheduler
+from upstream import UpstreamClient, UpstreamError
+
+
+def test_latency_specs():
+    rng = random.Random(1)
+    assert parse_latency("fixed:50").sample(rng) == 0.05
+    assert all(0.04 <= parse_latency("uniform:50:10").sample(rng) <= 0.06 for _ in range(100))
+    assert parse_latency("lognormal:120:0.4") == Latency("lognormal", 120.0, 0.4)
+    with pytest.raises(ValueError):
+        parse_latency("gaussian:10")
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.5) == 0.0
+
+
+def test_queries_are_reproducible():
+    queries = make_queries(50, 10, 0.2, seed=3)
+    assert queries == make_queries(50, 10, 0.2, seed=3)
+    assert any("Zzz" in query for query in queries)
+
+
+@pytest.fixture
+def unlimited():
+    # No retries either, the stub Open-Meteo below fails every request
+    for service in ("nominatim", "open_meteo"):
+        set_scheduler(service, HostScheduler(service, max_retries=0))
+    yield
+    for service in ("nominatim", "open_meteo"):
+        set_scheduler(service, None)
+
+
+def test_stubs_answer_like_the_real_services(unlimited):
+    stubs = StubUpstreams(
+        {"open_meteo": ServiceProfile(error_rate=1.0, error_status=503)}, overpass_elements=200
+    )
+
+    async def main():
+        url = await stubs.start()
+        client = UpstreamClient({"nominatim": url, "open_meteo": url, "overpass": url})
+        try:
+            found = await client.get_json("nominatim", "/search", {"q": "Kalo", "format": "json"})
+            again = await client.get_json("nominatim", "/search", {"q": "kalo", "format": "json"})
+            unknown = await client.get_json("nominatim", "/search", {"q": "Zzzkalo", "format": "json"})
+            answer = await client.post_form("overpass", "/api/interpreter", {
+                "data": '[out:json];node["tourism"]["name"](around:10000,12.97,77.59);out tags center 5;'
+            })
+            with pytest.raises(UpstreamError) as failed:
+                await client.get_json("open_meteo", "/v1/forecast", {"latitude": "1", "longitude": "2"})
+        finally:
+            await client.close()
+            await stubs.stop()
+        return found, again, unknown, answer, failed.value.status
+
+    found, again, unknown, answer, status = asyncio.run(main())
+    assert found[0]["lat"] == again[0]["lat"]
+    assert unknown == []
+    assert len(answer["elements"]) == 5
+    assert all("name" in element["tags"] for element in answer["elements"])
+    assert status == 503
+    assert stubs.counters["open_meteo"]["errors"] >= 1
+    assert stubs.counters["nominatim"]["requests"] == 3
@@ -0,0 +1,177 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import tourism_ai_agent
+import tracing
+from geocoding import ResolvedPlace
+from main import print_response
+from tourism_ai_agent import LOOKUP_TIMEOUT_MESSAGE, TourismAIAgent
+from warming import CacheWarmer
+
+QUERY = "What is the temperature in Paris, and what are the places I can visit?"
+PARIS = ResolvedPlace("Paris", 48.8566, 2.3522, "Paris, France", None)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    Stand-in geocoder and child agents, each taking the given seconds
+    """
+    delays = {"resolve": 0.0, "weather": 0.0, "places": 0.0}
+
+    async def resolve(place_name):
+        await asyncio.sleep(delays["resolve"])
+        return PARIS
+
+    async def weather(place_name, place, dates=None):
+        await asyncio.sleep(delays["weather"])
+        return f"In {place_name} it's currently 20°C."
+
+    async def places(place_name, place):
+        await asyncio.sleep(delays["places"])
+        return f"In {place_name} these are the places you can go, Louvre."
+
+    monkeypatch.setattr(tourism_ai_agent, "resolve_place_async", resolve)
+    monkeypatch.setattr(tourism_ai_agent, "format_weather_response_async", weather)
+    monkeypatch.setattr(tourism_ai_agent, "format_places_response_async", places)
+    monkeypatch.setattr(tourism_ai_agent, "get_warmer", lambda: CacheWarmer(seeds=[], enabled=False))
+    return delays
+
+
+def test_child_agents_run_concurrently(upstream):
+    upstream.update(weather=0.2, places=0.2)
+    started = time.perf_counter()
+    response = TourismAIAgent().process_request(QUERY)
+    assert time.perf_counter() - started < 0.35
+    assert response == "In Paris it's currently 20°C. And these are the places you can go: Louvre."
+
+
+def test_slow_agent_degrades_only_its_section(upstream):
+    upstream.update(places=5.0)
+    started = time.perf_counter()
+    response = TourismAIAgent(agent_timeout=0.1).process_request(QUERY)
+    assert time.perf_counter() - started < 1.0
+    assert response.startswith("In Paris it's currently 20°C.")
+    assert "I couldn't get the places to visit in Paris in time." in response
+
+
+def test_geocoding_counts_against_the_request_timeout(upstream):
+    upstream.update(resolve=5.0)
+    response = TourismAIAgent(request_timeout=0.1).process_request(QUERY)
+    assert response == LOOKUP_TIMEOUT_MESSAGE.format(place="Paris")
+
+    # Agents only get what geocoding left of the request's budget
+    upstream.update(resolve=0.15, weather=5.0, places=0.0)
+    started = time.perf_counter()
+    response = TourismAIAgent(agent_timeout=10.0, request_timeout=0.3).process_request(QUERY)
+    assert time.perf_counter() - started < 1.0
+    assert response.startswith("I couldn't get the weather for Paris in time.")
+
+
+def test_sections_stream_as_each_agent_finishes(upstream):
+    agent = TourismAIAgent()
+    upstream.update(weather=0.0, places=0.1)
+    sections = list(agent.process_request_stream(QUERY))
+    assert [section.kind for section in sections] == ["weather", "places", "answer"]
+    assert sections[1].text == "And these are the places you can go: Louvre."
+    assert sections[-1].text == agent.process_request(QUERY)
+
+    # A faster places agent comes first, worded as the start of the answer
+    upstream.update(weather=0.1, places=0.0)
+    sections = list(agent.process_request_stream(QUERY))
+    assert [section.kind for section in sections] == ["places", "weather", "answer"]
+    assert sections[0].text.startswith("In Paris these are the places you can go")
+
+
+def test_cli_prints_streamed_sections(capsys):
+    print_response(iter([("weather", "Sunny."), ("places", "See the Louvre."), ("answer", "Sunny. See the Louvre.")]))
+    assert capsys.readouterr().out == "Sunny. See the Louvre.\n"
+
+    print_response(iter([("answer", "I couldn't identify the place you want to visit.")]))
+    assert capsys.readouterr().out == "I couldn't identify the place you want to visit.\n"
+
+
+def test_one_agent_serves_concurrent_sessions(upstream):
+    agent = TourismAIAgent()
+    upstream.update(weather=0.02, places=0.02)
+    cities = ["Paris", "Rome", "Lisbon", "Oslo", "Vienna", "Prague", "Madrid", "Dublin"] * 4
+
+    def session(city):
+        # Like one Streamlit script run: stream the answer and capture its trace
+        with tracing.capture() as traces:
+            sections = list(agent.process_request_stream(QUERY.replace("Paris", city)))
+        return sections[-1].text, traces
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(session, cities))
+
+    for city, (answer, traces) in zip(cities, results):
+        assert answer == f"In {city} it's currently 20°C. And these are the places you can go: Louvre."
+        assert [trace.attributes["place"] for trace in traces] == [city]
+
+
+@pytest.fixture
+def destinations(upstream, monkeypatch):
+    """
+    Stand-in geocoder knowing Paris and Rome, and multi-location weather recording its calls
+    """
+    known = {"Paris": PARIS, "Rome": ResolvedPlace("Rome", 41.8933, 12.4829, "Rome, Italy", None)}
+    delays = {"Paris": 0.0, "Rome": 0.0, "Atlantis": 0.0}
+    calls = []
+
+    async def resolve(place_name):
+        await asyncio.sleep(delays[place_name])
+        return known.get(place_name)
+
+    async def weather_many(coordinates):
+        calls.append(("weather", coordinates))
+        return [f"{lat}°N" for lat, _ in coordinates]
+
+    async def forecast_many(coordinates):
+        calls.append(("forecast", coordinates))
+        return [f"{lat}°N" for lat, _ in coordinates]
+
+    monkeypatch.setattr(tourism_ai_agent, "resolve_place_async", resolve)
+    monkeypatch.setattr(tourism_ai_agent, "get_weather_many_async", weather_many)
+    monkeypatch.setattr(tourism_ai_agent, "get_forecast_many_async", forecast_many)
+    monkeypatch.setattr(tourism_ai_agent, "format_weather", lambda place_name, data: f"{place_name} is at {data}.")
+    monkeypatch.setattr(tourism_ai_agent, "format_forecast",
+                        lambda place_name, data, dates: f"{place_name} on {dates.start}.")
+    return delays, calls
+
+
+MANY_QUERY = "What is the weather in Paris, Rome and Atlantis, and what can I visit?"
+
+
+def test_destinations_are_answered_concurrently_in_query_order(destinations):
+    delays, calls = destinations
+    delays.update(Paris=0.2, Rome=0.2, Atlantis=0.2)
+    started = time.perf_counter()
+    response = TourismAIAgent().process_request(MANY_QUERY)
+    assert time.perf_counter() - started < 0.35
+    assert response.split("\n\n") == [
+        "Paris is at 48.8566°N. And these are the places you can go: Louvre.",
+        "Rome is at 41.8933°N. And these are the places you can go: Louvre.",
+        "I don't know if the place 'Atlantis' exists. Could you check the spelling?",
+    ]
+    # One multi-location weather request for every resolved destination
+    assert calls == [("weather", [(48.8566, 2.3522), (41.8933, 12.4829)])]
+
+
+def test_destination_sections_stream_in_query_order(destinations):
+    delays, calls = destinations
+    delays.update(Paris=0.2)
+    sections = list(TourismAIAgent().process_request_stream(MANY_QUERY))
+    assert [section.kind for section in sections] == ["destination"] * 3 + ["answer"]
+    assert [section.text.split()[0] for section in sections[:3]] == ["Paris", "Rome", "I"]
+    assert sections[-1].text == "\n\n".join(section.text for section in sections[:3])
+
+
+def test_destinations_with_dates_share_one_forecast_request(destinations):
+    delays, calls = destinations
+    response = TourismAIAgent().process_request("Weather in Paris and Rome tomorrow")
+    assert [line.split(" on ")[0] for line in response.split("\n\n")] == ["Paris", "Rome"]
+    assert calls == [("forecast", [(48.8566, 2.3522), (41.8933, 12.4829)])]
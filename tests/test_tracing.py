@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from tracing import MetricsSink, add_sink, annotate, capture, remove_sink, span
+
+
+def test_spans_nest_across_tasks():
+    async def stage(name):
+        with span(name):
+            await asyncio.sleep(0.01)
+            annotate(done=True)
+
+    async def request():
+        with span("request", query="q") as root:
+            await asyncio.gather(stage("weather"), stage("places"))
+        return root
+
+    with capture() as captured:
+        root = asyncio.run(request())
+
+    assert captured == [root]
+    assert sorted(child.name for child in root.children) == ["places", "weather"]
+    assert all(child.attributes == {"done": True} for child in root.children)
+    assert [depth for depth, _, _ in root.waterfall()] == [0, 1, 1]
+    assert root.duration >= max(child.duration for child in root.children)
+
+
+def test_failed_spans_record_the_error():
+    finished = []
+    add_sink(finished.append)
+    try:
+        with pytest.raises(KeyError):
+            with span("lookup"):
+                raise KeyError("missing")
+    finally:
+        remove_sink(finished.append)
+
+    assert [(item.name, item.error) for item in finished] == [("lookup", "KeyError")]
+
+
+def test_metrics_sink_renders_prometheus_text():
+    metrics = MetricsSink(buckets=(0.1, 1.0))
+    add_sink(metrics)
+    try:
+        with span("geocode", cache_hit=True):
+            pass
+        with span("geocode", cache_hit=False):
+            pass
+        with span("upstream.overpass", bytes_received=2048, elements=12):
+            pass
+    finally:
+        remove_sink(metrics)
+
+    text = metrics.render()
+    assert 'tourism_stage_duration_seconds_bucket{stage="geocode",le="0.1"} 2' in text
+    assert 'tourism_stage_duration_seconds_count{stage="geocode"} 2' in text
+    assert 'tourism_cache_lookups_total{stage="geocode",result="hit"} 1' in text
+    assert 'tourism_cache_lookups_total{stage="geocode",result="miss"} 1' in text
+    assert 'tourism_upstream_bytes_total{stage="upstream.overpass"} 2048' in text
+    assert 'tourism_elements_total{stage="upstream.overpass"} 12' in text
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from scheduler import HostScheduler, set_scheduler
+from upstream import UpstreamClient, UpstreamError, iterate_sync, run_sync
+
+
+@pytest.fixture
+def unlimited():
+    set_scheduler("open_meteo", HostScheduler("open_meteo"))
+    yield
+    set_scheduler("open_meteo", None)
+
+
+async def serve(handler):
+    """
+    Start a local server answering every GET with handler, return (runner, base URL)
+    """
+    app = web.Application()
+    app.router.add_get("/{path:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_requests_reuse_pooled_connections(unlimited):
+    async def handler(request):
+        return web.json_response({"path": request.path, "q": request.query.get("q")})
+
+    async def main():
+        runner, url = await serve(handler)
+        client = UpstreamClient({"open_meteo": url})
+        try:
+            answers = [await client.get_json("open_meteo", f"/v1/{i}", {"q": str(i)}) for i in range(5)]
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return answers, client.stats()
+
+    answers, stats = asyncio.run(main())
+    assert answers[:2] == [{"path": "/v1/0", "q": "0"}, {"path": "/v1/1", "q": "1"}]
+    # Sequential requests share one keep-alive connection
+    assert stats == {"requests": 5, "connections_opened": 1}
+
+
+def test_error_statuses_raise(unlimited):
+    async def handler(request):
+        return web.Response(status=404, reason="Not Found")
+
+    async def main():
+        runner, url = await serve(handler)
+        client = UpstreamClient({"open_meteo": url})
+        try:
+            await client.get_json("open_meteo", "/missing")
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    with pytest.raises(UpstreamError) as raised:
+        asyncio.run(main())
+    assert raised.value.status == 404
+    assert raised.value.service == "open_meteo"
+
+
+def test_sync_callers_share_the_background_loop():
+    async def loop_of_caller():
+        return asyncio.get_running_loop()
+
+    assert run_sync(loop_of_caller()) is run_sync(loop_of_caller())
+
+    async def nested():
+        return run_sync(loop_of_caller())
+
+    with pytest.raises(RuntimeError):
+        run_sync(nested())
+
+    async def numbers():
+        for number in range(3):
+            await asyncio.sleep(0)
+            yield number
+
+    assert list(iterate_sync(numbers())) == [0, 1, 2]
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+
+import warming
+from geocoding import ResolvedPlace
+from places_cache import PlacesCache, set_places_cache
+from upstream import UpstreamThrottled
+from warming import CacheWarmer, CountMinSketch, PopularDestinations
+
+
+def test_sketch_never_under_counts():
+    sketch = CountMinSketch(width=64, depth=4)
+    counts = {f"city-{index}": index % 7 + 1 for index in range(200)}
+    for key, count in counts.items():
+        sketch.add(key, count)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+
+    sketch.decay()
+    assert sketch.estimate("city-6") >= counts["city-6"] // 2
+
+
+def test_popular_destinations_follow_recent_traffic(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(warming.time, "monotonic", lambda: now[0])
+    popular = PopularDestinations(capacity=3, decay_seconds=60)
+    popular.record("Paris", 8)
+    popular.record("Delhi", 4)
+    popular.record("Jaipur", 2)
+    popular.record("Goa", 1)
+    assert popular.top(2) == [("Paris", 8), ("Delhi", 4)]
+    assert [name for name, _ in popular.top(5)] == ["Paris", "Delhi", "Jaipur"]
+
+    # A hotter destination replaces the coldest candidate, counts halve after decay_seconds
+    popular.record("Goa", 5)
+    now[0] += 60
+    popular.record("Goa", 4)
+    assert popular.top(5, min_count=2) == [("Goa", 7), ("Paris", 4), ("Delhi", 2)]
+
+
+def test_destinations_are_seeds_then_learned():
+    warmer = CacheWarmer(seeds=["Paris", "Delhi"], top_n=2, min_count=2)
+    for name in ["Rome", "Rome", "Rome", "paris", "paris", "Goa", "Lisbon", "Lisbon"]:
+        warmer.record(name)
+    assert warmer.destinations() == ["Paris", "Delhi", "Rome"]
+
+
+def test_state_survives_a_restart(tmp_path):
+    state = tmp_path / "state" / "popular.json"
+    warmer = CacheWarmer(seeds=[], state_path=str(state))
+    for _ in range(3):
+        warmer.record("Rome")
+    warmer._save()
+    assert json.loads(state.read_text()) == {"destinations": [["Rome", 3]]}
+
+    assert CacheWarmer(seeds=[], state_path=str(state)).destinations() == ["Rome"]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    places = PlacesCache()
+    set_places_cache(places)
+    calls = {"resolved": [], "weather": [], "attractions": []}
+
+    async def resolve(name):
+        calls["resolved"].append(name)
+        if name == "Atlantis":
+            return None
+        if name == "Busy":
+            raise UpstreamThrottled("nominatim", 429)
+        return ResolvedPlace(name, len(name), 10.0, name, None)
+
+    async def refresh_weather(coordinates):
+        calls["weather"].append(coordinates)
+        return len(coordinates)
+
+    async def refresh_attractions(lat, lon, limit):
+        calls["attractions"].append((lat, lon))
+        places.set(lat, lon, limit, ["Museum"])
+        return True
+
+    monkeypatch.setattr(warming, "resolve_place_async", resolve)
+    monkeypatch.setattr(warming, "refresh_weather_many_async", refresh_weather)
+    monkeypatch.setattr(warming, "refresh_attractions_async", refresh_attractions)
+    yield calls
+    set_places_cache(None)
+
+
+def test_warm_round(upstream, tmp_path):
+    warmer = CacheWarmer(seeds=["Paris", "Atlantis", "Busy"], interval=60,
+                         state_path=str(tmp_path / "popular.json"))
+    warmer.record("Lisbon")
+    warmer.record("Lisbon")
+    stats = asyncio.run(warmer.warm())
+
+    assert sorted(upstream["resolved"]) == ["Atlantis", "Busy", "Lisbon", "Paris"]
+    # One batched weather call for every resolved destination
+    assert upstream["weather"] == [[(5, 10.0), (6, 10.0)]]
+    assert sorted(upstream["attractions"]) == [(5, 10.0), (6, 10.0)]
+    assert {key: stats[key] for key in ["rounds", "destinations", "unresolved", "throttled",
+                                        "weather_refreshed", "attractions_refreshed"]} == {
+        "rounds": 1, "destinations": 4, "unresolved": 1, "throttled": 1,
+        "weather_refreshed": 2, "attractions_refreshed": 2}
+    assert (tmp_path / "popular.json").exists()
+
+    # Attractions cached for longer than the next two rounds aren't fetched again
+    asyncio.run(warmer.warm())
+    assert len(upstream["attractions"]) == 2
+    assert len(upstream["weather"]) == 2
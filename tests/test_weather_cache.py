@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+from geocode_cache import MISSING
+from weather_cache import WeatherCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000 * 900.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def test_nearby_points_share_a_grid_cell(clock):
+    cache = WeatherCache(grid_degrees=0.1, bucket_seconds=900)
+    cache.set(12.97, 77.59, {"temperature": 25})
+    assert cache.get(12.99, 77.61) == ({"temperature": 25}, True)
+    assert cache.get(13.2, 77.59) == (MISSING, False)
+
+
+def test_entries_go_stale_then_expire(clock):
+    cache = WeatherCache(bucket_seconds=900)
+    cache.set(12.97, 77.59, {"temperature": 25})
+
+    clock[0] += 899
+    assert cache.get(12.97, 77.59) == ({"temperature": 25}, True)
+    clock[0] += 1
+    assert cache.get(12.97, 77.59) == ({"temperature": 25}, False)
+    assert not cache.is_fresh(12.97, 77.59)
+    clock[0] += 900
+    assert cache.get(12.97, 77.59) == (MISSING, False)
+    assert cache.stats()["fresh_hits"] == 1
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_stale_cells_are_refreshed_once_in_the_background(clock):
+    cache = WeatherCache(bucket_seconds=900)
+    cache.set(12.97, 77.59, {"temperature": 25})
+    cache.set(48.85, 2.35, {"temperature": 15})
+    clock[0] += 900
+    fetched = []
+
+    async def fetch(points):
+        fetched.append(points)
+        await asyncio.sleep(0.01)
+        return [{"temperature": 26}, None]
+
+    async def main():
+        # Two stale requests for the same cells start one refresh
+        cache.revalidate([(12.97, 77.59), (48.85, 2.35)], fetch)
+        cache.revalidate([(12.98, 77.59)], fetch)
+        await asyncio.gather(*cache._tasks)
+
+    asyncio.run(main())
+    assert fetched == [[(12.97, 77.59), (48.85, 2.35)]]
+    assert cache.get(12.97, 77.59) == ({"temperature": 26}, True)
+    # A failed refresh keeps serving the stale value
+    assert cache.get(48.85, 2.35) == ({"temperature": 15}, False)
+    assert cache.stats()["refreshes"] == 1
@@ -1,11 +1,53 @@
 """
 Parent Tourism AI Agent - Orchestrates the multi-agent system
 """
-import re
-from typing import Dict, Optional
-from geocoding import place_exists
-from weather_agent import format_weather_response
-from places_agent import format_places_response
+import asyncio
+import functools
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from geocode_cache import normalize_key
+from geocoding import ResolvedPlace, resolve_place_async
+from weather_agent import (format_forecast, format_weather, format_weather_response_async, get_forecast_many_async,
+                           get_weather_many_async)
+from places_agent import format_places, format_places_response_async, get_tourist_attractions_at_async
+from query_parser import ParsedQuery, QueryParser
+from recording import get_recorder
+from scheduler import BATCH, request_priority
+from tracing import span
+from upstream import UpstreamThrottled, get_client, iterate_sync, run_sync
+from warming import get_warmer
+
+# Answers when a service keeps rate limiting us; unlike "not found" the place may well exist
+BUSY_MESSAGE = "I couldn't look up '{place}' right now because the service is busy. Please try again in a moment."
+# Answer when geocoding alone used up the request's time budget
+LOOKUP_TIMEOUT_MESSAGE = "I couldn't look up '{place}' in time. Please try again in a moment."
+BUSY_SECTION_MESSAGES = {
+    "weather": "I couldn't get the weather for {place} right now because the service is busy.",
+    "places": "I couldn't get the places to visit in {place} right now because the service is busy.",
+    "itinerary": "I couldn't plan your trip to {place} right now because the service is busy."
+}
+
+
+class BatchResult(NamedTuple):
+    """
+    Answers of process_batch, in query order, plus throughput statistics
+    """
+    responses: List[str]
+    stats: Dict[str, float]
+
+
+class ResponseSection(NamedTuple):
+    """
+    One piece of a streamed answer
+    
+    kind is "weather", "places" or "itinerary" for a child agent's section,
+    sent as soon as that agent finishes, and "answer" for the final combined
+    response. Queries naming several destinations send one "destination"
+    section per destination instead, in query order, each to be shown as its
+    own paragraph.
+    """
+    kind: str
+    text: str
 
 
 class TourismAIAgent:
@@ -13,7 +55,15 @@ class TourismAIAgent:
     Parent agent that orchestrates weather and places agents
     """
     
-    def __init__(self):
+    def __init__(self, agent_timeout: float = 20.0, request_timeout: float = 30.0):
+        """
+        Args:
+            agent_timeout: Seconds each child agent may take before its section degrades
+            request_timeout: Seconds the whole request may take, geocoding included;
+                child agents get what is left of it
+        """
+        self.agent_timeout = agent_timeout
+        self.request_timeout = request_timeout
         self.weather_keywords = [
             "weather", "temperature", "temp", "rain", "rainfall",
             "forecast", "climate", "rainy", "sunny", "cloudy"
@@ -21,8 +71,10 @@ class TourismAIAgent:
         self.places_keywords = [
             "places", "attractions", "tourist", "visit", "see",
             "sightseeing", "where to go", "things to do", "must see",
-            "plan", "planning", "trip"
+            "plan", "planning", "trip", "itinerary"
         ]
+        # Compiled once from the keyword lists above
+        self.parser = QueryParser(self.weather_keywords, self.places_keywords)
     
     def parse_user_intent(self, user_input: str) -> Dict[str, bool]:
         """
@@ -32,21 +84,10 @@ class TourismAIAgent:
             user_input: User's input string
             
         Returns:
-            Dictionary with flags for weather and places
+            Dictionary with flags for weather, places and forecast (the
+            query mentions dates, see QueryParser.date_range)
         """
-        input_lower = user_input.lower()
-        
-        wants_weather = any(keyword in input_lower for keyword in self.weather_keywords)
-        wants_places = any(keyword in input_lower for keyword in self.places_keywords)
-        
-        # If no specific keywords, default to both
-        if not wants_weather and not wants_places:
-            wants_places = True
-        
-        return {
-            "weather": wants_weather,
-            "places": wants_places
-        }
+        return self.parser.intent(user_input)
     
     def extract_place_name(self, user_input: str) -> Optional[str]:
         """
@@ -58,80 +99,31 @@ class TourismAIAgent:
         Returns:
             Extracted place name or None
         """
-        # Keywords that indicate the end of place name
-        stop_keywords = [
-            "what", "where", "when", "which", "who", "how",
-            "let's", "let us", "plan", "planning", "temperature",
-            "temp", "weather", "places", "attractions", "visit",
-            "can", "should", "will", "is", "are", "and"
-        ]
+        return self.parser.place_name(user_input)
+    
+    def extract_place_names(self, user_input: str) -> List[str]:
+        """
+        Extract every destination named in user input
         
-        # Common patterns - improved to better extract place names (case-insensitive)
-        patterns = [
-            # Pattern: "visiting/going to [place]"
-            r"(?:going\s+to|visit|visiting|trip\s+to|travel\s+to|heading\s+to|am\s+visiting)\s+([a-zA-Z][a-zA-Z\s]*?)(?:\s+(?:what|where|when|let|plan|conditions)|,|\.|$)",
-            # Pattern: "in [place]"
-            r"in\s+([a-zA-Z][a-zA-Z\s]*?)(?:\s+(?:what|where|when|it|the|conditions)|,|\.|$)",
-            # Pattern: "[Place], let's/what/where"
-            r"^([a-zA-Z][a-zA-Z\s]+?),?\s+(?:let's|let\s+us|what|where|temperature|and)",
-        ]
+        Args:
+            user_input: User's input string
+            
+        Returns:
+            Place names in query order, the first being extract_place_name's
+        """
+        return self.parser.place_names(user_input)
+    
+    def parse_query(self, user_input: str) -> ParsedQuery:
+        """
+        Place name and intent of user input from a single keyword scan
         
-        for pattern in patterns:
-            match = re.search(pattern, user_input, re.IGNORECASE)
-            if match:
-                place_name = match.group(1).strip()
-                # Clean up the place name and remove any stop keywords
-                place_name = re.sub(r'\s+', ' ', place_name)
-                
-                # Remove any stop keywords that might have been captured
-                words = place_name.split()
-                cleaned_words = []
-                for word in words:
-                    if word.lower() not in stop_keywords:
-                        cleaned_words.append(word)
-                    else:
-                        break
-                
-                if cleaned_words:
-                    # Preserve original capitalization but ensure first letter is capitalized
-                    place_name = ' '.join(cleaned_words)
-                    # Only title case if all lowercase, otherwise preserve original case
-                    if place_name.islower():
-                        place_name = place_name.title()
-                    elif not place_name[0].isupper():
-                        place_name = place_name[0].upper() + place_name[1:]
-                    return place_name
-        
-        # Fallback: try to extract capitalized or all-lowercase city names
-        words = user_input.split()
-        place_words = []
-        
-        for i, word in enumerate(words):
-            # Check if word looks like it could be part of a place name
-            # (capitalized or all lowercase after certain keywords)
-            if i > 0 and words[i-1].lower() in ["to", "visit", "visiting", "in", "going"]:
-                # Next word(s) after these keywords are likely the place name
-                j = i
-                while j < len(words):
-                    current_word = words[j].lower()
-                    # Stop if we hit a question keyword
-                    if current_word in stop_keywords:
-                        break
-                    # Stop if we hit punctuation
-                    if words[j] in [",", ".", "?", "!"]:
-                        break
-                    place_words.append(words[j])
-                    j += 1
-                break
-        
-        if place_words:
-            place_name = ' '.join(place_words)
-            # Remove trailing punctuation
-            place_name = re.sub(r'[,.!?]+$', '', place_name)
-            place_name = place_name.title()
-            return place_name
-        
-        return None
+        Args:
+            user_input: User's input string
+            
+        Returns:
+            ParsedQuery with the place name (or None) and the intent flags
+        """
+        return self.parser.parse(user_input)
     
     def process_request(self, user_input: str) -> str:
         """
@@ -143,55 +135,462 @@ class TourismAIAgent:
         Returns:
             Formatted response string
         """
-        # Extract place name
-        place_name = self.extract_place_name(user_input)
+        return run_sync(self.process_request_async(user_input))
+    
+    async def process_request_async(self, user_input: str) -> str:
+        """
+        Async variant of process_request, many requests can share one event loop
+        
+        Args:
+            user_input: User's input string
+            
+        Returns:
+            Formatted response string
+        """
+        return await self._answer(user_input)
+    
+    def process_request_stream(self, user_input: str) -> Iterator[ResponseSection]:
+        """
+        Process a user request, yielding each section as soon as its agent finishes
+        
+        Args:
+            user_input: User's input string
+            
+        Yields:
+            ResponseSection per finished child agent, then the "answer" section
+            holding the same combined response process_request returns
+        """
+        return iterate_sync(self.process_request_stream_async(user_input))
+    
+    async def process_request_stream_async(self, user_input: str) -> AsyncIterator[ResponseSection]:
+        """
+        Async variant of process_request_stream
+        
+        Args:
+            user_input: User's input string
+            
+        Yields:
+            ResponseSection per finished child agent, then the "answer" section
+        """
+        sections = asyncio.Queue()
         
-        if not place_name:
-            return "I couldn't identify the place you want to visit. Could you please specify the place name?"
+        async def produce():
+            try:
+                sections.put_nowait(ResponseSection("answer", await self._answer(user_input, sections.put_nowait)))
+            finally:
+                sections.put_nowait(None)
         
-        # Check if place exists
-        if not place_exists(place_name):
-            return f"I don't know if the place '{place_name}' exists. Could you check the spelling?"
+        # The request runs in its own task, so its spans stay out of the consumer's context
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                section = await sections.get()
+                if section is None:
+                    break
+                yield section
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+    
+    async def _answer(self, user_input: str, emit: Optional[Callable[[ResponseSection], None]] = None) -> str:
+        """
+        Answer one request, handing each child agent's section to emit as soon as it is ready
         
-        # Parse intent
-        intent = self.parse_user_intent(user_input)
+        The query and answer are recorded when recording is on (see recording.py).
+        """
+        recorder = get_recorder()
+        if not recorder.enabled:
+            return await self._respond(user_input, emit)
         
-        # Collect responses from child agents
-        responses = []
+        started, started_clock = time.time(), time.perf_counter()
+        response = await self._respond(user_input, emit)
+        recorder.query(user_input, response, started, time.perf_counter() - started_clock)
+        return response
+    
+    async def _respond(self, user_input: str, emit: Optional[Callable[[ResponseSection], None]]) -> str:
+        # Geocoding and the child agents share one budget, agents get whatever geocoding left
+        deadline = asyncio.get_running_loop().time() + self.request_timeout
         
-        if intent["weather"]:
-            weather_response = format_weather_response(place_name)
-            # Check if weather agent returned an error
-            if f"I don't know" in weather_response:
-                responses.append(weather_response)
-            else:
-                responses.append(weather_response)
+        with span("request", query=user_input) as current:
+            # Extract place name and intent in one pass
+            with span("parse") as parsed:
+                place_name, intent = self.parse_query(user_input)
+                place_names = self.parser.place_names(user_input)
+                parsed.set(place=place_name, **intent)
+            
+            if not place_name:
+                return "I couldn't identify the place you want to visit. Could you please specify the place name?"
+            
+            if len(place_names) > 1:
+                current.set(place=", ".join(place_names), destinations=len(place_names))
+                return await self._respond_many(user_input, place_names, intent, emit, deadline)
+            
+            current.set(place=place_name)
+            
+            # Resolve the place once and share it with the child agents
+            try:
+                place = await asyncio.wait_for(resolve_place_async(place_name), self._remaining(deadline))
+            except UpstreamThrottled:
+                current.set(throttled=True)
+                return BUSY_MESSAGE.format(place=place_name)
+            except asyncio.TimeoutError:
+                current.set(timed_out=True)
+                return LOOKUP_TIMEOUT_MESSAGE.format(place=place_name)
+            
+            if not place:
+                return f"I don't know if the place '{place_name}' exists. Could you check the spelling?"
+            
+            # Popular destinations are kept warm in the caches
+            get_warmer().record(place_name)
+            
+            # Dates in the query ask for their forecast instead of the current weather
+            dates = self.parser.date_range(user_input) if intent["weather"] and intent["forecast"] else None
+            agents = self._child_agents(user_input, intent,
+                                        functools.partial(format_weather_response_async, dates=dates))
+            return await self._run_agents(place_name, place, agents, emit, deadline)
+    
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        """
+        Seconds left until a deadline on the event loop clock, never negative
+        """
+        return max(deadline - asyncio.get_running_loop().time(), 0.0)
+    
+    def _child_agents(self, user_input: str, intent: Dict[str, bool], weather_agent) -> List[tuple]:
+        """
+        The child agents a query asks for, as (name, agent, timeout message)
         
+        Args:
+            user_input: User's input string
+            intent: Intent flags of the query
+            weather_agent: Coroutine function answering the weather section
+        """
+        agents = []
+        if intent["weather"]:
+            agents.append(("weather", weather_agent, "I couldn't get the weather for {place} in time."))
         if intent["places"]:
-            places_response = format_places_response(place_name)
-            # Check if places agent returned an error
-            if f"I don't know" in places_response:
-                responses.append(places_response)
+            # Planning a number of days (or asking for an itinerary) gets a day-by-day plan
+            days = self.parser.itinerary_days(user_input)
+            if days:
+                # The planner needs NumPy, it is imported with the first itinerary
+                from itinerary_agent import format_itinerary_response_async
+                agents.append(("itinerary", functools.partial(format_itinerary_response_async, days=days),
+                               "I couldn't plan your trip to {place} in time."))
             else:
-                responses.append(places_response)
+                agents.append(("places", format_places_response_async, "I couldn't get the places to visit in {place} in time."))
+        return agents
+    
+    async def _run_agents(self, place_name: str, place: ResolvedPlace, agents: List[tuple],
+                          emit: Optional[Callable[[ResponseSection], None]], deadline: float) -> str:
+        """
+        Run the child agents of one place concurrently and combine their sections
+        
+        Each agent gets agent_timeout seconds, but no more than is left until deadline.
+        """
+        timeout = min(self.agent_timeout, self._remaining(deadline))
+        streamed = []
+        
+        async def run(name: str, agent, timeout_message: str) -> str:
+            response = await self._run_agent(name, agent, timeout_message, place_name, place, timeout)
+            if emit is not None:
+                # Places following weather read as the second half of the combined answer
+                text = self._places_follow_up(place_name, response) if streamed == ["weather"] else response
+                streamed.append(name)
+                emit(ResponseSection(name, text))
+            return response
+        
+        # Collect responses from child agents in weather-then-places order
+        responses = await asyncio.gather(*(
+            run(name, agent, timeout_message) for name, agent, timeout_message in agents
+        ))
+        
+        return self._combine_responses(place_name, list(responses))
+    
+    async def _respond_many(self, user_input: str, place_names: List[str], intent: Dict[str, bool],
+                            emit: Optional[Callable[[ResponseSection], None]], deadline: float) -> str:
+        """
+        Answer a query naming several destinations
+        
+        Every destination is resolved concurrently, then the child agents of
+        all of them run concurrently, with the weather of every destination
+        fetched by one multi-location Open-Meteo request. The answer takes
+        about as long as the slowest destination rather than the sum of them.
+        Each destination's answer is a paragraph, emitted in query order.
+        """
+        async def resolve(place_name: str) -> Tuple[Optional[ResolvedPlace], Optional[str]]:
+            try:
+                place = await asyncio.wait_for(resolve_place_async(place_name), self._remaining(deadline))
+            except UpstreamThrottled:
+                return None, BUSY_MESSAGE.format(place=place_name)
+            except asyncio.TimeoutError:
+                return None, LOOKUP_TIMEOUT_MESSAGE.format(place=place_name)
+            if not place:
+                return None, f"I don't know if the place '{place_name}' exists. Could you check the spelling?"
+            get_warmer().record(place_name)
+            return place, None
         
-        # Combine responses
+        resolved = await asyncio.gather(*(resolve(place_name) for place_name in place_names))
+        
+        dates = self.parser.date_range(user_input) if intent["weather"] and intent["forecast"] else None
+        coordinates = list(dict.fromkeys(place.coordinates for place, _ in resolved if place))
+        weather = None
+        if intent["weather"] and coordinates:
+            fetch = get_forecast_many_async if dates else get_weather_many_async
+            weather = asyncio.ensure_future(fetch(coordinates))
+        
+        async def shared_weather(place_name: str, place: ResolvedPlace) -> str:
+            # Shielded, so one destination timing out does not cancel the request the others wait for
+            data = (await asyncio.shield(weather))[coordinates.index(place.coordinates)]
+            return format_forecast(place_name, data, dates) if dates else format_weather(place_name, data)
+        
+        agents = self._child_agents(user_input, intent, shared_weather)
+        answers = [asyncio.Future() for _ in place_names]
+        
+        async def destination(index: int, place_name: str):
+            place, message = resolved[index]
+            answers[index].set_result(message or await self._run_agents(place_name, place, agents, None, deadline))
+        
+        async def emit_in_order():
+            for answer in answers:
+                emit(ResponseSection("destination", await answer))
+        
+        try:
+            await asyncio.gather(
+                *(destination(index, place_name) for index, place_name in enumerate(place_names)),
+                *([emit_in_order()] if emit is not None else [])
+            )
+        finally:
+            if weather is not None:
+                # Nobody waits for the weather any more, e.g. every destination timed out
+                weather.cancel()
+        
+        return "\n\n".join(answer.result() for answer in answers)
+    
+    async def _run_agent(self, name: str, agent, timeout_message: str, place_name: str,
+                         place: ResolvedPlace, timeout: float) -> str:
+        """
+        Run one child agent, degrading its section if it misses the deadline
+        """
+        with span(f"agent.{name}", place=place_name) as current:
+            try:
+                return await asyncio.wait_for(agent(place_name, place), timeout)
+            except asyncio.TimeoutError:
+                # Degrade this section without blocking the others
+                current.set(timed_out=True)
+                return timeout_message.format(place=place_name)
+            except UpstreamThrottled:
+                current.set(throttled=True)
+                return BUSY_SECTION_MESSAGES[name].format(place=place_name)
+            except Exception as e:
+                print(f"Error in child agent: {e}")
+                current.set(failed=type(e).__name__)
+                return f"I don't know if the place '{place_name}' exists. Could you check the spelling?"
+    
+    def _places_follow_up(self, place_name: str, places_part: str) -> str:
+        """
+        Places section worded to follow the weather section
+        """
+        # Remove redundant place name from places part if it starts with "In {place_name}"
+        if places_part.startswith(f"In {place_name}"):
+            # Replace the beginning to match Example 3 format
+            places_part = places_part.replace(
+                f"In {place_name} these are the places you can go,", 
+                "And these are the places you can go:"
+            )
+        
+        return places_part
+    
+    def _combine_responses(self, place_name: str, responses: list) -> str:
+        """
+        Combine the child agent sections into the final answer
+        """
         if len(responses) == 2:
             # Combine weather and places responses
             weather_part = responses[0]
-            places_part = responses[1]
-            
-            # Remove redundant place name from places part if it starts with "In {place_name}"
-            if places_part.startswith(f"In {place_name}"):
-                # Replace the beginning to match Example 3 format
-                places_part = places_part.replace(
-                    f"In {place_name} these are the places you can go,", 
-                    "And these are the places you can go:"
-                )
+            places_part = self._places_follow_up(place_name, responses[1])
             
             return f"{weather_part} {places_part}"
         elif len(responses) == 1:
             return responses[0]
         else:
             return f"I couldn't process your request for {place_name}. Please try again."
-
+    
+    def process_batch(self, queries: List[str], max_concurrency: int = 8) -> BatchResult:
+        """
+        Answer many queries at once, sharing upstream calls between them
+        
+        Args:
+            queries: User input strings
+            max_concurrency: Maximum concurrent geocoding and Overpass lookups
+            
+        Returns:
+            BatchResult with one response per query and throughput statistics
+        """
+        return run_sync(self.process_batch_async(queries, max_concurrency))
+    
+    async def process_batch_async(self, queries: List[str], max_concurrency: int = 8) -> BatchResult:
+        """
+        Async variant of process_batch
+        
+        Distinct places are geocoded once, weather for all of them is fetched
+        with multi-location Open-Meteo calls, and Overpass lookups are fanned
+        out with bounded concurrency. Upstream calls run at BATCH priority,
+        so interactive requests sharing the process go ahead of them.
+        
+        Args:
+            queries: User input strings
+            max_concurrency: Maximum concurrent geocoding and Overpass lookups
+            
+        Returns:
+            BatchResult with one response per query and throughput statistics
+        """
+        with span("batch", queries=len(queries)) as current, request_priority(BATCH):
+            result = await self._process_batch(queries, max_concurrency)
+            current.set(**result.stats)
+            return result
+    
+    async def _process_batch(self, queries: List[str], max_concurrency: int) -> BatchResult:
+        started = time.perf_counter()
+        requests_before = get_client().stats()["requests"]
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        # Parse every query and dedupe the places they mention
+        parsed = []
+        place_names = {}
+        for user_input in queries:
+            place_name, intent = self.parse_query(user_input)
+            days = self.parser.itinerary_days(user_input) if intent["places"] else None
+            dates = self.parser.date_range(user_input) if intent["weather"] and intent["forecast"] else None
+            parsed.append((place_name, intent, days, dates))
+            if place_name:
+                place_names.setdefault(normalize_key(place_name), place_name)
+        
+        # Places and coordinates whose lookups were throttled, answered with a busy message
+        throttled_places = set()
+        throttled_coordinates = {"weather": set(), "forecast": set(), "places": set(), "itinerary": set()}
+        
+        async def resolve(place_name: str) -> Optional[ResolvedPlace]:
+            async with semaphore:
+                try:
+                    return await resolve_place_async(place_name)
+                except UpstreamThrottled:
+                    throttled_places.add(normalize_key(place_name))
+                    return None
+        
+        resolved = await asyncio.gather(*(resolve(name) for name in place_names.values()))
+        places = dict(zip(place_names, resolved))
+        
+        # Collect the distinct coordinates each child agent needs
+        weather_coordinates = {}
+        forecast_coordinates = {}
+        attraction_coordinates = {}
+        itinerary_requests = {}
+        for place_name, intent, days, dates in parsed:
+            place = places.get(normalize_key(place_name)) if place_name else None
+            if not place:
+                continue
+            get_warmer().record(place_name)
+            if dates:
+                forecast_coordinates.setdefault(place.coordinates, None)
+            elif intent["weather"]:
+                weather_coordinates.setdefault(place.coordinates, None)
+            if days:
+                itinerary_requests.setdefault((place.coordinates, days), place)
+            elif intent["places"]:
+                attraction_coordinates.setdefault(place.coordinates, None)
+        
+        async def weather(coordinates: list, fetch, kind: str):
+            try:
+                return await fetch(coordinates)
+            except UpstreamThrottled:
+                throttled_coordinates[kind].update(coordinates)
+                return [None] * len(coordinates)
+        
+        async def attractions(lat: float, lon: float):
+            async with semaphore:
+                try:
+                    return await get_tourist_attractions_at_async(lat, lon)
+                except UpstreamThrottled:
+                    throttled_coordinates["places"].add((lat, lon))
+                    return None
+        
+        async def itinerary(key: tuple, place: ResolvedPlace):
+            from itinerary_agent import plan_itinerary_async
+            
+            async with semaphore:
+                try:
+                    return await plan_itinerary_async(place.name, key[1], place)
+                except UpstreamThrottled:
+                    throttled_coordinates["itinerary"].add(key)
+                    return None
+        
+        weather_list, forecast_list, attraction_list, itinerary_list = await asyncio.gather(
+            weather(list(weather_coordinates), get_weather_many_async, "weather"),
+            weather(list(forecast_coordinates), get_forecast_many_async, "forecast"),
+            asyncio.gather(*(attractions(lat, lon) for lat, lon in attraction_coordinates)),
+            asyncio.gather(*(itinerary(key, place) for key, place in itinerary_requests.items()))
+        )
+        weather_by_coordinates = dict(zip(weather_coordinates, weather_list))
+        forecasts_by_coordinates = dict(zip(forecast_coordinates, forecast_list))
+        attractions_by_coordinates = dict(zip(attraction_coordinates, attraction_list))
+        itineraries = dict(zip(itinerary_requests, itinerary_list))
+        
+        # Assemble the answers in query order
+        responses = []
+        for place_name, intent, days, dates in parsed:
+            if not place_name:
+                responses.append("I couldn't identify the place you want to visit. Could you please specify the place name?")
+                continue
+            
+            place = places.get(normalize_key(place_name))
+            if not place and normalize_key(place_name) in throttled_places:
+                responses.append(BUSY_MESSAGE.format(place=place_name))
+                continue
+            if not place:
+                responses.append(f"I don't know if the place '{place_name}' exists. Could you check the spelling?")
+                continue
+            
+            sections = []
+            if dates:
+                if place.coordinates in throttled_coordinates["forecast"]:
+                    sections.append(BUSY_SECTION_MESSAGES["weather"].format(place=place_name))
+                else:
+                    sections.append(format_forecast(place_name, forecasts_by_coordinates[place.coordinates], dates))
+            elif intent["weather"]:
+                if place.coordinates in throttled_coordinates["weather"]:
+                    sections.append(BUSY_SECTION_MESSAGES["weather"].format(place=place_name))
+                else:
+                    sections.append(format_weather(place_name, weather_by_coordinates[place.coordinates]))
+            if days:
+                if (place.coordinates, days) in throttled_coordinates["itinerary"]:
+                    sections.append(BUSY_SECTION_MESSAGES["itinerary"].format(place=place_name))
+                else:
+                    from itinerary_agent import format_itinerary
+                    sections.append(format_itinerary(place_name, itineraries[(place.coordinates, days)]))
+            elif intent["places"]:
+                if place.coordinates in throttled_coordinates["places"]:
+                    sections.append(BUSY_SECTION_MESSAGES["places"].format(place=place_name))
+                else:
+                    sections.append(format_places(place_name, attractions_by_coordinates[place.coordinates]))
+            responses.append(self._combine_responses(place_name, sections))
+        
+        elapsed = time.perf_counter() - started
+        
+        # Without batching every query would geocode once and call each agent it needs
+        unbatched_calls = sum(
+            1 + intent["weather"] + intent["places"]
+            for place_name, intent, _, _ in parsed if place_name
+        )
+        upstream_calls = get_client().stats()["requests"] - requests_before
+        
+        stats = {
+            "queries": len(queries),
+            "unique_places": len(place_names),
+            "elapsed_s": elapsed,
+            "queries_per_s": len(queries) / elapsed if elapsed > 0 else 0.0,
+            "upstream_calls": upstream_calls,
+            "upstream_calls_saved": max(unbatched_calls - upstream_calls, 0)
+        }
+        
+        return BatchResult(responses, stats)
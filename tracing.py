@@ -0,0 +1,274 @@
+"""
+Tracing - Timed spans for each stage of the agent pipeline, pluggable sinks and Prometheus metrics
+
+A span covers one stage (parsing, geocoding, an upstream call, ...) and
+records its duration and attributes such as the place, cache hits, bytes
+received or element counts. Spans nest through a context variable, so a
+request's stages form a tree even across asyncio tasks and run_sync calls.
+Every finished span is handed to the registered sinks; the process-wide
+metrics sink turns them into latency histograms and counters in the
+Prometheus text format.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_span = contextvars.ContextVar("tourism_current_span", default=None)
+_captured = contextvars.ContextVar("tourism_captured_traces", default=None)
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed stage, with its attributes and child stages
+    """
+
+    __slots__ = ("name", "attributes", "parent", "children", "start", "end", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.parent = parent
+        self.children = []
+        self.start = time.perf_counter()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        """
+        Seconds the span took, or has taken so far
+        """
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def waterfall(self) -> List[Tuple[int, "Span", float]]:
+        """
+        The span and its descendants in start order
+
+        Returns:
+            (depth, span, seconds from this span's start) tuples
+        """
+        rows = []
+
+        def visit(span: Span, depth: int):
+            rows.append((depth, span, span.start - self.start))
+            for child in sorted(span.children, key=lambda child: child.start):
+                visit(child, depth + 1)
+
+        visit(self, 0)
+        return rows
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, {self.duration * 1000:.1f}ms, {self.attributes})"
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time the enclosed block as a stage of the current trace
+
+    Args:
+        name: Stage name, e.g. "geocode" or "upstream.overpass"
+        **attributes: Initial attributes of the span
+
+    Yields:
+        The span, so attributes known later can be added with span.set()
+    """
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    if parent is not None:
+        parent.children.append(current)
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        _finish(current)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def annotate(**attributes):
+    """
+    Add attributes to the current span, if there is one
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def add_sink(sink: Callable[[Span], None]):
+    """
+    Register a callable that receives every finished span
+
+    Root spans (parent is None) arrive last and carry the whole trace.
+    Sinks are called on the thread that finished the span and must be quick.
+    """
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks.append(sink)
+
+
+def remove_sink(sink: Callable[[Span], None]):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def _finish(finished: Span):
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(finished)
+        except Exception as e:
+            print(f"Error in tracing sink: {e}")
+
+    if finished.parent is None:
+        captured = _captured.get()
+        if captured is not None:
+            captured.append(finished)
+
+
+@contextmanager
+def capture() -> Iterator[List[Span]]:
+    """
+    Collect the root spans finished inside the block, e.g. to show one answer's waterfall
+
+    Yields:
+        List that receives the finished root spans
+    """
+    captured = []
+    token = _captured.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured.reset(token)
+
+
+class MetricsSink:
+    """
+    Sink aggregating spans into per-stage latency histograms and counters
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._errors = {}
+        self._cache_lookups = {}
+        self._bytes = {}
+        self._elements = {}
+
+    def __call__(self, finished: Span):
+        stage = finished.name
+        duration = finished.duration
+        attributes = finished.attributes
+
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += duration
+            histogram[2] += 1
+
+            if finished.error:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+            if "cache_hit" in attributes:
+                key = (stage, "hit" if attributes["cache_hit"] else "miss")
+                self._cache_lookups[key] = self._cache_lookups.get(key, 0) + 1
+            if "bytes_received" in attributes:
+                self._bytes[stage] = self._bytes.get(stage, 0) + attributes["bytes_received"]
+            if "elements" in attributes:
+                self._elements[stage] = self._elements.get(stage, 0) + attributes["elements"]
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            histograms = {stage: (list(counts), total, count) for stage, (counts, total, count) in self._histograms.items()}
+            errors = dict(self._errors)
+            cache_lookups = dict(self._cache_lookups)
+            received = dict(self._bytes)
+            elements = dict(self._elements)
+
+        lines = [
+            "# HELP tourism_stage_duration_seconds Time spent in each pipeline stage",
+            "# TYPE tourism_stage_duration_seconds histogram"
+        ]
+        for stage in sorted(histograms):
+            counts, total, count = histograms[stage]
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'tourism_stage_duration_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {bucket_count}')
+            lines.append(f'tourism_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'tourism_stage_duration_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'tourism_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+        lines += [
+            "# HELP tourism_stage_errors_total Stages that ended with an exception",
+            "# TYPE tourism_stage_errors_total counter"
+        ]
+        lines += [f'tourism_stage_errors_total{{stage="{stage}"}} {value}' for stage, value in sorted(errors.items())]
+
+        lines += [
+            "# HELP tourism_cache_lookups_total Cache lookups per stage and result",
+            "# TYPE tourism_cache_lookups_total counter"
+        ]
+        lines += [
+            f'tourism_cache_lookups_total{{stage="{stage}",result="{result}"}} {value}'
+            for (stage, result), value in sorted(cache_lookups.items())
+        ]
+
+        lines += [
+            "# HELP tourism_upstream_bytes_total Response bytes received per stage",
+            "# TYPE tourism_upstream_bytes_total counter"
+        ]
+        lines += [f'tourism_upstream_bytes_total{{stage="{stage}"}} {value}' for stage, value in sorted(received.items())]
+
+        lines += [
+            "# HELP tourism_elements_total Result elements (e.g. Overpass features) per stage",
+            "# TYPE tourism_elements_total counter"
+        ]
+        lines += [f'tourism_elements_total{{stage="{stage}"}} {value}' for stage, value in sorted(elements.items())]
+
+        return "\n".join(lines) + "\n"
+
+
+# Registered at import so metrics cover every span from the start
+_default_metrics = MetricsSink()
+add_sink(_default_metrics)
+
+
+def get_metrics() -> MetricsSink:
+    """
+    Return the process-wide metrics sink
+    """
+    return _default_metrics
+
+
+def prometheus_text() -> str:
+    """
+    Process-wide stage metrics in the Prometheus text format
+    """
+    return get_metrics().render()
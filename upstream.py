@@ -0,0 +1,570 @@
+"""
+Upstream Client - Shared async HTTP layer with pooled keep-alive sessions for all upstream APIs
+"""
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Coroutine, Dict, Iterator, List, Optional, Tuple
+
+from endpoints import Endpoint, EndpointPool, endpoint_urls
+from recording import get_recorder
+from scheduler import THROTTLE_STATUSES, get_scheduler, parse_retry_after
+from tracing import Span, span
+
+if TYPE_CHECKING:
+    import aiohttp
+
+USER_AGENT = "Tourism-AI-Agent/1.0"
+
+# Base URL of every upstream service, each can be overridden through the environment
+DEFAULT_BASE_URLS = {
+    "nominatim": "https://nominatim.openstreetmap.org",
+    "open_meteo": "https://api.open-meteo.com",
+    "overpass": "https://overpass-api.de"
+}
+
+BASE_URL_ENV_VARS = {
+    "nominatim": "TOURISM_NOMINATIM_URL",
+    "open_meteo": "TOURISM_OPEN_METEO_URL",
+    "overpass": "TOURISM_OVERPASS_URL"
+}
+
+# Services served by interchangeable mirrors, preferred first; requests to
+# them are hedged and every mirror has a circuit breaker (see endpoints.py)
+DEFAULT_ENDPOINTS = {
+    "overpass": ["https://overpass-api.de", "https://overpass.kumi.systems"]
+}
+
+
+class UpstreamError(Exception):
+    """
+    Raised when an upstream service answers with an HTTP error status
+    """
+
+    def __init__(self, service: str, status: int, message: str = ""):
+        super().__init__(f"{service} returned HTTP {status}{': ' + message if message else ''}")
+        self.service = service
+        self.status = status
+
+
+class UpstreamThrottled(UpstreamError):
+    """
+    Raised when an upstream service keeps rate limiting or timing out, as
+    opposed to answering that nothing was found
+    """
+
+
+class UpstreamClient:
+    """
+    Async-first HTTP client holding one pooled keep-alive session per upstream host
+
+    Sessions are bound to the event loop that created them, so every loop that
+    uses the client gets its own pool. Synchronous callers go through
+    ``run_sync`` which serves all of them from one background event loop.
+    """
+
+    def __init__(self, base_urls: Optional[Dict[str, str]] = None, limit_per_host: int = 32,
+                 endpoints: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            base_urls: Overrides for the upstream base URLs, keyed by service name
+            limit_per_host: Maximum pooled connections per upstream host
+            endpoints: Mirror URLs of the services in DEFAULT_ENDPOINTS, preferred first
+        """
+        self.base_urls = {
+            service: os.environ.get(BASE_URL_ENV_VARS[service], url)
+            for service, url in DEFAULT_BASE_URLS.items()
+        }
+        self.base_urls.update(base_urls or {})
+        self.limit_per_host = limit_per_host
+
+        # A single configured base URL replaces the default mirrors
+        self.pools = {}
+        for service, defaults in DEFAULT_ENDPOINTS.items():
+            configured = (base_urls or {}).get(service) or os.environ.get(BASE_URL_ENV_VARS[service])
+            urls = (endpoints or {}).get(service) or endpoint_urls(service, configured, defaults)
+            self.pools[service] = EndpointPool(service, urls)
+
+        self._sessions = weakref.WeakKeyDictionary()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "connections_opened": 0}
+
+    def url(self, service: str, path: str) -> str:
+        return self.base_urls[service].rstrip("/") + path
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Request and connection counters, connections_opened counts TCP(+TLS) handshakes
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def endpoint_stats(self) -> Dict[str, Dict]:
+        """
+        Hedging counters and per-endpoint health of the mirrored services
+        """
+        return {service: pool.stats() for service, pool in self.pools.items()}
+
+    def _session(self, service: str) -> "aiohttp.ClientSession":
+        """
+        Return the pooled session for a service on the running event loop
+        """
+        # aiohttp takes about a third of a second to import, so it is loaded
+        # with the first request rather than with the agent modules
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        sessions = self._sessions.setdefault(loop, {})
+        session = sessions.get(service)
+
+        if session is None or session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_start.append(self._on_request_start)
+            trace_config.on_connection_create_end.append(self._on_connection_create_end)
+
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.limit_per_host, keepalive_timeout=60),
+                headers={"User-Agent": USER_AGENT},
+                trace_configs=[trace_config]
+            )
+            sessions[service] = session
+
+        return session
+
+    async def _on_request_start(self, session, context, params):
+        self._count("requests")
+
+    async def _on_connection_create_end(self, session, context, params):
+        self._count("connections_opened")
+
+    async def get_json(self, service: str, path: str, params: Optional[Dict] = None, timeout: float = 10) -> Any:
+        """
+        GET a JSON document from an upstream service
+
+        Args:
+            service: Upstream service name (nominatim, open_meteo, overpass)
+            path: Request path below the service base URL
+            params: Query string parameters
+            timeout: Total timeout in seconds
+
+        Returns:
+            Decoded JSON body
+        """
+        async with self._recorded(service, "GET", path, params) as exchange:
+            async with self._request(service, "GET", path, timeout, params=params) as (response, current):
+                body = await response.read()
+                current.set(bytes_received=len(body))
+                if exchange is not None:
+                    exchange.update(status=response.status, body=body)
+                return json.loads(body)
+
+    async def post_form(self, service: str, path: str, data: Dict, timeout: float = 30) -> Any:
+        """
+        POST form data to an upstream service and decode the JSON answer
+
+        Args:
+            service: Upstream service name (nominatim, open_meteo, overpass)
+            path: Request path below the service base URL
+            data: Form fields
+            timeout: Total timeout in seconds
+
+        Returns:
+            Decoded JSON body
+        """
+        async with self._recorded(service, "POST", path, data) as exchange:
+            async with self._request(service, "POST", path, timeout, data=data) as (response, current):
+                body = await response.read()
+                current.set(bytes_received=len(body))
+                if exchange is not None:
+                    exchange.update(status=response.status, body=body)
+                return json.loads(body)
+
+    @asynccontextmanager
+    async def stream_post_form(self, service: str, path: str, data: Dict,
+                               timeout: float = 30, chunk_size: int = 65536) -> AsyncIterator[AsyncIterator[bytes]]:
+        """
+        POST form data and stream the answer body in chunks
+
+        Leaving the context before the body is fully read closes the connection,
+        so callers can stop downloading as soon as they have what they need.
+
+        Args:
+            service: Upstream service name (nominatim, open_meteo, overpass)
+            path: Request path below the service base URL
+            data: Form fields
+            timeout: Total timeout in seconds
+            chunk_size: Maximum bytes per chunk
+
+        Yields:
+            Async iterator over body chunks
+        """
+        async with self._recorded(service, "POST", path, data) as exchange, \
+                self._request(service, "POST", path, timeout, data=data) as (response, current):
+            current.set(bytes_received=0)
+            received = [] if exchange is not None else None
+
+            async def counted_chunks():
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    current.attributes["bytes_received"] += len(chunk)
+                    if received is not None:
+                        received.append(chunk)
+                    yield chunk
+
+            try:
+                yield counted_chunks()
+            finally:
+                if exchange is not None:
+                    exchange.update(status=response.status, body=b"".join(received),
+                                    complete=response.content.at_eof())
+                if not response.content.at_eof():
+                    response.close()
+
+    @asynccontextmanager
+    async def _recorded(self, service: str, method: str, path: str,
+                        fields: Optional[Dict]) -> AsyncIterator[Optional[Dict]]:
+        """
+        Record the exchange made inside the context when recording is on (see recording.py)
+
+        Yields:
+            None when not recording, otherwise a dict the caller fills with
+            the status and body of the answer; error statuses are filled in here
+        """
+        recorder = get_recorder()
+        if not recorder.enabled:
+            yield None
+            return
+
+        exchange = {"status": None, "body": None, "complete": True}
+        started, started_clock = time.time(), time.perf_counter()
+        try:
+            yield exchange
+        except UpstreamError as e:
+            exchange["status"] = e.status
+            raise
+        finally:
+            # Nothing is recorded for requests cancelled before an answer
+            if exchange["status"] is not None:
+                recorder.upstream(service, method, path, fields, exchange["status"], exchange["body"], started,
+                                  time.perf_counter() - started_clock, exchange["complete"])
+
+    def _request(self, service: str, method: str, path: str, timeout: float, **kwargs):
+        if service in self.pools:
+            return self._hedged_response(service, method, path, timeout, **kwargs)
+        return self._response(service, method, path, timeout, **kwargs)
+
+    @asynccontextmanager
+    async def _hedged_response(self, service: str, method: str, path: str, timeout: float,
+                               **kwargs) -> AsyncIterator[Tuple["aiohttp.ClientResponse", Span]]:
+        """
+        Send a request to the service's preferred endpoint, hedging to the next one when it is slow
+
+        The request goes to the first endpoint whose circuit breaker lets it
+        through. If that endpoint fails or throttles, the next one gets the
+        request at once.
+        If it hasn't answered after the pool's hedge delay (its recent p95) and
+        the hedge budget allows, the next one gets the same request as well.
+        The first answer is used and the other attempt is cancelled, which
+        closes its connection.
+
+        Yields:
+            (response, span) of the winning attempt
+
+        Raises:
+            UpstreamThrottled: Every endpoint's breaker is open
+            UpstreamError: The request itself was rejected (a 4xx answer), or
+                every endpoint failed and this was the last error
+        """
+        pool = self.pools[service]
+        candidates = pool.start()
+        if not candidates:
+            raise UpstreamThrottled(service, 503, "every endpoint is unavailable")
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        won = loop.create_future()
+        release = asyncio.Event()
+        attempts = {}
+
+        async def attempt(endpoint: Endpoint, hedge: bool, retry_throttled: bool):
+            pool.sent(endpoint, hedge)
+            sent = loop.time()
+            try:
+                async with self._response(service, method, path, timeout, endpoint=endpoint,
+                                          retry_throttled=retry_throttled, **kwargs) as (response, current):
+                    first = not won.done()
+                    pool.answered(endpoint, loop.time() - sent, loop.time() - started if first else None, hedge and first)
+                    if not first:
+                        return
+                    current.set(hedge=hedge)
+                    won.set_result((response, current, asyncio.current_task()))
+                    # The caller reads the body, then lets the request finish
+                    await release.wait()
+            except asyncio.CancelledError:
+                if won.done() and won.result()[2] is not asyncio.current_task():
+                    pool.cancelled(endpoint)
+                raise
+            except UpstreamError as e:
+                if _rejected(e):
+                    pool.cancelled(endpoint)
+                else:
+                    pool.failed(endpoint, e)
+                raise
+            except Exception as e:
+                pool.failed(endpoint, e)
+                raise
+
+        def launch(hedge: bool) -> bool:
+            while candidates:
+                endpoint = candidates.pop(0)
+                # The first candidate was already let through by pool.start()
+                if not attempts or pool.allow(endpoint):
+                    # A throttled endpoint is left for the next one rather than retried, unless it is the last
+                    attempts[loop.create_task(attempt(endpoint, hedge, retry_throttled=not candidates))] = endpoint
+                    return True
+            return False
+
+        launch(hedge=False)
+        hedged = False
+        error = None
+        try:
+            while not won.done():
+                running = [task for task in attempts if not task.done()]
+                if not running and not candidates:
+                    break
+
+                wait_for = None
+                if candidates and running and not hedged:
+                    wait_for = max(pool.hedge_delay() - (loop.time() - started), 0.0)
+                done, _ = await asyncio.wait(running + [won], timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if won.done():
+                    break
+
+                failed = [task for task in done if task is not won and task.exception() is not None]
+                if failed:
+                    error = failed[0].exception()
+                    if isinstance(error, UpstreamError) and _rejected(error):
+                        raise error
+                    # Another endpoint gets the request right away, that is no hedge
+                    if launch(hedge=False):
+                        pool.failover()
+                elif not done:
+                    hedged = True
+                    if pool.take_hedge():
+                        launch(hedge=True)
+
+            if not won.done():
+                raise error or UpstreamThrottled(service, 503, "every endpoint is unavailable")
+
+            response, current, winner = won.result()
+            for task in attempts:
+                if task is not winner:
+                    task.cancel()
+            yield response, current
+        finally:
+            release.set()
+            for task in attempts:
+                if not task.done() and not (won.done() and won.result()[2] is task):
+                    task.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+    @asynccontextmanager
+    async def _response(self, service: str, method: str, path: str, timeout: float,
+                        endpoint: Optional[Endpoint] = None, retry_throttled: bool = True,
+                        **kwargs) -> AsyncIterator[Tuple["aiohttp.ClientResponse", Span]]:
+        """
+        Send one request through the service's scheduler, retrying throttled answers
+
+        Every attempt waits for a scheduler slot at the caller's request
+        priority. A 429/503/504 answer pauses the host (honouring Retry-After)
+        and the request is retried up to the scheduler's max_retries.
+
+        Args:
+            endpoint: Mirror to send the request to, with its own scheduler,
+                instead of the service's base URL
+            retry_throttled: Retry throttled answers, otherwise raise at the first one
+
+        Yields:
+            (response, span) for the successful attempt, the slot is held until exit
+
+        Raises:
+            UpstreamThrottled: The service kept throttling, or timed out
+            UpstreamError: Any other HTTP error status
+        """
+        import aiohttp
+
+        session = self._session(service)
+        scheduler = get_scheduler(endpoint.scheduler_name if endpoint else service)
+        url = endpoint.url + path if endpoint else self.url(service, path)
+        attempt = 0
+
+        while True:
+            async with scheduler.slot():
+                with span(f"upstream.{service}", path=path, attempt=attempt) as current:
+                    if endpoint:
+                        current.set(endpoint=endpoint.host)
+                    try:
+                        async with session.request(
+                            method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+                        ) as response:
+                            current.set(status=response.status)
+
+                            if response.status in THROTTLE_STATUSES:
+                                backoff = scheduler.throttled(parse_retry_after(response.headers.get("Retry-After")))
+                                current.set(backoff_s=round(backoff, 3))
+                                if attempt >= scheduler.max_retries or not retry_throttled:
+                                    raise UpstreamThrottled(service, response.status, response.reason or "")
+                            elif response.status >= 400:
+                                raise UpstreamError(service, response.status, response.reason or "")
+                            else:
+                                scheduler.succeeded()
+                                yield response, current
+                                return
+                    except asyncio.TimeoutError:
+                        raise UpstreamThrottled(service, 504, "timed out") from None
+
+            # The scheduler holds the retry back until the host's pause is over
+            attempt += 1
+
+    async def close(self):
+        """
+        Close the sessions owned by the running event loop
+        """
+        sessions = self._sessions.pop(asyncio.get_running_loop(), {})
+        for session in sessions.values():
+            await session.close()
+
+
+def _rejected(error: UpstreamError) -> bool:
+    """
+    Whether the request itself was refused (a 4xx other than throttling), which no mirror would answer
+    """
+    return error.status < 500 and not isinstance(error, UpstreamThrottled)
+
+
+class _LoopThread:
+    """
+    Background event loop that serves every synchronous caller
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="tourism-upstream-loop", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+_client = None
+_loop_thread = None
+_lock = threading.Lock()
+
+
+def get_client() -> UpstreamClient:
+    """
+    Return the process-wide upstream client, creating it on first use
+    """
+    global _client
+
+    with _lock:
+        if _client is None:
+            _client = UpstreamClient()
+        return _client
+
+
+def configure_client(base_urls: Optional[Dict[str, str]] = None, **kwargs) -> UpstreamClient:
+    """
+    Replace the process-wide upstream client, e.g. to point at local stand-in servers
+
+    Args:
+        base_urls: Overrides for the upstream base URLs, keyed by service name
+        **kwargs: Further UpstreamClient options
+
+    Returns:
+        The new client
+    """
+    global _client
+
+    client = UpstreamClient(base_urls, **kwargs)
+    with _lock:
+        _client = client
+    return client
+
+
+def _shared_loop() -> _LoopThread:
+    global _loop_thread
+
+    with _lock:
+        if _loop_thread is None:
+            _loop_thread = _LoopThread()
+        return _loop_thread
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the shared background loop and wait for its result
+
+    Args:
+        coro: Coroutine to run
+        timeout: Seconds to wait before giving up
+
+    Returns:
+        The coroutine's result
+    """
+    loop_thread = _shared_loop()
+
+    if threading.current_thread() is loop_thread.thread:
+        coro.close()
+        raise RuntimeError("run_sync() called from the upstream event loop, await the coroutine instead")
+
+    future = asyncio.run_coroutine_threadsafe(coro, loop_thread.loop)
+    return future.result(timeout)
+
+
+def run_background(coro: Coroutine) -> concurrent.futures.Future:
+    """
+    Start a coroutine on the shared background loop without waiting for it, e.g. a periodic job
+
+    Returns:
+        Future of the coroutine's result; cancelling it cancels the coroutine
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _shared_loop().loop)
+
+
+def iterate_sync(iterator: AsyncIterator) -> Iterator:
+    """
+    Iterate an async iterator from synchronous code, each item is fetched on the shared background loop
+
+    Args:
+        iterator: Async iterator, e.g. an async generator
+
+    Yields:
+        The iterator's items as soon as each one is ready
+    """
+    async def next_item():
+        return await iterator.__anext__()
+
+    async def close():
+        await iterator.aclose()
+
+    try:
+        while True:
+            try:
+                item = run_sync(next_item())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        # Stopping early closes the async iterator so its pending work is cancelled
+        if hasattr(iterator, "aclose"):
+            run_sync(close())
@@ -0,0 +1,369 @@
+"""
+Warming - Keeps the geocodes, weather and attractions of popular destinations cached
+
+Every answered query records its place in a count-min sketch whose counts
+halve every DECAY_SECONDS, so the destinations it ranks highest follow
+recent traffic. The warmer keeps the seed destinations (the app's example
+cities by default) and the top learned ones cached: it warms them when it
+starts and then again shortly after every weather time bucket begins, at
+PREFETCH priority so it never delays a user's request.
+
+A round resolves every destination (the geocode cache keeps them for 30
+days, so this rarely calls Nominatim), refetches the weather of all of them
+in one batched Open-Meteo call, and refetches the attractions whose cache
+entries would expire before the next round. Hot destinations are therefore
+answered from fresh cache entries.
+
+The top destinations are saved after every round and counted again when the
+warmer is created, so a restarted process warms them straight away.
+Services and the daemon start the warmer with the agent; set TOURISM_WARM=0
+to turn it off.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from geocode_cache import normalize_key
+from geocoding import ResolvedPlace, resolve_place_async
+from places_agent import refresh_attractions_async
+from places_cache import get_places_cache
+from scheduler import PREFETCH, request_priority
+from tracing import span
+from upstream import UpstreamThrottled, run_background
+from weather_agent import refresh_weather_many_async
+from weather_cache import get_weather_cache
+
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "tourism_ai", "popular_destinations.json")
+# The example cities shown in app.py
+DEFAULT_SEEDS = ["Bangalore", "Delhi", "Paris", "Mumbai", "Jaipur"]
+# Learned destinations kept warm, and how often one must be asked for first
+DEFAULT_TOP_N = 20
+DEFAULT_MIN_COUNT = 2
+# Attractions are cached like the places agent asks for them
+ATTRACTIONS_LIMIT = 5
+
+# 4 rows of 2048 counters over-count a place by at most 0.13% of the traffic, with 98% probability
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+# Counts halve every hour, so yesterday's peak fades out
+DECAY_SECONDS = 3600.0
+# Rounds start this share of a weather bucket after it begins (18 s of 15 minutes)
+ROUND_DELAY = 0.02
+
+
+class CountMinSketch:
+    """
+    Approximate counts of many keys in fixed memory
+
+    Each key increments one counter per row; its count is the smallest of
+    them, which never under-counts. Conservative updates only raise the
+    counters at that minimum, which keeps the over-count of rare keys low.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self._rows = [[0] * width for _ in range(depth)]
+
+    def _columns(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width for row in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """
+        Count a key, returning its new estimated count
+        """
+        columns = self._columns(key)
+        estimate = min(row[column] for row, column in zip(self._rows, columns)) + count
+        for row, column in zip(self._rows, columns):
+            if row[column] < estimate:
+                row[column] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[column] for row, column in zip(self._rows, self._columns(key)))
+
+    def decay(self):
+        """
+        Halve every count
+        """
+        self._rows = [[count >> 1 for count in row] for row in self._rows]
+
+
+class PopularDestinations:
+    """
+    Most asked for destinations, from a decaying count-min sketch
+
+    The sketch counts every destination; only the ``capacity`` with the
+    highest counts are kept by name as candidates for the top list.
+    """
+
+    def __init__(self, capacity: int = 4 * DEFAULT_TOP_N, decay_seconds: float = DECAY_SECONDS):
+        self.capacity = capacity
+        self.decay_seconds = decay_seconds
+        self.sketch = CountMinSketch()
+        # Normalized key -> [place name, estimated count]
+        self._candidates = {}
+        self._decayed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, place_name: str, count: int = 1):
+        """
+        Count a destination, count times (e.g. when restoring saved counts)
+        """
+        key = normalize_key(place_name)
+        if not key:
+            return
+
+        with self._lock:
+            if time.monotonic() - self._decayed_at >= self.decay_seconds:
+                self._decay()
+
+            count = self.sketch.add(key, count)
+            if key in self._candidates:
+                self._candidates[key][1] = count
+            elif len(self._candidates) < self.capacity:
+                self._candidates[key] = [place_name, count]
+            else:
+                coldest = min(self._candidates, key=lambda candidate: self._candidates[candidate][1])
+                if count > self._candidates[coldest][1]:
+                    del self._candidates[coldest]
+                    self._candidates[key] = [place_name, count]
+
+    def _decay(self):
+        self.sketch.decay()
+        for candidate in self._candidates.values():
+            candidate[1] >>= 1
+        self._decayed_at = time.monotonic()
+
+    def top(self, count: int, min_count: int = 1) -> List[Tuple[str, int]]:
+        """
+        Up to count (place name, estimated count) pairs, most asked for first
+        """
+        with self._lock:
+            ranked = sorted(self._candidates.values(), key=lambda candidate: candidate[1], reverse=True)
+        return [(name, estimate) for name, estimate in ranked[:count] if estimate >= min_count]
+
+
+class CacheWarmer:
+    """
+    Prefetches and refreshes the caches of the seed and most popular destinations
+    """
+
+    def __init__(self, seeds: Optional[List[str]] = None, top_n: int = DEFAULT_TOP_N,
+                 min_count: int = DEFAULT_MIN_COUNT, interval: Optional[float] = None, enabled: bool = True,
+                 state_path: Optional[str] = None):
+        """
+        Args:
+            seeds: Destinations always kept warm, DEFAULT_SEEDS by default
+            top_n: Learned destinations kept warm besides the seeds
+            min_count: Times a destination must have been asked for to be learned
+            interval: Seconds between rounds, by default one per weather time bucket
+            enabled: Whether start() runs the rounds, destinations are learned either way
+            state_path: JSON file the learned destinations are saved to and restored from, None to keep them in memory
+        """
+        self.seeds = list(DEFAULT_SEEDS if seeds is None else seeds)
+        self.top_n = top_n
+        self.min_count = min_count
+        self.interval = interval
+        self.enabled = enabled
+        self.popular = PopularDestinations(capacity=4 * max(top_n, 1))
+        self.counters = {"rounds": 0, "destinations": 0, "unresolved": 0, "weather_refreshed": 0,
+                         "attractions_refreshed": 0, "throttled": 0, "errors": 0}
+        self.last_round_s = None
+        self.state_path = state_path
+
+        self._lock = threading.Lock()
+        self._task = None
+        self._load()
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                for name, count in json.load(f)["destinations"]:
+                    self.popular.record(name, count)
+        except Exception as e:
+            print(f"Error reading popular destinations from {self.state_path}: {e}")
+
+    def _save(self):
+        if not self.state_path:
+            return
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Written next to the file and renamed, so a crash never leaves half a file
+            temporary = f"{self.state_path}.tmp"
+            with open(temporary, "w") as f:
+                json.dump({"destinations": self.popular.top(self.popular.capacity)}, f)
+            os.replace(temporary, self.state_path)
+        except Exception as e:
+            print(f"Error saving popular destinations to {self.state_path}: {e}")
+
+    def record(self, place_name: str):
+        """
+        Count a destination a user asked for
+        """
+        self.popular.record(place_name)
+
+    def destinations(self) -> List[str]:
+        """
+        Seed destinations followed by the most popular learned ones
+        """
+        names = {}
+        for name in self.seeds:
+            names.setdefault(normalize_key(name), name)
+        for name, _ in self.popular.top(self.top_n, self.min_count):
+            names.setdefault(normalize_key(name), name)
+        return list(names.values())
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    async def _resolve(self, place_name: str) -> Optional[ResolvedPlace]:
+        try:
+            place = await resolve_place_async(place_name)
+        except UpstreamThrottled:
+            self._count("throttled")
+            return None
+        if place is None:
+            self._count("unresolved")
+        return place
+
+    async def _refresh_attractions(self, place: ResolvedPlace, min_ttl: float):
+        if get_places_cache().expires_in(place.lat, place.lon, ATTRACTIONS_LIMIT) > min_ttl:
+            return
+        try:
+            if await refresh_attractions_async(place.lat, place.lon, ATTRACTIONS_LIMIT):
+                self._count("attractions_refreshed")
+        except UpstreamThrottled:
+            self._count("throttled")
+
+    async def warm(self) -> Dict[str, int]:
+        """
+        Run one round: resolve every destination and refresh its weather and attractions
+
+        Returns:
+            The warmer's counters after the round
+        """
+        started = time.perf_counter()
+        with request_priority(PREFETCH), span("warming") as current:
+            names = self.destinations()
+            resolved = [place for place in await asyncio.gather(*(self._resolve(name) for name in names)) if place]
+            current.set(destinations=len(names), resolved=len(resolved))
+
+            try:
+                self._count("weather_refreshed", await refresh_weather_many_async([place.coordinates for place in resolved]))
+            except UpstreamThrottled:
+                self._count("throttled")
+
+            # Entries that would expire before the next round are fetched now
+            min_ttl = 2 * self._next_round_in()
+            await asyncio.gather(*(self._refresh_attractions(place, min_ttl) for place in resolved))
+
+        with self._lock:
+            self.counters["rounds"] += 1
+            self.counters["destinations"] = len(names)
+        self.last_round_s = time.perf_counter() - started
+        self._save()
+        return self.stats()
+
+    def _next_round_in(self) -> float:
+        if self.interval is not None:
+            return self.interval
+        cache = get_weather_cache()
+        return cache.seconds_to_next_bucket() + ROUND_DELAY * cache.bucket_seconds
+
+    async def run(self):
+        """
+        Warm now and then once per interval, until cancelled
+        """
+        while True:
+            try:
+                await self.warm()
+            except Exception as e:
+                print(f"Error warming caches: {e}")
+                self._count("errors")
+            await asyncio.sleep(self._next_round_in())
+
+    def start(self) -> bool:
+        """
+        Start the rounds in the background, on the running event loop or else the shared one
+
+        Returns:
+            True if the warmer is running (it is started only once)
+        """
+        if not self.enabled:
+            return False
+
+        with self._lock:
+            if self._task is None:
+                try:
+                    self._task = asyncio.get_running_loop().create_task(self.run())
+                except RuntimeError:
+                    self._task = run_background(self.run())
+        return True
+
+    def stop(self):
+        with self._lock:
+            if self._task is not None:
+                self._task.cancel()
+                self._task = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["running"] = self._task is not None
+        stats["last_round_s"] = round(self.last_round_s, 3) if self.last_round_s is not None else None
+        stats["top"] = self.popular.top(self.top_n, self.min_count)
+        return stats
+
+
+_default_warmer = None
+_default_warmer_lock = threading.Lock()
+
+
+def get_warmer() -> CacheWarmer:
+    """
+    Return the process-wide cache warmer, creating it from the environment on first use
+
+    Environment:
+        TOURISM_WARM: 0 turns the background rounds off
+        TOURISM_WARM_SEEDS: Comma-separated destinations always kept warm
+        TOURISM_WARM_TOP_N: Learned destinations kept warm
+        TOURISM_WARM_INTERVAL: Seconds between rounds, by default one per weather time bucket
+        TOURISM_WARM_STATE_PATH: File the learned destinations are kept in, empty to keep them in memory only
+    """
+    global _default_warmer
+
+    with _default_warmer_lock:
+        if _default_warmer is None:
+            seeds = os.environ.get("TOURISM_WARM_SEEDS")
+            interval = os.environ.get("TOURISM_WARM_INTERVAL")
+            _default_warmer = CacheWarmer(
+                seeds=None if seeds is None else [name.strip() for name in seeds.split(",") if name.strip()],
+                top_n=int(os.environ.get("TOURISM_WARM_TOP_N", DEFAULT_TOP_N)),
+                interval=float(interval) if interval else None,
+                enabled=os.environ.get("TOURISM_WARM", "1") != "0",
+                state_path=os.environ.get("TOURISM_WARM_STATE_PATH", DEFAULT_STATE_PATH) or None
+            )
+        return _default_warmer
+
+
+def set_warmer(warmer: Optional[CacheWarmer]):
+    """
+    Replace the process-wide cache warmer (None recreates it from the environment)
+    """
+    global _default_warmer
+
+    with _default_warmer_lock:
+        if _default_warmer is not None and _default_warmer is not warmer:
+            _default_warmer.stop()
+        _default_warmer = warmer
@@ -1,15 +1,41 @@
 """
 Weather Agent - Uses Open-Meteo API to get current weather and forecast
 """
-import requests
-from typing import Optional, Dict
-from geocoding import get_coordinates
+import asyncio
+from typing import TYPE_CHECKING, Callable, Optional, Dict, List, Tuple
+from geocoding import ResolvedPlace, geocode_async
+from geocode_cache import MISSING
+from query_parser import DateRange
+from singleflight import get_group
+from tracing import span
+from upstream import UpstreamThrottled, get_client, run_sync
+from weather_cache import WeatherCache, get_forecast_cache, get_weather_cache
+
+if TYPE_CHECKING:
+    from forecast import HourlyForecast
+
+# Open-Meteo accepts comma-separated coordinate lists, this many per call
+MAX_LOCATIONS_PER_CALL = 100
+CURRENT_VARIABLES = "temperature_2m,precipitation_probability,weather_code"
 
 
 def get_weather(place_name: str) -> Optional[Dict]:
     """
     Get current weather for a place using Open-Meteo API
     
+    Args:
+        place_name: Name of the place
+        
+    Returns:
+        Dictionary with weather information, or None if place not found
+    """
+    return run_sync(get_weather_async(place_name))
+
+
+async def get_weather_async(place_name: str) -> Optional[Dict]:
+    """
+    Async variant of get_weather
+    
     Args:
         place_name: Name of the place
         
@@ -17,60 +43,410 @@ def get_weather(place_name: str) -> Optional[Dict]:
         Dictionary with weather information, or None if place not found
     """
     # First, get coordinates
-    coords = get_coordinates(place_name)
+    result = await geocode_async(place_name)
     
-    if not coords:
+    if not result:
         return None
+        
+    return await get_weather_at_async(result["lat"], result["lon"])
+
+
+def get_weather_at(lat: float, lon: float) -> Optional[Dict]:
+    """
+    Get current weather for already resolved coordinates using Open-Meteo API
     
-    lat, lon = coords
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        
+    Returns:
+        Dictionary with weather information, or None if the lookup failed
+    """
+    return run_sync(get_weather_at_async(lat, lon))
+
+
+async def get_weather_at_async(lat: float, lon: float) -> Optional[Dict]:
+    """
+    Async variant of get_weather_at
     
-    # Open-Meteo API endpoint
-    base_url = "https://api.open-meteo.com/v1/forecast"
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        
+    Returns:
+        Dictionary with weather information, or None if the lookup failed
+    """
+    with span("weather") as current:
+        # Serve from the shared cache, refreshing stale cells in the background
+        cache = get_weather_cache()
+        cached, fresh = cache.get(lat, lon)
+        current.set(cache_hit=cached is not MISSING)
+        
+        if cached is not MISSING:
+            current.set(fresh=fresh)
+            if not fresh:
+                cache.revalidate([(lat, lon)], _fetch_many)
+            return cached
+        
+        # Concurrent requests for the same grid cell share one Open-Meteo call
+        return await get_group("weather").do_async(cache.cell(lat, lon), lambda: _fetch_and_cache(lat, lon))
+
+
+async def _fetch_and_cache(lat: float, lon: float) -> Optional[Dict]:
+    weather = await _fetch_current(lat, lon)
+    if weather is not None:
+        get_weather_cache().set(lat, lon, weather)
     
+    return weather
+
+
+async def _fetch_current(lat: float, lon: float) -> Optional[Dict]:
+    """
+    Call Open-Meteo API for the current weather at one point
+    """
     params = {
         "latitude": lat,
         "longitude": lon,
-        "current": "temperature_2m,precipitation_probability,weather_code",
+        "current": CURRENT_VARIABLES,
         "timezone": "auto"
     }
     
     try:
-        response = requests.get(base_url, params=params, timeout=10)
-        response.raise_for_status()
+        data = await get_client().get_json("open_meteo", "/v1/forecast", params=params, timeout=10)
+        
+        return _parse_current(data)
+    except UpstreamThrottled:
+        raise
+    except Exception as e:
+        print(f"Error fetching weather: {e}")
+        return None
+
+
+async def get_weather_many_async(coordinates: List[Tuple[float, float]]) -> List[Optional[Dict]]:
+    """
+    Get current weather for many coordinates with one Open-Meteo call per
+    MAX_LOCATIONS_PER_CALL locations
+    
+    Args:
+        coordinates: List of (latitude, longitude)
         
-        data = response.json()
+    Returns:
+        Weather dictionaries (or None where the lookup failed), in input order
         
-        if "current" in data:
-            current = data["current"]
-            return {
-                "temperature": current.get("temperature_2m", "N/A"),
-                "precipitation_probability": current.get("precipitation_probability", 0),
-                "weather_code": current.get("weather_code", 0)
-            }
+    Raises:
+        UpstreamThrottled: Open-Meteo kept rate limiting a missing location
+    """
+    with span("weather.many", locations=len(coordinates)) as current:
+        return await _get_many_cached(get_weather_cache(), coordinates, _fetch_many, current)
+
+
+async def _get_many_cached(cache: WeatherCache, coordinates: List[Tuple[float, float]],
+                           fetch: Callable, current) -> List:
+    """
+    Serve many points from a grid cell cache, fetching the missing ones together
+    and refreshing the stale ones in the background
+    """
+    results = []
+    missing = []
+    stale = []
+    
+    for lat, lon in coordinates:
+        cached, fresh = cache.get(lat, lon)
+        if cached is MISSING:
+            missing.append((lat, lon))
+        elif not fresh:
+            stale.append((lat, lon))
+        results.append(None if cached is MISSING else cached)
+    
+    current.set(cache_misses=len(missing), stale=len(stale))
+    
+    if stale:
+        cache.revalidate(stale, fetch)
+    
+    if missing:
+        fetched = dict(zip(missing, await fetch(missing)))
+        for (lat, lon), value in fetched.items():
+            if value is not None:
+                cache.set(lat, lon, value)
+        results = [
+            fetched.get(point) if value is None else value
+            for point, value in zip(coordinates, results)
+        ]
+    
+    return results
+
+
+async def refresh_weather_many_async(coordinates: List[Tuple[float, float]]) -> int:
+    """
+    Fetch the weather of every point whose cached value isn't from the current
+    time bucket, with one Open-Meteo call per MAX_LOCATIONS_PER_CALL locations
+    
+    Args:
+        coordinates: List of (latitude, longitude)
         
-        return None
+    Returns:
+        Number of points whose weather was refreshed
+        
+    Raises:
+        UpstreamThrottled: Open-Meteo kept rate limiting us
+    """
+    cache = get_weather_cache()
+    # One point per grid cell is enough
+    cells = {cache.cell(lat, lon): (lat, lon) for lat, lon in coordinates if not cache.is_fresh(lat, lon)}
+    if not cells:
+        return 0
+    
+    points = list(cells.values())
+    refreshed = 0
+    for (lat, lon), weather in zip(points, await _fetch_many(points)):
+        if weather is not None:
+            cache.set(lat, lon, weather)
+            refreshed += 1
+    
+    return refreshed
+
+
+def get_forecast_at(lat: float, lon: float) -> Optional["HourlyForecast"]:
+    """
+    Get the hourly forecast for already resolved coordinates using Open-Meteo API
+    
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        
+    Returns:
+        HourlyForecast of the next FORECAST_DAYS days, or None if the lookup failed
+    """
+    return run_sync(get_forecast_at_async(lat, lon))
+
+
+async def get_forecast_at_async(lat: float, lon: float) -> Optional["HourlyForecast"]:
+    """
+    Async variant of get_forecast_at
+    
+    Args:
+        lat: Latitude of the place
+        lon: Longitude of the place
+        
+    Returns:
+        HourlyForecast of the next FORECAST_DAYS days, or None if the lookup failed
+    """
+    with span("forecast") as current:
+        # Whole forecasts are cached per grid cell, any range of days is a slice of one
+        cache = get_forecast_cache()
+        cached, fresh = cache.get(lat, lon)
+        current.set(cache_hit=cached is not MISSING)
+        
+        if cached is not MISSING:
+            current.set(fresh=fresh)
+            if not fresh:
+                cache.revalidate([(lat, lon)], _fetch_forecasts)
+            return cached
+        
+        return await get_group("forecast").do_async(cache.cell(lat, lon), lambda: _fetch_and_cache_forecast(lat, lon))
+
+
+async def _fetch_and_cache_forecast(lat: float, lon: float) -> Optional["HourlyForecast"]:
+    forecast = (await _fetch_forecasts([(lat, lon)]))[0]
+    if forecast is not None:
+        get_forecast_cache().set(lat, lon, forecast)
+    
+    return forecast
+
+
+async def get_forecast_many_async(coordinates: List[Tuple[float, float]]) -> List[Optional["HourlyForecast"]]:
+    """
+    Get hourly forecasts for many coordinates with one Open-Meteo call per
+    MAX_LOCATIONS_PER_CALL locations
+    
+    Args:
+        coordinates: List of (latitude, longitude)
+        
+    Returns:
+        HourlyForecast objects (or None where the lookup failed), in input order
+        
+    Raises:
+        UpstreamThrottled: Open-Meteo kept rate limiting a missing location
+    """
+    with span("forecast.many", locations=len(coordinates)) as current:
+        return await _get_many_cached(get_forecast_cache(), coordinates, _fetch_forecasts, current)
+
+
+async def _fetch_many(coordinates: List[Tuple[float, float]]) -> List[Optional[Dict]]:
+    """
+    Call Open-Meteo API for the current weather at many points, MAX_LOCATIONS_PER_CALL per request
+    """
+    return await _fetch_chunked(coordinates, {"current": CURRENT_VARIABLES}, _parse_current)
+
+
+async def _fetch_forecasts(coordinates: List[Tuple[float, float]]) -> List[Optional["HourlyForecast"]]:
+    """
+    Call Open-Meteo API for the whole hourly forecast at many points, MAX_LOCATIONS_PER_CALL per request
+    """
+    # Forecasts are kept in NumPy arrays, NumPy is imported with the first one
+    from forecast import FORECAST_DAYS, HOURLY_VARIABLES, HourlyForecast
+    
+    params = {"hourly": HOURLY_VARIABLES, "forecast_days": FORECAST_DAYS}
+    return await _fetch_chunked(coordinates, params, HourlyForecast.from_open_meteo)
+
+
+async def _fetch_chunked(coordinates: List[Tuple[float, float]], variables: Dict, parse: Callable) -> List:
+    chunks = [
+        coordinates[start:start + MAX_LOCATIONS_PER_CALL]
+        for start in range(0, len(coordinates), MAX_LOCATIONS_PER_CALL)
+    ]
+    
+    results = await asyncio.gather(*(_get_weather_chunk(chunk, variables, parse) for chunk in chunks))
+    
+    return [weather for chunk_results in results for weather in chunk_results]
+
+
+async def _get_weather_chunk(coordinates: List[Tuple[float, float]], variables: Dict, parse: Callable) -> List:
+    """
+    One multi-location Open-Meteo call, each location's block turned into a value by parse
+    """
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in coordinates),
+        "longitude": ",".join(str(lon) for _, lon in coordinates),
+        **variables,
+        "timezone": "auto"
+    }
+    
+    try:
+        data = await get_client().get_json("open_meteo", "/v1/forecast", params=params, timeout=10)
+    except UpstreamThrottled:
+        raise
     except Exception as e:
         print(f"Error fetching weather: {e}")
-        return None
+        return [None] * len(coordinates)
+    
+    # A single location comes back as an object, several as a list
+    if isinstance(data, dict):
+        data = [data]
+    
+    results = [parse(item) for item in data[:len(coordinates)]]
+    results.extend([None] * (len(coordinates) - len(results)))
+    return results
+
+
+def _parse_current(data: Dict) -> Optional[Dict]:
+    """
+    Extract the fields we use from an Open-Meteo "current" block
+    """
+    if "current" in data:
+        current = data["current"]
+        return {
+            "temperature": current.get("temperature_2m", "N/A"),
+            "precipitation_probability": current.get("precipitation_probability", 0),
+            "weather_code": current.get("weather_code", 0)
+        }
+    
+    return None
 
 
-def format_weather_response(place_name: str) -> str:
+def format_weather_response(place_name: str, place: Optional[ResolvedPlace] = None,
+                            dates: Optional[DateRange] = None) -> str:
     """
     Format weather information as a natural language response
     
     Args:
         place_name: Name of the place
+        place: Already resolved place, skips geocoding when given
+        dates: Days to forecast, the current weather when None
         
     Returns:
         Formatted weather response string
     """
-    weather_data = get_weather(place_name)
+    return run_sync(format_weather_response_async(place_name, place, dates))
+
+
+async def format_weather_response_async(place_name: str, place: Optional[ResolvedPlace] = None,
+                                        dates: Optional[DateRange] = None) -> str:
+    """
+    Async variant of format_weather_response
     
+    Args:
+        place_name: Name of the place
+        place: Already resolved place, skips geocoding when given
+        dates: Days to forecast, the current weather when None
+        
+    Returns:
+        Formatted weather response string
+        
+    Raises:
+        UpstreamThrottled: A service kept rate limiting the lookup
+    """
+    if dates:
+        if place:
+            lat, lon = place.lat, place.lon
+        else:
+            result = await geocode_async(place_name)
+            if not result:
+                return format_forecast(place_name, None, dates)
+            lat, lon = result["lat"], result["lon"]
+        
+        return format_forecast(place_name, await get_forecast_at_async(lat, lon), dates)
+    
+    if place:
+        weather_data = await get_weather_at_async(place.lat, place.lon)
+    else:
+        weather_data = await get_weather_async(place_name)
+    
+    return format_weather(place_name, weather_data)
+
+
+def format_weather(place_name: str, weather_data: Optional[Dict]) -> str:
+    """
+    Format already fetched weather information as a natural language response
+    
+    Args:
+        place_name: Name of the place
+        weather_data: Result of get_weather, or None
+        
+    Returns:
+        Formatted weather response string
+    """
     if not weather_data:
         return f"I don't know if the place '{place_name}' exists. Could you check the spelling?"
-    
+        
     temp = weather_data["temperature"]
     precip_prob = weather_data["precipitation_probability"]
     
     return f"In {place_name} it's currently {temp}°C with a chance of {precip_prob}% to rain."
 
+
+def format_forecast(place_name: str, forecast: Optional["HourlyForecast"], dates: DateRange) -> str:
+    """
+    Format a forecast of some days as a natural language response
+    
+    Args:
+        place_name: Name of the place
+        forecast: Result of get_forecast_at, or None
+        dates: Days asked about
+        
+    Returns:
+        Formatted forecast response string
+    """
+    if not forecast:
+        return f"I don't know if the place '{place_name}' exists. Could you check the spelling?"
+    
+    from forecast import describe_weather_code
+    
+    summary = forecast.summarize(dates.start, dates.end)
+    if not summary.days:
+        return (f"I can only forecast the weather in {place_name} from {forecast.start:%a %d %b} "
+                f"to {forecast.end:%a %d %b}, so I can't tell you about {dates.start:%a %d %b} yet.")
+    
+    first, last = summary.days[0].day, summary.days[-1].day
+    when = f"on {first:%a %d %b}" if first == last else f"from {first:%a %d %b} to {last:%a %d %b}"
+    lines = [f"Here is the forecast for {place_name} {when}:"]
+    for day in summary.days:
+        rain = f"rain likely for {day.rain_hours} hours" if day.rain_hours else "dry"
+        lines.append(f"- {day.day:%a %d %b}: {day.low:.0f} to {day.high:.0f}°C, "
+                     f"{describe_weather_code(day.weather_code)}, {rain}")
+    if summary.best_day:
+        lines.append(f"{summary.best_day:%a %d %b} looks like the best day.")
+    if dates.end > summary.covered_until:
+        lines.append(f"The forecast doesn't reach beyond {summary.covered_until:%a %d %b} yet.")
+    
+    return "\n".join(lines)
@@ -0,0 +1,213 @@
+"""
+Weather Cache - Process-wide current-weather and forecast caches keyed by grid cell and time bucket
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
+
+from geocode_cache import MISSING, LRUCache
+
+# Open-Meteo refreshes "current" conditions every 15 minutes
+DEFAULT_BUCKET_SECONDS = 900
+# 0.1 degree cells are roughly 11km, about the size of a city centre
+DEFAULT_GRID_DEGREES = 0.1
+DEFAULT_MAX_ENTRIES = 5000
+# Hourly forecasts are updated about once an hour; at about 4 KB a forecast
+# the default size is some 20 MB
+DEFAULT_FORECAST_BUCKET_SECONDS = 3600
+DEFAULT_FORECAST_MAX_ENTRIES = 5000
+
+
+class WeatherCache:
+    """
+    Bounded cache of current weather (or forecasts) per lat/lon grid cell
+
+    An entry is fresh during the time bucket it was fetched in. During the
+    following bucket it is stale: it is still served immediately, while a
+    single background refresh per cell fetches the new value.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        grid_degrees: float = DEFAULT_GRID_DEGREES,
+        bucket_seconds: float = DEFAULT_BUCKET_SECONDS
+    ):
+        self.grid_degrees = grid_degrees
+        self.bucket_seconds = bucket_seconds
+        self._entries = LRUCache(max_entries)
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._counters = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """
+        Grid cell containing a point
+        """
+        return (round(lat / self.grid_degrees), round(lon / self.grid_degrees))
+
+    def _bucket(self) -> int:
+        return int(time.time() // self.bucket_seconds)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, lat: float, lon: float) -> Tuple[Any, bool]:
+        """
+        Look up the weather of the cell containing a point
+
+        Returns:
+            (value, fresh), value is MISSING if nothing usable is cached
+        """
+        entry = self._entries.get(self.cell(lat, lon))
+        if entry is MISSING:
+            self._count("misses")
+            return MISSING, False
+
+        value, bucket = entry
+        fresh = bucket == self._bucket()
+        self._count("fresh_hits" if fresh else "stale_hits")
+        return value, fresh
+
+    def is_fresh(self, lat: float, lon: float) -> bool:
+        """
+        Whether the cell containing a point holds this bucket's weather, without counting a hit or miss
+        """
+        entry = self._entries.get(self.cell(lat, lon))
+        return entry is not MISSING and entry[1] == self._bucket()
+
+    def seconds_to_next_bucket(self) -> float:
+        return self.bucket_seconds - time.time() % self.bucket_seconds
+
+    def set(self, lat: float, lon: float, value: Dict):
+        """
+        Store the weather of the cell containing a point for this bucket and the next
+        """
+        bucket = self._bucket()
+        expires_at = (bucket + 2) * self.bucket_seconds
+        self._entries.set(self.cell(lat, lon), (value, bucket), expires_at)
+
+    def revalidate(self, points: List[Tuple[float, float]],
+                   fetch: Callable[[List[Tuple[float, float]]], Coroutine]):
+        """
+        Refresh stale cells in the background, at most once at a time per cell
+
+        Args:
+            points: (latitude, longitude) of the stale entries
+            fetch: Coroutine function taking the points to refresh and
+                returning their new values (or None) in the same order
+        """
+        with self._lock:
+            pending = {}
+            for lat, lon in points:
+                cell = self.cell(lat, lon)
+                if cell not in self._refreshing and cell not in pending:
+                    pending[cell] = (lat, lon)
+            self._refreshing.update(pending)
+
+        if not pending:
+            return
+
+        async def refresh():
+            try:
+                points = list(pending.values())
+                for (lat, lon), value in zip(points, await fetch(points)):
+                    if value is not None:
+                        self.set(lat, lon, value)
+                        self._count("refreshes")
+            except Exception as e:
+                print(f"Error refreshing weather cache: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(pending)
+
+        # Keep a reference so the task isn't garbage collected mid-flight
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit/miss/refresh counters for sizing the cache
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        stats["evictions"] = self._entries.evictions
+        stats["entries"] = len(self._entries)
+        return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_weather_cache() -> WeatherCache:
+    """
+    Return the process-wide weather cache, creating it from the environment on first use
+
+    Environment:
+        TOURISM_WEATHER_CACHE_SIZE: Maximum cached grid cells
+        TOURISM_WEATHER_GRID_DEGREES: Grid cell size in degrees
+        TOURISM_WEATHER_BUCKET_SECONDS: Time bucket length in seconds
+    """
+    global _default_cache
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = WeatherCache(
+                max_entries=int(os.environ.get("TOURISM_WEATHER_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                grid_degrees=float(os.environ.get("TOURISM_WEATHER_GRID_DEGREES", DEFAULT_GRID_DEGREES)),
+                bucket_seconds=float(os.environ.get("TOURISM_WEATHER_BUCKET_SECONDS", DEFAULT_BUCKET_SECONDS))
+            )
+        return _default_cache
+
+
+def set_weather_cache(cache: Optional[WeatherCache]):
+    """
+    Replace the process-wide weather cache (None recreates it from the environment)
+    """
+    global _default_cache
+
+    with _default_cache_lock:
+        _default_cache = cache
+
+
+_forecast_cache = None
+
+
+def get_forecast_cache() -> WeatherCache:
+    """
+    Return the process-wide hourly forecast cache, creating it from the environment on first use
+
+    Environment:
+        TOURISM_FORECAST_CACHE_SIZE: Maximum cached grid cells
+        TOURISM_WEATHER_GRID_DEGREES: Grid cell size in degrees
+        TOURISM_FORECAST_BUCKET_SECONDS: Time bucket length in seconds
+    """
+    global _forecast_cache
+
+    with _default_cache_lock:
+        if _forecast_cache is None:
+            _forecast_cache = WeatherCache(
+                max_entries=int(os.environ.get("TOURISM_FORECAST_CACHE_SIZE", DEFAULT_FORECAST_MAX_ENTRIES)),
+                grid_degrees=float(os.environ.get("TOURISM_WEATHER_GRID_DEGREES", DEFAULT_GRID_DEGREES)),
+                bucket_seconds=float(os.environ.get("TOURISM_FORECAST_BUCKET_SECONDS", DEFAULT_FORECAST_BUCKET_SECONDS))
+            )
+        return _forecast_cache
+
+
+def set_forecast_cache(cache: Optional[WeatherCache]):
+    """
+    Replace the process-wide forecast cache (None recreates it from the environment)
+    """
+    global _forecast_cache
+
+    with _default_cache_lock:
+        _forecast_cache = cache